@@ -0,0 +1,258 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# ******************************************************************************
+# ZYNTHIAN PROJECT: Zynthian GUI
+#
+# zynmidi buffer decoder tests
+#
+# ******************************************************************************
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of
+# the License, or any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# For a full copy of the GNU General Public License see the LICENSE.txt file.
+#
+# ******************************************************************************
+#
+# Replays synthetic zynmidi buffers through the batch decoder and checks the
+# resulting event stream matches the legacy event-by-event loop. Also checks
+# zynmidi_read dispatches to the same destinations, in the same order, as
+# passing each event to zynmidi_event.
+#
+# ******************************************************************************
+
+import ctypes
+import random
+import unittest
+import functools
+from unittest import mock
+
+from zyngine.zynthian_zynmidi_decoder import *
+from zyngine import zynthian_state_manager as state_manager_module
+from zyngine.zynthian_chain_manager import zynthian_chain_manager
+
+DRIVER_ZMIPS = {3}
+MASTER_CHAN = 15
+
+
+def legacy_read(words, driver_zmips, master_chan):
+    """Reference model of legacy zynmidi_read loop => (izmip, ev) reaching dispatch & clock flag"""
+
+    events = []
+    clock = False
+    n = len(words)
+    i = 0
+    while i < n:
+        ev = words[i].to_bytes(4, 'big')
+        i += 1
+        izmip = ev[0]
+        evhead = ev[1]
+        ev = ev[1:]
+        if evhead == 0xF0:
+            sysex_data = bytearray(ev)
+            while i < n:
+                chunk = words[i].to_bytes(4, 'big')
+                sysex_data.extend(chunk)
+                if 0xF7 in chunk:
+                    break
+                i += 1
+            if i == n:
+                continue
+            while sysex_data[-1] != 0xF7:
+                del sysex_data[-1]
+            ev = bytes(sysex_data)
+        if izmip not in driver_zmips:
+            if evhead == 0xF8:
+                clock = True
+                continue
+            if evhead in (0xF9, 0xFE):
+                continue
+        events.append((izmip, ev))
+    return events, clock
+
+
+def batch_read(words, driver_zmips, master_chan):
+    """Flatten batch decoder output => (izmip, ev) & clock flag"""
+
+    buf = (ctypes.c_uint32 * len(words))(*words)
+    items, clock = decode_zynmidi_buffer(buf, len(words), driver_zmips, master_chan)
+    events = []
+    for item in items:
+        if item[0] == ZYNMIDI_CC_RUN:
+            for izmip, chan, ccnum, ccval in item[1]:
+                events.append((izmip, bytes((0xB0 | chan, ccnum, ccval))))
+        else:
+            events.append((item[1], item[2]))
+    return events, clock
+
+
+def random_stream(rnd, n):
+    words = []
+    while len(words) < n:
+        izmip = rnd.choice((0, 1, 3, 0xFF))
+        kind = rnd.random()
+        if kind < 0.5:
+            status = 0xB0 | rnd.choice((0, 1, 9, MASTER_CHAN))
+            words.append(izmip << 24 | status << 16 | rnd.randrange(128) << 8 | rnd.randrange(128))
+        elif kind < 0.65:
+            status = rnd.choice((0x80, 0x90, 0xC0, 0xE0)) | rnd.randrange(16)
+            words.append(izmip << 24 | status << 16 | rnd.randrange(128) << 8 | rnd.randrange(128))
+        elif kind < 0.9:
+            words.append(izmip << 24 | rnd.choice((0xF8, 0xF9, 0xFA, 0xFC, 0xFE)) << 16)
+        else:
+            data = [0xF0] + [rnd.randrange(128) for i in range(rnd.randrange(12))] + [0xF7]
+            data += [0] * (-(len(data) + 1) % 4)
+            words.append(izmip << 24 | data[0] << 16 | data[1] << 8 | data[2])
+            for i in range(3, len(data), 4):
+                words.append(int.from_bytes(bytes(data[i:i + 4]), 'big'))
+    return words
+
+
+class TestZynmidiDecoder(unittest.TestCase):
+
+    def check(self, words):
+        self.assertEqual(batch_read(words, DRIVER_ZMIPS, MASTER_CHAN), legacy_read(words, DRIVER_ZMIPS, MASTER_CHAN))
+
+    def test_aa00_split(self):
+        buf = (ctypes.c_uint32 * 2)(0x01B00740, 0xFF903C64)
+        self.assertEqual(split_zynmidi_buffer(buf, 2), (b'\x01\xff', b'\xb0\x90', b'\x07\x3c', b'\x40\x64'))
+
+    def test_aa01_cc_run(self):
+        words = [0x01B00700 | v for v in range(64)]
+        buf = (ctypes.c_uint32 * len(words))(*words)
+        items, clock = decode_zynmidi_buffer(buf, len(words), DRIVER_ZMIPS, MASTER_CHAN)
+        self.assertEqual(len(items), 1)
+        self.assertEqual(items[0][0], ZYNMIDI_CC_RUN)
+        self.assertEqual(len(items[0][1]), 64)
+        self.check(words)
+
+    def test_aa02_clock(self):
+        words = [0x00F80000] * 24 + [0x01FE0000, 0x01F90000]
+        buf = (ctypes.c_uint32 * len(words))(*words)
+        items, clock = decode_zynmidi_buffer(buf, len(words), DRIVER_ZMIPS, MASTER_CHAN)
+        self.assertEqual(items, [])
+        self.assertTrue(clock)
+        self.check(words)
+
+    def test_aa03_driver(self):
+        self.check([0x03F80000, 0x03B00740, 0x03B00741])
+
+    def test_aa04_sysex(self):
+        self.check([0x01F00102, 0x03040506, 0xF7000000, 0x01B00740])
+
+    def test_aa05_unterminated_sysex(self):
+        self.check([0x01B00740, 0x01F00102, 0x03040506])
+
+    def test_ab00_replay(self):
+        rnd = random.Random(1234)
+        for i in range(200):
+            self.check(random_stream(rnd, rnd.randrange(1, 300)))
+
+
+def dispatch_stream(rnd, n):
+    """Random stream without SysEx, program change & master channel messages, which aren't CC run related"""
+
+    words = []
+    for i in range(n):
+        izmip = rnd.choice((0, 1, 3, 0xFF))
+        kind = rnd.random()
+        if kind < 0.6:
+            status = 0xB0 | rnd.choice((0, 1, 9))
+            ccnum = rnd.choice((1, 7, 10, 64, 120, 121, 123, rnd.randrange(128)))
+            words.append(izmip << 24 | status << 16 | ccnum << 8 | rnd.randrange(128))
+        elif kind < 0.85:
+            status = rnd.choice((0x80, 0x90, 0xE0)) | rnd.randrange(15)
+            words.append(izmip << 24 | status << 16 | rnd.randrange(128) << 8 | rnd.randrange(128))
+        else:
+            words.append(izmip << 24 | rnd.choice((0xF8, 0xF9, 0xFE)) << 16)
+    return words
+
+
+class TestZynmidiDispatch(unittest.TestCase):
+
+    def setUp(self):
+        # Records calls to every destination, in order
+        self.log = mock.Mock()
+        self.sm = state_manager_module.zynthian_state_manager.__new__(state_manager_module.zynthian_state_manager)
+        sm = self.sm
+        sm.chain_manager = self.log.chain_manager
+        # Runs are handed to the real chain manager method, which sends each CC to the (logged) chains
+        sm.chain_manager.midi_control_change_run = functools.partial(zynthian_chain_manager.midi_control_change_run,
+                                                                     sm.chain_manager)
+        sm.zynmixer = self.log.zynmixer
+        sm.alsa_mixer_processor = self.log.alsa_mixer_processor
+        sm.audio_player = self.log.audio_player
+        sm.all_sounds_off_chan = self.log.all_sounds_off_chan
+        sm.all_notes_off_chan = self.log.all_notes_off_chan
+        sm.get_max_num_midi_devs = lambda: 16
+        sm.ctrldev_manager = mock.Mock()
+        sm.ctrldev_manager.drivers = {3: None}
+        sm.ctrldev_manager.midi_event.side_effect = lambda izmip, ev: izmip == 3
+        sm.midi_learn_zctrl = None
+        sm.cc_coalesce_zmips = set()
+        sm.cc_coalesce_counters = {"received": 0, "merged": 0}
+        sm.status_midi = False
+        sm.status_midi_clock = False
+        sm.last_event_flag = False
+        zynsigman = mock.Mock()
+        zynsigman.is_subscribed.return_value = True
+        zynsigman.send_queued = self.log.send_queued
+        patches = [
+            mock.patch.object(state_manager_module, "zynsigman", zynsigman),
+            mock.patch.object(state_manager_module.zynthian_gui_config, "master_midi_channel", MASTER_CHAN)
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def legacy_dispatch(self, words):
+        """Legacy zynmidi_read loop => each event is passed to zynmidi_event"""
+
+        buf = (ctypes.c_uint32 * len(words))(*words)
+        self.log.reset_mock()
+        for izmip, ev in decode_zynmidi_buffer_seq(buf, len(words)):
+            self.sm.zynmidi_event(izmip, ev)
+        return self.log.mock_calls, self.sm.status_midi_clock
+
+    def batch_dispatch(self, words):
+        lib_zyncore = mock.Mock()
+        lib_zyncore.get_zynmidi_num_pending.return_value = len(words)
+
+        def read_zynmidi_buffer(buf, n):
+            buf[:n] = words[:n]
+            return n
+
+        lib_zyncore.read_zynmidi_buffer.side_effect = read_zynmidi_buffer
+        self.log.reset_mock()
+        with mock.patch.object(state_manager_module, "lib_zyncore", lib_zyncore):
+            self.assertEqual(self.sm.zynmidi_read(), len(words))
+        return self.log.mock_calls, self.sm.status_midi_clock
+
+    def check(self, words):
+        self.sm.status_midi_clock = False
+        legacy = self.legacy_dispatch(words)
+        self.sm.status_midi_clock = False
+        self.assertEqual(self.batch_dispatch(words), legacy)
+
+    def test_aa00_cc_run(self):
+        self.check([0x01B00700 | v for v in range(16)])
+
+    def test_aa01_interleaved(self):
+        # Note & channel mode messages between CCs must not be reordered
+        self.check([0x01B00740, 0x01903C64, 0x01B00741, 0x01B07B00, 0x01B00742, 0x03B00743, 0x01B00744])
+
+    def test_ab00_replay(self):
+        rnd = random.Random(4321)
+        for i in range(100):
+            self.check(dispatch_stream(rnd, rnd.randrange(1, 200)))
+
+
+if __name__ == '__main__':
+    unittest.main()
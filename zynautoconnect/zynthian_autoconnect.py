@@ -27,6 +27,9 @@ import re
 import usb
 import json
 import jack
+import ctypes
+import ctypes.util
+import select
 import psutil
 import pexpect
 import logging
@@ -38,6 +41,7 @@ from threading import Thread, Lock
 import zynconf
 from zyncoder.zyncore import lib_zyncore
 from zyngui import zynthian_gui_config
+from zynautoconnect.zynthian_port_graph import zynthian_port_graph
 
 # -------------------------------------------------------------------------------
 # Configure logging
@@ -75,7 +79,10 @@ class fake_port:
 MAIN_MIX_CHAN = 17 				# TODO: Get this from mixer
 
 jclient = None					# JACK client
+port_graph = None				# Cache of JACK ports & connections
 thread = None					# Thread to check for changed MIDI ports
+wake_fds = None					# Pipe (read, write) to wake up autoconnect thread
+hotplug_monitor = None			# pyudev monitor or inotify file descriptor watching sound devices
 lock = None						# Manage concurrence
 exit_flag = False				# True to exit thread
 paused_flag = False				# True id autoconnect task is paused
@@ -86,6 +93,8 @@ xruns = 0						# Quantity of xruns since startup or last reset
 deferred_midi_connect = False
 # True to perform audio connect on next port check cycle
 deferred_audio_connect = False
+# True to check hardware ports on next port check cycle
+hw_scan_requested = False
 # List of hardware MIDI  source ports (including network, aubionotes, etc.)
 hw_midi_src_ports = []
 # List of hardware MIDI destination ports (including network, aubionotes, etc.)
@@ -110,6 +119,15 @@ zyn_routed_audio = {}
 # Map of lists of MIDI sources routed by zynautoconnect, indexed by destination
 zyn_routed_midi = {}
 
+# Cache of required routes of each chain, indexed by chain id
+chain_midi_routes = {}
+chain_audio_routes = {}
+# Set of chain ids whose routes must be recalculated (flagged by zynthian_chain.rebuild_graph)
+dirty_midi_chains = set()
+dirty_audio_chains = set()
+# Number of chain routes calculated / taken from cache
+route_stats = {"calculated": 0, "cached": 0}
+
 # Processors sending control feedback (connected to zynmidirouter:ctrl_in)
 ctrl_fb_procs = []
 
@@ -175,7 +193,7 @@ def set_port_friendly_name(port, friendly_name=None):
 
 
 def get_ports(name, is_input=None):
-    return jclient.get_ports(name, is_input=is_input)
+    return port_graph.get_ports(name, is_input=is_input)
 
 
 def dev_in_2_dev_out(zmip):
@@ -366,6 +384,7 @@ def add_sidechain_ports(jackname):
         for port_name in sidechain_map[client_name]:
             if f"{jackname}:{port_name}" not in sidechain_ports:
                 sidechain_ports.append(f"{jackname}:{port_name}")
+                chain_audio_routes.clear()
 
 
 def remove_sidechain_ports(jackname):
@@ -380,6 +399,7 @@ def remove_sidechain_ports(jackname):
         for port_name in sidechain_map[client_name]:
             try:
                 sidechain_ports.remove(f"{jackname}:{port_name}")
+                chain_audio_routes.clear()
             except:
                 pass
 
@@ -406,10 +426,20 @@ def get_sidechain_portnames(jackname=None):
 # ------------------------------------------------------------------------------
 
 
+def wake_thread():
+    """Wake up autoconnect thread"""
+
+    try:
+        os.write(wake_fds[1], b'\x01')
+    except (TypeError, OSError):
+        # Not started or pipe full => it's awake anyway
+        pass
+
+
 def request_audio_connect(fast=False):
     """Request audio connection graph refresh
 
-    fast : True for fast update (default=False to trigger on next 2s cycle
+    fast : True for fast update (default=False to merge with other requests in the next autoconnect cycle)
     """
 
     # if paused_flag:
@@ -419,12 +449,13 @@ def request_audio_connect(fast=False):
     else:
         global deferred_audio_connect
         deferred_audio_connect = True
+        wake_thread()
 
 
 def request_midi_connect(fast=False):
     """Request MIDI connection graph refresh
 
-    fast : True for fast update (default=False to trigger on next 2s cycle
+    fast : True for fast update (default=False to merge with other requests in the next autoconnect cycle)
     """
 
     # if paused_flag:
@@ -435,6 +466,15 @@ def request_midi_connect(fast=False):
     else:
         global deferred_midi_connect
         deferred_midi_connect = True
+        wake_thread()
+
+
+def request_hw_scan():
+    """Request check of hardware ports in the next autoconnect cycle"""
+
+    global hw_scan_requested
+    hw_scan_requested = True
+    wake_thread()
 
 
 def find_usb_gadget_device():
@@ -521,23 +561,23 @@ def update_hw_midi_ports(force=False):
     hw_port_fingerprint = hw_midi_src_ports + hw_midi_dst_ports
 
     # List of physical MIDI source ports
-    hw_midi_src_ports = jclient.get_ports(
+    hw_midi_src_ports = port_graph.get_ports(
         is_output=True, is_physical=True, is_midi=True)
 
     # List of physical MIDI destination ports
-    hw_midi_dst_ports = jclient.get_ports(
+    hw_midi_dst_ports = port_graph.get_ports(
         is_input=True, is_physical=True, is_midi=True)
 
     # Treat some virtual MIDI ports as hardware
     for port_name in ("QmidiNet:in", "jackrtpmidid:rtpmidi_in", "jacknetumpd:netump_in", "RtMidiIn Client:TouchOSC Bridge", "ZynMaster:midi_in", "ZynMidiRouter:seq_in"):
         try:
-            ports = jclient.get_ports(port_name, is_midi=True, is_input=True)
+            ports = port_graph.get_ports(port_name, is_midi=True, is_input=True)
             hw_midi_dst_ports += ports
         except:
             pass
     for port_name in ("QmidiNet:out", "jackrtpmidid:rtpmidi_out", "jacknetumpd:netump_out", "RtMidiOut Client:TouchOSC Bridge", "aubio"):
         try:
-            ports = jclient.get_ports(port_name, is_midi=True, is_output=True)
+            ports = port_graph.get_ports(port_name, is_midi=True, is_output=True)
             hw_midi_src_ports += ports
         except:
             pass
@@ -561,6 +601,218 @@ def update_hw_midi_ports(force=False):
     return update
 
 
+def get_chain_midi_routes(chain_id):
+    """Calculate required MIDI routes for a chain
+
+    chain_id : Chain ID
+    returns : Tuple (routes, deps) => routes is a map of sets of source port names indexed by destination port name,
+        deps is a set with the IDs of other chains these routes depend on
+    """
+
+    chain = chain_manager.chains[chain_id]
+    chain_routes = {}
+    deps = set()
+
+    # TODO: Handle processors with multiple MIDI ports
+    # Add chain internal routes
+    routes = dict(chain_manager.get_chain_midi_routing(chain_id))
+    for dst in list(routes):
+        if isinstance(dst, int):
+            # Destination is a chain
+            deps.add(dst)
+            route = routes.pop(dst)
+            dst_chain = chain_manager.get_chain(dst)
+            if dst_chain:
+                if dst_chain.midi_slots:
+                    for proc in dst_chain.midi_slots[0]:
+                        routes[proc.engine.get_jackname()] = route
+                elif dst_chain.synth_slots:
+                    proc = dst_chain.synth_slots[0][0]
+                    routes[proc.engine.get_jackname()] = route
+
+    for dst_name in routes:
+        dst_ports = port_graph.get_ports(re.escape(dst_name), is_input=True, is_midi=True)
+        if not dst_ports:
+            # Try to get destiny port by alias
+            try:
+                dst_ports = [port_graph.get_port_by_name(dst_name)]
+            except:
+                pass
+        if dst_ports:
+            for src_name in routes[dst_name]:
+                src_ports = port_graph.get_ports(src_name, is_output=True, is_midi=True)
+                if src_ports:
+                    chain_routes.setdefault(dst_ports[0].name, set()).add(src_ports[0].name)
+
+    # Add chain MIDI outputs
+    if chain.midi_slots and chain.midi_thru:
+        dests = []
+        for out in chain.midi_out:
+            if out in chain_manager.chains:
+                deps.add(out)
+                chain_midi_first_procs = chain_manager.get_processors(out, "MIDI Tool", 0)
+                if not chain_midi_first_procs:
+                    chain_midi_first_procs = chain_manager.get_processors(out, "Synth", 0)
+                for processor in chain_midi_first_procs:
+                    for dst in port_graph.get_ports(processor.get_jackname(True), is_midi=True, is_input=True):
+                        dests.append(dst.name)
+            else:
+                pass
+                # dests.append(out)
+        for processor in chain.midi_slots[-1]:
+            src_ports = port_graph.get_ports(processor.get_jackname(True), is_midi=True, is_output=True)
+            if src_ports:
+                for dst in dests:
+                    chain_routes.setdefault(dst, set()).add(src_ports[0].name)
+
+    # Add MIDI router outputs
+    if chain.is_midi():
+        src_ports = port_graph.get_ports(f"ZynMidiRouter:ch{chain.zmop_index}_out", is_midi=True, is_output=True)
+        if src_ports:
+            for dst_proc in chain.get_processors(slot=0):
+                dst_ports = port_graph.get_ports(dst_proc.get_jackname(True), is_midi=True, is_input=True)
+                if dst_ports:
+                    chain_routes.setdefault(dst_ports[0].name, set()).add(src_ports[0].name)
+
+    return chain_routes, deps
+
+
+def get_chain_audio_routes(chain_id):
+    """Calculate required audio routes for a chain
+
+    chain_id : Chain ID
+    returns : Tuple (routes, deps) => routes is a map of sets of source port names indexed by destination port name,
+        deps is a set with the IDs of other chains these routes depend on
+    """
+
+    chain_routes = {}
+    deps = set()
+
+    routes = dict(chain_manager.get_chain_audio_routing(chain_id))
+    for dst in list(routes):
+        if isinstance(dst, int):
+            # Destination is a chain
+            deps.add(dst)
+            route = routes.pop(dst)
+            dst_chain = chain_manager.get_chain(dst)
+            if dst_chain:
+                if dst_chain.audio_slots and dst_chain.fader_pos:
+                    for proc in dst_chain.audio_slots[0]:
+                        routes[proc.get_jackname()] = route
+                elif dst_chain.is_synth():
+                    proc = dst_chain.synth_slots[0][0]
+                    if proc.type == "Special":
+                        routes[proc.get_jackname()] = route
+                else:
+                    if dst == 0:
+                        route = list(route)
+                        for name in list(route):
+                            if name.startswith('zynmixer:output'):
+                                # Use mixer internal normalisation
+                                route.remove(name)
+                    routes[f"zynmixer:input_{dst_chain.mixer_chan + 1:02d}"] = route
+    for dst in routes:
+        if dst in sidechain_ports:
+            # This is an exact match so we do want to route exactly this
+            dst_ports = port_graph.get_ports(f"^{dst}$", is_input=True, is_audio=True)
+        else:
+            # This may be a client name that will return all input ports, including side-chain inputs
+            dst_ports = port_graph.get_ports(dst, is_input=True, is_audio=True)
+            # Remove side-chain (no route) destinations
+            for port in list(dst_ports):
+                if port.name in sidechain_ports:
+                    dst_ports.remove(port)
+        dst_count = len(dst_ports)
+
+        for src_name in routes[dst]:
+            src_ports = port_graph.get_ports(src_name, is_output=True, is_audio=True)
+            # Auto mono/stereo routing
+            source_count = len(src_ports)
+            if source_count and dst_count:
+                for i in range(min(2, max(source_count, dst_count))):
+                    src = src_ports[min(i, source_count - 1)]
+                    dst_port = dst_ports[min(i, dst_count - 1)]
+                    chain_routes.setdefault(dst_port.name, set()).add(src.name)
+
+    return chain_routes, deps
+
+
+def get_chains_routes(cache, dirty_chains, get_routes):
+    """Get required routes of all chains, recalculating only those changed since last call
+
+    A chain's routes are recalculated if the chain is dirty, if a chain it depends on is dirty
+    or if the list of JACK ports has changed since they were calculated.
+
+    cache : Map of tuples (routes, deps, port graph version) indexed by chain ID (updated)
+    dirty_chains : Set with IDs of chains changed since last call (emptied)
+    get_routes : Function to calculate routes of a chain
+    returns : Map of routes indexed by chain ID
+    """
+
+    dirty = set()
+    while dirty_chains:
+        dirty.add(dirty_chains.pop())
+    # Added or removed chains
+    dirty |= set(cache) ^ set(chain_manager.chains)
+    for chain_id in list(cache):
+        if chain_id not in chain_manager.chains:
+            del cache[chain_id]
+
+    version = port_graph.version
+    result = {}
+    for chain_id in chain_manager.chains:
+        try:
+            routes, deps, cache_version = cache[chain_id]
+            if cache_version == version and chain_id not in dirty and deps.isdisjoint(dirty):
+                route_stats["cached"] += 1
+                result[chain_id] = routes
+                continue
+        except KeyError:
+            pass
+        routes, deps = get_routes(chain_id)
+        cache[chain_id] = (routes, deps, version)
+        route_stats["calculated"] += 1
+        result[chain_id] = routes
+    return result
+
+
+def set_chain_midi_dirty(chain_id):
+    """Flag chain's MIDI routes to be recalculated on next MIDI autoconnect
+
+    chain_id : Chain ID
+    """
+
+    dirty_midi_chains.add(chain_id)
+
+
+def set_chain_audio_dirty(chain_id):
+    """Flag chain's audio routes to be recalculated on next audio autoconnect
+
+    chain_id : Chain ID
+    """
+
+    dirty_audio_chains.add(chain_id)
+
+
+def get_route_stats():
+    """Get dictionary with autoconnect counters
+
+    Includes number of calls sent to jackd and number of chain routes calculated / taken from cache.
+    """
+
+    stats = route_stats.copy()
+    if port_graph:
+        stats.update(port_graph.get_stats())
+    return stats
+
+
+def reset_route_stats():
+    for key in route_stats:
+        route_stats[key] = 0
+    if port_graph:
+        port_graph.reset_stats()
+
+
 def midi_autoconnect():
     """Connect all expected MIDI routes"""
 
@@ -578,7 +830,7 @@ def midi_autoconnect():
 
     # Create graph of required chain routes as sets of sources indexed by destination
     required_routes = {}
-    all_midi_dst = jclient.get_ports(is_input=True, is_midi=True)
+    all_midi_dst = port_graph.get_ports(is_input=True, is_midi=True)
     for dst in all_midi_dst:
         required_routes[dst.name] = set()
 
@@ -654,73 +906,18 @@ def midi_autoconnect():
             devices_out[i] = None
             devices_out_name[i] = None
 
-    # Chain MIDI routing
-    # TODO: Handle processors with multiple MIDI ports
-    for chain_id, chain in chain_manager.chains.items():
-        # Add chain internal routes
-        routes = chain_manager.get_chain_midi_routing(chain_id)
-        for dst in list(routes):
-            if isinstance(dst, int):
-                # Destination is a chain
-                route = routes.pop(dst)
-                dst_chain = chain_manager.get_chain(dst)
-                if dst_chain:
-                    if dst_chain.midi_slots:
-                        for proc in dst_chain.midi_slots[0]:
-                            routes[proc.engine.get_jackname()] = route
-                    elif dst_chain.synth_slots:
-                        proc = dst_chain.synth_slots[0][0]
-                        routes[proc.engine.get_jackname()] = route
-
-        for dst_name in routes:
-            dst_ports = jclient.get_ports(re.escape(dst_name), is_input=True, is_midi=True)
-            if not dst_ports:
-                # Try to get destiny port by alias
-                try:
-                    dst_ports = [jclient.get_port_by_name(dst_name)]
-                except:
-                    pass
-            if dst_ports:
-                for src_name in routes[dst_name]:
-                    src_ports = jclient.get_ports(src_name, is_output=True, is_midi=True)
-                    if src_ports:
-                        required_routes[dst_ports[0].name].add(src_ports[0].name)
-
-        # Add chain MIDI outputs
-        if chain.midi_slots and chain.midi_thru:
-            dests = []
-            for out in chain.midi_out:
-                if out in chain_manager.chains:
-                    chain_midi_first_procs = chain_manager.get_processors(out, "MIDI Tool", 0)
-                    if not chain_midi_first_procs:
-                        chain_midi_first_procs = chain_manager.get_processors(out, "Synth", 0)
-                    for processor in chain_midi_first_procs:
-                        for dst in jclient.get_ports(processor.get_jackname(True), is_midi=True, is_input=True):
-                            dests.append(dst.name)
-                else:
-                    pass
-                    # dests.append(out)
-            for processor in chain.midi_slots[-1]:
-                src_ports = jclient.get_ports(processor.get_jackname(True), is_midi=True, is_output=True)
-                if src_ports:
-                    for dst in dests:
-                        required_routes[dst].add(src_ports[0].name)
-
-        # Add MIDI router outputs
-        if chain.is_midi():
-            src_ports = jclient.get_ports(f"ZynMidiRouter:ch{chain.zmop_index}_out", is_midi=True, is_output=True)
-            if src_ports:
-                for dst_proc in chain.get_processors(slot=0):
-                    dst_ports = jclient.get_ports(dst_proc.get_jackname(True), is_midi=True, is_input=True)
-                    if dst_ports:
-                        src = src_ports[0]
-                        dst = dst_ports[0]
-                        required_routes[dst.name].add(src.name)
+    # Chain MIDI routing => Only recalculate routes of chains changed since last run
+    for routes in get_chains_routes(chain_midi_routes, dirty_midi_chains, get_chain_midi_routes).values():
+        for dst, sources in routes.items():
+            try:
+                required_routes[dst].update(sources)
+            except KeyError:
+                pass
 
     # Add zynseq to MIDI input devices
     idev = state_manager.get_zmip_step_index()
     if devices_in[idev] is None:
-        src_ports = jclient.get_ports("zynseq:output", is_midi=True, is_output=True)
+        src_ports = port_graph.get_ports("zynseq:output", is_midi=True, is_output=True)
         if src_ports:
             devices_in[idev] = src_ports[0]
             update_midi_port_aliases(src_ports[0])
@@ -730,7 +927,7 @@ def midi_autoconnect():
     # Add SMF player to MIDI input devices
     idev = state_manager.get_zmip_seq_index()
     if devices_in[idev] is None:
-        src_ports = jclient.get_ports("zynsmf:midi_out", is_midi=True, is_output=True)
+        src_ports = port_graph.get_ports("zynsmf:midi_out", is_midi=True, is_output=True)
         if src_ports:
             devices_in[idev] = src_ports[0]
             update_midi_port_aliases(src_ports[0])
@@ -749,21 +946,22 @@ def midi_autoconnect():
     # Add engine's controller-feedback to ZynMidiRouter:ctrl_in
     # Each engine sending controller feedback should use a different zmip
     # Only setBfree is using this, so we have just one: "ctrl_in"
+    fb_procs = []
     for proc in chain_manager.processors.values():
         try:
             if proc.engine.options["ctrl_fb"]:
-                ports = jclient.get_ports(proc.get_jackname(True), is_midi=True, is_output=True)
+                ports = port_graph.get_ports(proc.get_jackname(True), is_midi=True, is_output=True)
                 required_routes["ZynMidiRouter:ctrl_in"].add(ports[0].name)
-                ctrl_fb_procs.append(proc)
+                fb_procs.append(proc)
                 # logging.debug(f"Routed controller feedback from {proc.get_jackname(True)}")
         except Exception as e:
             # logging.error(f"Can't route controller feedback from {proc.get_name()} => {e}")
             pass
 
-    # Remove from control feedback list those processors removed from chains
-    for i, proc in enumerate(ctrl_fb_procs):
-        if proc.id not in chain_manager.processors:
-            del ctrl_fb_procs[i]
+    # Update control feedback list, removing processors removed from chains
+    if fb_procs != ctrl_fb_procs:
+        ctrl_fb_procs[:] = fb_procs
+        chain_manager.invalidate_ctrl_fb_map()
 
     # Connect ZynMidiRouter:step_out to ZynthStep input
     required_routes["zynseq:input"].add("ZynMidiRouter:step_out")
@@ -780,36 +978,35 @@ def midi_autoconnect():
             required_routes.pop(dst)
     # Workaround for mod-host auto routing
     try:
-        port = jclient.get_port_by_name("mod-host:midi_in")
-        current_routes = jclient.get_all_connections(port)
-        for src in current_routes:
-            if not src.name.startswith("ZynMidiRouter"):
-                jclient.disconnect(src, port)
+        for src in list(port_graph.get_connections("mod-host:midi_in")):
+            if not src.startswith("ZynMidiRouter"):
+                port_graph.disconnect(src, "mod-host:midi_in")
     except:
         pass
 
-    # Connect and disconnect routes
+    # Connect and disconnect routes => Only changes are sent to jackd
     for dst, sources in required_routes.items():
         if dst not in zyn_routed_midi:
             zyn_routed_midi[dst] = []
         try:
-            current_routes = jclient.get_all_connections(dst)
+            current_routes = port_graph.get_connections(dst)
         except Exception as e:
-            current_routes = []
+            current_routes = set()
             logging.warning(e)
-        for src in current_routes:
-            if src.name in sources:
-                sources.remove(src.name)
+        for src in list(current_routes):
+            if src in sources:
                 continue
-            if src.name in zyn_routed_midi[dst]:
+            if src in zyn_routed_midi[dst]:
                 try:
-                    jclient.disconnect(src, dst)
+                    port_graph.disconnect(src, dst)
                 except:
                     pass
-                zyn_routed_midi[dst].remove(src.name)
+                zyn_routed_midi[dst].remove(src)
         for src in sources:
+            if src in current_routes:
+                continue
             try:
-                jclient.connect(src, dst)
+                port_graph.connect(src, dst)
                 zyn_routed_midi[dst].append(src)
             except:
                 pass
@@ -834,65 +1031,29 @@ def audio_autoconnect():
     for port in hw_audio_dst_ports:
         for i in range(1, 3):
             try:
-                jclient.disconnect(f"mod-monitor:out_{i}", port)
+                if f"mod-monitor:out_{i}" in port_graph.get_connections(port.name):
+                    port_graph.disconnect(f"mod-monitor:out_{i}", port.name)
             except:
                 pass
 
     # Create graph of required chain routes as sets of sources indexed by destination
     required_routes = {}
 
-    all_audio_dst = jclient.get_ports(is_input=True, is_audio=True)
+    all_audio_dst = port_graph.get_ports(is_input=True, is_audio=True)
     for dst in all_audio_dst:
         required_routes[dst.name] = set()
 
-    # Chain audio routing
-    for chain_id in chain_manager.chains:
-        routes = chain_manager.get_chain_audio_routing(chain_id)
-        normalise = 0 in chain_manager.chains[chain_id].audio_out and chain_manager.chains[0].fader_pos == 0 and len(
-            chain_manager.chains[chain_id].audio_slots) == chain_manager.chains[chain_id].fader_pos
-        state_manager.zynmixer.normalise(chain_manager.chains[chain_id].mixer_chan, normalise)
-        for dst in list(routes):
-            if isinstance(dst, int):
-                # Destination is a chain
-                route = routes.pop(dst)
-                dst_chain = chain_manager.get_chain(dst)
-                if dst_chain:
-                    if dst_chain.audio_slots and dst_chain.fader_pos:
-                        for proc in dst_chain.audio_slots[0]:
-                            routes[proc.get_jackname()] = route
-                    elif dst_chain.is_synth():
-                        proc = dst_chain.synth_slots[0][0]
-                        if proc.type == "Special":
-                            routes[proc.get_jackname()] = route
-                    else:
-                        if dst == 0:
-                            for name in list(route):
-                                if name.startswith('zynmixer:output'):
-                                    # Use mixer internal normalisation
-                                    route.remove(name)
-                        routes[f"zynmixer:input_{dst_chain.mixer_chan + 1:02d}"] = route
-        for dst in routes:
-            if dst in sidechain_ports:
-                # This is an exact match so we do want to route exactly this
-                dst_ports = jclient.get_ports(f"^{dst}$", is_input=True, is_audio=True)
-            else:
-                # This may be a client name that will return all input ports, including side-chain inputs
-                dst_ports = jclient.get_ports(dst, is_input=True, is_audio=True)
-                # Remove side-chain (no route) destinations
-                for port in list(dst_ports):
-                    if port.name in sidechain_ports:
-                        dst_ports.remove(port)
-            dst_count = len(dst_ports)
-
-            for src_name in routes[dst]:
-                src_ports = jclient.get_ports(src_name, is_output=True, is_audio=True)
-                # Auto mono/stereo routing
-                source_count = len(src_ports)
-                if source_count and dst_count:
-                    for i in range(min(2, max(source_count, dst_count))):
-                        src = src_ports[min(i, source_count - 1)]
-                        dst = dst_ports[min(i, dst_count - 1)]
-                        required_routes[dst.name].add(src.name)
+    # Chain audio routing => Only recalculate routes of chains changed since last run
+    for chain_id, chain in chain_manager.chains.items():
+        normalise = 0 in chain.audio_out and chain_manager.chains[0].fader_pos == 0 and len(
+            chain.audio_slots) == chain.fader_pos
+        state_manager.zynmixer.normalise(chain.mixer_chan, normalise)
+    for routes in get_chains_routes(chain_audio_routes, dirty_audio_chains, get_chain_audio_routes).values():
+        for dst, sources in routes.items():
+            try:
+                required_routes[dst].update(sources)
+            except KeyError:
+                pass
 
     # Connect metronome to aux
     required_routes[f"zynmixer:input_{MAIN_MIX_CHAN}a"].add("zynseq:metronome")
@@ -900,7 +1061,7 @@ def audio_autoconnect():
 
     # Connect global audio player to aux
     if state_manager.audio_player and state_manager.audio_player.jackname:
-        ports = jclient.get_ports(
+        ports = port_graph.get_ports(
             state_manager.audio_player.jackname, is_output=True, is_audio=True)
         required_routes[f"zynmixer:input_{MAIN_MIX_CHAN}a"].add(ports[0].name)
         required_routes[f"zynmixer:input_{MAIN_MIX_CHAN}b"].add(ports[1].name)
@@ -908,7 +1069,7 @@ def audio_autoconnect():
     # Connect inputs to aubionotes
     if zynthian_gui_config.midi_aubionotes_enabled:
         capture_ports = get_audio_capture_ports()
-        for port in jclient.get_ports("aubio", is_input=True, is_audio=True):
+        for port in port_graph.get_ports("aubio", is_input=True, is_audio=True):
             for i in state_manager.aubio_in:
                 try:
                     required_routes[port.name].add(capture_ports[i - 1].name)
@@ -921,36 +1082,37 @@ def audio_autoconnect():
             required_routes.pop(dst)
 
     # Replicate main output to headphones
-    hp_ports = jclient.get_ports(
+    hp_ports = port_graph.get_ports(
         "Headphones:playback", is_input=True, is_audio=True)
     if len(hp_ports) >= 2:
         required_routes[hp_ports[0].name] = required_routes[hw_audio_dst_ports[0].name]
         required_routes[hp_ports[1].name] = required_routes[hw_audio_dst_ports[1].name]
 
-    # Connect and disconnect routes
+    # Connect and disconnect routes => Only changes are sent to jackd
     for dst, sources in required_routes.items():
         if dst not in zyn_routed_audio:
-            zyn_routed_audio[dst] = sources
+            zyn_routed_audio[dst] = set(sources)
         else:
             zyn_routed_audio[dst] = zyn_routed_audio[dst].union(sources)
         try:
-            current_routes = jclient.get_all_connections(dst)
+            current_routes = port_graph.get_connections(dst)
         except Exception as e:
-            current_routes = []
+            current_routes = set()
             logging.warning(e)
-        for src in current_routes:
-            if src.name in sources:
+        for src in list(current_routes):
+            if src in sources:
                 continue
-            if src.name in zyn_routed_audio[dst]:
+            if src in zyn_routed_audio[dst]:
                 try:
-                    jclient.disconnect(src.name, dst)
+                    port_graph.disconnect(src, dst)
                 except:
                     pass
-                zyn_routed_audio[dst].remove(src.name)
+                zyn_routed_audio[dst].remove(src)
         for src in sources:
+            if src in current_routes:
+                continue
             try:
-                jclient.connect(src, dst)
-                zyn_routed_audio[dst].append(src.name)
+                port_graph.connect(src, dst)
             except:
                 pass
 
@@ -1303,47 +1465,137 @@ def get_hw_dst_ports():
     return hw_midi_dst_ports
 
 
+# Sound devices hot-plug monitor
+IN_CREATE = 0x100  # inotify event masks
+IN_DELETE = 0x200
+
+
+def start_hotplug_monitor():
+    """Start monitoring sound devices hot-plug, using udev or inotify on /dev/snd
+
+    returns : File descriptor to poll for events or None if not available
+    """
+
+    global hotplug_monitor
+
+    try:
+        import pyudev
+        monitor = pyudev.Monitor.from_netlink(pyudev.Context())
+        monitor.filter_by(subsystem="sound")
+        monitor.start()
+        hotplug_monitor = monitor
+        logger.info("Monitoring sound devices hot-plug with udev")
+        return monitor.fileno()
+    except Exception as e:
+        logger.debug(f"Can't monitor sound devices with udev => {e}")
+
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        if libc.inotify_add_watch(fd, b"/dev/snd", IN_CREATE | IN_DELETE) < 0:
+            err = ctypes.get_errno()
+            os.close(fd)
+            raise OSError(err, "inotify_add_watch failed")
+        hotplug_monitor = fd
+        logger.info("Monitoring sound devices hot-plug with inotify")
+        return fd
+    except Exception as e:
+        logger.warning(f"Can't monitor sound devices hot-plug. Polling each {zynthian_gui_config.autoconnect_poll_secs}s => {e}")
+
+    return None
+
+
+def read_hotplug_monitor():
+    """Read all pending hot-plug events
+
+    returns : True if there were events
+    """
+
+    events = False
+    if isinstance(hotplug_monitor, int):
+        try:
+            while os.read(hotplug_monitor, 4096):
+                events = True
+        except BlockingIOError:
+            pass
+    elif hotplug_monitor:
+        while hotplug_monitor.poll(timeout=0):
+            events = True
+    return events
+
+
+def stop_hotplug_monitor():
+    global hotplug_monitor
+    if isinstance(hotplug_monitor, int):
+        os.close(hotplug_monitor)
+    hotplug_monitor = None
+
+
 def auto_connect_thread():
-    """Thread to run autoconnect, checking if physical (hardware) interfaces have changed, e.g. USB plug"""
+    """Thread to run autoconnect, checking if physical (hardware) interfaces have changed, e.g. USB plug
+
+    It sleeps until woken up by a connect request, a JACK port (un)registration or a sound device
+    hot-plug event. Requests arriving in a short window are merged into a single autoconnect run.
+    """
 
-    deferred_timeout = 2  # Period to run deferred connect (in seconds)
-    # Delay between loop cycles (in seconds) - allows faster exit from thread
-    deferred_inc = 0.1
-    deferred_count = 5  # Run at startup
-    do_audio = False
-    do_midi = False
+    global hw_scan_requested
+
+    hotplug_fd = start_hotplug_monitor()
+    poller = select.poll()
+    poller.register(wake_fds[0], select.POLLIN)
+    if hotplug_fd is not None:
+        poller.register(hotplug_fd, select.POLLIN)
+    # Poll hardware ports if hot-plug can't be notified. USB gadget host connection is never notified.
+    if hotplug_fd is None or find_usb_gadget_device():
+        poll_timeout = 1000 * zynthian_gui_config.autoconnect_poll_secs
+    else:
+        poll_timeout = None
+    merge_window = zynthian_gui_config.autoconnect_merge_ms / 1000
+    hw_scan_requested = True  # Run at startup
 
     while not exit_flag:
-        if not paused_flag:
-            try:
-                if deferred_count > deferred_timeout:
-                    deferred_count = 0
-                    # Check if hardware MIDI ports changed, e.g. USB inserted/removed
-                    if update_hw_midi_ports():
-                        do_midi = True
-                    # Check if requested to run midi connect (slow)
-                    if deferred_midi_connect:
-                        do_midi = True
-                    # Check if dynamic (hot-plug) audio changed
-                    if update_hw_audio_ports():
-                        do_audio = True
-                    # Check if requested to run audio connect (slow)
-                    if deferred_audio_connect:
-                        do_audio = True
-
-                if do_midi:
-                    midi_autoconnect()
-                    do_midi = False
-
-                if do_audio:
-                    audio_autoconnect()
-                    do_audio = False
-
-            except Exception as err:
-                logger.error("ZynAutoConnect ERROR: {}".format(err))
-
-        sleep(deferred_inc)
-        deferred_count += deferred_inc
+        if paused_flag or not (hw_scan_requested or deferred_midi_connect or deferred_audio_connect):
+            if not poller.poll(poll_timeout):
+                # Timeout => Check hardware ports
+                hw_scan_requested = True
+            # Merge requests arriving in a short window
+            if merge_window > 0:
+                sleep(merge_window)
+        # Clear wake-up events
+        try:
+            while os.read(wake_fds[0], 4096):
+                pass
+        except BlockingIOError:
+            pass
+        if read_hotplug_monitor():
+            hw_scan_requested = True
+        if exit_flag or paused_flag:
+            continue
+
+        try:
+            do_midi = deferred_midi_connect
+            do_audio = deferred_audio_connect
+            if hw_scan_requested:
+                hw_scan_requested = False
+                # Check if hardware MIDI ports changed, e.g. USB inserted/removed
+                if update_hw_midi_ports():
+                    do_midi = True
+                # Check if dynamic (hot-plug) audio changed
+                if update_hw_audio_ports():
+                    do_audio = True
+
+            if do_midi:
+                midi_autoconnect()
+
+            if do_audio:
+                audio_autoconnect()
+
+        except Exception as err:
+            logger.error("ZynAutoConnect ERROR: {}".format(err))
+
+    stop_hotplug_monitor()
 
 
 def acquire_lock():
@@ -1404,7 +1656,7 @@ def start(sm):
     sm : State manager object
     """
 
-    global exit_flag, jclient, thread, lock, chain_manager, state_manager, hw_audio_dst_ports, sidechain_map
+    global exit_flag, jclient, port_graph, thread, wake_fds, lock, chain_manager, state_manager, hw_audio_dst_ports, sidechain_map
 
     if jclient:
         return  # Already started
@@ -1415,7 +1667,11 @@ def start(sm):
 
     try:
         jclient = jack.Client("Zynthian_autoconnect")
+        port_graph = zynthian_port_graph(jclient)
         jclient.set_xrun_callback(cb_jack_xrun)
+        jclient.set_port_registration_callback(cb_jack_port_registration, only_available=False)
+        jclient.set_port_rename_callback(port_graph.cb_port_rename, only_available=False)
+        jclient.set_port_connect_callback(port_graph.cb_port_connect, only_available=False)
         jclient.set_property_change_callback(cb_jack_property_change)
         jclient.activate()
     except Exception as e:
@@ -1435,6 +1691,11 @@ def start(sm):
     # Create Lock object (Mutex) to avoid concurrence problems
     lock = Lock()
 
+    # Pipe to wake up autoconnect thread
+    wake_fds = os.pipe()
+    for fd in wake_fds:
+        os.set_blocking(fd, False)
+
     # Start port change checking thread
     thread = Thread(target=auto_connect_thread, args=())
     thread.daemon = True  # thread dies with the program
@@ -1445,11 +1706,16 @@ def start(sm):
 def stop():
     """Reset state and stop autoconnect thread"""
 
-    global exit_flag, jclient, thread, lock, hw_audio_dst_ports
+    global exit_flag, jclient, port_graph, thread, wake_fds, lock, hw_audio_dst_ports
     exit_flag = True
     if thread:
+        wake_thread()
         thread.join()
         thread = None
+    if wake_fds:
+        for fd in wake_fds:
+            os.close(fd)
+        wake_fds = None
 
     if acquire_lock():
         release_lock()
@@ -1462,6 +1728,9 @@ def stop():
     if jclient:
         jclient.deactivate()
         jclient = None
+    port_graph = None
+    chain_midi_routes.clear()
+    chain_audio_routes.clear()
 
 
 def pause():
@@ -1472,6 +1741,7 @@ def pause():
 def resume():
     global paused_flag
     paused_flag = False
+    wake_thread()
 
 
 def is_running():
@@ -1498,6 +1768,18 @@ def cb_jack_xrun(delayed_usecs: float):
         state_manager.status_xrun = True
 
 
+def cb_jack_port_registration(port, register):
+    """Jack port (un)registration callback
+
+    port : Jack port object (None if not available anymore)
+    register : True if registered, False if unregistered
+    """
+
+    port_graph.cb_port_registration(port, register)
+    # Hardware ports may have changed, e.g. USB MIDI device plugged
+    request_hw_scan()
+
+
 def cb_jack_property_change(subject, key, change):
     """Jack property change callback
 
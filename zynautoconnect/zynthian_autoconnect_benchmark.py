@@ -0,0 +1,317 @@
+# -*- coding: utf-8 -*-
+# ********************************************************************
+# ZYNTHIAN PROJECT: Zynthian Autoconnector
+#
+# Benchmark of autoconnect route calculation with a simulated JACK server
+#
+# Copyright (C) 2015-2024 Fernando Moyano <jofemodo@zynthian.org>
+#
+# ********************************************************************
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of
+# the License, or any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# For a full copy of the GNU General Public License see the LICENSE.txt file.
+#
+# ********************************************************************
+#
+# Usage: python3 -m zynautoconnect.zynthian_autoconnect_benchmark [num_chains] [round_trip_us]
+#
+# Builds 16 chains x 4 processors (MIDI tool => synth => 2 audio effects)
+# on a fake JACK client that counts server calls and simulates the
+# round-trip time of each one, then runs MIDI + audio autoconnect for:
+#   - full pass: empty caches (as after startup)
+#   - idle pass: nothing changed
+#   - chain edit: one chain's audio effects swapped
+#   - ZS3 load: all chains flagged dirty, same routes
+#
+# ********************************************************************
+
+import re
+import sys
+from time import sleep, monotonic
+from threading import Lock
+
+import zynautoconnect.zynthian_autoconnect as zynautoconnect
+
+# -------------------------------------------------------------------------------
+# Fake JACK server
+# -------------------------------------------------------------------------------
+
+
+class fake_jack_port:
+    def __init__(self, name, is_input, is_audio, is_physical=False):
+        self.name = name
+        self.shortname = name.split(':', 1)[1]
+        self.aliases = []
+        self.is_input = is_input
+        self.is_output = not is_input
+        self.is_audio = is_audio
+        self.is_midi = not is_audio
+        self.is_physical = is_physical
+
+
+class fake_jack_client:
+
+    def __init__(self, round_trip):
+        self.round_trip = round_trip
+        self.ports = {}
+        self.connections = {}
+        self.calls = 0
+
+    def call(self):
+        self.calls += 1
+        if self.round_trip:
+            sleep(self.round_trip)
+
+    def add_port(self, name, is_input, is_audio, is_physical=False):
+        self.ports[name] = fake_jack_port(name, is_input, is_audio, is_physical)
+        self.connections[name] = set()
+
+    def get_ports(self, name_pattern='', is_audio=False, is_midi=False, is_input=False, is_output=False, is_physical=False):
+        self.call()
+        regex = re.compile(name_pattern)
+        return [port for name, port in self.ports.items() if regex.search(name)
+                and (not is_audio or is_midi or port.is_audio)
+                and (not is_midi or is_audio or port.is_midi)
+                and (not is_input or port.is_input)
+                and (not is_output or port.is_output)
+                and (not is_physical or port.is_physical)]
+
+    def get_port_by_name(self, name):
+        self.call()
+        return self.ports[name]
+
+    def get_all_connections(self, port):
+        self.call()
+        if not isinstance(port, str):
+            port = port.name
+        return [self.ports[name] for name in self.connections[port]]
+
+    def connect(self, src, dst):
+        self.call()
+        if not isinstance(src, str):
+            src = src.name
+        if not isinstance(dst, str):
+            dst = dst.name
+        if src in self.connections[dst]:
+            raise Exception(f"Connection {src} => {dst} already exists")
+        self.connections[dst].add(src)
+
+    def disconnect(self, src, dst):
+        self.call()
+        if not isinstance(src, str):
+            src = src.name
+        if not isinstance(dst, str):
+            dst = dst.name
+        if src not in self.connections[dst]:
+            raise Exception(f"Ports {src} and {dst} are not connected")
+        self.connections[dst].discard(src)
+
+# -------------------------------------------------------------------------------
+# Fake chains
+# -------------------------------------------------------------------------------
+
+
+class fake_engine:
+    def __init__(self, jackname):
+        self.jackname = jackname
+        self.options = {"ctrl_fb": False}
+
+    def get_jackname(self):
+        return self.jackname
+
+
+class fake_processor:
+    def __init__(self, proc_id, jackname):
+        self.id = proc_id
+        self.type = "Synth"
+        self.engine = fake_engine(jackname)
+
+    def get_jackname(self, engine=False):
+        return self.engine.jackname
+
+
+class fake_chain:
+    def __init__(self, chain_id, procs):
+        self.chain_id = chain_id
+        self.zmop_index = chain_id
+        self.mixer_chan = chain_id
+        self.midi_thru = False
+        self.midi_out = []
+        self.audio_out = []
+        self.midi_slots = [[procs[0]]]
+        self.synth_slots = [[procs[1]]]
+        self.audio_slots = [[procs[2]], [procs[3]]]
+        self.fader_pos = 2
+        self.rebuild_graph()
+
+    def is_midi(self):
+        return True
+
+    def is_synth(self):
+        return True
+
+    def get_processors(self, slot=None):
+        return self.midi_slots[0]
+
+    def rebuild_graph(self):
+        tool, synth = self.midi_slots[0][0], self.synth_slots[0][0]
+        fx1, fx2 = self.audio_slots[0][0], self.audio_slots[1][0]
+        self.midi_routes = {synth.get_jackname(): [tool.get_jackname()]}
+        self.audio_routes = {
+            fx1.get_jackname(): [synth.get_jackname()],
+            fx2.get_jackname(): [fx1.get_jackname()],
+            f"zynmixer:input_{self.mixer_chan + 1:02d}": [fx2.get_jackname()]
+        }
+        zynautoconnect.set_chain_midi_dirty(self.chain_id)
+        zynautoconnect.set_chain_audio_dirty(self.chain_id)
+
+
+class fake_chain_manager:
+    def __init__(self):
+        self.chains = {}
+        self.processors = {}
+
+    def get_chain(self, chain_id):
+        return self.chains.get(chain_id)
+
+    def get_chain_midi_routing(self, chain_id):
+        return self.chains[chain_id].midi_routes
+
+    def get_chain_audio_routing(self, chain_id):
+        return self.chains[chain_id].audio_routes
+
+    def get_processors(self, chain_id, type=None, slot=None):
+        return []
+
+
+class fake_zynmixer:
+    def normalise(self, chan, enable):
+        pass
+
+
+class fake_ctrldev_manager:
+    drivers = {}
+
+
+class fake_state_manager:
+    def __init__(self, chain_manager):
+        self.chain_manager = chain_manager
+        self.ctrldev_manager = fake_ctrldev_manager()
+        self.zynmixer = fake_zynmixer()
+        self.audio_player = None
+        self.aubio_in = []
+
+    def get_zmip_step_index(self):
+        return 16
+
+    def get_zmip_seq_index(self):
+        return 17
+
+    def get_zmip_int_index(self):
+        return 18
+
+# -------------------------------------------------------------------------------
+# Benchmark
+# -------------------------------------------------------------------------------
+
+
+def build(num_chains, round_trip):
+    jclient = fake_jack_client(round_trip)
+    for i in range(16):
+        jclient.add_port(f"ZynMidiRouter:dev{i}_in", True, False)
+        jclient.add_port(f"ZynMidiRouter:ch{i}_out", False, False)
+    for name in ("step_in", "seq_in", "ctrl_in"):
+        jclient.add_port(f"ZynMidiRouter:{name}", True, False)
+    jclient.add_port("ZynMidiRouter:step_out", False, False)
+    jclient.add_port("zynseq:input", True, False)
+    jclient.add_port("zynseq:output", False, False)
+    jclient.add_port("zynseq:metronome", False, True)
+    jclient.add_port("zynsmf:midi_in", True, False)
+    jclient.add_port("zynsmf:midi_out", False, False)
+    for i in range(1, 18):
+        for ch in "ab":
+            jclient.add_port(f"zynmixer:input_{i:02d}{ch}", True, True)
+            jclient.add_port(f"zynmixer:output_{i:02d}{ch}", False, True)
+    for i in (1, 2):
+        jclient.add_port(f"system:playback_{i}", True, True, True)
+        jclient.add_port(f"system:capture_{i}", False, True, True)
+
+    chain_manager = fake_chain_manager()
+    zynautoconnect.jclient = jclient
+    zynautoconnect.port_graph = zynautoconnect.zynthian_port_graph(jclient)
+    zynautoconnect.chain_manager = chain_manager
+    zynautoconnect.state_manager = fake_state_manager(chain_manager)
+    zynautoconnect.lock = Lock()
+    zynautoconnect.max_num_chains = 16
+    zynautoconnect.devices_in[:] = [None] * 20
+    zynautoconnect.devices_out[:] = [None] * 20
+    zynautoconnect.devices_out_name[:] = [None] * 20
+    zynautoconnect.hw_audio_dst_ports = [jclient.ports["system:playback_1"], jclient.ports["system:playback_2"]]
+
+    for chain_id in range(num_chains):
+        procs = []
+        for j, name in enumerate(("miditool", "synth", "fxa", "fxb")):
+            jackname = f"{name}-{chain_id:02d}"
+            is_audio = j > 0
+            if j < 2:
+                jclient.add_port(f"{jackname}:midi_in", True, False)
+            if j == 0:
+                jclient.add_port(f"{jackname}:midi_out", False, False)
+            if j > 1:
+                jclient.add_port(f"{jackname}:in_1", True, True)
+                jclient.add_port(f"{jackname}:in_2", True, True)
+            if is_audio:
+                jclient.add_port(f"{jackname}:out_1", False, True)
+                jclient.add_port(f"{jackname}:out_2", False, True)
+            proc = fake_processor(4 * chain_id + j, jackname)
+            chain_manager.processors[proc.id] = proc
+            procs.append(proc)
+        chain_manager.chains[chain_id] = fake_chain(chain_id, procs)
+    return jclient, chain_manager
+
+
+def run_pass(name, jclient):
+    zynautoconnect.reset_route_stats()
+    calls = jclient.calls
+    ts = monotonic()
+    zynautoconnect.midi_autoconnect()
+    zynautoconnect.audio_autoconnect()
+    elapsed = monotonic() - ts
+    stats = zynautoconnect.get_route_stats()
+    print(f"{name:>12}: {1000 * elapsed:8.2f}ms, jackd calls={jclient.calls - calls:4d} "
+          f"(get_ports={stats['get_ports']}, get_all_connections={stats['get_all_connections']}, "
+          f"connect={stats['connect']}, disconnect={stats['disconnect']}), "
+          f"chain routes calculated={stats['calculated']}, cached={stats['cached']}")
+
+
+if __name__ == "__main__":
+    num_chains = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    round_trip = float(sys.argv[2]) / 1000000 if len(sys.argv) > 2 else 0.0001
+
+    jclient, chain_manager = build(num_chains, round_trip)
+    print(f"{num_chains} chains x 4 processors, {len(jclient.ports)} ports, simulated round trip={1000000 * round_trip:.0f}us")
+
+    run_pass("full", jclient)
+    run_pass("idle", jclient)
+
+    # Swap audio effects in one chain
+    chain = chain_manager.chains[num_chains // 2]
+    chain.audio_slots.reverse()
+    chain.rebuild_graph()
+    run_pass("chain edit", jclient)
+
+    # ZS3 recall rebuilds all chains with the same routes
+    for chain in chain_manager.chains.values():
+        chain.rebuild_graph()
+    run_pass("ZS3 load", jclient)
+
+# -------------------------------------------------------------------------------
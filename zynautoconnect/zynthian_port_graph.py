@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+# ********************************************************************
+# ZYNTHIAN PROJECT: Zynthian Autoconnector
+#
+# In-memory cache of the JACK port graph
+#
+# Copyright (C) 2015-2024 Fernando Moyano <jofemodo@zynthian.org>
+#
+# ********************************************************************
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of
+# the License, or any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# For a full copy of the GNU General Public License see the LICENSE.txt file.
+#
+# ********************************************************************
+#
+# Each get_ports / get_all_connections call is a round trip to jackd.
+# This cache keeps the list of ports and the connections of each
+# destination port in memory, updated from JACK notification callbacks,
+# so autoconnect can compute routes and diff them without querying jackd.
+#
+# ********************************************************************
+
+import re
+import logging
+from threading import Lock
+
+# -------------------------------------------------------------------------------
+# Port Graph Class
+# -------------------------------------------------------------------------------
+
+
+class zynthian_port_graph:
+
+    # Port flag bits
+    FLAG_INPUT = 1
+    FLAG_OUTPUT = 2
+    FLAG_AUDIO = 4
+    FLAG_MIDI = 8
+    FLAG_PHYSICAL = 16
+
+    def __init__(self, jclient):
+        """Create a port graph cache
+
+        jclient - JACK client used to query the server when cache is stale
+        """
+
+        self.jclient = jclient
+        self.lock = Lock()
+        self.ports = {}         # Map of (port, flags) indexed by port name, in jackd order
+        self.connections = {}   # Map of sets of source port names, indexed by destination port name
+        self.query_cache = {}   # Map of get_ports results, indexed by query arguments
+        self.ports_dirty = True
+        self.version = 0        # Incremented each time the list of ports changes
+        self.stats = {}
+        self.reset_stats()
+
+    def reset(self):
+        """Drop all cached data. Next query will reload it from jackd."""
+
+        with self.lock:
+            self.ports_dirty = True
+            self.connections = {}
+            self.query_cache = {}
+            self.version += 1
+
+    def reset_stats(self):
+        self.stats = {
+            "get_ports": 0,
+            "get_all_connections": 0,
+            "connect": 0,
+            "disconnect": 0
+        }
+
+    def get_stats(self):
+        """Get dictionary with number of calls sent to jackd, by type"""
+
+        return self.stats.copy()
+
+    # ---------------------------------------------------------------------------
+    # JACK notification callbacks
+    # ---------------------------------------------------------------------------
+
+    def cb_port_registration(self, port, register):
+        """Port (un)registration callback => Invalidate port list"""
+
+        with self.lock:
+            self.ports_dirty = True
+            self.query_cache = {}
+            # Connections of removed ports are dropped by jackd without notifying every peer
+            self.connections = {}
+            self.version += 1
+
+    def cb_port_rename(self, port, old, new):
+        """Port rename callback => Invalidate port list"""
+
+        self.cb_port_registration(port, True)
+
+    def cb_port_connect(self, a, b, connect):
+        """Port (dis)connection callback => Update cached connections
+
+        a - First port
+        b - Second port
+        connect - True if connected, False if disconnected
+        """
+
+        with self.lock:
+            if a is None or b is None:
+                # Port not available anymore => reload connections on next query
+                self.connections = {}
+                return
+            if a.is_input:
+                a, b = b, a
+            try:
+                sources = self.connections[b.name]
+            except KeyError:
+                return
+            if connect:
+                sources.add(a.name)
+            else:
+                sources.discard(a.name)
+
+    # ---------------------------------------------------------------------------
+    # Queries
+    # ---------------------------------------------------------------------------
+
+    def refresh_ports(self):
+        """Reload list of ports from jackd (a single round trip)"""
+
+        version = self.version
+        ports = self.jclient.get_ports()
+        self.stats["get_ports"] += 1
+        plist = {}
+        for port in ports:
+            try:
+                flags = 0
+                if port.is_input:
+                    flags |= self.FLAG_INPUT
+                if port.is_output:
+                    flags |= self.FLAG_OUTPUT
+                if port.is_audio:
+                    flags |= self.FLAG_AUDIO
+                if port.is_midi:
+                    flags |= self.FLAG_MIDI
+                if port.is_physical:
+                    flags |= self.FLAG_PHYSICAL
+                plist[port.name] = (port, flags)
+            except Exception as e:
+                # Port removed while reading it
+                logging.debug(f"Can't read port flags => {e}")
+        with self.lock:
+            self.ports = plist
+            self.query_cache = {}
+            # Ports changed while reloading => reload again on next query
+            self.ports_dirty = version != self.version
+
+    def get_ports(self, name_pattern='', is_audio=False, is_midi=False, is_input=False, is_output=False, is_physical=False):
+        """Get list of ports matching name regex and flags, as jack.Client.get_ports
+
+        name_pattern - Regular expression, searched in port name
+        is_audio - True to get audio ports only
+        is_midi - True to get MIDI ports only
+        is_input - True to get input ports only
+        is_output - True to get output ports only
+        is_physical - True to get physical ports only
+        returns - List of JACK port objects
+        """
+
+        key = (name_pattern, is_audio, is_midi, is_input, is_output, is_physical)
+        if self.ports_dirty:
+            self.refresh_ports()
+        else:
+            try:
+                return self.query_cache[key].copy()
+            except KeyError:
+                pass
+
+        mask = 0
+        if is_input:
+            mask |= self.FLAG_INPUT
+        if is_output:
+            mask |= self.FLAG_OUTPUT
+        if is_physical:
+            mask |= self.FLAG_PHYSICAL
+        # Both or none => any type
+        if is_audio and not is_midi:
+            mask |= self.FLAG_AUDIO
+        elif is_midi and not is_audio:
+            mask |= self.FLAG_MIDI
+
+        try:
+            regex = re.compile(name_pattern) if name_pattern else None
+        except re.error:
+            # Not a valid python regex => ask jackd
+            self.stats["get_ports"] += 1
+            return self.jclient.get_ports(name_pattern, is_audio=is_audio, is_midi=is_midi, is_input=is_input, is_output=is_output, is_physical=is_physical)
+
+        with self.lock:
+            result = [port for name, (port, flags) in self.ports.items()
+                      if flags & mask == mask and (regex is None or regex.search(name))]
+            self.query_cache[key] = result
+        return result.copy()
+
+    def get_port_by_name(self, name):
+        """Get port by name or alias
+
+        name - Port name or alias
+        returns - JACK port object
+        raises - jack.JackError if port not found
+        """
+
+        if self.ports_dirty:
+            self.refresh_ports()
+        try:
+            return self.ports[name][0]
+        except KeyError:
+            # May be an alias
+            return self.jclient.get_port_by_name(name)
+
+    def get_connections(self, dst):
+        """Get set of names of ports connected to a destination port
+
+        dst - Destination port name
+        returns - Set of source port names (must not be modified)
+        """
+
+        try:
+            return self.connections[dst]
+        except KeyError:
+            pass
+        if self.ports_dirty:
+            self.refresh_ports()
+        if dst not in self.ports:
+            return set()
+        sources = set(port.name for port in self.jclient.get_all_connections(dst))
+        self.stats["get_all_connections"] += 1
+        with self.lock:
+            self.connections[dst] = sources
+        return sources
+
+    # ---------------------------------------------------------------------------
+    # Changes
+    # ---------------------------------------------------------------------------
+
+    def connect(self, src, dst):
+        """Connect two ports, updating the cache
+
+        src - Source port name
+        dst - Destination port name
+        """
+
+        self.stats["connect"] += 1
+        self.jclient.connect(src, dst)
+        with self.lock:
+            try:
+                self.connections[dst].add(src)
+            except KeyError:
+                pass
+
+    def disconnect(self, src, dst):
+        """Disconnect two ports, updating the cache
+
+        src - Source port name
+        dst - Destination port name
+        """
+
+        self.stats["disconnect"] += 1
+        self.jclient.disconnect(src, dst)
+        with self.lock:
+            try:
+                self.connections[dst].discard(src)
+            except KeyError:
+                pass
+
+# -------------------------------------------------------------------------------
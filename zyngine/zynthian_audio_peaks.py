@@ -0,0 +1,297 @@
+# -*- coding: utf-8 -*-
+# ****************************************************************************
+# ZYNTHIAN PROJECT: Zynthian Audio Peaks (zynthian_audio_peaks)
+#
+# Multi-resolution peak files for drawing audio waveforms
+#
+# Copyright (C) 2015-2024 Fernando Moyano <jofemodo@zynthian.org>
+#
+# ****************************************************************************
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of
+# the License, or any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# For a full copy of the GNU General Public License see the LICENSE.txt file.
+#
+# ****************************************************************************
+#
+# The peaks of an audio file are stored as a pyramid of levels. Level 0
+# has the min & max value of each block of BASE_BLOCK frames, for each
+# channel. Each following level reduces LEVEL_FACTOR blocks of the previous
+# one. A waveform is drawn from the level with the biggest blocks that are
+# not wider than a pixel, so drawing cost depends on the width, not on the
+# length of the audio. When zoomed in further, audio frames are read.
+#
+# The pyramid is generated once per audio file and saved in a central cache
+# directory, in a file named after the audio file's path, mtime & size.
+#
+# ****************************************************************************
+
+import os
+import struct
+import logging
+import hashlib
+import soundfile
+import numpy
+from threading import Lock
+from collections import OrderedDict
+
+# ----------------------------------------------------------------------------
+# Definitions
+# ----------------------------------------------------------------------------
+
+PEAKS_CACHE_DIR = os.environ.get('ZYNTHIAN_CONFIG_DIR', "/zynthian/config") + "/peaks_cache"
+PEAKS_MAGIC = b"ZPKS"
+PEAKS_VERSION = 1
+PEAKS_HEADER = struct.Struct("<4sIIQIIII")  # magic, version, channels, frames, samplerate, base block, level factor, levels
+
+BASE_BLOCK = 256        # Frames per block in level 0
+LEVEL_FACTOR = 4        # Blocks of a level reduced to each block of the next level
+MIN_BLOCKS = 16         # Don't add levels with less blocks than this
+READ_BLOCKS = 4096      # Blocks read from audio file at once while generating
+MAX_CACHE_FILES = 200   # Older peak files are removed when exceeded
+MAX_LOADED = 4          # Peak pyramids kept in memory
+
+# ----------------------------------------------------------------------------
+# Zynthian Audio Peaks Class
+# ----------------------------------------------------------------------------
+
+
+class zynthian_audio_peaks:
+
+    def __init__(self, channels, frames, samplerate, levels, base_block=BASE_BLOCK, factor=LEVEL_FACTOR):
+        """Peak pyramid of an audio file
+
+        channels - Quantity of channels
+        frames - Quantity of frames
+        samplerate - Samplerate
+        levels - List of int16 arrays with shape (blocks, channels, 2) => min & max of each block & channel
+        """
+
+        self.channels = channels
+        self.frames = frames
+        self.samplerate = samplerate
+        self.levels = levels
+        self.base_block = base_block
+        self.factor = factor
+
+    @classmethod
+    def generate(cls, sf):
+        """Generate peak pyramid from an open soundfile"""
+
+        channels = sf.channels
+        sf.seek(0)
+        chunks = []
+        frames = 0
+        while True:
+            data = sf.read(BASE_BLOCK * READ_BLOCKS, dtype='float32', always_2d=True)
+            n = len(data)
+            if n == 0:
+                break
+            frames += n
+            nblocks = -(-n // BASE_BLOCK)
+            if nblocks * BASE_BLOCK != n:
+                # Pad last block repeating its last frame, so min & max don't change
+                data = numpy.concatenate((data, numpy.repeat(data[-1:], nblocks * BASE_BLOCK - n, axis=0)))
+            data = data.reshape(nblocks, BASE_BLOCK, channels)
+            chunks.append(numpy.stack((data.min(axis=1), data.max(axis=1)), axis=-1))
+        if chunks:
+            level = numpy.concatenate(chunks)
+        else:
+            level = numpy.zeros((0, channels, 2), dtype='float32')
+        levels = [cls.quantize(level)]
+
+        while len(levels[-1]) >= MIN_BLOCKS * LEVEL_FACTOR:
+            levels.append(cls.reduce(levels[-1], LEVEL_FACTOR))
+        return cls(channels, frames, sf.samplerate, levels)
+
+    @staticmethod
+    def quantize(level):
+        return numpy.round(numpy.clip(level, -1.0, 1.0) * 32767).astype(numpy.int16)
+
+    @staticmethod
+    def reduce(level, factor):
+        """Get next pyramid level, reducing blocks by factor"""
+
+        nblocks = -(-len(level) // factor)
+        pad = nblocks * factor - len(level)
+        if pad:
+            level = numpy.concatenate((level, numpy.repeat(level[-1:], pad, axis=0)))
+        level = level.reshape(nblocks, factor, level.shape[1], 2)
+        return numpy.stack((level[:, :, :, 0].min(axis=1), level[:, :, :, 1].max(axis=1)), axis=-1)
+
+    # ------------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------------
+
+    def save(self, fpath):
+        tmp_fpath = fpath + ".tmp"
+        with open(tmp_fpath, "wb") as fh:
+            fh.write(PEAKS_HEADER.pack(PEAKS_MAGIC, PEAKS_VERSION, self.channels, self.frames, self.samplerate,
+                                       self.base_block, self.factor, len(self.levels)))
+            for level in self.levels:
+                fh.write(struct.pack("<Q", len(level)))
+                fh.write(numpy.ascontiguousarray(level, dtype='<i2').tobytes())
+        os.replace(tmp_fpath, fpath)
+
+    @classmethod
+    def load(cls, fpath):
+        """Load peak pyramid from file, memory mapped => None if not valid"""
+
+        with open(fpath, "rb") as fh:
+            header = fh.read(PEAKS_HEADER.size)
+        if len(header) < PEAKS_HEADER.size:
+            return None
+        magic, version, channels, frames, samplerate, base_block, factor, nlevels = PEAKS_HEADER.unpack(header)
+        if magic != PEAKS_MAGIC or version != PEAKS_VERSION or channels == 0:
+            return None
+        data = numpy.memmap(fpath, dtype='u1', mode='r')
+        offset = PEAKS_HEADER.size
+        levels = []
+        for i in range(nlevels):
+            nblocks = struct.unpack_from("<Q", data, offset)[0]
+            offset += 8
+            size = nblocks * channels * 2 * 2
+            if offset + size > len(data):
+                return None
+            levels.append(data[offset:offset + size].view('<i2').reshape(nblocks, channels, 2))
+            offset += size
+        return cls(channels, frames, samplerate, levels, base_block, factor)
+
+    # ------------------------------------------------------------------------
+    # Drawing
+    # ------------------------------------------------------------------------
+
+    def get_pixels(self, start, length, width, sf=None):
+        """Get min & max values of each pixel
+
+        start - First frame
+        length - Quantity of frames
+        width - Quantity of pixels
+        sf - Open soundfile, used when pixels are narrower than level 0 blocks
+        Returns tuple of float arrays (mins, maxs) with shape (pixels, channels), values in [-1, 1].
+        There may be less pixels than width at the end of the audio.
+        """
+
+        start = min(self.frames, max(0, start))
+        length = min(self.frames - start, length)
+        frames_per_pixel = length / width
+        edges = start + (numpy.arange(width) * frames_per_pixel).astype(numpy.int64)
+
+        if frames_per_pixel < self.base_block:
+            if sf is None:
+                raise ValueError("Soundfile is needed to draw at this zoom level")
+            sf.seek(start)
+            data = sf.read(length, dtype='float32', always_2d=True)
+            edges = edges[edges - start < len(data)] - start
+            if len(edges) == 0:
+                return numpy.zeros((0, self.channels)), numpy.zeros((0, self.channels))
+            mins = numpy.minimum.reduceat(data, edges, axis=0)
+            maxs = numpy.maximum.reduceat(data, edges, axis=0)
+            return mins, maxs
+
+        # Level with the biggest blocks not wider than a pixel
+        block_size = self.base_block
+        level = self.levels[0]
+        for next_level in self.levels[1:]:
+            if block_size * self.factor > frames_per_pixel:
+                break
+            block_size *= self.factor
+            level = next_level
+        # Limit the last pixel to the blocks of the requested range
+        level = level[:-(-(start + length) // block_size)]
+        indexes = edges // block_size
+        indexes = indexes[indexes < len(level)]
+        if len(indexes) == 0:
+            return numpy.zeros((0, self.channels)), numpy.zeros((0, self.channels))
+        mins = numpy.minimum.reduceat(level[:, :, 0], indexes, axis=0) / 32767
+        maxs = numpy.maximum.reduceat(level[:, :, 1], indexes, axis=0) / 32767
+        return mins, maxs
+
+# ----------------------------------------------------------------------------
+# Peaks cache
+# ----------------------------------------------------------------------------
+
+
+lock = Lock()
+file_locks = {}             # Generation locks indexed by cache key
+loaded = OrderedDict()      # Recently used peak pyramids indexed by cache key
+
+
+def get_cache_fpath(key):
+    return f"{PEAKS_CACHE_DIR}/{hashlib.sha1(key.encode()).hexdigest()}.peaks"
+
+
+def get_peaks(fpath):
+    """Get peak pyramid of an audio file, loading it from cache or generating it.
+    Generating may take a while, so call it from a background thread.
+
+    fpath - Audio file path
+    Returns zynthian_audio_peaks instance
+    """
+
+    st = os.stat(fpath)
+    key = f"{fpath}:{st.st_mtime_ns}:{st.st_size}"
+    with lock:
+        try:
+            loaded.move_to_end(key)
+            return loaded[key]
+        except KeyError:
+            pass
+        file_lock = file_locks.setdefault(key, Lock())
+
+    # Only one thread generates peaks of each file. The others wait for it.
+    with file_lock:
+        with lock:
+            peaks = loaded.get(key)
+        if peaks is None:
+            cache_fpath = get_cache_fpath(key)
+            try:
+                peaks = zynthian_audio_peaks.load(cache_fpath)
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                logging.warning(f"Can't load peaks file '{cache_fpath}' => {e}")
+            if peaks is None:
+                with soundfile.SoundFile(fpath) as sf:
+                    peaks = zynthian_audio_peaks.generate(sf)
+                try:
+                    os.makedirs(PEAKS_CACHE_DIR, exist_ok=True)
+                    peaks.save(cache_fpath)
+                    prune_cache()
+                except Exception as e:
+                    logging.warning(f"Can't save peaks file '{cache_fpath}' => {e}")
+            with lock:
+                loaded[key] = peaks
+                while len(loaded) > MAX_LOADED:
+                    loaded.popitem(last=False)
+
+    with lock:
+        file_locks.pop(key, None)
+    return peaks
+
+
+def prune_cache():
+    """Remove oldest peak files if there are too many"""
+
+    try:
+        with os.scandir(PEAKS_CACHE_DIR) as it:
+            entries = [(entry.stat().st_mtime, entry.path) for entry in it if entry.name.endswith(".peaks")]
+    except OSError:
+        return
+    if len(entries) > MAX_CACHE_FILES:
+        entries.sort()
+        for mtime, path in entries[:len(entries) - MAX_CACHE_FILES]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+# ----------------------------------------------------------------------------
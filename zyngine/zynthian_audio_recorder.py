@@ -28,6 +28,7 @@ import os
 import logging
 from subprocess import Popen
 from datetime import datetime
+from threading import Thread, Lock
 
 # Zynthian specific modules
 from zyngui import zynthian_gui_config
@@ -53,6 +54,7 @@ class zynthian_audio_recorder:
         self.armed = set()  # List of chains armed to record
         self.state_manager = state_manager
         self.filename = None
+        self.lock = Lock()
 
     def arm(self, channel):
         self.armed.add(channel)
@@ -108,6 +110,11 @@ class zynthian_audio_recorder:
         self.status = True
         zynsigman.send(zynsigman.S_AUDIO_RECORDER, self.SS_AUDIO_RECORDER_STATE, state=True)
 
+        # Notify if recording process ends by itself (e.g. disk full), without polling it
+        thread = Thread(target=self.watch_recording, args=(self.rec_proc,), daemon=True)
+        thread.name = "audio recorder watch"
+        thread.start()
+
         # Should this be implemented using signals?
         if processor:
             processor.controllers_dict['record'].set_value("recording", False)
@@ -118,8 +125,10 @@ class zynthian_audio_recorder:
         if self.rec_proc:
             logging.info("STOPPING AUDIO RECORD ...")
             try:
-                self.rec_proc.terminate()
-                self.rec_proc = None
+                with self.lock:
+                    rec_proc = self.rec_proc
+                    self.rec_proc = None
+                rec_proc.terminate()
             except Exception as e:
                 logging.error("ERROR STOPPING AUDIO RECORD: %s" % e)
                 return False
@@ -138,6 +147,20 @@ class zynthian_audio_recorder:
 
         return False
 
+    def watch_recording(self, rec_proc):
+        """Wait for recording process to end. Runs in a thread for each recording."""
+
+        res = rec_proc.wait()
+        with self.lock:
+            if self.rec_proc is not rec_proc:
+                # Stopped by stop_recording
+                return
+            self.rec_proc = None
+        logging.error(f"AUDIO RECORD PROCESS ENDED UNEXPECTEDLY => {res}")
+        self.status = False
+        zynsigman.send(zynsigman.S_AUDIO_RECORDER, self.SS_AUDIO_RECORDER_STATE, state=False)
+        self.state_manager.sync = True
+
     def toggle_recording(self, player=None):
         logging.info("TOGGLING AUDIO RECORDING ...")
         if self.status:
@@ -365,6 +365,7 @@ class zynthian_chain:
             for output in self.get_audio_out():
                 self.audio_routes[output] = sources.copy()
 
+        zynautoconnect.set_chain_audio_dirty(self.chain_id)
         zynautoconnect.release_lock()
 
     def get_input_pairs(self):
@@ -426,6 +427,7 @@ class zynthian_chain:
             for proc in slot:
                 self.midi_routes[proc.engine.jackname] = sources
 
+        zynautoconnect.set_chain_midi_dirty(self.chain_id)
         zynautoconnect.release_lock()
 
     def rebuild_graph(self):
@@ -24,6 +24,8 @@
 # ****************************************************************************
 
 import logging
+from time import monotonic
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # Zynthian specific modules
 import zynautoconnect
@@ -36,6 +38,7 @@ from zyngine.zynthian_engine_jalv import *
 from zyngine.zynthian_engine_pianoteq import *
 from zyngine.zynthian_signal_manager import zynsigman
 from zyngine.zynthian_processor import zynthian_processor
+from zyngine.zynthian_midi_learn import zynthian_midi_learn_store
 from zyngui import zynthian_gui_config
 
 # ----------------------------------------------------------------------------
@@ -94,6 +97,8 @@ class zynthian_chain_manager:
 
     engine_info = None
     single_processor_engines = ["BF", "MD", "PT", "AE", "SL", "IR"]
+    # Engines whose process is started on creation and can be started concurrently with others
+    parallel_start_engines = ["JV", "SF", "ZY", "FS", "LS", "PT"]
 
     def __init__(self, state_manager):
         """ Create an instance of a chain manager
@@ -113,19 +118,38 @@ class zynthian_chain_manager:
         self.ordered_chain_ids = []  # List of chain IDs in display order
         self.zyngine_counter = 0  # Appended to engine names for uniqueness
         self.zyngines = {}  # List of instantiated engines
+        self.prestarted_engines = {}  # Engines started before adding their processor, indexed by processor UID
+        self.engine_start_times = {}  # Map of (engine name, start time in seconds, parallel) indexed by engine key
         self.processors = {}  # Dictionary of processor objects indexed by UID
         self.active_chain_id = None  # Active chain id
         self.midi_chan_2_chain_ids = [list() for _ in range(MAX_NUM_MIDI_CHANS)]  # Chain IDs mapped by MIDI channel
 
         # Map of list of zctrls indexed by 24-bit ZMOP,CHAN,CC
-        self.absolute_midi_cc_binding = {}
+        self.absolute_midi_cc_binding = zynthian_midi_learn_store()
         # Map of list of zctrls indexed by 24-bit CHAIN,CHAN,CC
-        self.chain_midi_cc_binding = {}
+        self.chain_midi_cc_binding = zynthian_midi_learn_store()
+        # Map of feedback zctrls indexed by 16-bit CHAN,CC (processor's part_i, zctrl's midi_cc)
+        self.ctrl_fb_map = {}
+        self.ctrl_fb_map_dirty = True
 
     # ------------------------------------------------------------------------
     # Engine Management
     # ------------------------------------------------------------------------
 
+    @staticmethod
+    def get_preset_index_roots():
+        """Get list of (bank root directory, file extensions) of file-based engines, including external storage"""
+
+        roots = []
+        for eng_class in dict.fromkeys(engine2class.values()):
+            if not eng_class.root_bank_dirs or not eng_class.preset_fexts:
+                continue
+            for exd in zynthian_gui_config.get_external_storage_dirs(eng_class.ex_data_dir):
+                roots.append((exd, eng_class.preset_fexts))
+            for title, dpath in eng_class.root_bank_dirs:
+                roots.append((dpath, eng_class.preset_fexts))
+        return roots
+
     @classmethod
     def get_engine_info(cls):
         """Get engine config from file and add extra info"""
@@ -902,6 +926,7 @@ class zynthian_chain_manager:
                 self.processors.pop(id)
             except:
                 pass
+            self.invalidate_ctrl_fb_map()
             if stop_engine:
                 self.stop_unused_engines()
 
@@ -993,25 +1018,19 @@ class zynthian_chain_manager:
             logging.error(f"Engine '{eng_code}' not found!")
             return None
 
-        if eng_code in self.zyngines:
+        if processor.id in self.prestarted_engines:
+            # Engine started by staged snapshot loader
+            zyngine = self.prestarted_engines.pop(processor.id)
+        elif eng_code in self.zyngines:
             # Engine already started
             zyngine = self.zyngines[eng_code]
         else:
             # Start new engine instance
-            info = self.engine_info[eng_code]
-            zynthian_engine_class = info["ENGINE"]
-            if eng_code[0:3] == "JV/":
-                eng_key = f"JV/{self.zyngine_counter}"
-                zyngine = zynthian_engine_class(eng_code, self.state_manager, False)
-            elif eng_code in ("SF", "PD"):
-                eng_key = f"{eng_code}/{self.zyngine_counter}"
-                zyngine = zynthian_engine_class(self.state_manager)
-            else:
-                eng_key = eng_code
-                zyngine = zynthian_engine_class(self.state_manager)
-
+            eng_key = self.get_engine_key(eng_code)
+            ts = monotonic()
+            zyngine = self.create_engine(eng_code)
+            self.engine_start_times[eng_key] = (zyngine.get_name(), monotonic() - ts, False)
             self.zyngines[eng_key] = zyngine
-            self.zyngine_counter += 1
 
         # Set extended configuration (optional)
         if eng_config:
@@ -1020,6 +1039,127 @@ class zynthian_chain_manager:
         processor.set_engine(zyngine)
         return zyngine
 
+    def get_engine_key(self, eng_code):
+        """Get a new key for indexing an engine instance in zyngines
+
+        eng_code : Engine short code
+        Returns : Engine key
+        """
+
+        if eng_code[0:3] == "JV/":
+            eng_key = f"JV/{self.zyngine_counter}"
+        elif eng_code in ("SF", "PD"):
+            eng_key = f"{eng_code}/{self.zyngine_counter}"
+        else:
+            eng_key = eng_code
+        self.zyngine_counter += 1
+        return eng_key
+
+    def create_engine(self, eng_code, jackname=None):
+        """Create a new engine instance. Most engines start their process when created.
+
+        eng_code : Engine short code
+        jackname : Jack client name for engines allowing several instances (optional)
+        Returns : engine object
+        """
+
+        zynthian_engine_class = self.engine_info[eng_code]["ENGINE"]
+        if eng_code[0:3] == "JV/":
+            return zynthian_engine_class(eng_code, self.state_manager, False, jackname)
+        elif eng_code == "SF":
+            return zynthian_engine_class(self.state_manager, jackname)
+        else:
+            return zynthian_engine_class(self.state_manager)
+
+    def get_engine_start_plan(self, state):
+        """Get list of engines that can be started concurrently before creating chains from state
+
+        state : Map of chain states
+        Returns : List of tuples (processor UID or None for shared engines, engine key, engine code, jackname)
+        """
+
+        plan = []
+        shared = set()
+        jacknames = set()
+        for chain_state in state.values():
+            for slot_state in chain_state.get("slots", []):
+                for proc_id, eng_code in slot_state.items():
+                    proc_id = int(proc_id)
+                    if eng_code[0:2] not in self.parallel_start_engines or proc_id in self.processors:
+                        continue
+                    try:
+                        if not self.engine_info[eng_code]["ENGINE"]:
+                            continue
+                    except KeyError:
+                        continue
+                    if eng_code[0:3] == "JV/":
+                        jackname = self.get_next_jackname(self.engine_info[eng_code]["NAME"], reserved=jacknames)
+                    elif eng_code == "SF":
+                        jackname = self.get_next_jackname("sfizz", reserved=jacknames)
+                    elif eng_code in self.zyngines or eng_code in shared:
+                        continue
+                    else:
+                        shared.add(eng_code)
+                        plan.append((None, self.get_engine_key(eng_code), eng_code, None))
+                        continue
+                    jacknames.add(jackname)
+                    plan.append((proc_id, self.get_engine_key(eng_code), eng_code, jackname))
+        return plan
+
+    def start_engines(self, plan):
+        """Start engines concurrently in a pool of worker threads
+
+        Started engines are used when adding their processors.
+        plan : List of engines to start, as returned by get_engine_start_plan
+        """
+
+        def start(eng_code, jackname):
+            ts = monotonic()
+            zyngine = self.create_engine(eng_code, jackname)
+            return zyngine, monotonic() - ts
+
+        n = len(plan)
+        jobs = min(n, zynthian_gui_config.engine_start_jobs)
+        logging.info(f"Starting {n} engines with {jobs} workers")
+        with ThreadPoolExecutor(max_workers=jobs, thread_name_prefix="engine_start") as executor:
+            futures = {}
+            for proc_id, eng_key, eng_code, jackname in plan:
+                futures[executor.submit(start, eng_code, jackname)] = (proc_id, eng_key, eng_code)
+            for i, future in enumerate(as_completed(futures)):
+                proc_id, eng_key, eng_code = futures[future]
+                try:
+                    zyngine, elapsed = future.result()
+                except Exception as e:
+                    logging.error(f"Can't start engine '{eng_code}' => {e}")
+                    continue
+                self.zyngines[eng_key] = zyngine
+                self.engine_start_times[eng_key] = (zyngine.get_name(), elapsed, True)
+                if proc_id is not None:
+                    self.prestarted_engines[proc_id] = zyngine
+                self.state_manager.set_busy_details(f"started engine {i + 1}/{n}: {zyngine.get_name()}")
+
+    def stop_prestarted_engines(self):
+        """Stop engines started by staged loader but not used by any processor"""
+
+        for zyngine in self.prestarted_engines.values():
+            for eng_key in list(self.zyngines):
+                if self.zyngines[eng_key] is zyngine:
+                    logging.debug(f"Stopping Unused Engine '{eng_key}' ...")
+                    zyngine.stop()
+                    del self.zyngines[eng_key]
+        self.prestarted_engines = {}
+
+    def get_engine_start_report(self):
+        """Get a human readable report of engine start times"""
+
+        lines = ["Engine start times:"]
+        total = 0
+        for eng_key, (name, elapsed, parallel) in self.engine_start_times.items():
+            total += elapsed
+            lines.append(f"  {eng_key:>12} {name:<24} {elapsed:7.3f}s {'(parallel)' if parallel else ''}")
+        lines.append(f"  {'total':>12} {'':<24} {total:7.3f}s")
+        return "\n".join(lines)
+
     def stop_unused_engines(self):
         """Stop engines that are not used by any processors"""
         for eng_key in list(self.zyngines.keys()):
@@ -1066,10 +1206,12 @@ class zynthian_chain_manager:
                     del result[eng_cat]
         return result
 
-    def get_next_jackname(self, jackname, sanitize=True):
+    def get_next_jackname(self, jackname, sanitize=True, reserved=()):
         """Get the next available jackname
 
         jackname : stub of jackname
+        sanitize : True to replace characters not allowed in jack names
+        reserved : Collection of jacknames already assigned to engines not bound to a processor yet
         """
 
         try:
@@ -1078,7 +1220,7 @@ class zynthian_chain_manager:
             if sanitize:
                 jackname = re.sub("[\_]{2,}", "_", re.sub(
                     "[\s\'\*\(\)\[\]]", "_", jackname))
-            names = set()
+            names = set(jn for jn in reserved if jn.startswith(jackname))
             for processor in self.get_processors():
                 jn = processor.get_jackname()
                 if jn is not None and jn.startswith(jackname):
@@ -1148,6 +1290,7 @@ class zynthian_chain_manager:
         """
 
         self.state_manager.start_busy("set_chain_state", None, "loading chains")
+        ts = monotonic()
 
         # Clean all chains but don't stop unused engines
         if not merge:
@@ -1157,6 +1300,15 @@ class zynthian_chain_manager:
             # so we stop Jalv engines!
             self.stop_unused_jalv_engines()  # TODO: Can we factor this out? => Not yet!!
 
+        # Start engine processes concurrently
+        self.engine_start_times = {}
+        if zynthian_gui_config.engine_start_jobs > 0:
+            plan = self.get_engine_start_plan(state)
+            if plan:
+                self.start_engines(plan)
+        ts_start = monotonic()
+
+        # Create chains & bind processors to engines
         for chain_id, chain_state in state.items():
             if merge:
                 chain_id = None
@@ -1185,6 +1337,9 @@ class zynthian_chain_manager:
             if "zctrls" in chain_state:
                 self.chains[chain_id].set_zctrls_state(chain_state["zctrls"])
 
+        self.stop_prestarted_engines()
+        logging.info(self.get_engine_start_report())
+        logging.info(f"Chains loaded in {monotonic() - ts:.3f}s (starting engines {ts_start - ts:.3f}s, creating chains {monotonic() - ts_start:.3f}s)")
         self.state_manager.end_busy("set_chain_state")
 
     def restore_presets(self):
@@ -1248,29 +1403,17 @@ class zynthian_chain_manager:
         if zmip is None:
             if zctrl.processor and zctrl.processor.chain_id is not None:
                 key = (zctrl.processor.chain_id << 16) | (midi_chan << 8) | midi_cc
-                if key in self.chain_midi_cc_binding:
-                    if zctrl not in self.chain_midi_cc_binding[key]:
-                        self.chain_midi_cc_binding[key].append(zctrl)
-                else:
-                    self.chain_midi_cc_binding[key] = [zctrl]
+                self.chain_midi_cc_binding.add(key, zctrl)
 
         # Absolute learning for external devices
         elif zmip != ZMIP_STEP_INDEX:
             key = (zmip << 16) | (midi_chan << 8) | midi_cc
-            if key in self.absolute_midi_cc_binding:
-                if zctrl not in self.absolute_midi_cc_binding[key]:
-                    self.absolute_midi_cc_binding[key].append(zctrl)
-            else:
-                self.absolute_midi_cc_binding[key] = [zctrl]
+            self.absolute_midi_cc_binding.add(key, zctrl)
 
         # ZynStep mapping => MIDI chains only
         if map_zynstep and zctrl.processor and zctrl.processor.midi_chan is not None:
             key = (ZMIP_STEP_INDEX << 16) | (zctrl.processor.midi_chan << 8) | midi_cc
-            if key in self.absolute_midi_cc_binding:
-                if zctrl not in self.absolute_midi_cc_binding[key]:
-                    self.absolute_midi_cc_binding[key].append(zctrl)
-            else:
-                self.absolute_midi_cc_binding[key] = [zctrl]
+            self.absolute_midi_cc_binding.add(key, zctrl)
 
         #self.print_midi_learn()
 
@@ -1314,72 +1457,47 @@ class zynthian_chain_manager:
             zynstep = not self.is_custom_zynstep_mapping(zctrl)
 
         if chain:
-            for key in list(self.chain_midi_cc_binding):
-                zctrls = self.chain_midi_cc_binding[key]
-                try:
-                    zctrls.remove(zctrl)
-                except:
-                    pass
-                if not zctrls:
-                    self.chain_midi_cc_binding.pop(key)
+            self.chain_midi_cc_binding.remove_zctrl(zctrl)
         if abs:
-            for key in list(self.absolute_midi_cc_binding):
-                if (key >> 16) & 0xff == ZMIP_STEP_INDEX:
-                    continue
-                zctrls = self.absolute_midi_cc_binding[key]
-                try:
-                    zctrls.remove(zctrl)
-                except:
-                    pass
-                if not zctrls:
-                    self.absolute_midi_cc_binding.pop(key)
-
+            self.absolute_midi_cc_binding.remove_zctrl(zctrl, self.is_not_zynstep_zmip)
         if zynstep:
-            for key in list(self.absolute_midi_cc_binding):
-                if (key >> 16) & 0xff != ZMIP_STEP_INDEX:
-                    continue
-                zctrls = self.absolute_midi_cc_binding[key]
-                try:
-                    zctrls.remove(zctrl)
-                except:
-                    pass
-                if not zctrls:
-                    self.absolute_midi_cc_binding.pop(key)
+            self.absolute_midi_cc_binding.remove_zctrl(zctrl, self.is_zynstep_zmip)
+
+    @staticmethod
+    def is_zynstep_zmip(zmip):
+        return zmip == ZMIP_STEP_INDEX
+
+    @staticmethod
+    def is_not_zynstep_zmip(zmip):
+        return zmip != ZMIP_STEP_INDEX
 
     def get_midi_learn_from_zctrl(self, zctrl, chain=True, abs=True, zynstep=True):
         if chain:
-            for key, zctrls in self.chain_midi_cc_binding.items():
-                if zctrl in zctrls:
-                    return [key, "chain"]
+            keys = self.chain_midi_cc_binding.get_keys(zctrl)
+            if keys:
+                return [keys[0], "chain"]
         if abs:
-            for key, zctrls in self.absolute_midi_cc_binding.items():
-                if (key >> 16) & 0xff == ZMIP_STEP_INDEX:
-                    continue
-                if zctrl in zctrls:
-                    return [key, "abs"]
+            keys = self.absolute_midi_cc_binding.get_keys(zctrl, self.is_not_zynstep_zmip)
+            if keys:
+                return [keys[0], "abs"]
         if zynstep:
-            for key, zctrls in self.absolute_midi_cc_binding.items():
-                if (key >> 16) & 0xff != ZMIP_STEP_INDEX:
-                    continue
-                if zctrl in zctrls:
-                    return [key, "zynstep"]
+            keys = self.absolute_midi_cc_binding.get_keys(zctrl, self.is_zynstep_zmip)
+            if keys:
+                return [keys[0], "zynstep"]
 
     def is_custom_zynstep_mapping(self, zctrl):
+        # Look for a zynstep mapping
+        keys = self.absolute_midi_cc_binding.get_keys(zctrl, self.is_zynstep_zmip)
+        if not keys:
+            return False
         # Look for a non-zynstep mapping (absolute or chain)
         try:
-            key = self. get_midi_learn_from_zctrl(zctrl, chain=True, abs=True, zynstep=False)[0]
+            key = self.get_midi_learn_from_zctrl(zctrl, chain=True, abs=True, zynstep=False)[0]
             midi_cc = key & 0x7f
         except:
             midi_cc = None
-        # Look for a zynstep mapping
-        for key, zctrls in self.absolute_midi_cc_binding.items():
-            if ZMIP_STEP_INDEX == (key >> 16) & 0xff and zctrl in zctrls:
-                # Check if it's custom mapping => It's different to non-zynstep mapping (not auto-mapped!)
-                if midi_cc is None or midi_cc != key & 0x7f:
-                    return True
-                else:
-                    return False
-        return False
+        # Check if it's custom mapping => It's different to non-zynstep mapping (not auto-mapped!)
+        return midi_cc is None or midi_cc != keys[0] & 0x7f
 
     def get_zynstep_mapped_zctrl(self, midi_chan, cc_num):
         try:
@@ -1388,6 +1506,75 @@ class zynthian_chain_manager:
         except:
             return None
 
+    def get_midi_cc_zctrls(self, zmip, midi_chan, cc_num):
+        """Get list of zctrls driven by a MIDI CC message
+
+        zmip : Index of MIDI input device
+        midi_chan : MIDI channel
+        cc_num : CC number
+        """
+        key_low = (midi_chan << 8) | cc_num
+        zctrls = list(self.absolute_midi_cc_binding.get((zmip << 16) | key_low, []))
+        if zmip != ZMIP_STEP_INDEX and self.active_chain_id is not None:
+            zctrls += self.chain_midi_cc_binding.get((self.active_chain_id << 16) | key_low, [])
+            zctrls += self.chain_midi_cc_binding.get((self.active_chain_id << 16) | (0xff << 8) | cc_num, [])
+        return zctrls
+
+    def is_midi_cc_absolute(self, zmip, midi_chan, cc_num):
+        """Check if a MIDI CC message only drives absolute mode controllers, so values may be coalesced
+
+        zmip : Index of MIDI input device
+        midi_chan : MIDI channel
+        cc_num : CC number
+        """
+        # Controller feedback is always absolute
+        if zmip == ZMIP_CTRL_INDEX:
+            return True
+        for zctrl in self.get_midi_cc_zctrls(zmip, midi_chan, cc_num):
+            if not zctrl.is_midi_cc_absolute():
+                return False
+        return True
+
+    def update_ctrl_fb_map(self):
+        """Rebuild the map of controller feedback zctrls from the processors sending feedback
+
+        Feedback is received in the processor's part_i channel, with the zctrl's midi_cc number.
+        If several zctrls match the same channel & CC, the first one is used.
+        """
+
+        self.ctrl_fb_map_dirty = False
+        ctrl_fb_map = {}
+        for proc in list(zynautoconnect.ctrl_fb_procs):
+            try:
+                if proc.id not in self.processors or not isinstance(proc.part_i, int):
+                    continue
+                for zctrl in proc.controllers_dict.values():
+                    if isinstance(zctrl.midi_cc, int):
+                        ctrl_fb_map.setdefault((proc.part_i << 8) | zctrl.midi_cc, zctrl)
+            except Exception as e:
+                logging.warning(f"Can't map control feedback for processor {proc.id} => {e}")
+        self.ctrl_fb_map = ctrl_fb_map
+
+    def invalidate_ctrl_fb_map(self):
+        """Flag the controller feedback map to be rebuilt on next feedback message.
+
+        Call it when processors sending feedback, their controllers or their MIDI channels change.
+        """
+
+        self.ctrl_fb_map_dirty = True
+
+    def midi_control_change_run(self, cc_events, cc_cb=None):
+        """Send a run of MIDI CC messages to relevant chains
+
+        cc_events : List of (zmip, midi_chan, cc_num, cc_val) tuples
+        cc_cb : Function called with each CC after sending it to chains, so other destinations get CCs in the same order
+        """
+        midi_control_change = self.midi_control_change
+        for zmip, midi_chan, cc_num, cc_val in cc_events:
+            midi_control_change(zmip, midi_chan, cc_num, cc_val)
+            if cc_cb:
+                cc_cb(zmip, midi_chan, cc_num, cc_val)
+
     def midi_control_change(self, zmip, midi_chan, cc_num, cc_val):
         """Send MIDI CC message to relevant chain
 
@@ -1418,17 +1605,14 @@ class zynthian_chain_manager:
         # Each engine sending feedback should use a separated zmip, currently only setBfree does.
         if zmip == ZMIP_CTRL_INDEX:
             #logging.debug(f"MIDI CONTROL FEEDBACK {midi_chan}, {cc_num} => {cc_val}")
-            for proc in zynautoconnect.ctrl_fb_procs:
-                try:
-                    if proc.part_i == midi_chan:
-                        for symbol, zctrl in proc.controllers_dict.items():
-                            if zctrl.midi_cc == cc_num:
-                                #logging.debug(f"CONTROLLER FEEDBACK {proc.id}:{symbol} ({midi_chan}:{cc_num}) => {cc_val}")
-                                #zctrl.midi_control_change(cc_val, send=False)
-                                zctrl.set_value(cc_val, send=False)
-                                return
-                except Exception as e:
-                    logging.warning(f"Can't manage control feedback for CH{midi_chan}:CC{cc_num} => {e}")
+            if self.ctrl_fb_map_dirty:
+                self.update_ctrl_fb_map()
+            try:
+                self.ctrl_fb_map[key_low].set_value(cc_val, send=False)
+            except KeyError:
+                pass
+            except Exception as e:
+                logging.warning(f"Can't manage control feedback for CH{midi_chan}:CC{cc_num} => {e}")
             return
 
         # Handle absolute CC binding
@@ -1558,6 +1742,7 @@ class zynthian_chain_manager:
                     pass
 
         chain.set_midi_chan(midi_chan)
+        self.invalidate_ctrl_fb_map()
 
     def get_free_midi_chans(self):
         """Get list of unused MIDI channels"""
@@ -26,11 +26,12 @@ import math
 import liblo
 import logging
 from time import monotonic
-from threading import Timer
+from threading import Lock
 
 # Zynthian specific modules
 from zyncoder.zyncore import lib_zyncore
 from zyngine.zynthian_signal_manager import zynsigman
+from zyngine.zynthian_scheduler import zynsched
 
 # ----------------------------------------------------------------------------
 
@@ -40,6 +41,9 @@ MIDI_CC_MODE_DETECT_STEPS = 8
 
 class zynthian_controller:
 
+    # Guards ignore_engine_fb state, shared by all controllers
+    ignore_engine_fb_lock = Lock()
+
     def __init__(self, engine, symbol, options=None):
         """ Instantiate a new zynthian controller
 
@@ -91,7 +95,9 @@ class zynthian_controller:
         self.display_priority = 0  # Hint of order in which to display control (higher comes first)
 
         self.is_dirty = True  # True if control value changed since last UI update
-        self.ignore_engine_fb_ts = None  # Ignore next feedback value from the engine until this timestamp is over
+        self.ignore_engine_fb = False  # True to ignore next feedback value from the engine
+        self.ignore_engine_fb_timer = None  # Scheduled event to stop ignoring feedback from the engine
+        self.ignore_engine_fb_serial = 0  # Incremented on each set_ignore_engine_fb to discard stale expiries
 
         # Parameters to send values if engine-specific send method not available
         self.midi_chan = None  # MIDI channel to send CC messages from control
@@ -338,19 +344,36 @@ class zynthian_controller:
             self.is_dirty = True
 
     def set_ignore_engine_fb(self, timeout=2.0):
-        # Ignore FB from engine for 2.0 seconds
-        self.ignore_engine_fb_ts = monotonic() + timeout
+        # Ignore next FB from engine for timeout seconds.
+        # Replacing the timer and bumping the serial is atomic, so an expiry
+        # already running for a previous call can't clear the new deadline.
+        with self.ignore_engine_fb_lock:
+            if self.ignore_engine_fb_timer:
+                self.ignore_engine_fb_timer.cancel()
+            self.ignore_engine_fb = True
+            self.ignore_engine_fb_serial += 1
+            self.ignore_engine_fb_timer = zynsched.schedule(timeout, self.reset_ignore_engine_fb, self.ignore_engine_fb_serial)
+
+    def reset_ignore_engine_fb(self, serial=None):
+        # serial: Only reset if it matches the latest call to set_ignore_engine_fb (None to reset always)
+        with self.ignore_engine_fb_lock:
+            if serial is not None and serial != self.ignore_engine_fb_serial:
+                return
+            if self.ignore_engine_fb_timer:
+                self.ignore_engine_fb_timer.cancel()
+            self.ignore_engine_fb = False
+            self.ignore_engine_fb_timer = None
 
     def get_ignore_engine_fb(self):
-        if self.ignore_engine_fb_ts:
-            if self.ignore_engine_fb_ts > monotonic():
-                self.ignore_engine_fb_ts = None
+        with self.ignore_engine_fb_lock:
+            if self.ignore_engine_fb:
+                if self.ignore_engine_fb_timer:
+                    self.ignore_engine_fb_timer.cancel()
+                self.ignore_engine_fb = False
+                self.ignore_engine_fb_timer = None
                 return True
             else:
-                self.ignore_engine_fb_ts = None
                 return False
-        else:
-            return False
 
     def set_send_value_cb(self, cb_func):
         self.send_value_cb = cb_func
@@ -418,8 +441,7 @@ class zynthian_controller:
             if self.midi_cc_debounce:
                 if self.midi_cc_debounce_timer:
                     self.midi_cc_debounce_timer.cancel()
-                self.midi_cc_debounce_timer = Timer(0.02, self.midi_cc_debounce_cb, (value, True))
-                self.midi_cc_debounce_timer.start()
+                self.midi_cc_debounce_timer = zynsched.schedule(0.02, self.midi_cc_debounce_cb, value, True)
             else:
                 self.set_value(value, send=True)
 
@@ -634,8 +656,7 @@ class zynthian_controller:
             if self.midi_cc_debounce:
                 if self.midi_cc_debounce_timer:
                     self.midi_cc_debounce_timer.cancel()
-                self.midi_cc_debounce_timer = Timer(0.02, self.midi_cc_debounce_cb, (value, send))
-                self.midi_cc_debounce_timer.start()
+                self.midi_cc_debounce_timer = zynsched.schedule(0.02, self.midi_cc_debounce_cb, value, send)
             else:
                 self.set_value(value, send)
 
@@ -687,6 +708,10 @@ class zynthian_controller:
 
             self.set_value(value, send)
 
+    def is_midi_cc_absolute(self):
+        """Check if CC values are absolute, so intermediate values may be dropped"""
+        return self.midi_cc_mode == 0 and not (self.is_toggle and self.midi_cc_momentary_switch)
+
     def midi_cc_mode_reset(self):
         self.midi_cc_mode = -1
 
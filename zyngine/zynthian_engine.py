@@ -35,6 +35,7 @@ from time import sleep
 
 import zynautoconnect
 from . import zynthian_controller
+from zyngine.zynthian_preset_index import zynpresetindex
 from zyngui import zynthian_gui_config
 
 # --------------------------------------------------------------------------------
@@ -142,6 +143,9 @@ class zynthian_basic_engine:
 
 class zynthian_engine(zynthian_basic_engine):
 
+    # Subsignals are defined inside each module. Here we define engine subsignals (sent with S_CHAIN):
+    SS_PRESET_LIST = 1  # Preset list of some banks changed in background => bank_dpaths
+
     # ---------------------------------------------------------------------------
     # Default Controllers & Screens
     # ---------------------------------------------------------------------------
@@ -271,37 +275,13 @@ class zynthian_engine(zynthian_basic_engine):
 
     @staticmethod
     def find_some_preset_file(path, fexts, recursion=1):
-        rules = []
-        for ext in fexts:
-            rules.append(fnmatch.translate("*." + ext))
-        rerule = re.compile("(" + "|".join(rules) + ")", re.IGNORECASE)
         # TODO: Support levels of recrsions instead boolean
-        if recursion:
-            for item in glob.iglob(os.path.join(path, "**"), recursive=True):
-                if rerule.match(item):
-                    return True
-        else:
-            for item in glob.iglob(os.path.join(path, "*"), recursive=False):
-                if rerule.match(item):
-                    return True
-        return False
+        return zynpresetindex.has_files(path, fexts, recursion)
 
     @staticmethod
     def find_all_preset_files(path, fexts, recursion=1):
-        rules = []
-        for ext in fexts:
-            rules.append(fnmatch.translate("*." + ext))
-        rerule = re.compile("(" + "|".join(rules) + ")", re.IGNORECASE)
-        res = []
         # TODO: Support levels of recrsions instead boolean
-        if recursion:
-            for item in glob.iglob(os.path.join(path, "**"), recursive=True):
-                if rerule.match(item):
-                    res.append(item)
-        else:
-            for item in glob.iglob(os.path.join(path, "*"), recursive=False):
-                if rerule.match(item):
-                    res.append(item)
+        res = zynpresetindex.find_files(path, fexts, maxdepth=None if recursion else 1, hidden=False, dirs=True)
         return sorted(res, key=str.casefold)
 
     @classmethod
@@ -317,11 +297,20 @@ class zynthian_engine(zynthian_basic_engine):
             dp = dpd[1]
             dn = dpd[0]
             try:
-                for f in sorted(os.listdir(dp)):
+                listing = zynpresetindex.get_dir(dp)
+                if listing is None:
+                    continue
+                if include_dirs:
+                    subdirs = set(listing[1])
+                    fnames = sorted(listing[0] + listing[1])
+                else:
+                    subdirs = ()
+                    fnames = listing[0]
+                for f in fnames:
                     if f.startswith('.'):
                         continue
                     path = os.path.join(dp, f)
-                    if os.path.isfile(path):
+                    if f not in subdirs:
                         parts = os.path.splitext(f)
                         ext = parts[1][1:].lower()
                         if ext in fext:
@@ -329,12 +318,12 @@ class zynthian_engine(zynthian_basic_engine):
                             if dn != '_':
                                 title = dn + '/' + title
                             # print("filelist => " + title)
-                            row = [os.path.join(dp, f), i, title, dn, f, ext]
+                            row = [path, i, title, dn, f, ext]
                             if info:
                                 row.append(info[1])
                             files.append(row)
                             i += 1
-                    elif include_dirs and os.path.isdir(path) and (not exclude_empty_dirs or cls.find_some_preset_file(path, fext)):
+                    elif not exclude_empty_dirs or cls.find_some_preset_file(path, fext):
                         row = [path, i, "> " + f, dn, f]
                         if info:
                             row.append(info[0])
@@ -410,13 +399,12 @@ class zynthian_engine(zynthian_basic_engine):
         # Generate list
         res = []
         for root_dir in root_dirs:
-            if not os.path.isdir(root_dir[1]):
+            listing = zynpresetindex.get_dir(root_dir[1])
+            if listing is None:
                 continue
             sres = []
-            walk = next(os.walk(root_dir[1]))
-            walk[1].sort()
-            for dir in walk[1]:
-                dpath = walk[0] + "/" + dir
+            for dir in listing[1]:
+                dpath = root_dir[1] + "/" + dir
                 if (not exclude_empty or internal_include_empty) or cls.find_some_preset_file(dpath, fexts, recursion):
                     title = dir_marker + dir
                     row = [dpath, None, title, None, dir]
@@ -611,11 +611,12 @@ class zynmixer(zynthian_engine):
                     state["midi_learn"][f"{chan},{cc}"] = zctrl.graph_path
         return state
 
-    def set_state(self, state, full=True):
+    def set_state(self, state, full=True, diff=False):
         """Set mixer state
 
         state : List of mixer channels containing dictionary of each state value
         full : True to reset parameters omitted from state
+        diff : True to set only parameters (and MIDI learn) that differ from current state
         """
 
         for chan, zctrls in enumerate(self.zctrls):
@@ -623,13 +624,20 @@ class zynmixer(zynthian_engine):
             for symbol, zctrl in zctrls.items():
                 try:
                     if zctrl.is_toggle:
-                        zctrl.set_value(state[key][symbol] & 1, True)
+                        value = state[key][symbol] & 1
                         zctrl.midi_cc_momentary_switch = state[key][symbol] >> 1
                     else:
-                        zctrl.set_value(state[key][symbol], True)
+                        value = state[key][symbol]
                 except:
-                    if full:
-                        zctrl.reset_value()
+                    if not full:
+                        continue
+                    value = zctrl.value_default
+                if not diff or zctrl.value != value:
+                    zctrl.set_value(value, True)
+        if diff and "midi_learn" in state:
+            learned = {f"{chan},{cc}": zctrl.graph_path for chan in range(16) for cc, zctrl in self.learned_cc[chan].items()}
+            if state["midi_learn"] == learned:
+                return
         if "midi_learn" in state:
             # state["midi_learn"][f"{chan},{cc}"] = zctrl.graph_path
             self.midi_unlearn_all()
@@ -665,6 +673,20 @@ class zynmixer(zynthian_engine):
                 except:
                     pass
 
+    def is_midi_cc_absolute(self, ccnum):
+        """Check if a CC only drives absolute mode controllers, so values may be coalesced
+
+        ccnum : CC number
+        """
+        if self.midi_learn_zctrl:
+            return False
+        for ch in range(16):
+            try:
+                return self.learned_cc[ch][ccnum].is_midi_cc_absolute()
+            except KeyError:
+                pass
+        return True
+
     def midi_unlearn(self, zctrl):
         for chan, learned in enumerate(self.learned_cc):
             for cc, ctrl in learned.items():
@@ -28,13 +28,14 @@ import json
 import copy
 from subprocess import Popen, STDOUT, PIPE
 import socket
-from threading import Thread, Timer
+from threading import Thread
 from os.path import basename
 from os import listdir
 from time import sleep, monotonic
 
 from . import zynthian_engine
 import zynautoconnect
+from zyngine.zynthian_scheduler import zynsched
 
 
 # ------------------------------------------------------------------------------
@@ -811,8 +812,7 @@ class zynthian_engine_inet_radio(zynthian_engine):
         zynautoconnect.request_audio_connect(True)
         if self.connect_timer:
             self.connect_timer.cancel()
-        self.connect_timer = Timer(2, zynautoconnect.audio_autoconnect)
-        self.connect_timer.start()
+        self.connect_timer = zynsched.schedule(2, zynautoconnect.audio_autoconnect)
         
     # ----------------------------------------------------------------------------
     # Controllers Management
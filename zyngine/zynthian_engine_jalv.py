@@ -28,19 +28,25 @@ import re
 import sys
 import copy
 import shutil
+import select
+import socket
 import logging
 import traceback
 from time import sleep
 #from datetime import datetime
-from threading import Thread
+from threading import Lock, RLock, Event
 from subprocess import Popen, check_output, STDOUT, PIPE
 
 import zynautoconnect
 from . import zynthian_lv2
 from . import zynthian_engine
 from . import zynthian_controller
+from . import zynthian_jalv_protocol as jalv_ipc
 from zyncoder.zyncore import lib_zyncore
 from zyngine.ctrlinfo import *
+from zyngine.zynthian_scheduler import zynsched
+from zyngine.zynthian_proc_reader import zynprocreader
+from zyngui import zynthian_gui_config
 
 # ------------------------------------------------------------------------------
 # Jalv Engine Class => Engine for LV2 plugins
@@ -173,7 +179,18 @@ class zynthian_engine_jalv(zynthian_engine):
     def __init__(self, eng_code, state_manager, dryrun=False, jackname=None):
         super().__init__(state_manager)
 
-        self.proc_poll_thread = None
+        self.proc_stdout_fd = None
+        self.proc_prompt_event = Event()
+        self.proc_output = ""
+
+        # Binary IPC (see zynthian_jalv_protocol)
+        self.ipc_sock = None
+        self.ipc_reader = None
+        self.ipc_zctrls = {}       # zctrls indexed by port index
+        self.ipc_symbols = {}      # Port symbols indexed by port index
+        self.ipc_batch = {}        # Pending control values indexed by port index
+        self.ipc_batch_lock = Lock()
+        self.ipc_flush_lock = RLock()
 
         self.save_bank = None
         self.save_preset_uri = None
@@ -319,13 +336,32 @@ class zynthian_engine_jalv(zynthian_engine):
                 # when cwd is specified for pexpect.spawn(), so do it here.
                 if self.command_cwd:
                     self.command_env['PWD'] = self.command_cwd
+                # Offer binary IPC socket to jalv
+                pass_fds = ()
+                ipc_jalv_sock = None
+                if zynthian_gui_config.jalv_binary_ipc:
+                    try:
+                        self.ipc_sock, ipc_jalv_sock = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+                        pass_fds = (ipc_jalv_sock.fileno(),)
+                        self.command_env[jalv_ipc.JALV_IPC_FD_ENV] = str(ipc_jalv_sock.fileno())
+                    except Exception as e:
+                        logging.warning(f"Can't create jalv IPC socket => {e}")
+                        self.ipc_sock = None
                 # Setting cwd is because we've set PWD above. Some engines doesn't
                 # care about the process's cwd, but it is more consistent to set
                 # cwd when PWD has been set.
                 self.proc = Popen(self.command, env=self.command_env, cwd=self.command_cwd, shell=False,
-                                  text=True, bufsize=1, stdout=PIPE, stderr=STDOUT, stdin=PIPE)
+                                  text=True, bufsize=1, stdout=PIPE, stderr=STDOUT, stdin=PIPE, pass_fds=pass_fds)
+                if ipc_jalv_sock:
+                    ipc_jalv_sock.close()
+                    del self.command_env[jalv_ipc.JALV_IPC_FD_ENV]
+                # Output is read by the shared process reader
+                self.proc_prompt_event.clear()
+                self.proc_output = ""
+                self.proc_stdout_fd = self.proc.stdout.fileno()
+                zynprocreader.register_lines(self.proc_stdout_fd, self.jackname, self.proc_poll_parse_lines)
                 output = self.proc_get_output()
-                self.start_proc_poll_thread()
+                self.ipc_negotiate()
                 return output
 
             except Exception as err:
@@ -341,25 +377,33 @@ class zynthian_engine_jalv(zynthian_engine):
                 except Exception as e:
                     logging.error(f"Exception while ending jalv => {e}")
                 self.proc_exit = True
+                self.proc_unregister()
                 self.proc.terminate()
                 try:
                     self.proc.wait(timeout=5)
                 except:
                     self.proc.kill()
                 self.proc = None
+                self.ipc_close()
             except Exception as err:
                 logging.error(f"Can't stop engine {self.name} => {err}")
 
     def proc_cmd(self, cmd):
         #a = datetime.now()
+        # Send pending binary control values first, so commands are executed in order.
+        # Flush even if nothing is pending, to wait for a flush in progress.
+        if self.ipc_sock:
+            self.ipc_flush()
         try:
             self.proc.stdin.writelines([cmd + "\n"])
             #logging.debug(f"Executed jalv command '{cmd}'")
         except BrokenPipeError:
             logging.error(f"Broken pipe when executing jalv command '{cmd}'. Restarting engine ...")
             self.proc_exit = True
+            self.proc_unregister()
             self.proc.kill()
             self.proc = None
+            self.ipc_close()
             self.start()
             # Reconnect jack
             zynautoconnect.request_audio_connect()
@@ -372,23 +416,32 @@ class zynthian_engine_jalv(zynthian_engine):
         #logging.debug(f"COMMAND ({tdus}): {cmd}")
 
     def proc_get_output(self):
-        res = ""
+        """Wait for first prompt and get output printed before it"""
+
         while not self.proc_exit:
-            line = self.proc.stdout.readline().strip()
-            if line == self.command_prompt:
+            if self.proc_prompt_event.wait(0.5):
+                break
+            if self.proc.poll() is not None:
+                logging.error(f"Engine {self.name} exited while starting")
                 break
+        return self.proc_output
+
+    def proc_unregister(self):
+        if self.proc_stdout_fd is not None:
+            zynprocreader.unregister(self.proc_stdout_fd)
+            self.proc_stdout_fd = None
+
+    def proc_poll_parse_lines(self, lines):
+        """Parse a batch of lines from jalv output, called from shared process reader"""
+
+        for line in lines:
+            if self.proc_prompt_event.is_set():
+                if line:
+                    self.proc_poll_parse_line(line)
+            elif line == self.command_prompt:
+                self.proc_prompt_event.set()
             elif line:
-                res += line
-        return res
-
-    def proc_poll_line(self):
-        return self.proc.stdout.readline()
-
-    def proc_poll_thread_task(self):
-        while self.proc and not self.proc_exit:
-            line = self.proc.stdout.readline().strip()
-            if line:
-                self.proc_poll_parse_line(line)
+                self.proc_output += line
 
     def proc_poll_parse_line(self, line):
         #logging.debug(f"{self.jackname} PARSE => " + line)
@@ -420,14 +473,11 @@ class zynthian_engine_jalv(zynthian_engine):
                         logging.warning(f"Wrong controller value when parsing jalv output => {line}")
                         return
                 #logging.debug(f"#CTR> {symparts[1]} ({symparts[0]}) = {val}")
-                if zctrl.get_ignore_engine_fb():
-                    #logging.debug(f"Ignoring feedback value for {zctrl.symbol} from {self.name} => {val}")
-                    pass
-                else:
-                    zctrl.set_value(val, False)
+                self.set_ctrl_feedback(zctrl, val)
                 if zctrl.graph_path is None:
                     try:
                         zctrl.graph_path = int(symparts[0])
+                        self.ipc_zctrls[zctrl.graph_path] = zctrl
                         #logging.debug(f"UPDATING JALV ZCTRL INDEX FOR '{symparts[1]}' => {zctrl.graph_path}")
                     except:
                         logging.warning(f"Cant't parse controller index from jalv output: {line}")
@@ -437,6 +487,13 @@ class zynthian_engine_jalv(zynthian_engine):
         else:
             logging.warning(f"Wrong controller format when parsing jalv output => {line}")
 
+    def set_ctrl_feedback(self, zctrl, val):
+        if zctrl.get_ignore_engine_fb():
+            #logging.debug(f"Ignoring feedback value for {zctrl.symbol} from {self.name} => {val}")
+            pass
+        else:
+            zctrl.set_value(val, False)
+
     def proc_parse_mon_value(self, line):
         parts = line.split("=")
         if len(parts) == 2:
@@ -463,11 +520,133 @@ class zynthian_engine_jalv(zynthian_engine):
         else:
             logging.warning(f"Wrong preset format when parsing jalv output => {line}")
 
-    def start_proc_poll_thread(self):
-        self.proc_poll_thread = Thread(target=self.proc_poll_thread_task, args=())
-        self.proc_poll_thread.name = f"proc_poll_{self.jackname}"
-        self.proc_poll_thread.daemon = True  # thread dies with the program
-        self.proc_poll_thread.start()
+    # ---------------------------------------------------------------------------
+    # Binary IPC
+    # ---------------------------------------------------------------------------
+
+    def ipc_negotiate(self, timeout=0):
+        """Check HELLO frame from jalv. Close IPC socket if not received.
+
+        timeout : Max time to wait for HELLO. jalv sends it before the first prompt,
+                  so there is no need to wait when called after reading the prompt.
+        """
+
+        if not self.ipc_sock:
+            return False
+        self.ipc_reader = jalv_ipc.zynthian_jalv_frame_reader()
+        self.ipc_zctrls = {}
+        self.ipc_symbols = {}
+        try:
+            if select.select([self.ipc_sock], [], [], timeout)[0]:
+                frames = self.ipc_reader.feed(self.ipc_sock.recv(4096))
+                if frames and frames[0][0] == jalv_ipc.FRAME_HELLO:
+                    version = jalv_ipc.decode_hello(frames[0][1])
+                    if version == jalv_ipc.JALV_IPC_VERSION:
+                        logging.info(f"Using binary IPC protocol v{version} with {self.jackname}")
+                        self.ipc_parse_frames(frames[1:])
+                        zynprocreader.register_data(self.ipc_sock.fileno(), f"{self.jackname} ipc", self.ipc_parse_data)
+                        return True
+                    logging.warning(f"Unsupported jalv IPC protocol version {version} => Using text protocol")
+        except Exception as e:
+            logging.warning(f"Can't negotiate IPC protocol with {self.jackname} => {e}")
+        self.ipc_close()
+        return False
+
+    def ipc_close(self):
+        if self.ipc_sock:
+            zynprocreader.unregister(self.ipc_sock.fileno())
+            try:
+                self.ipc_sock.close()
+            except:
+                pass
+            self.ipc_sock = None
+
+    def ipc_send_value(self, index, value):
+        """Queue a control value. Values queued in a burst are sent in a single frame.
+
+        index : Port index
+        value : Control value
+        """
+
+        with self.ipc_batch_lock:
+            flush = not self.ipc_batch
+            self.ipc_batch[index] = value
+        if flush:
+            zynsched.schedule(0, self.ipc_flush)
+
+    def ipc_flush(self):
+        # Flushes from scheduler & proc_cmd are serialised, so values are sent in order
+        with self.ipc_flush_lock:
+            with self.ipc_batch_lock:
+                batch = self.ipc_batch
+                self.ipc_batch = {}
+            if not batch:
+                return
+            try:
+                self.ipc_sock.sendall(jalv_ipc.encode_records(jalv_ipc.FRAME_SET, list(batch.items())))
+            except Exception as e:
+                self.ipc_close()
+                # Engine stopped => Nothing to send
+                if self.proc is None:
+                    return
+                logging.error(f"Can't send IPC frame to {self.jackname} => {e}. Using text protocol.")
+                for index, value in batch.items():
+                    self.proc_cmd("set %d %.6f" % (index, value))
+
+    def ipc_parse_frames(self, frames):
+        for ftype, body in frames:
+            if ftype == jalv_ipc.FRAME_MON:
+                for index, val in jalv_ipc.decode_records(body):
+                    try:
+                        self.lv2_monitors_dict[self.ipc_symbols[index]] = val
+                    except KeyError:
+                        logging.warning(f"Unknown monitor index {index} from {self.jackname}")
+            elif ftype == jalv_ipc.FRAME_CTRL:
+                for index, val in jalv_ipc.decode_records(body):
+                    zctrl = self.ipc_get_zctrl(index)
+                    if zctrl:
+                        self.set_ctrl_feedback(zctrl, val)
+                    else:
+                        logging.warning(f"Unknown controller index {index} from {self.jackname}")
+            elif ftype == jalv_ipc.FRAME_PORT:
+                index, symbol = jalv_ipc.decode_port(body)
+                self.ipc_symbols[index] = symbol
+                self.ipc_zctrls.pop(index, None)
+                self.ipc_get_zctrl(index)
+
+    def ipc_get_zctrl(self, index):
+        """Get controller of a port index => None if unknown
+
+        Port indexes are learnt from PORT frames or from controller indexes in jalv text output,
+        so they are resolved when first used, not when the protocol is negotiated.
+        """
+
+        try:
+            return self.ipc_zctrls[index]
+        except KeyError:
+            pass
+        zctrl = None
+        symbol = self.ipc_symbols.get(index)
+        if symbol is not None:
+            zctrl = self.lv2_zctrl_dict.get(symbol)
+        else:
+            for ctrl in self.lv2_zctrl_dict.values():
+                if ctrl.graph_path == index:
+                    zctrl = ctrl
+                    break
+        if zctrl:
+            if zctrl.graph_path is None:
+                zctrl.graph_path = index
+            self.ipc_zctrls[index] = zctrl
+        return zctrl
+
+    def ipc_parse_data(self, data):
+        """Parse data received from IPC socket, called from shared process reader"""
+
+        try:
+            self.ipc_parse_frames(self.ipc_reader.feed(data))
+        except Exception as e:
+            logging.error(f"Wrong IPC frame from {self.jackname} => {e}")
 
     # ---------------------------------------------------------------------------
     # Processor Management
@@ -933,6 +1112,8 @@ class zynthian_engine_jalv(zynthian_engine):
             if zctrl.is_path:
                 #logging.debug("set %d %s" % (zctrl.graph_path, zctrl.value))
                 self.proc_cmd("set %d %s" % (zctrl.graph_path, zctrl.value))
+            elif self.ipc_sock:
+                self.ipc_send_value(zctrl.graph_path, zctrl.value)
             else:
                 self.proc_cmd("set %d %.6f" % (zctrl.graph_path, zctrl.value))
         else:
@@ -29,14 +29,16 @@ import logging
 import socket
 import shutil
 from time import sleep
-from os.path import isfile
 from Levenshtein import distance
-from subprocess import check_output
 from collections import OrderedDict
 
 from . import zynthian_engine_sfz
 from zynconf import ServerPort
 from zyncoder.zyncore import lib_zyncore
+from zyngui import zynthian_gui_config
+from zyngine.zynthian_preset_index import zynpresetindex, find_files
+from zyngine.zynthian_gig_cache import zyngigcache
+from zyngine.zynthian_signal_manager import zynsigman
 
 # ------------------------------------------------------------------------------
 # Linuxsampler Exception Classes
@@ -232,83 +234,75 @@ class zynthian_engine_linuxsampler(zynthian_engine_sfz):
         i = 0
         preset_list = []
         preset_dpath = bank[0]
-        if os.path.isdir(preset_dpath):
+        listing = zynpresetindex.get_dir(preset_dpath)
+        if listing is not None:
             exclude_sfz = re.compile(r"[MOPRSTV][1-9]?l?\.sfz")
-            for sd in glob.glob(preset_dpath + "/*"):
-                if os.path.isdir(sd):
-                    cmd = f"find '{sd}' -maxdepth 2 -type f -name '*.sfz'"
-                    output = check_output(cmd, shell=True).decode('utf8')
-                    flist = list(filter(None, output.split('\n')))
-                    for f in flist:
-                        filehead, filetail = os.path.split(f)
-                        if not exclude_sfz.fullmatch(filetail):
-                            filename, filext = os.path.splitext(f)
-                            filename = filename[len(preset_dpath)+1:]
-                            if len(flist) == 1:
-                                dirname = filehead.split("/")[-1]
-                                if dirname[-4:].lower() == ".sfz":
-                                    dirname = dirname[:-4]
-                                title = dirname.replace('_', ' ')
-                            else:
-                                title = filename.replace('_', ' ')
-                            engine = filext[1:].lower()
-                            preset_list.append([f, i, title, engine, "{}{}".format(filename, filext)])
-                            i += 1
-                else:
-                    f = sd
+            subdirs = [preset_dpath + "/" + name for name in listing[1] if not name.startswith('.')]
+            files = [preset_dpath + "/" + name for name in listing[0] if not name.startswith('.')]
+            # Scan subdirectories concurrently, 2 levels deep
+            flists = zynpresetindex.find_files_multi(subdirs, ["sfz"], maxdepth=2, ignore_case=False,
+                                                     jobs=zynthian_gui_config.preset_scan_jobs)
+            for flist in flists:
+                for f in flist:
                     filehead, filetail = os.path.split(f)
-                    filename, filext = os.path.splitext(f)
-                    if filext.lower() == ".sfz" and not exclude_sfz.fullmatch(filetail):
-                        filename = filename[len(preset_dpath) + 1:]
-                        title = filename.replace('_', ' ')
+                    if not exclude_sfz.fullmatch(filetail):
+                        filename, filext = os.path.splitext(f)
+                        filename = filename[len(preset_dpath)+1:]
+                        if len(flist) == 1:
+                            dirname = filehead.split("/")[-1]
+                            if dirname[-4:].lower() == ".sfz":
+                                dirname = dirname[:-4]
+                            title = dirname.replace('_', ' ')
+                        else:
+                            title = filename.replace('_', ' ')
                         engine = filext[1:].lower()
                         preset_list.append([f, i, title, engine, "{}{}".format(filename, filext)])
                         i += 1
-                    elif filext.lower() == ".gig":
-                        filename = filename[len(preset_dpath) + 1:]
-                        title = filename.replace('_', ' ')
-                        engine = filext[1:].lower()
-                        # Get instrument list inside each GIG file
-                        inslist = ""
-                        # Try getting from cache file
-                        icache_fpath = f + ".ins"
-                        if isfile(icache_fpath):
-                            try:
-                                with open(icache_fpath, "r") as fh:
-                                    inslist = fh.read()
-                            except Exception as e:
-                                logging.error(f"Can't load instrument cache '{icache_fpath}'")
-                        # If not cache, parse soundfont and cache info
-                        if not inslist:
-                            cmd = f"gigdump --instrument-names \"{f}\""
-                            inslist = check_output(
-                                cmd, shell=True).decode('utf8')
-                            try:
-                                with open(icache_fpath, "w") as fh:
-                                    fh.write(inslist)
-                            except Exception as e:
-                                logging.error(f"Can't save instrument cache '{icache_fpath}'")
-                        # logging.debug(f"INSTRUMENTS IN {f} =>\n{inslist}")
-                        ilines = inslist.split('\n')
-                        ii = 0
-                        for iline in ilines:
-                            try:
-                                parts = iline.split(")")
-                                ititle = parts[1].replace('"', '').strip()
-                                l = len(title)
-                                if distance(title.lower(), ititle.lower()[0:l]) > int(l/3):
-                                    ititle = title + "/" + ititle
-                            except:
-                                continue
-                            preset_list.append([f"{f}#{ii}", i, ititle, engine, f"{filename}{filext}#{ii}"])
-                            ii += 1
-                            i += 1
+            for f in files:
+                filehead, filetail = os.path.split(f)
+                filename, filext = os.path.splitext(f)
+                if filext.lower() == ".sfz" and not exclude_sfz.fullmatch(filetail):
+                    filename = filename[len(preset_dpath) + 1:]
+                    title = filename.replace('_', ' ')
+                    engine = filext[1:].lower()
+                    preset_list.append([f, i, title, engine, "{}{}".format(filename, filext)])
+                    i += 1
+                elif filext.lower() == ".gig":
+                    filename = filename[len(preset_dpath) + 1:]
+                    title = filename.replace('_', ' ')
+                    engine = filext[1:].lower()
+                    # Get instrument list inside each GIG file. If not cached, it's extracted in background.
+                    inslist = zyngigcache.get_instruments(f, zynthian_engine_linuxsampler.cb_gig_instruments)
+                    if not inslist:
+                        # Placeholder until the instrument list is available
+                        preset_list.append([f"{f}#0", i, title, engine, f"{filename}{filext}#0"])
+                        i += 1
+                        continue
+                    # logging.debug(f"INSTRUMENTS IN {f} =>\n{inslist}")
+                    ilines = inslist.split('\n')
+                    ii = 0
+                    for iline in ilines:
+                        try:
+                            parts = iline.split(")")
+                            ititle = parts[1].replace('"', '').strip()
+                            l = len(title)
+                            if distance(title.lower(), ititle.lower()[0:l]) > int(l/3):
+                                ititle = title + "/" + ititle
+                        except:
+                            continue
+                        preset_list.append([f"{f}#{ii}", i, ititle, engine, f"{filename}{filext}#{ii}"])
+                        ii += 1
+                        i += 1
         preset_list.sort(key=lambda x: x[2].casefold())
         return preset_list
 
     def get_preset_list(self, bank, processor=None):
         return self._get_preset_list(bank)
 
+    @staticmethod
+    def cb_gig_instruments(dpaths):
+        zynsigman.send_queued(zynsigman.S_CHAIN, zynthian_engine_linuxsampler.SS_PRESET_LIST, bank_dpaths=dpaths)
+
     def set_preset(self, processor, preset, preload=False):
         # Search for an instrument index, if any
         parts = preset[0].split("#")
@@ -572,9 +566,7 @@ class zynthian_engine_linuxsampler(zynthian_engine_sfz):
         if os.path.isdir(dpath):
             # Locate sfz files and move all them to first level directory
             try:
-                cmd = "find \"{}\" -type f -iname *.sfz".format(dpath)
-                sfz_files = check_output(
-                    cmd, shell=True).decode("utf-8").split("\n")
+                sfz_files = find_files(dpath, ["sfz"])
                 # Find the "shallower" SFZ file
                 shallower_sfz_file = sfz_files[0]
                 for f in sfz_files:
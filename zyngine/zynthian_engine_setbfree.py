@@ -313,6 +313,9 @@ class zynthian_engine_setbfree(zynthian_engine):
                 lib_zyncore.set_active_midi_chan(1)
             self.manuals_split_config = None
 
+        # Manuals' MIDI channels (part_i) may have changed
+        chain_manager.invalidate_ctrl_fb_map()
+
         # Start engine
         logging.debug("STARTING SETBFREE!!")
         self.generate_config_file()
@@ -27,9 +27,10 @@ import re
 import glob
 import shutil
 import logging
-from subprocess import check_output
 
 from . import zynthian_engine_sfz
+from zyngui import zynthian_gui_config
+from zyngine.zynthian_preset_index import zynpresetindex, find_files
 
 # ------------------------------------------------------------------------------
 # Sfizz Engine Class
@@ -103,36 +104,39 @@ class zynthian_engine_sfizz(zynthian_engine_sfz):
         i = 0
         preset_list = []
         preset_dpath = bank[0]
-        if os.path.isdir(preset_dpath):
+        listing = zynpresetindex.get_dir(preset_dpath)
+        if listing is not None:
             exclude_sfz = re.compile(r"[MOPRSTV][1-9]?l?\.sfz")
-            for sd in glob.iglob(preset_dpath + "/*"):
-                if os.path.isdir(sd):
-                    flist = cls.find_all_preset_files(sd, cls.preset_fexts, recursion=0)
-                    for f in flist:
-                        filehead, filetail = os.path.split(f)
-                        if not exclude_sfz.fullmatch(filetail):
-                            filename, filext = os.path.splitext(f)
-                            filename = filename[len(preset_dpath)+1:]
-                            if len(flist) == 1:
-                                dirname = filehead.split("/")[-1]
-                                if dirname[-4:].lower() == ".sfz":
-                                    dirname = dirname[:-4]
-                                title = dirname.replace('_', ' ')
-                            else:
-                                title = filename.replace('_', ' ')
-                            engine = filext[1:].lower()
-                            preset_list.append([f, i, title, engine, "{}{}".format(filename, filext)])
-                            i += 1
-                else:
-                    f = sd
+            subdirs = [preset_dpath + "/" + name for name in listing[1] if not name.startswith('.')]
+            files = [preset_dpath + "/" + name for name in listing[0] if not name.startswith('.')]
+            # Scan subdirectories concurrently
+            flists = zynpresetindex.find_files_multi(subdirs, cls.preset_fexts, maxdepth=1, hidden=False, dirs=True,
+                                                     jobs=zynthian_gui_config.preset_scan_jobs)
+            for flist in flists:
+                for f in flist:
                     filehead, filetail = os.path.split(f)
-                    filename, filext = os.path.splitext(f)
-                    if filext.lower() == ".sfz" and not exclude_sfz.fullmatch(filetail):
-                        filename = filename[len(preset_dpath) + 1:]
-                        title = filename.replace('_', ' ')
+                    if not exclude_sfz.fullmatch(filetail):
+                        filename, filext = os.path.splitext(f)
+                        filename = filename[len(preset_dpath)+1:]
+                        if len(flist) == 1:
+                            dirname = filehead.split("/")[-1]
+                            if dirname[-4:].lower() == ".sfz":
+                                dirname = dirname[:-4]
+                            title = dirname.replace('_', ' ')
+                        else:
+                            title = filename.replace('_', ' ')
                         engine = filext[1:].lower()
                         preset_list.append([f, i, title, engine, "{}{}".format(filename, filext)])
                         i += 1
+            for f in files:
+                filehead, filetail = os.path.split(f)
+                filename, filext = os.path.splitext(f)
+                if filext.lower() == ".sfz" and not exclude_sfz.fullmatch(filetail):
+                    filename = filename[len(preset_dpath) + 1:]
+                    title = filename.replace('_', ' ')
+                    engine = filext[1:].lower()
+                    preset_list.append([f, i, title, engine, "{}{}".format(filename, filext)])
+                    i += 1
 
         preset_list.sort(key=lambda x:x[2].casefold())
         return preset_list
@@ -243,9 +247,7 @@ class zynthian_engine_sfizz(zynthian_engine_sfz):
         if os.path.isdir(dpath):
             # Locate sfz files and move all them to first level directory
             try:
-                cmd = f"find \"{dpath}\" -type f -iname *.sfz"
-                sfz_files = check_output(
-                    cmd, shell=True).decode("utf-8").split("\n")
+                sfz_files = find_files(dpath, ["sfz"])
                 # Find the "shallower" SFZ file
                 shallower_sfz_file = sfz_files[0]
                 shallower_sfz_deep = shallower_sfz_file.count('/')
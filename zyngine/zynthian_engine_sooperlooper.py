@@ -30,11 +30,11 @@ import os
 from glob import glob
 from subprocess import Popen, DEVNULL
 from time import sleep, monotonic
-from threading import Timer
 
 from . import zynthian_controller
 from zynconf import ServerPort
 from zyngine.zynthian_signal_manager import zynsigman
+from zyngine.zynthian_scheduler import zynsched
 
 # ------------------------------------------------------------------------------
 # Sooper Looper State Codes
@@ -675,8 +675,7 @@ class zynthian_engine_sooperlooper(zynthian_engine):
 					case 3:
 						# Triple tap
 						self.osc_server.send(self.osc_target, f'/sl/{loop}/hit', ('s', 'undo_all'))
-				self.single_pedal_timer = Timer(1.5, self.single_pedal_cb)
-				self.single_pedal_timer.start()
+				self.single_pedal_timer = zynsched.schedule(1.5, self.single_pedal_cb)
 			else:
 				# Pedal release: so check loop state, pedal press duration, etc.
 				try:
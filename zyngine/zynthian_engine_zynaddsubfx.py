@@ -28,11 +28,11 @@ import logging
 from time import sleep
 from string import Template
 from os.path import isfile, join
-from subprocess import check_output
 
 from . import zynthian_engine
 from zynconf import ServerPort
 from zyncoder.zyncore import lib_zyncore
+from zyngine.zynthian_preset_index import find_files
 
 # ------------------------------------------------------------------------------
 # ZynAddSubFX Engine Class
@@ -414,8 +414,7 @@ class zynthian_engine_zynaddsubfx(zynthian_engine):
 
         if os.path.isdir(dpath):
             # Get list of directories (banks) containing xiz files ...
-            xiz_files = check_output(
-                "find \"{}\" -type f -iname *.xiz".format(dpath), shell=True).decode("utf-8").split("\n")
+            xiz_files = find_files(dpath, ["xiz"])
 
             # Copy xiz files to destiny, creating the bank if needed ...
             count = 0
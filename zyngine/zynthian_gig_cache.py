@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+# ****************************************************************************
+# ZYNTHIAN PROJECT: Zynthian GIG Cache (zynthian_gig_cache)
+#
+# Background extraction & cache of instrument names inside GIG files
+#
+# Copyright (C) 2015-2024 Fernando Moyano <jofemodo@zynthian.org>
+#
+# ****************************************************************************
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of
+# the License, or any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# For a full copy of the GNU General Public License see the LICENSE.txt file.
+#
+# ****************************************************************************
+#
+# Instrument lists are extracted with "gigdump --instrument-names" by a
+# bounded pool of worker threads, so the UI doesn't wait for parsing.
+# Results are saved in a central cache directory, in a file named after the
+# GIG file's path, mtime & size, so read-only media are supported and
+# modified files are extracted again. Legacy "<file>.ins" cache files, next
+# to the GIG file, are still read if they exist.
+#
+# ****************************************************************************
+
+import os
+import logging
+import hashlib
+import subprocess
+from threading import Lock
+from concurrent.futures import ThreadPoolExecutor
+
+from zyngine.zynthian_scheduler import zynsched
+from zyngui import zynthian_gui_config
+
+# ----------------------------------------------------------------------------
+# Definitions
+# ----------------------------------------------------------------------------
+
+GIG_CACHE_DIR = os.environ.get('ZYNTHIAN_CONFIG_DIR', "/zynthian/config") + "/gig_cache"
+
+NOTIFY_DELAY = 0.5      # Seconds to group finished extractions before notifying
+GIGDUMP_TIMEOUT = 120   # Max seconds to parse a GIG file
+
+# ----------------------------------------------------------------------------
+# Zynthian GIG Cache Class
+# ----------------------------------------------------------------------------
+
+
+class zynthian_gig_cache:
+
+    def __init__(self, cache_dir, jobs=2):
+        """Create a GIG instrument cache
+
+        cache_dir - Directory where instrument lists are saved
+        jobs - Max number of GIG files parsed concurrently
+        """
+
+        self.cache_dir = cache_dir
+        self.jobs = max(1, jobs)
+        self.lock = Lock()
+        self.executor = None
+        self.inslists = {}      # Instrument lists indexed by cache key
+        self.pending = {}       # Notification callbacks indexed by cache key of the files being extracted
+        self.notify = {}        # Set of directories with finished extractions, indexed by callback
+        self.notify_event = None
+
+    @staticmethod
+    def get_key(fpath):
+        """Get cache key of a GIG file => None if file doesn't exist"""
+
+        try:
+            st = os.stat(fpath)
+        except OSError:
+            return None
+        return f"{fpath}:{st.st_mtime_ns}:{st.st_size}"
+
+    def get_cache_fpath(self, key):
+        return f"{self.cache_dir}/{hashlib.sha1(key.encode()).hexdigest()}.ins"
+
+    def get_instruments(self, fpath, cb=None):
+        """Get the instrument list of a GIG file, as printed by gigdump
+
+        fpath - GIG file path
+        cb - Function called with a set of directories when the list is extracted in background
+        Returns instrument list text or None if it's not available yet. In such case, it's extracted in background.
+        """
+
+        key = self.get_key(fpath)
+        if key is None:
+            return ""
+        with self.lock:
+            try:
+                return self.inslists[key]
+            except KeyError:
+                pass
+            if key in self.pending:
+                self.pending[key].add(cb)
+                return None
+
+        inslist = self.load(key, fpath)
+        if inslist is not None:
+            with self.lock:
+                self.inslists[key] = inslist
+            return inslist
+
+        with self.lock:
+            if key in self.pending:
+                self.pending[key].add(cb)
+                return None
+            self.pending[key] = {cb}
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=self.jobs, thread_name_prefix="GIG_CACHE")
+            self.executor.submit(self.extract, key, fpath)
+        return None
+
+    def load(self, key, fpath):
+        """Load instrument list from cache => None if not cached"""
+
+        for cache_fpath in (self.get_cache_fpath(key), fpath + ".ins"):
+            try:
+                with open(cache_fpath, "r") as fh:
+                    inslist = fh.read()
+                if inslist:
+                    return inslist
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                logging.error(f"Can't load instrument cache '{cache_fpath}' => {e}")
+        return None
+
+    def extract(self, key, fpath):
+        """Parse a GIG file & cache its instrument list. Runs in a worker thread."""
+
+        inslist = ""
+        try:
+            res = subprocess.run(["gigdump", "--instrument-names", fpath], capture_output=True, timeout=GIGDUMP_TIMEOUT)
+            inslist = res.stdout.decode('utf8', errors='replace')
+            if res.returncode != 0:
+                logging.error(f"Can't get instruments from '{fpath}' => {res.stderr.decode('utf8', errors='replace')}")
+        except Exception as e:
+            logging.error(f"Can't get instruments from '{fpath}' => {e}")
+
+        if inslist:
+            cache_fpath = self.get_cache_fpath(key)
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                tmp_fpath = cache_fpath + ".tmp"
+                with open(tmp_fpath, "w") as fh:
+                    fh.write(inslist)
+                os.replace(tmp_fpath, cache_fpath)
+            except Exception as e:
+                logging.error(f"Can't save instrument cache '{cache_fpath}' => {e}")
+
+        # Failed extractions are kept in memory too, so they are not retried until the file changes
+        with self.lock:
+            self.inslists[key] = inslist
+            for cb in self.pending.pop(key, ()):
+                if cb:
+                    self.notify.setdefault(cb, set()).add(os.path.dirname(fpath))
+            if self.notify and self.notify_event is None:
+                self.notify_event = zynsched.schedule(NOTIFY_DELAY, self.send_notify)
+
+    def send_notify(self):
+        with self.lock:
+            notify = self.notify
+            self.notify = {}
+            self.notify_event = None
+        for cb, dpaths in notify.items():
+            try:
+                cb(dpaths)
+            except Exception as e:
+                logging.error(f"GIG cache callback failed => {e}")
+
+    def is_busy(self):
+        with self.lock:
+            return len(self.pending) > 0
+
+# ---------------------------------------------------------------------------
+
+
+global zyngigcache
+zyngigcache = zynthian_gig_cache(GIG_CACHE_DIR, zynthian_gui_config.gig_scan_jobs)  # Instance GIG cache
+
+# ---------------------------------------------------------------------------
@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+# ****************************************************************************
+# ZYNTHIAN PROJECT: Zynthian jalv binary protocol (zynthian_jalv_protocol)
+#
+# Compact binary IPC frames exchanged with jalv
+#
+# Copyright (C) 2015-2024 Fernando Moyano <jofemodo@zynthian.org>
+#
+# ****************************************************************************
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of
+# the License, or any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# For a full copy of the GNU General Public License see the LICENSE.txt file.
+#
+# ****************************************************************************
+#
+# The host creates a unix socket pair and passes one end to jalv, with its
+# file descriptor number in the JALV_ZYN_IPC_FD environment variable.
+# A jalv supporting the protocol sends a HELLO frame before its first prompt.
+# If no HELLO is received, the host closes the socket and uses text commands.
+#
+# Frame => uint16 body length (little endian), uint8 frame type, body
+#
+#   HELLO (jalv => host) : uint16 protocol version
+#   SET   (host => jalv) : N x (uint32 port index, float32 value)
+#   CTRL  (jalv => host) : N x (uint32 port index, float32 value) => control input feedback
+#   MON   (jalv => host) : N x (uint32 port index, float32 value) => monitor (output) ports
+#   PORT  (jalv => host) : uint32 port index, utf-8 port symbol
+#
+# Path (string) values and preset notifications keep using the text protocol.
+#
+# ****************************************************************************
+
+import struct
+
+# ----------------------------------------------------------------------------
+# Protocol definitions
+# ----------------------------------------------------------------------------
+
+JALV_IPC_VERSION = 1
+JALV_IPC_FD_ENV = "JALV_ZYN_IPC_FD"
+
+FRAME_HELLO = 0
+FRAME_SET = 1
+FRAME_CTRL = 2
+FRAME_MON = 3
+FRAME_PORT = 4
+
+HEADER = struct.Struct("<HB")
+RECORD = struct.Struct("<If")
+VERSION = struct.Struct("<H")
+PORT_INDEX = struct.Struct("<I")
+
+MAX_BODY_LEN = 0xFFFF
+MAX_RECORDS = MAX_BODY_LEN // RECORD.size
+
+# ----------------------------------------------------------------------------
+# Encoding / decoding functions
+# ----------------------------------------------------------------------------
+
+
+def encode_frame(ftype, body=b''):
+    return HEADER.pack(len(body), ftype) + body
+
+
+def encode_records(ftype, records):
+    """Encode (index, value) records into frames
+
+    ftype - Frame type (FRAME_SET, FRAME_CTRL, FRAME_MON)
+    records - List of (port index, value) tuples
+    Returns bytes with one or more frames
+    """
+
+    frames = []
+    for i in range(0, len(records), MAX_RECORDS):
+        chunk = records[i:i + MAX_RECORDS]
+        frames.append(HEADER.pack(len(chunk) * RECORD.size, ftype))
+        frames.extend([RECORD.pack(index, value) for index, value in chunk])
+    return b''.join(frames)
+
+
+def decode_records(body):
+    """Decode body of a record frame => iterator of (index, value) tuples"""
+
+    return RECORD.iter_unpack(body)
+
+
+def encode_port(index, symbol):
+    return encode_frame(FRAME_PORT, PORT_INDEX.pack(index) + symbol.encode())
+
+
+def decode_port(body):
+    """Decode body of a PORT frame => (index, symbol)"""
+
+    return PORT_INDEX.unpack_from(body)[0], body[PORT_INDEX.size:].decode(errors="replace")
+
+
+def decode_hello(body):
+    """Decode body of a HELLO frame => protocol version"""
+
+    return VERSION.unpack_from(body)[0]
+
+# ----------------------------------------------------------------------------
+# Frame reader
+# ----------------------------------------------------------------------------
+
+
+class zynthian_jalv_frame_reader:
+
+    def __init__(self):
+        """Split a byte stream into frames"""
+
+        self.buf = bytearray()
+
+    def feed(self, data):
+        """Add received data and get complete frames
+
+        data - Received bytes
+        Returns list of (frame type, body) tuples
+        """
+
+        self.buf += data
+        frames = []
+        pos = 0
+        n = len(self.buf)
+        while n - pos >= HEADER.size:
+            blen, ftype = HEADER.unpack_from(self.buf, pos)
+            end = pos + HEADER.size + blen
+            if end > n:
+                break
+            frames.append((ftype, bytes(self.buf[pos + HEADER.size:end])))
+            pos = end
+        if pos:
+            del self.buf[:pos]
+        return frames
+
+# ---------------------------------------------------------------------------
+# Benchmark: text vs binary protocol throughput over a unix socket
+# ---------------------------------------------------------------------------
+
+
+if __name__ == "__main__":
+    import sys
+    import socket
+    import random
+    from threading import Thread
+    from time import monotonic
+
+    n_updates = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    n_ports = 64
+    symbols = [f"port_{i}" for i in range(n_ports)]
+    rnd = random.Random(1234)
+    updates = [(rnd.randrange(n_ports), rnd.random()) for i in range(n_updates)]
+
+    def transfer(data, parse):
+        """Send data through a socket pair and parse it at the other end => elapsed seconds"""
+
+        a, b = socket.socketpair()
+
+        def writer():
+            a.sendall(data)
+            a.close()
+
+        t0 = monotonic()
+        thread = Thread(target=writer, daemon=True)
+        thread.start()
+        parse(b)
+        thread.join()
+        b.close()
+        return monotonic() - t0
+
+    # Monitor updates, as parsed by proc_parse_mon_value
+    def parse_text(sock):
+        monitors = {}
+        with sock.makefile("r") as f:
+            for line in f:
+                line = line.strip()
+                if line[0:5] == "#MON>":
+                    parts = line[6:].split("=")
+                    val = float(parts[1])
+                    symparts = parts[0].split("#", maxsplit=1)
+                    monitors[symparts[1]] = val
+
+    def parse_binary(sock):
+        monitors = {}
+        reader = zynthian_jalv_frame_reader()
+        while True:
+            data = sock.recv(65536)
+            if not data:
+                break
+            for ftype, body in reader.feed(data):
+                if ftype == FRAME_MON:
+                    for index, val in decode_records(body):
+                        monitors[symbols[index]] = val
+
+    t0 = monotonic()
+    text_data = "".join(f"#MON> {i}#{symbols[i]}={v:.6f}\n" for i, v in updates).encode()
+    t_text_enc = monotonic() - t0
+    t_text = transfer(text_data, parse_text)
+
+    # jalv batches the monitor updates of each cycle
+    batch = 32
+    t0 = monotonic()
+    bin_data = b''.join(encode_records(FRAME_MON, updates[i:i + batch]) for i in range(0, n_updates, batch))
+    t_bin_enc = monotonic() - t0
+    t_bin = transfer(bin_data, parse_binary)
+
+    print(f"{n_updates} monitor updates, {n_ports} ports, binary batch={batch}")
+    print(f"  text  : {len(text_data):9d} bytes, encode {1000 * t_text_enc:7.1f}ms, transfer+parse {1000 * t_text:7.1f}ms => {n_updates / t_text:10.0f} updates/s")
+    print(f"  binary: {len(bin_data):9d} bytes, encode {1000 * t_bin_enc:7.1f}ms, transfer+parse {1000 * t_bin:7.1f}ms => {n_updates / t_bin:10.0f} updates/s")
+
+    # Control writes, as formatted by send_controller_value
+    t0 = monotonic()
+    for index, value in updates:
+        cmd = "set %d %.6f" % (index, value) + "\n"
+    t_text_set = monotonic() - t0
+    t0 = monotonic()
+    for i in range(0, n_updates, batch):
+        frame = encode_records(FRAME_SET, updates[i:i + batch])
+    t_bin_set = monotonic() - t0
+    print(f"{n_updates} control writes: text format {1000 * t_text_set:.1f}ms, binary encode (batch={batch}) {1000 * t_bin_set:.1f}ms")
+
+# ---------------------------------------------------------------------------
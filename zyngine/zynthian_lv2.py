@@ -27,7 +27,6 @@ import os
 import re
 import sys
 import json
-import lilv
 import copy
 import time
 import string
@@ -36,6 +35,8 @@ import logging
 import urllib.parse
 from enum import Enum
 from random import randrange
+from threading import RLock
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 # ------------------------------------------------------------------------------
 # Some variables & definitions
@@ -180,17 +181,44 @@ ENGINE_CONFIG_FILE = "{}/engine_config.json".format(
 JALV_LV2_CONFIG_FILE = "{}/jalv/plugins.json".format(
     os.environ.get('ZYNTHIAN_CONFIG_DIR'))
 
+PORTS_CACHE_FILE = "{}/jalv/ports_cache.json".format(
+    os.environ.get('ZYNTHIAN_CONFIG_DIR'))
+PORTS_CACHE_VERSION = 1
+PRESETS_INDEX_FILE = "{}/jalv/presets_index.json".format(
+    os.environ.get('ZYNTHIAN_CONFIG_DIR'))
+
 engines = None
 engines_by_type = None
 engines_mtime = None
 
+# lilv module & world are loaded lazily (see load_lilv)
+lilv = None
+world = None
+# lilv world is not thread safe => Serialize access from concurrently started engines
+world_lock = RLock()
+
+# Port metadata cache => {plugin_uri: {"bundle": path, "fingerprint": hash, "ports": ports_info}}
+ports_cache = None
+ports_cache_lock = RLock()
+
 # ------------------------------------------------------------------------------
 # Lilv LV2 library initialization
 # ------------------------------------------------------------------------------
 
 
+def load_lilv():
+    """Load lilv world if not loaded yet"""
+
+    with world_lock:
+        if world is None:
+            init_lilv()
+    return world
+
+
 def init_lilv():
-    global world
+    global world, lilv
+    import lilv
+    start = time.monotonic()
     world = lilv.World()
     # Disable language filtering
     # world.set_option(lilv.OPTION_FILTER_LANG, world.new_bool(False))
@@ -205,6 +233,7 @@ def init_lilv():
     world.ns.atom = lilv.Namespace(world, "http://lv2plug.in/ns/ext/atom#")
     world.ns.doap = lilv.Namespace(world, "http://usefulinc.com/ns/doap#")
     world.ns.mod = lilv.Namespace(world, "http://moddevices.com/ns/mod#")
+    logging.debug(f"Loading lilv world took {time.monotonic() - start:.3f}s")
 
 # ------------------------------------------------------------------------------
 # Engines management
@@ -349,6 +378,8 @@ def generate_engines_config_file(refresh=True, reset_rankings=None):
     start = int(round(time.time()))
     if refresh:
         init_lilv()
+    else:
+        load_lilv()
 
     # Add standalone engines
     i = 0
@@ -601,30 +632,153 @@ def get_plugin_description(plugin):
 
 # workaround to fix segfault:
 def generate_presets_cache_workaround():
+    load_lilv()
     start = int(round(time.time()))
     for plugin in world.get_all_plugins():
         plugin.get_name()
     logging.info('Workaround took {}s'.format(int(round(time.time())) - start))
 
 
-def generate_all_presets_cache(refresh=True):
+def generate_all_presets_cache(refresh=True, jobs=1, changed_only=False):
+    """Generate presets cache files for all plugins
+
+    refresh : True to reload lilv world
+    jobs : Number of worker processes (1 => generate in this process)
+    changed_only : True to regenerate only plugins with changed preset files
+    Returns : Dictionary with summary counters
+    """
+
     if refresh:
         init_lilv()
+    else:
+        load_lilv()
+
+    start = time.monotonic()
+    index = load_presets_index()
+    summary = {
+        "plugins": 0,
+        "skipped": 0,
+        "generated": 0,
+        "failed": 0,
+        "presets": 0,
+        "jobs": jobs
+    }
 
+    # Find stale plugins
+    stale = {}
     for plugin in world.get_all_plugins():
-        _generate_plugin_presets_cache(plugin)
+        summary["plugins"] += 1
+        plugin_url = str(plugin.get_uri())
+        fingerprint = get_plugin_presets_fingerprint(plugin)
+        if changed_only and fingerprint and index.get(plugin_url) == fingerprint and \
+                os.path.isfile(_get_plugin_preset_cache_fpath(str(plugin.get_name()))):
+            summary["skipped"] += 1
+        else:
+            stale[plugin_url] = fingerprint
+
+    def add_result(plugin_url, presets_info):
+        summary["generated"] += 1
+        summary["presets"] += sum(len(bank["presets"]) for bank in presets_info.values())
+        index[plugin_url] = stale[plugin_url]
+
+    if jobs > 1 and len(stale) > 1:
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_presets_cache_worker) as executor:
+            futures = {executor.submit(_generate_plugin_presets_cache_worker, plugin_url): plugin_url for plugin_url in stale}
+            for future in as_completed(futures):
+                plugin_url = futures[future]
+                try:
+                    add_result(plugin_url, future.result())
+                except Exception as e:
+                    logging.error(f"Can't generate presets cache for <{plugin_url}> => {e}")
+                    summary["failed"] += 1
+    else:
+        wplugins = world.get_all_plugins()
+        for plugin_url in stale:
+            try:
+                add_result(plugin_url, _generate_plugin_presets_cache(wplugins[plugin_url]))
+            except Exception as e:
+                logging.error(f"Can't generate presets cache for <{plugin_url}> => {e}")
+                summary["failed"] += 1
+
+    save_presets_index(index)
+    summary["time"] = time.monotonic() - start
+    return summary
+
+
+def _init_presets_cache_worker():
+    """Preset cache worker process initializer => load its own lilv world"""
+
+    init_lilv()
+    generate_presets_cache_workaround()
+
+
+def _generate_plugin_presets_cache_worker(plugin_url):
+    return _generate_plugin_presets_cache(world.get_all_plugins()[plugin_url])
+
+
+def get_plugin_presets_fingerprint(plugin):
+    """Get hash of path, size & mtime of plugin data files and preset files
+
+    plugin : lilv plugin
+    Returns : Hex digest or None if files can't be read
+    """
+
+    fpaths = set()
+    for uri in plugin.get_data_uris():
+        fpaths.add(str(uri))
+    for preset in plugin.get_related(world.ns.presets.Preset):
+        fpaths.add(str(preset))
+    hash = hashlib.sha1()
+    for uri in sorted(fpaths):
+        if not uri.startswith("file://"):
+            continue
+        fpath = urllib.parse.unquote(uri[7:].split('#')[0])
+        try:
+            st = os.stat(fpath)
+        except Exception as e:
+            logging.debug(f"Can't read preset file '{fpath}' => {e}")
+            return None
+        hash.update(f"{fpath}:{st.st_size}:{st.st_mtime_ns};".encode())
+    return hash.hexdigest()
+
+
+def load_presets_index():
+    """Load dictionary of preset fingerprints indexed by plugin URI"""
+
+    try:
+        with open(PRESETS_INDEX_FILE) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logging.error(f"Can't load presets index file '{PRESETS_INDEX_FILE}' => {e}")
+    return {}
+
+
+def save_presets_index(index):
+    try:
+        with open(PRESETS_INDEX_FILE, 'w') as f:
+            json.dump(index, f)
+    except Exception as e:
+        logging.error(f"Can't save presets index file '{PRESETS_INDEX_FILE}' => {e}")
 
 
 def generate_plugin_presets_cache(plugin_url, refresh=True):
     if refresh:
         init_lilv()
+    else:
+        load_lilv()
     wplugins = world.get_all_plugins()
     try:
         plugin = wplugins[plugin_url]
     except:
         logging.debug(f"Plugin {plugin_url} not found.")
         return None
-    return _generate_plugin_presets_cache(plugin)
+    presets_info = _generate_plugin_presets_cache(plugin)
+    index = load_presets_index()
+    index[plugin_url] = get_plugin_presets_fingerprint(plugin)
+    save_presets_index(index)
+    return presets_info
 
 
 def _get_plugin_preset_cache_fpath(plugin_name):
@@ -781,7 +935,107 @@ def get_node_value(node):
         return str(node)
 
 
-def get_plugin_ports(plugin_url):
+def get_plugin_ports(plugin_url, save=True):
+    """Get plugin port metadata, from cache if plugin bundle didn't change
+
+    plugin_url : Plugin URI
+    save : True to save cache file after a cache miss
+    Returns : Dictionary of port info indexed by port index. Caller may modify it.
+    """
+
+    with ports_cache_lock:
+        load_ports_cache()
+        try:
+            entry = ports_cache[plugin_url]
+            if entry["fingerprint"] and entry["fingerprint"] == get_bundle_fingerprint(entry["bundle"]):
+                return copy.deepcopy(entry["ports"])
+        except KeyError:
+            pass
+
+    # Cache miss => Get port info from lilv
+    with world_lock:
+        load_lilv()
+        ports_info = _get_plugin_ports(plugin_url)
+        bundle = get_plugin_bundle_path(world.get_all_plugins()[plugin_url])
+    with ports_cache_lock:
+        ports_cache[plugin_url] = {
+            "bundle": bundle,
+            "fingerprint": get_bundle_fingerprint(bundle),
+            "ports": ports_info
+        }
+        if save:
+            save_ports_cache()
+    return copy.deepcopy(ports_info)
+
+
+def get_plugin_bundle_path(plugin):
+    return urllib.parse.unquote(str(plugin.get_bundle_uri())[7:])
+
+
+def get_bundle_fingerprint(bundle_path):
+    """Get hash of name, size & mtime of the TTL files in a plugin bundle
+
+    bundle_path : Plugin bundle directory
+    Returns : Hex digest or None if bundle can't be read
+    """
+
+    hash = hashlib.sha1()
+    try:
+        for entry in sorted(os.scandir(bundle_path), key=lambda e: e.name):
+            if entry.name.endswith(".ttl"):
+                st = entry.stat()
+                hash.update(f"{entry.name}:{st.st_size}:{st.st_mtime_ns};".encode())
+    except Exception as e:
+        logging.debug(f"Can't read bundle '{bundle_path}' => {e}")
+        return None
+    return hash.hexdigest()
+
+
+def load_ports_cache(reload=False):
+    """Load port metadata cache file, if not loaded yet
+
+    reload : True to reload from file
+    """
+
+    global ports_cache
+    with ports_cache_lock:
+        if ports_cache is not None and not reload:
+            return
+        ports_cache = {}
+        try:
+            with open(PORTS_CACHE_FILE) as f:
+                data = json.load(f)
+            if data["version"] != PORTS_CACHE_VERSION:
+                logging.info(f"Discarding port cache version {data['version']}")
+                return
+            for uri, entry in data["plugins"].items():
+                # JSON keys are strings => restore integer port indexes
+                entry["ports"] = {int(i): info for i, info in entry["ports"].items()}
+                ports_cache[uri] = entry
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logging.error(f"Can't load port cache file '{PORTS_CACHE_FILE}' => {e}")
+
+
+def save_ports_cache():
+    """Save port metadata cache file"""
+
+    with ports_cache_lock:
+        data = {
+            "version": PORTS_CACHE_VERSION,
+            "plugins": ports_cache
+        }
+        fpath_tmp = PORTS_CACHE_FILE + ".tmp"
+        try:
+            with open(fpath_tmp, 'w') as f:
+                json.dump(data, f)
+            os.replace(fpath_tmp, PORTS_CACHE_FILE)
+        except Exception as e:
+            logging.error(f"Can't save port cache file '{PORTS_CACHE_FILE}' => {e}")
+
+
+def _get_plugin_ports(plugin_url):
     wplugins = world.get_all_plugins()
     plugin = wplugins[plugin_url]
 
@@ -1029,9 +1283,7 @@ def get_plugin_ports(plugin_url):
 # ------------------------------------------------------------------------------
 
 
-# Init Lilv
-init_lilv()
-# Load engine info from cache
+# Load engine info from cache. Lilv is loaded only when needed.
 load_engines()
 
 if __name__ == '__main__':
@@ -1055,13 +1307,31 @@ if __name__ == '__main__':
                     generate_plugin_presets_cache(info['URL'], False)
 
         elif sys.argv[1] == "presets":
+            # presets [--jobs N] [--changed-only] [plugin_url]
+            jobs = 1
+            changed_only = False
+            plugin_url = None
+            args = sys.argv[2:]
+            while args:
+                arg = args.pop(0)
+                if arg == "--jobs":
+                    jobs = max(1, int(args.pop(0)))
+                elif arg.startswith("--jobs="):
+                    jobs = max(1, int(arg[7:]))
+                elif arg == "--changed-only":
+                    changed_only = True
+                else:
+                    plugin_url = arg
+
             generate_presets_cache_workaround()
 
-            if len(sys.argv) > 2:
-                plugin_url = sys.argv[2]
+            if plugin_url:
                 generate_plugin_presets_cache(plugin_url, False)
             else:
-                generate_all_presets_cache(False)
+                summary = generate_all_presets_cache(False, jobs, changed_only)
+                logging.info(f"Presets cache: {summary['plugins']} plugins, {summary['generated']} generated, "
+                             f"{summary['skipped']} unchanged, {summary['failed']} failed, {summary['presets']} presets "
+                             f"in {summary['time']:.1f}s ({summary['jobs']} jobs)")
 
         elif sys.argv[1] == "ports":
             if len(sys.argv) > 2:
@@ -1069,6 +1339,42 @@ if __name__ == '__main__':
             else:
                 pass
 
+        elif sys.argv[1] == "ports_cache":
+            # Regenerate port metadata cache, reporting cold (lilv) & warm (cache) timings
+            if len(sys.argv) > 2:
+                plugin_urls = sys.argv[2:]
+            else:
+                plugin_urls = [info['URL'] for info in engines.values() if info['URL']]
+            start = time.monotonic()
+            load_lilv()
+            t_world = time.monotonic() - start
+            load_ports_cache()
+            ports_cache.clear()
+            t_cold = {}
+            for plugin_url in plugin_urls:
+                start = time.monotonic()
+                try:
+                    get_plugin_ports(plugin_url, save=False)
+                except Exception as e:
+                    logging.warning(f"Can't get ports for <{plugin_url}> => {e}")
+                    continue
+                t_cold[plugin_url] = time.monotonic() - start
+            save_ports_cache()
+            # Warm => reload cache from file, as a fresh process would do
+            start = time.monotonic()
+            load_ports_cache(reload=True)
+            t_load = time.monotonic() - start
+            t_warm = {}
+            for plugin_url in t_cold:
+                start = time.monotonic()
+                get_plugin_ports(plugin_url)
+                t_warm[plugin_url] = time.monotonic() - start
+            for plugin_url in t_cold:
+                logging.info(f"{1000 * t_cold[plugin_url]:8.2f}ms cold, {1000 * t_warm[plugin_url]:6.2f}ms warm => <{plugin_url}>")
+            logging.info(f"{len(t_cold)} plugins: lilv world load {1000 * t_world:.1f}ms, "
+                         f"cold {1000 * sum(t_cold.values()):.1f}ms, cache file load {1000 * t_load:.1f}ms, "
+                         f"warm {1000 * sum(t_warm.values()):.1f}ms")
+
         elif sys.argv[1] == "all":
             generate_engines_config_file(refresh=False)
             generate_all_presets_cache(False)
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+# ****************************************************************************
+# ZYNTHIAN PROJECT: Zynthian MIDI-learn store (zynthian_midi_learn)
+#
+# Indexed store of MIDI-learn bindings
+#
+# Copyright (C) 2015-2024 Fernando Moyano <jofemodo@zynthian.org>
+#
+# ****************************************************************************
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of
+# the License, or any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# For a full copy of the GNU General Public License see the LICENSE.txt file.
+#
+# ****************************************************************************
+#
+# Binding keys are 24-bit integers => HIGH (chain id or zmip), CHAN, CC
+#
+# ****************************************************************************
+
+# ----------------------------------------------------------------------------
+# MIDI-learn store Class
+# ----------------------------------------------------------------------------
+
+
+class zynthian_midi_learn_store:
+
+    def __init__(self):
+        """Create an empty MIDI-learn store
+
+        Keeps a bidirectional index, so lookups by key, by zctrl & by key high byte
+        don't need to scan all bindings. Read access is dict-like (key => list of zctrls).
+        """
+
+        self.bindings = {}      # List of zctrls indexed by key
+        self.zctrl_keys = {}    # Ordered dict of keys (values unused) indexed by zctrl
+        self.high_keys = {}     # Ordered dict of keys (values unused) indexed by key high byte (chain id or zmip)
+
+    def clear(self):
+        self.bindings = {}
+        self.zctrl_keys = {}
+        self.high_keys = {}
+
+    # ------------------------------------------------------------------------
+    # Dict-like read access
+    # ------------------------------------------------------------------------
+
+    def __getitem__(self, key):
+        return self.bindings[key]
+
+    def __contains__(self, key):
+        return key in self.bindings
+
+    def __iter__(self):
+        return iter(self.bindings)
+
+    def __len__(self):
+        return len(self.bindings)
+
+    def get(self, key, default=None):
+        return self.bindings.get(key, default)
+
+    def items(self):
+        return self.bindings.items()
+
+    def keys(self):
+        return self.bindings.keys()
+
+    # ------------------------------------------------------------------------
+    # Bindings management
+    # ------------------------------------------------------------------------
+
+    def add(self, key, zctrl):
+        """Bind a zctrl to a key. Binding twice is ignored.
+
+        key : 24-bit binding key
+        zctrl : Controller object
+        """
+
+        keys = self.zctrl_keys.setdefault(zctrl, {})
+        if key in keys:
+            return
+        keys[key] = None
+        try:
+            self.bindings[key].append(zctrl)
+        except KeyError:
+            self.bindings[key] = [zctrl]
+            self.high_keys.setdefault((key >> 16) & 0xff, {})[key] = None
+
+    def remove(self, key, zctrl):
+        """Unbind a zctrl from a key. It's safe to remove a binding that doesn't exist.
+
+        key : 24-bit binding key
+        zctrl : Controller object
+        """
+
+        keys = self.zctrl_keys.get(zctrl)
+        if keys is None or key not in keys:
+            return
+        del keys[key]
+        if not keys:
+            del self.zctrl_keys[zctrl]
+        zctrls = self.bindings[key]
+        zctrls.remove(zctrl)
+        if not zctrls:
+            del self.bindings[key]
+            high = (key >> 16) & 0xff
+            hkeys = self.high_keys[high]
+            del hkeys[key]
+            if not hkeys:
+                del self.high_keys[high]
+
+    def remove_zctrl(self, zctrl, high_filter=None):
+        """Remove all bindings of a zctrl
+
+        zctrl : Controller object
+        high_filter : Optional function returning True for the key high bytes to remove
+        """
+
+        for key in self.get_keys(zctrl, high_filter):
+            self.remove(key, zctrl)
+
+    def get_keys(self, zctrl, high_filter=None):
+        """Get list of keys bound to a zctrl, in binding order
+
+        zctrl : Controller object
+        high_filter : Optional function returning True for the key high bytes to get
+        """
+
+        keys = self.zctrl_keys.get(zctrl)
+        if not keys:
+            return []
+        if high_filter is None:
+            return list(keys)
+        return [key for key in keys if high_filter((key >> 16) & 0xff)]
+
+    def get_high_keys(self, high):
+        """Get list of keys with a high byte (chain id or zmip)"""
+
+        return list(self.high_keys.get(high, ()))
+
+    # ------------------------------------------------------------------------
+    # State management (ZS3 format)
+    # ------------------------------------------------------------------------
+
+    def get_state(self, high):
+        """Get bindings with a high byte as ZS3 state
+
+        high : Key high byte (chain id or zmip)
+        Returns : Dictionary of [[processor id, symbol], ...] indexed by 16-bit CHAN,CC key
+        """
+
+        state = {}
+        for key in self.high_keys.get(high, ()):
+            state[key & 0xff7f] = [[zctrl.processor.id, zctrl.symbol] for zctrl in self.bindings[key]]
+        return state
+
+    @staticmethod
+    def parse_state(state):
+        """Parse ZS3 MIDI-learn state
+
+        state : Dictionary of [[processor id, symbol], ...] indexed by 16-bit CHAN,CC key (int or str)
+        Returns : List of (midi_chan, midi_cc, processor id, symbol) tuples
+        """
+
+        res = []
+        for key_low, cfg in state.items():
+            key_low = int(key_low)
+            midi_chan = (key_low >> 8) & 0xff
+            midi_cc = key_low & 0x7f
+            for proc_id, symbol in cfg:
+                res.append((midi_chan, midi_cc, proc_id, symbol))
+        return res
+
+# ---------------------------------------------------------------------------
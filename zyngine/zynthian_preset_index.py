@@ -0,0 +1,549 @@
+# -*- coding: utf-8 -*-
+# ****************************************************************************
+# ZYNTHIAN PROJECT: Zynthian Preset Index (zynthian_preset_index)
+#
+# Persistent index of bank & preset directories of file-based engines
+#
+# Copyright (C) 2015-2024 Fernando Moyano <jofemodo@zynthian.org>
+#
+# ****************************************************************************
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of
+# the License, or any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# For a full copy of the GNU General Public License see the LICENSE.txt file.
+#
+# ****************************************************************************
+#
+# The index keeps the list of files & subdirectories of each scanned
+# directory, with the directory's mtime. A cached listing is reused while
+# the directory's mtime doesn't change, so only modified directories are
+# read again. Scanned directories are watched with inotify, if available.
+# Watched directories are trusted without calling stat, until notified.
+#
+# Searches for preset files in a subtree ("has_files", "find_files") are
+# memoised by directory & filter, only when all visited directories are
+# watched. Any change notified inside the subtree drops the memoised results.
+#
+# The index is saved as JSON, so it survives reboots. Listings of external
+# storage (USB sticks, etc.) are not saved: they may be edited on another
+# machine without changing directory mtimes (i.e. FAT/exFAT), so they are
+# read again after each restart or remount.
+#
+# ****************************************************************************
+
+import os
+import re
+import json
+import ctypes
+import ctypes.util
+import fnmatch
+import logging
+import struct
+from time import monotonic
+from threading import Thread, RLock
+from concurrent.futures import ThreadPoolExecutor
+
+from zyngine.zynthian_scheduler import zynsched
+from zyngine.zynthian_proc_reader import zynprocreader
+from zyngui import zynthian_gui_config
+
+# ----------------------------------------------------------------------------
+# Definitions
+# ----------------------------------------------------------------------------
+
+PRESET_INDEX_FILE = os.environ.get('ZYNTHIAN_CONFIG_DIR', "/zynthian/config") + "/preset_index.json"
+PRESET_INDEX_VERSION = 1
+EX_DATA_DIR = os.environ.get('ZYNTHIAN_EX_DATA_DIR', "/media/root")
+
+SAVE_DELAY = 5      # Seconds from last change to saving the index
+MAX_DEPTH = 32      # Max recursion depth, to avoid symlink loops
+
+# inotify event masks
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_DELETE_SELF = 0x400
+IN_MOVE_SELF = 0x800
+IN_UNMOUNT = 0x2000
+IN_Q_OVERFLOW = 0x4000
+IN_IGNORED = 0x8000
+IN_ONLYDIR = 0x1000000
+WATCH_MASK = IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+
+INOTIFY_EVENT = struct.Struct("iIII")  # wd, mask, cookie, len => followed by name
+
+# ----------------------------------------------------------------------------
+# Directory scanning functions
+# ----------------------------------------------------------------------------
+
+
+def list_dir(dpath):
+    """Read a directory
+
+    dpath - Directory path
+    Returns tuple (files, subdirs) of sorted lists of names or None if not a readable directory
+    """
+
+    files = []
+    subdirs = []
+    try:
+        with os.scandir(dpath) as it:
+            for entry in it:
+                try:
+                    if entry.is_dir():
+                        subdirs.append(entry.name)
+                    elif entry.is_file():
+                        files.append(entry.name)
+                except OSError:
+                    pass
+    except OSError:
+        return None
+    files.sort()
+    subdirs.sort()
+    return files, subdirs
+
+
+fexts_regex = {}  # Compiled file extension regex, indexed by (fexts tuple, ignore_case)
+
+
+def get_fexts_regex(fexts, ignore_case=True):
+    """Get compiled regex matching names with one of the extensions"""
+
+    key = (tuple(fexts), ignore_case)
+    try:
+        return fexts_regex[key]
+    except KeyError:
+        rules = [fnmatch.translate("*." + ext) for ext in fexts]
+        regex = re.compile("(" + "|".join(rules) + ")", re.IGNORECASE if ignore_case else 0)
+        fexts_regex[key] = regex
+        return regex
+
+
+def find_files(dpath, fexts, maxdepth=None, ignore_case=True, hidden=True, dirs=False, get_dir=list_dir):
+    """Find files with some extensions in a directory tree, like `find dpath -maxdepth N -type f -iname "*.ext"`
+
+    dpath - Root directory path
+    fexts - List of file extensions
+    maxdepth - Max depth: 1 => only files in root directory, None => unlimited
+    ignore_case - False to match extensions case sensitively (-name instead of -iname)
+    hidden - False to skip hidden files & directories
+    dirs - True to match directory names too
+    get_dir - Directory listing function
+    Returns sorted list of paths
+    """
+
+    rerule = get_fexts_regex(fexts, ignore_case)
+    if maxdepth is None:
+        maxdepth = MAX_DEPTH
+    res = []
+    stack = [(dpath, 1)]
+    while stack:
+        path, depth = stack.pop()
+        listing = get_dir(path)
+        if listing is None:
+            continue
+        files, subdirs = listing
+        for name in files:
+            if (hidden or not name.startswith('.')) and rerule.match(name):
+                res.append(os.path.join(path, name))
+        for name in subdirs:
+            if hidden or not name.startswith('.'):
+                if dirs and rerule.match(name):
+                    res.append(os.path.join(path, name))
+                if depth < maxdepth:
+                    stack.append((os.path.join(path, name), depth + 1))
+    res.sort()
+    return res
+
+# ----------------------------------------------------------------------------
+# Zynthian Preset Index Class
+# ----------------------------------------------------------------------------
+
+
+class zynthian_preset_index:
+
+    def __init__(self, fpath, max_watches=8192):
+        """Create a preset index
+
+        fpath - Path of the index file
+        max_watches - Max number of directories watched with inotify
+        """
+
+        self.fpath = fpath
+        self.max_watches = max_watches
+        self.lock = RLock()
+        self.loaded = False
+        self.dirs = {}          # [mtime_ns, files, subdirs] indexed by directory path
+        self.found = {}         # Map of has_files & find_files results indexed by filter, indexed by directory path
+        self.verified = set()   # Watched directories whose listing is up to date
+        self.generation = 0     # Incremented on each notified change
+
+        self.libc = None
+        self.inotify_fd = None
+        self.watches = {}       # Watch descriptors indexed by directory path
+        self.watch_paths = {}   # Directory paths indexed by watch descriptor
+
+        self.save_event = None
+        self.warm_up_thread = None
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.stats = {
+            "hits": 0,      # Listings got without stat
+            "checks": 0,    # Listings validated with stat
+            "scans": 0,     # Directories (re)read
+            "found_hits": 0
+        }
+
+    def get_stats(self):
+        """Get dictionary with index counters & sizes"""
+
+        with self.lock:
+            stats = self.stats.copy()
+            stats["dirs"] = len(self.dirs)
+            stats["watches"] = len(self.watches)
+        return stats
+
+    # ------------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------------
+
+    def load(self):
+        """Load index from file. Cached listings will be validated on use."""
+
+        with self.lock:
+            self.loaded = True
+            try:
+                with open(self.fpath) as fh:
+                    data = json.load(fh)
+                if data.get("version") != PRESET_INDEX_VERSION:
+                    logging.info("Preset index version has changed. Rebuilding it.")
+                    return
+                for dpath, rec in data["dirs"].items():
+                    if self.is_persistent(dpath):
+                        self.dirs.setdefault(dpath, rec)
+                logging.debug(f"Loaded preset index with {len(self.dirs)} directories")
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                logging.warning(f"Can't load preset index '{self.fpath}' => {e}")
+
+    def save(self):
+        """Save index to file"""
+
+        with self.lock:
+            self.save_event = None
+            data = {
+                "version": PRESET_INDEX_VERSION,
+                "dirs": {dpath: rec for dpath, rec in self.dirs.items() if self.is_persistent(dpath)}
+            }
+        try:
+            os.makedirs(os.path.dirname(self.fpath), exist_ok=True)
+            tmp_fpath = self.fpath + ".tmp"
+            with open(tmp_fpath, "w") as fh:
+                json.dump(data, fh, separators=(',', ':'))
+            os.replace(tmp_fpath, self.fpath)
+        except Exception as e:
+            logging.warning(f"Can't save preset index '{self.fpath}' => {e}")
+
+    @staticmethod
+    def is_persistent(dpath):
+        """Check if a directory listing can be saved, i.e. it's not in external storage"""
+
+        return dpath != EX_DATA_DIR and not dpath.startswith(EX_DATA_DIR + os.sep)
+
+    def request_save(self):
+        with self.lock:
+            if self.save_event is None:
+                self.save_event = zynsched.schedule(SAVE_DELAY, self.save)
+
+    # ------------------------------------------------------------------------
+    # Change notification (inotify)
+    # ------------------------------------------------------------------------
+
+    def init_inotify(self):
+        """Start watching directories with inotify => False if not available"""
+
+        if self.inotify_fd is not None:
+            return self.inotify_fd is not False
+        try:
+            self.libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+            fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+            if fd < 0:
+                raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+            self.inotify_fd = fd
+            zynprocreader.register_data(fd, "preset_index", self.cb_inotify)
+            return True
+        except Exception as e:
+            logging.warning(f"Can't watch preset directories. Using directory mtimes only => {e}")
+            self.inotify_fd = False
+            return False
+
+    def watch(self, dpath):
+        """Start watching a directory, if not already watched and max watches not reached"""
+
+        if dpath in self.watches or len(self.watches) >= self.max_watches or not self.init_inotify():
+            return
+        wd = self.libc.inotify_add_watch(self.inotify_fd, os.fsencode(dpath), WATCH_MASK)
+        if wd < 0:
+            logging.debug(f"Can't watch directory '{dpath}' => errno {ctypes.get_errno()}")
+            return
+        with self.lock:
+            # The same directory may be reached by several paths (symlinks)
+            old_dpath = self.watch_paths.get(wd)
+            if old_dpath is not None:
+                self.watches.pop(old_dpath, None)
+                self.verified.discard(old_dpath)
+            self.watches[dpath] = wd
+            self.watch_paths[wd] = dpath
+
+    def cb_inotify(self, data):
+        """Process inotify events read from the watching file descriptor"""
+
+        pos = 0
+        while pos + INOTIFY_EVENT.size <= len(data):
+            wd, mask, cookie, nlen = INOTIFY_EVENT.unpack_from(data, pos)
+            pos += INOTIFY_EVENT.size + nlen
+            if mask & IN_Q_OVERFLOW:
+                logging.debug("Preset index watch queue overflow")
+                self.invalidate_all()
+                continue
+            with self.lock:
+                dpath = self.watch_paths.get(wd)
+                if dpath is None:
+                    continue
+                if mask & IN_IGNORED:
+                    # Watch removed: directory deleted or unmounted
+                    del self.watch_paths[wd]
+                    if self.watches.get(dpath) == wd:
+                        del self.watches[dpath]
+                if mask & (IN_DELETE_SELF | IN_MOVE_SELF | IN_UNMOUNT):
+                    self.forget(dpath)
+                else:
+                    self.invalidate(dpath)
+
+    def invalidate(self, dpath):
+        """Directory has changed => Validate its listing on next use and drop memoised results of it & its parents"""
+
+        with self.lock:
+            self.generation += 1
+            self.verified.discard(dpath)
+            while True:
+                self.found.pop(dpath, None)
+                parent = os.path.dirname(dpath)
+                if parent == dpath:
+                    break
+                dpath = parent
+
+    def invalidate_all(self):
+        with self.lock:
+            self.generation += 1
+            self.verified.clear()
+            self.found.clear()
+
+    # ------------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------------
+
+    def get_dir(self, dpath):
+        """Get listing of a directory
+
+        dpath - Directory path
+        Returns tuple (files, subdirs) of sorted lists of names (must not be modified) or None if not a directory
+        """
+
+        dpath = os.path.normpath(dpath)
+        with self.lock:
+            if not self.loaded:
+                self.load()
+            rec = self.dirs.get(dpath)
+            if rec is not None and dpath in self.verified:
+                self.stats["hits"] += 1
+                return rec[1], rec[2]
+            generation = self.generation
+
+        # Watch before reading, so changes while reading are notified
+        self.watch(dpath)
+        try:
+            mtime = os.stat(dpath).st_mtime_ns
+        except OSError:
+            self.forget(dpath)
+            return None
+
+        if rec is not None and rec[0] == mtime:
+            self.stats["checks"] += 1
+        else:
+            listing = list_dir(dpath)
+            if listing is None:
+                self.forget(dpath)
+                return None
+            rec = [mtime, listing[0], listing[1]]
+            with self.lock:
+                self.dirs[dpath] = rec
+                self.stats["scans"] += 1
+            if self.is_persistent(dpath):
+                self.request_save()
+
+        with self.lock:
+            if generation == self.generation and dpath in self.watches:
+                self.verified.add(dpath)
+        return rec[1], rec[2]
+
+    def forget(self, dpath):
+        """Remove a directory (not existing anymore) from the index"""
+
+        with self.lock:
+            if self.dirs.pop(dpath, None) is not None and self.is_persistent(dpath):
+                self.request_save()
+            self.invalidate(dpath)
+
+    def has_files(self, dpath, fexts, recursion=1):
+        """Find if a directory contains some file (or subdirectory) with one of the extensions.
+        Hidden entries are ignored.
+
+        dpath - Directory path
+        fexts - List of file extensions
+        recursion - True to search in all subdirectories
+        Returns True if some file was found
+        """
+
+        dpath = os.path.normpath(dpath)
+        fexts = tuple(fexts)
+        key = (fexts, bool(recursion))
+        with self.lock:
+            try:
+                res = self.found[dpath][key]
+                self.stats["found_hits"] += 1
+                return res
+            except KeyError:
+                pass
+            generation = self.generation
+
+        rerule = get_fexts_regex(fexts)
+        res = False
+        cacheable = True
+        stack = [(dpath, 0)]
+        while stack:
+            path, depth = stack.pop()
+            listing = self.get_dir(path)
+            if listing is None:
+                cacheable = False
+                continue
+            if path not in self.verified:
+                cacheable = False
+            files, subdirs = listing
+            if any(not name.startswith('.') and rerule.match(name) for name in files) or \
+                    any(not name.startswith('.') and rerule.match(name) for name in subdirs):
+                res = True
+                break
+            if recursion and depth < MAX_DEPTH:
+                for name in reversed(subdirs):
+                    if not name.startswith('.'):
+                        stack.append((os.path.join(path, name), depth + 1))
+
+        if cacheable:
+            with self.lock:
+                if generation == self.generation:
+                    self.found.setdefault(dpath, {})[key] = res
+        return res
+
+    def find_files(self, dpath, fexts, maxdepth=None, ignore_case=True, hidden=True, dirs=False):
+        """Find files with some extensions in a directory tree, using the index. See find_files function.
+
+        Returns sorted list of paths (must not be modified)
+        """
+
+        dpath = os.path.normpath(dpath)
+        key = ("find", tuple(fexts), maxdepth, ignore_case, hidden, dirs)
+        with self.lock:
+            try:
+                res = self.found[dpath][key]
+                self.stats["found_hits"] += 1
+                return res
+            except KeyError:
+                pass
+            generation = self.generation
+
+        cacheable = True
+
+        def get_dir(path):
+            nonlocal cacheable
+            listing = self.get_dir(path)
+            if listing is None or path not in self.verified:
+                cacheable = False
+            return listing
+
+        res = find_files(dpath, fexts, maxdepth, ignore_case, hidden, dirs, get_dir)
+        if cacheable:
+            with self.lock:
+                if generation == self.generation:
+                    self.found.setdefault(dpath, {})[key] = res
+        return res
+
+    def find_files_multi(self, dpaths, fexts, maxdepth=None, ignore_case=True, hidden=True, dirs=False, jobs=1):
+        """Find files in several directory trees, scanning them concurrently
+
+        dpaths - List of root directory paths
+        jobs - Max number of concurrent scans
+        Returns list with the sorted list of paths found in each directory
+        """
+
+        if jobs <= 1 or len(dpaths) <= 1:
+            return [self.find_files(dpath, fexts, maxdepth, ignore_case, hidden, dirs) for dpath in dpaths]
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            return list(executor.map(lambda dpath: self.find_files(dpath, fexts, maxdepth, ignore_case, hidden, dirs), dpaths))
+
+    # ------------------------------------------------------------------------
+    # Background warm-up
+    # ------------------------------------------------------------------------
+
+    def start_warm_up(self, roots):
+        """Warm up the index in a background thread
+
+        roots - List of (root directory, file extensions) tuples
+        """
+
+        if self.warm_up_thread and self.warm_up_thread.is_alive():
+            return
+        self.warm_up_thread = Thread(target=self.warm_up, args=(roots,))
+        self.warm_up_thread.name = "PRESET_INDEX"
+        self.warm_up_thread.daemon = True  # thread dies with the program
+        self.warm_up_thread.start()
+
+    def warm_up(self, roots):
+        """Validate listings of root directories & search preset files in their subdirectories, as the bank lists do
+
+        roots - List of (root directory, file extensions) tuples
+        """
+
+        ts = monotonic()
+        for dpath, fexts in roots:
+            try:
+                self.has_files(dpath, fexts, 1)
+                listing = self.get_dir(dpath)
+                if listing is None:
+                    continue
+                for name in listing[1]:
+                    self.has_files(os.path.join(dpath, name), fexts, 1)
+            except Exception as e:
+                logging.warning(f"Can't warm up preset index for '{dpath}' => {e}")
+        stats = self.get_stats()
+        logging.info(f"Preset index warmed up in {1000 * (monotonic() - ts):.0f}ms => {stats['dirs']} directories, "
+                     f"{stats['scans']} scanned, {stats['watches']} watched")
+
+# ---------------------------------------------------------------------------
+
+
+global zynpresetindex
+zynpresetindex = zynthian_preset_index(PRESET_INDEX_FILE, zynthian_gui_config.preset_index_max_watches)  # Instance preset index
+
+# ---------------------------------------------------------------------------
@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+# ****************************************************************************
+# ZYNTHIAN PROJECT: Zynthian Process Reader (zynthian_proc_reader)
+#
+# Shared reader multiplexing the output of engine processes
+#
+# Copyright (C) 2015-2024 Fernando Moyano <jofemodo@zynthian.org>
+#
+# ****************************************************************************
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of
+# the License, or any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# For a full copy of the GNU General Public License see the LICENSE.txt file.
+#
+# ****************************************************************************
+
+import os
+import logging
+import selectors
+import traceback
+from time import monotonic
+from threading import Thread, Lock
+
+# ----------------------------------------------------------------------------
+# Registered stream
+# ----------------------------------------------------------------------------
+
+
+class zynthian_proc_stream:
+
+    __slots__ = ("fd", "name", "callback", "lines", "partial", "n_lines", "n_bytes", "stats_ts")
+
+    def __init__(self, fd, name, callback, lines):
+        self.fd = fd
+        self.name = name
+        self.callback = callback
+        self.lines = lines      # True => callback receives list of lines, False => raw bytes
+        self.partial = b''      # Incomplete line
+        self.n_lines = 0
+        self.n_bytes = 0
+        self.stats_ts = monotonic()  # Start of stats period
+
+# ----------------------------------------------------------------------------
+# Zynthian Process Reader Class
+# ----------------------------------------------------------------------------
+
+
+class zynthian_proc_reader:
+
+    def __init__(self):
+        """ Create an instance of a process reader
+
+        A single thread waits on all registered file descriptors and dispatches
+        the data read from each one to its callback. Callbacks should return
+        quickly, as they delay the other streams.
+        """
+
+        self.selector = selectors.DefaultSelector()
+        self.lock = Lock()
+        self.streams = {}
+        self.wake_rfd, self.wake_wfd = os.pipe()
+        os.set_blocking(self.wake_rfd, False)
+        os.set_blocking(self.wake_wfd, False)
+        self.selector.register(self.wake_rfd, selectors.EVENT_READ, None)
+        self.exit_flag = False
+        self.thread = None
+
+    def stop(self):
+        self.exit_flag = True
+        self.wake()
+
+    def wake(self):
+        try:
+            os.write(self.wake_wfd, b'\0')
+        except BlockingIOError:
+            pass
+
+    def register_lines(self, fd, name, callback):
+        """Register a text stream. Callback receives a list with the completed lines of each read.
+
+        fd - File descriptor (process stdout)
+        name - Stream name, used in stats
+        callback - Function called with a list of lines (str, without end of line)
+        """
+
+        self.register(zynthian_proc_stream(fd, name, callback, True))
+
+    def register_data(self, fd, name, callback):
+        """Register a binary stream. Callback receives the bytes of each read.
+
+        fd - File descriptor (socket, pipe)
+        name - Stream name, used in stats
+        callback - Function called with bytes
+        """
+
+        self.register(zynthian_proc_stream(fd, name, callback, False))
+
+    def register(self, stream):
+        with self.lock:
+            self.streams[stream.fd] = stream
+            self.selector.register(stream.fd, selectors.EVENT_READ, stream)
+            if self.thread is None:
+                self.start_thread()
+        self.wake()
+
+    def unregister(self, fd):
+        """Stop reading a file descriptor. It's safe to unregister a fd that is not registered."""
+
+        with self.lock:
+            if self.streams.pop(fd, None) is not None:
+                try:
+                    self.selector.unregister(fd)
+                except Exception:
+                    pass
+        self.wake()
+
+    def get_stats(self):
+        """Get dictionary with lines, bytes & lines/second of each stream, since last reset or registration"""
+
+        now = monotonic()
+        stats = {}
+        with self.lock:
+            for stream in self.streams.values():
+                dt = now - stream.stats_ts
+                stats[stream.name] = {
+                    "lines": stream.n_lines,
+                    "bytes": stream.n_bytes,
+                    "lines_per_sec": stream.n_lines / dt if dt > 0 else 0.0
+                }
+        return stats
+
+    def get_report(self):
+        """Get stats of streams with some data as human readable text"""
+
+        lines = ["Process reader throughput:"]
+        for name, stats in sorted(self.get_stats().items()):
+            if stats["bytes"]:
+                lines.append(f"  {name}: {stats['lines']} lines, {stats['lines_per_sec']:.1f} lines/s, {stats['bytes']} bytes")
+        if len(lines) == 1:
+            lines[0] += " no data"
+        return "\n".join(lines)
+
+    def reset_stats(self):
+        now = monotonic()
+        with self.lock:
+            for stream in self.streams.values():
+                stream.n_lines = 0
+                stream.n_bytes = 0
+                stream.stats_ts = now
+
+    # ----------------------------------------------------------------------------
+    # Reader thread
+    # ----------------------------------------------------------------------------
+
+    def start_thread(self):
+        self.thread = Thread(target=self.thread_task, args=())
+        self.thread.name = "PROC_READER"
+        self.thread.daemon = True  # thread dies with the program
+        self.thread.start()
+
+    def thread_task(self):
+        while not self.exit_flag:
+            try:
+                events = self.selector.select()
+            except Exception as e:
+                logging.error(f"Process reader select failed => {e}")
+                continue
+            for key, mask in events:
+                stream = key.data
+                if stream is None:
+                    try:
+                        while os.read(self.wake_rfd, 64):
+                            pass
+                    except BlockingIOError:
+                        pass
+                    continue
+                if self.streams.get(stream.fd) is not stream:
+                    # Unregistered while waiting
+                    continue
+                try:
+                    data = os.read(stream.fd, 65536)
+                except Exception as e:
+                    logging.debug(f"Can't read from '{stream.name}' => {e}")
+                    data = b''
+                if not data:
+                    # End of stream
+                    self.unregister(stream.fd)
+                    if stream.lines and stream.partial:
+                        self.dispatch(stream, [stream.partial.decode(errors="replace").strip()])
+                    continue
+                stream.n_bytes += len(data)
+                if stream.lines:
+                    data = stream.partial + data
+                    lines = data.split(b'\n')
+                    stream.partial = lines.pop()
+                    if lines:
+                        stream.n_lines += len(lines)
+                        self.dispatch(stream, [line.decode(errors="replace").strip() for line in lines])
+                else:
+                    self.dispatch(stream, data)
+
+    def dispatch(self, stream, data):
+        try:
+            stream.callback(data)
+        except Exception as e:
+            logging.error(f"Process reader callback for '{stream.name}': {e}")
+            logging.exception(traceback.format_exc())
+
+# ---------------------------------------------------------------------------
+
+
+global zynprocreader
+zynprocreader = zynthian_proc_reader()  # Instance process reader
+
+# ---------------------------------------------------------------------------
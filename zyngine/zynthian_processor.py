@@ -825,6 +825,39 @@ class zynthian_processor:
                 except Exception as e:
                     logging.warning(f"Invalid controller for processor {self.get_basepath()}: {e}")
 
+    def set_state_diff(self, state):
+        """Configure processor from state model dictionary, applying only changes
+
+        If bank or preset differ, the full state is restored, as loading a preset changes controller values.
+        Otherwise only controllers with a different value are sent to the engine.
+
+        state : Processor state
+        Returns : Number of controllers set or None if full state was restored
+        """
+
+        if ("bank_subdir_info" in state and state["bank_subdir_info"] and state["bank_subdir_info"] != self.bank_subdir_info) or \
+                ("bank_info" in state and state["bank_info"] and state["bank_info"] != self.bank_info) or \
+                ("preset_subdir_info" in state and state["preset_subdir_info"] and state["preset_subdir_info"] != self.preset_subdir_info) or \
+                ("preset_info" in state and state["preset_info"] != self.preset_info):
+            self.set_state(state)
+            return None
+
+        nset = 0
+        if "controllers" in state:
+            for symbol, ctrl_state in state["controllers"].items():
+                try:
+                    zctrl = self.controllers_dict[symbol]
+                    if "value" in ctrl_state and ctrl_state["value"] != zctrl.value:
+                        zctrl.set_value(ctrl_state["value"], True)
+                        nset += 1
+                    if "midi_cc_momentary_switch" in ctrl_state:
+                        zctrl.midi_cc_momentary_switch = ctrl_state['midi_cc_momentary_switch']
+                    if "midi_cc_debounce" in ctrl_state:
+                        zctrl.midi_cc_debounce = ctrl_state['midi_cc_debounce']
+                except Exception as e:
+                    logging.warning(f"Invalid controller for processor {self.get_basepath()}: {e}")
+        return nset
+
     def restore_state_legacy(self, state):
         """Restore legacy states from state
 
@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+# ****************************************************************************
+# ZYNTHIAN PROJECT: Zynthian Scheduler (zynthian_scheduler)
+#
+# Shared scheduler for delayed callbacks (debounce, timeouts, etc.)
+#
+# Copyright (C) 2015-2024 Fernando Moyano <jofemodo@zynthian.org>
+#
+# ****************************************************************************
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of
+# the License, or any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# For a full copy of the GNU General Public License see the LICENSE.txt file.
+#
+# ****************************************************************************
+
+import heapq
+import logging
+import traceback
+from time import monotonic
+from threading import Thread, Condition
+
+# ----------------------------------------------------------------------------
+# Scheduled event
+# ----------------------------------------------------------------------------
+
+
+class zynthian_scheduled_event:
+
+    __slots__ = ("deadline", "callback", "args", "cancelled")
+
+    def __init__(self, deadline, callback, args):
+        self.deadline = deadline
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        """Cancel event. It's safe to cancel an event that has already run."""
+        self.cancelled = True
+
+    def __lt__(self, other):
+        return self.deadline < other.deadline
+
+# ----------------------------------------------------------------------------
+# Zynthian Scheduler Class
+# ----------------------------------------------------------------------------
+
+
+class zynthian_scheduler:
+
+    def __init__(self):
+        """ Create an instance of a scheduler
+
+        A single thread runs all delayed callbacks, ordered by deadline in a heap.
+        Callbacks should return quickly, as they delay the following ones.
+        """
+
+        self.exit_flag = False
+        self.heap = []
+        self.cond = Condition()
+        # Counters
+        self.n_scheduled = 0
+        self.n_executed = 0
+        self.n_cancelled = 0
+
+        self.thread = None
+        self.start_thread()
+
+    def stop(self):
+        with self.cond:
+            self.exit_flag = True
+            self.cond.notify()
+
+    def schedule(self, delay, callback, *args):
+        """Schedule a callback
+
+        delay - Time in seconds from now
+        callback - Function to call
+        args - Arguments passed to callback
+        Returns scheduled event object. Call its cancel() method to cancel.
+        """
+
+        event = zynthian_scheduled_event(monotonic() + delay, callback, args)
+        with self.cond:
+            heapq.heappush(self.heap, event)
+            self.n_scheduled += 1
+            # Wake up thread only if new event is the first one
+            if self.heap[0] is event:
+                self.cond.notify()
+        return event
+
+    def get_stats(self):
+        """Get dictionary with scheduler counters"""
+
+        with self.cond:
+            return {
+                "scheduled": self.n_scheduled,
+                "executed": self.n_executed,
+                "cancelled": self.n_cancelled,
+                "pending": len(self.heap)
+            }
+
+    # ----------------------------------------------------------------------------
+    # Scheduler thread
+    # ----------------------------------------------------------------------------
+
+    def start_thread(self):
+        self.thread = Thread(target=self.thread_task, args=())
+        self.thread.name = "SCHEDULER"
+        self.thread.daemon = True  # thread dies with the program
+        self.thread.start()
+
+    def thread_task(self):
+        while True:
+            with self.cond:
+                while not self.exit_flag:
+                    if self.heap:
+                        timeout = self.heap[0].deadline - monotonic()
+                        if timeout <= 0:
+                            break
+                    else:
+                        timeout = None
+                    self.cond.wait(timeout)
+                if self.exit_flag:
+                    return
+                event = heapq.heappop(self.heap)
+                if event.cancelled:
+                    self.n_cancelled += 1
+                    continue
+                self.n_executed += 1
+            try:
+                event.callback(*event.args)
+            except Exception as e:
+                logging.error(f"Scheduled callback '{event.callback.__name__}(...)': {e}")
+                logging.exception(traceback.format_exc())
+
+# ---------------------------------------------------------------------------
+
+
+global zynsched
+zynsched = zynthian_scheduler()  # Instance scheduler
+
+# ---------------------------------------------------------------------------
+# Benchmark: debounce a fader sweep using threading.Timer vs shared scheduler
+# ---------------------------------------------------------------------------
+
+if __name__ == "__main__":
+    import sys
+    from time import sleep, process_time
+    from threading import Timer, active_count
+
+    n_values = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    interval = 0.001  # Fader sweep: a value each millisecond
+    delay = 0.02  # Debounce delay, as used by zynthian_controller
+
+    def run(name, debounce):
+        result = []
+        max_threads = active_count()
+        t0 = process_time()
+        ts0 = monotonic()
+        for i in range(n_values):
+            debounce(i, result.append)
+            max_threads = max(max_threads, active_count())
+            sleep(interval)
+        sleep(2 * delay)
+        print(f"{name}: {n_values} values in {monotonic() - ts0:.2f}s, CPU={1000 * (process_time() - t0):.1f}ms, max threads={max_threads}, callbacks={len(result)}")
+
+    timer = None
+    n_timer_threads = 0
+
+    def debounce_timer(value, cb):
+        global timer, n_timer_threads
+        if timer:
+            timer.cancel()
+        timer = Timer(delay, cb, (value,))
+        timer.start()
+        n_timer_threads += 1
+
+    event = None
+
+    def debounce_sched(value, cb):
+        global event
+        if event:
+            event.cancel()
+        event = zynsched.schedule(delay, cb, value)
+
+    run("threading.Timer", debounce_timer)
+    print(f"  threads created: {n_timer_threads}")
+    run("zynthian_scheduler", debounce_sched)
+    print(f"  threads created: 0 (shared thread), stats: {zynsched.get_stats()}")
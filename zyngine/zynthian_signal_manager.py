@@ -24,8 +24,11 @@
 
 import logging
 import traceback
-from queue import SimpleQueue
-from threading import Thread
+from time import monotonic
+from collections import deque
+from threading import Thread, Condition
+
+from zyngine.zynthian_stats import zynthian_histogram
 
 # ----------------------------------------------------------------------------
 # Zynthian Signal Manager Class
@@ -67,6 +70,11 @@ class zynthian_signal_manager:
     last_signal = 13
     last_subsignal = 10
 
+    # Queue priority lanes. Lower lanes are only processed when higher ones are empty.
+    PRIORITY_HIGH = 0
+    PRIORITY_NORMAL = 1
+    PRIORITY_LOW = 2
+
     def __init__(self):
         """ Create an instance of a signal manager
 
@@ -80,8 +88,28 @@ class zynthian_signal_manager:
         self.signal_register = None
         self.reset_register()
 
-        self.queue = SimpleQueue()
+        # Priority lane for each signal
+        self.signal_priority = [self.PRIORITY_NORMAL] * self.last_signal
+        for signal in (self.S_STATE_MAN, self.S_CHAIN_MAN, self.S_CHAIN, self.S_CUIA, self.S_GUI):
+            self.signal_priority[signal] = self.PRIORITY_HIGH
+        self.signal_priority[self.S_MIDI] = self.PRIORITY_LOW
+
+        # Coalescing: tuple of kwargs names used as key, indexed by signal & subsignal.
+        # Only applied to callbacks registered with coalesce=True.
+        self.coalesce_keys = {}
+        self.set_coalesce(self.S_MIDI, self.SS_MIDI_CC, ("izmip", "chan", "num"))
+
+        # Queue entries are lists [signal, subsignal, callback, kwargs, timestamp, index key]
+        self.queue_lanes = [deque(), deque(), deque()]
+        self.queue_cond = Condition()
+        self.queue_index = {}  # Pending coalesced & batched entries, indexed by key
         self.queue_thread = None
+
+        # Metrics
+        self.queue_depth = [0] * self.last_signal
+        self.queue_depth_max = [0] * self.last_signal
+        self.dispatch_latency = [zynthian_histogram(f"signal {i} dispatch latency") for i in range(self.last_signal)]
+
         self.start_queue_thread()
 
     def stop(self):
@@ -98,47 +126,124 @@ class zynthian_signal_manager:
             self.signal_register.append([])
             for j in range(self.last_subsignal):
                 self.signal_register[i].append([])
+        # Bitmaps of subsignals with registered callbacks (any / queued), indexed by signal
+        self.subscribed_mask = [0] * self.last_signal
+        self.queued_mask = [0] * self.last_signal
+        # Reverse index => set of (signal, subsignal) indexed by callback
+        self.callback_slots = {}
+
+    def update_subscribed(self, signal, subsignal):
+        """Update subscriber bitmaps for a signal/subsignal after changing its register"""
+        bit = 1 << subsignal
+        rlist = self.signal_register[signal][subsignal]
+        if rlist:
+            self.subscribed_mask[signal] |= bit
+        else:
+            self.subscribed_mask[signal] &= ~bit
+        if any(rdata[1] for rdata in rlist):
+            self.queued_mask[signal] |= bit
+        else:
+            self.queued_mask[signal] &= ~bit
+
+    def is_subscribed(self, signal, subsignal):
+        """Check if any callback is registered for a signal/subsignal.
+
+        Hot producers may use it to avoid building the signal payload.
+        """
+        return (self.subscribed_mask[signal] >> subsignal) & 1
 
-    def register(self, signal, subsignal, callback, queued=False):
+    def is_subscribed_queued(self, signal, subsignal):
+        """Check if any queued callback is registered for a signal/subsignal"""
+        return (self.queued_mask[signal] >> subsignal) & 1
+
+    def register(self, signal, subsignal, callback, queued=False, batch=False, coalesce=False):
+        """Register a callback for a signal
+
+        signal : Signal number
+        subsignal : Subsignal number
+        callback : Function called with signal kwargs
+        queued : True to call from queue thread
+        batch : True to receive all pending queued signals in a single call => callback(batch=[kwargs, ...])
+        coalesce : True to skip pending queued signals replaced by a later one (see set_coalesce).
+                   Only for callbacks that don't need intermediate values, e.g. displays.
+        """
         if 0 <= signal <= self.last_signal and 0 <= subsignal <= self.last_subsignal:
             # logging.debug(f"Registering callback '{callback.__name__}()' for signal({signal},{subsignal})")
-            self.signal_register[signal][subsignal].append((callback, queued))
+            self.signal_register[signal][subsignal].append((callback, queued, batch, coalesce))
+            self.callback_slots.setdefault(callback, set()).add((signal, subsignal))
+            self.update_subscribed(signal, subsignal)
 
-    def register_queued(self, signal, subsignal, callback):
+    def register_queued(self, signal, subsignal, callback, batch=False, coalesce=False):
         if 0 <= signal <= self.last_signal and 0 <= subsignal <= self.last_subsignal:
             # logging.debug(f"Registering queued callback '{callback.__name__}()' for signal({signal},{subsignal})")
-            self.signal_register[signal][subsignal].append((callback, True))
+            self.signal_register[signal][subsignal].append((callback, True, batch, coalesce))
+            self.callback_slots.setdefault(callback, set()).add((signal, subsignal))
+            self.update_subscribed(signal, subsignal)
 
     def unregister(self, signal, subsignal, callback):
         if 0 <= signal <= self.last_signal and 0 <= subsignal <= self.last_subsignal:
             # logging.debug(f"Unregistering callback '{callback.__name__}()' from signal({signal},{subsignal})")
-            n = 0
-            for k, rdata in enumerate(self.signal_register[signal][subsignal]):
-                if rdata[0] == callback:
-                    del self.signal_register[signal][subsignal][k]
-                    n += 1
-            if n == 0:
+            if self._unregister_slot(signal, subsignal, callback) == 0:
                 logging.warning(
                     f"Callback not registered for signal({signal},{subsignal})")
+            else:
+                try:
+                    slots = self.callback_slots[callback]
+                    slots.discard((signal, subsignal))
+                    if not slots:
+                        del self.callback_slots[callback]
+                except KeyError:
+                    pass
 
     def unregister_all(self, callback):
         n = 0
-        for i in range(self.last_signal):
-            for j in range(self.last_subsignal):
-                for k, rdata in enumerate(self.signal_register[i][j]):
-                    if rdata[0] == callback:
-                        del self.signal_register[i][j][k]
-                        n += 1
+        for signal, subsignal in self.callback_slots.pop(callback, ()):
+            n += self._unregister_slot(signal, subsignal, callback)
         if n == 0:
             logging.warning(f"Callback not registered")
 
+    def _unregister_slot(self, signal, subsignal, callback):
+        """Remove all registrations of a callback from a signal/subsignal. Returns number of removed entries."""
+        rlist = self.signal_register[signal][subsignal]
+        n = len(rlist)
+        rlist[:] = [rdata for rdata in rlist if rdata[0] != callback]
+        n -= len(rlist)
+        if n:
+            self.update_subscribed(signal, subsignal)
+        return n
+
+    def set_priority(self, signal, priority):
+        """Set queue priority lane for a signal
+
+        signal : Signal number
+        priority : PRIORITY_HIGH, PRIORITY_NORMAL or PRIORITY_LOW
+        """
+        self.signal_priority[signal] = priority
+
+    def set_coalesce(self, signal, subsignal, keys):
+        """Set coalescing key of queued signals
+
+        Pending queued signals with the same values for the key kwargs are replaced by the last one,
+        for callbacks registered with coalesce=True.
+
+        signal : Signal number
+        subsignal : Subsignal number
+        keys : Tuple of kwargs names used as coalescing key. None to disable coalescing.
+        """
+        if keys:
+            self.coalesce_keys[(signal, subsignal)] = tuple(keys)
+        else:
+            self.coalesce_keys.pop((signal, subsignal), None)
+
     def process_signal(self, force_queued, signal, subsignal, **kwargs):
-        if 0 <= signal <= self.last_signal and 0 <= subsignal <= self.last_subsignal:
+        if 0 <= signal < self.last_signal and 0 <= subsignal < self.last_subsignal:
+            # Fast path when nobody is listening
+            if not (self.subscribed_mask[signal] >> subsignal) & 1:
+                return
             # logging.debug(f"Signal({signal},{subsignal}): {kwargs}")
             for rdata in self.signal_register[signal][subsignal]:
                 if force_queued == 1 or rdata[1]:
-                    self.queue.put_nowait(
-                        (signal, subsignal, rdata[0], kwargs))
+                    self.queue_signal(signal, subsignal, rdata[0], rdata[2], rdata[3], kwargs)
                 else:
                     try:
                         # logging.debug(f"  => calling {rdata[0].__name__}(...)")
@@ -162,6 +267,53 @@ class zynthian_signal_manager:
     # Queued signal handling
     # ----------------------------------------------------------------------------
 
+    def queue_signal(self, signal, subsignal, callback, batch, coalesce, kwargs):
+        """Add a callback call to the queue, coalescing or batching with pending ones if requested"""
+
+        if batch:
+            key = (signal, subsignal, callback)
+        elif coalesce:
+            try:
+                key = (signal, subsignal, callback, tuple(kwargs[k] for k in self.coalesce_keys[(signal, subsignal)]))
+            except KeyError:
+                key = None
+        else:
+            key = None
+        with self.queue_cond:
+            if key is not None:
+                entry = self.queue_index.get(key)
+                if entry:
+                    if batch:
+                        entry[3].append(kwargs)
+                    else:
+                        entry[3] = kwargs
+                    return
+                if batch:
+                    kwargs = [kwargs]
+            entry = [signal, subsignal, callback, kwargs, monotonic(), key]
+            if key is not None:
+                self.queue_index[key] = entry
+            self.queue_lanes[self.signal_priority[signal]].append(entry)
+            self.queue_depth[signal] += 1
+            if self.queue_depth[signal] > self.queue_depth_max[signal]:
+                self.queue_depth_max[signal] = self.queue_depth[signal]
+            self.queue_cond.notify()
+
+    def get_queue_entry(self, timeout):
+        """Get next queue entry, from highest priority lane. Wait for timeout seconds if queue is empty."""
+
+        with self.queue_cond:
+            if not any(self.queue_lanes):
+                self.queue_cond.wait(timeout)
+            for lane in self.queue_lanes:
+                if lane:
+                    entry = lane.popleft()
+                    if entry[5] is not None:
+                        del self.queue_index[entry[5]]
+                    self.queue_depth[entry[0]] -= 1
+                    return entry
+        return None
+
     def start_queue_thread(self):
         self.queue_thread = Thread(target=self.queue_thread_task, args=())
         self.queue_thread.name = "SIGNAL_QUEUE"
@@ -170,18 +322,54 @@ class zynthian_signal_manager:
 
     def queue_thread_task(self):
         while not self.exit_flag:
-            try:
-                data = self.queue.get(True, 1)
-            except:
+            data = self.get_queue_entry(1)
+            if data is None:
                 continue
+            self.dispatch_latency[data[0]].add(monotonic() - data[4])
             try:
                 # logging.debug(f"  => calling {data[2].__name__}(...)")
-                data[2](**data[3])
+                if isinstance(data[3], list):
+                    data[2](batch=data[3])
+                else:
+                    data[2](**data[3])
             except Exception as e:
                 logging.error(
                     f"Queued callback '{data[2].__name__}(...)' for signal({data[0]},{data[1]}): {e}")
                 logging.exception(traceback.format_exc())
 
+    # ----------------------------------------------------------------------------
+    # Metrics
+    # ----------------------------------------------------------------------------
+
+    def get_metrics(self):
+        """Get queue metrics
+
+        Returns dictionary indexed by signal with current queue depth, max queue depth and dispatch latency histogram
+        """
+        res = {}
+        for signal in range(self.last_signal):
+            res[signal] = {
+                "queue_depth": self.queue_depth[signal],
+                "queue_depth_max": self.queue_depth_max[signal],
+                "dispatch_latency": self.dispatch_latency[signal].get_state()
+            }
+        return res
+
+    def get_metrics_report(self):
+        """Get queue metrics as human readable text, for signals that have been queued"""
+
+        lines = []
+        for signal in range(self.last_signal):
+            if self.dispatch_latency[signal].count or self.queue_depth[signal]:
+                lines.append(f"Signal {signal}: queue depth={self.queue_depth[signal]}, max={self.queue_depth_max[signal]}")
+                lines.append(self.dispatch_latency[signal].get_report())
+        return "\n".join(lines)
+
+    def reset_metrics(self):
+        for signal in range(self.last_signal):
+            self.queue_depth_max[signal] = self.queue_depth[signal]
+            self.dispatch_latency[signal].reset()
+
 # ---------------------------------------------------------------------------
 
 
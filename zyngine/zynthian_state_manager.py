@@ -25,6 +25,7 @@
 
 import base64
 import ctypes
+import select
 import logging
 import traceback
 from glob import glob
@@ -51,6 +52,11 @@ from zyngine.zynthian_chain_manager import *
 from zyngine.zynthian_processor import zynthian_processor
 from zyngine.zynthian_audio_recorder import zynthian_audio_recorder
 from zyngine.zynthian_signal_manager import zynsigman
+from zyngine.zynthian_stats import zynthian_histogram
+from zyngine.zynthian_midi_learn import zynthian_midi_learn_store
+from zyngine.zynthian_preset_index import zynpresetindex
+from zyngine.zynthian_proc_reader import zynprocreader
+from zyngine.zynthian_zynmidi_decoder import decode_zynmidi_buffer, ZYNMIDI_CC_RUN
 from zyngine.zynthian_legacy_snapshot import zynthian_legacy_snapshot, SNAPSHOT_SCHEMA_VERSION
 from zyngine import zynthian_engine_audio_mixer
 from zyngine import zynthian_midi_filter
@@ -87,6 +93,9 @@ class zynthian_state_manager:
     SS_AUDIO_RECORDER_STATE = 1
     SS_AUDIO_RECORDER_ARM = 2
 
+    # MIDI capture state keys that change routing when restored
+    MIDI_CAPTURE_ROUTING_KEYS = ("audio_in", "ctrldev_driver", "disable_ctrldev", "zmip_input_mode")
+
     def __init__(self):
         """ Create an instance of a state manager
 
@@ -185,6 +194,35 @@ class zynthian_state_manager:
         # Initialize internal MIDI sender
         self.zynmidi = zynthian_zcmidi()
 
+        # CC coalescing => last value wins for absolute CCs in each read batch
+        self.cc_coalesce_zmips = set()  # Set of MIDI input devices with CC coalescing enabled
+        self.cc_coalesce_counters = {"received": 0, "merged": 0}
+
+        # Latency from zynmidi buffer to dispatch (see fast_thread_task)
+        self.zynmidi_latency = zynthian_histogram("zynmidi latency")
+
+        # ZS3 recall stats (see load_zs3)
+        self.zs3_recall_time = zynthian_histogram("ZS3 recall time", (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0))
+        self.zs3_recall_counters = {
+            "recalls": 0,
+            "chains_rebuilt": 0,
+            "chains_skipped": 0,
+            "zmop_set": 0,
+            "zmop_skipped": 0,
+            "processors_full": 0,
+            "processors_diff": 0,
+            "controllers_set": 0,
+            "controllers_skipped": 0
+        }
+        # ZS3 chain zmop parameters => (key, default, getter, setter)
+        self.zs3_zmop_params = (
+            ("note_low", 0, lib_zyncore.zmop_get_note_low, lib_zyncore.zmop_set_note_low),
+            ("note_high", 127, lib_zyncore.zmop_get_note_high, lib_zyncore.zmop_set_note_high),
+            ("transpose_octave", 0, lib_zyncore.zmop_get_transpose_octave, lib_zyncore.zmop_set_transpose_octave),
+            ("transpose_semitone", 0, lib_zyncore.zmop_get_transpose_semitone, lib_zyncore.zmop_set_transpose_semitone)
+        )
+        self.zynmidi_wakeup_fd = None
+
         self.exit_flag = False
         self.slow_thread = None
         self.fast_thread = None
@@ -238,6 +276,8 @@ class zynthian_state_manager:
         self.reload_midi_config()
         self.create_audio_player()
         self.chain_manager.add_chain(0)
+        if zynthian_gui_config.preset_index_warmup:
+            zynpresetindex.start_warm_up(self.chain_manager.get_preset_index_roots())
 
         self.exit_flag = False
         self.slow_thread = Thread(target=self.slow_thread_task)
@@ -251,6 +291,7 @@ class zynthian_state_manager:
         self.fast_thread.start()
 
         zynsigman.register(zynsigman.S_AUDIO_PLAYER, self.SS_AUDIO_PLAYER_STATE, self.cb_status_audio_player)
+        zynsmf.set_status_cb(self.cb_status_smf)
 
         self.end_busy("start state")
 
@@ -260,11 +301,14 @@ class zynthian_state_manager:
         self.start_busy("stop state")
 
         zynsigman.unregister(zynsigman.S_AUDIO_PLAYER, self.SS_AUDIO_PLAYER_STATE, self.cb_status_audio_player)
+        zynsmf.set_status_cb(None)
 
         self.exit_flag = True
         if self.fast_thread and self.fast_thread.is_alive():
             self.fast_thread.join()
         self.fast_thread = None
+        logging.info(self.get_zynmidi_latency_report())
+        logging.info(zynprocreader.get_report())
         if self.slow_thread and self.slow_thread.is_alive():
             self.slow_thread.join()
         self.slow_thread = None
@@ -558,6 +602,7 @@ class zynthian_state_manager:
         # Short delay after startup before first slow update
         next_second_check = monotonic() + 2
         self.add_slow_update_callback(3600, self.check_for_updates)
+        self.add_slow_update_callback(60, self.log_proc_reader_stats)
 
         while not self.exit_flag:
             # Get CPU Load
@@ -611,25 +656,9 @@ class zynthian_state_manager:
                 else:
                     status_counter += 1
 
-                # MIDI Player
-                # TODO: Add callback from MIDI player to avoid polling (and regular access to c-lib)
-                status_midi_player = libsmf.getPlayState()
-                if self.status_midi_player != status_midi_player:
-                    self.status_midi_player = status_midi_player
-                    if status_midi_player == 0:
-                        self.zynseq.transport_stop("zynsmf")
-
-                    zynsigman.send(zynsigman.S_STATE_MAN, self.SS_MIDI_PLAYER_STATE, state=status_midi_player)
-
-                # MIDI Recorder
-                # TODO: Add callback from MIDI recorder to avoid polling (and regular access to c-lib)
-                status_midi_recorder = libsmf.isRecording()
-                if self.status_midi_recorder != status_midi_recorder:
-                    self.status_midi_recorder = status_midi_recorder
-                    zynsigman.send(zynsigman.S_STATE_MAN, self.SS_MIDI_RECORDER_STATE, state=status_midi_recorder)
-
-                # Sequencer Status => It must be improved using callbacks
-                self.zynseq.update_state()
+                # Sequencer Status => Only polled if libseq can't notify changes
+                if not self.zynseq.is_state_notify():
+                    self.zynseq.update_state()
 
                 # Clean some status flags
                 if xruns_status:
@@ -673,13 +702,108 @@ class zynthian_state_manager:
         if handle == self.audio_player.handle:
             self.status_audio_player = state
 
+    def cb_status_smf(self, play_state, recording):
+        """Handle change of MIDI player & recorder state, notified by libsmf"""
+
+        # MIDI Player
+        if self.status_midi_player != play_state:
+            self.status_midi_player = play_state
+            if play_state == zynsmf.PLAY_STATE_STOPPED:
+                self.zynseq.transport_stop("zynsmf")
+            zynsigman.send(zynsigman.S_STATE_MAN, self.SS_MIDI_PLAYER_STATE, state=play_state)
+
+        # MIDI Recorder
+        if self.status_midi_recorder != recording:
+            self.status_midi_recorder = recording
+            zynsigman.send(zynsigman.S_STATE_MAN, self.SS_MIDI_RECORDER_STATE, state=recording)
+
     def fast_thread_task(self):
-        """Perform fast / high priority background tasks"""
+        """Perform fast / high priority background tasks
 
-        while not self.exit_flag:
-            # Process MIDI events
-            self.zynmidi_read()
-            sleep(0.01)
+        Latency histogram measures the time from the earliest moment pending events may have
+        been written to the zynmidi buffer until they have been dispatched, including wakeup delay:
+          - poll mode: from the buffer was last seen empty, before sleeping (up to 10ms wait)
+          - eventfd mode: from the eventfd, signalled when events are written, woke the thread.
+            Idle time blocked in poll() is not latency, so it isn't included.
+        """
+
+        self.zynmidi_wakeup_fd = self.get_zynmidi_wakeup_fd()
+        if self.zynmidi_wakeup_fd is None:
+            logging.info("Polling zynmidi buffer")
+            ts = monotonic()
+            while not self.exit_flag:
+                # Process MIDI events
+                if self.zynmidi_read():
+                    self.zynmidi_latency.add(monotonic() - ts)
+                # Events written from now on wait for the next read
+                ts = monotonic()
+                sleep(0.01)
+        else:
+            logging.info("Waiting for zynmidi buffer events")
+            poller = select.poll()
+            poller.register(self.zynmidi_wakeup_fd, select.POLLIN)
+            while not self.exit_flag:
+                # Timeout allows checking exit flag
+                if not poller.poll(500):
+                    continue
+                ts = monotonic()
+                try:
+                    os.read(self.zynmidi_wakeup_fd, 8)
+                except BlockingIOError:
+                    pass
+                # Process MIDI events until buffer is empty. Events written while reading re-signal the eventfd.
+                while self.zynmidi_read():
+                    self.zynmidi_latency.add(monotonic() - ts)
+                    ts = monotonic()
+
+    def get_zynmidi_wakeup_fd(self):
+        """Get eventfd signalled by lib_zyncore when events are written to zynmidi buffer
+
+        Returns file descriptor or None if not available, so polling must be used.
+        """
+
+        if zynthian_gui_config.midi_zynmidi_poll:
+            return None
+        try:
+            fd = lib_zyncore.get_zynmidi_eventfd()
+        except AttributeError:
+            logging.info("lib_zyncore doesn't support zynmidi eventfd")
+            return None
+        except Exception as e:
+            logging.error(f"Can't get zynmidi eventfd => {e}")
+            return None
+        if fd < 0:
+            return None
+        return fd
+
+    def get_zynmidi_latency_report(self):
+        """Get zynmidi latency histogram as human readable text"""
+
+        if self.zynmidi_wakeup_fd is None:
+            mode = "poll"
+        else:
+            mode = "eventfd"
+        return f"[{mode}] {self.zynmidi_latency.get_report()}"
+
+    def reset_zynmidi_latency(self):
+        self.zynmidi_latency.reset()
+
+    def get_zs3_recall_report(self):
+        """Get ZS3 recall timing histogram and counters as human readable text"""
+
+        counters = ", ".join(f"{key}={value}" for key, value in self.zs3_recall_counters.items())
+        return f"{self.zs3_recall_time.get_report()}\n  {counters}"
+
+    def reset_zs3_recall_stats(self):
+        self.zs3_recall_time.reset()
+        for key in self.zs3_recall_counters:
+            self.zs3_recall_counters[key] = 0
+
+    def log_proc_reader_stats(self):
+        """Log engine output throughput since the previous call"""
+
+        logging.debug(zynprocreader.get_report())
+        zynprocreader.reset_stats()
 
     def add_slow_update_callback(self, rate, cb):
         """Add a callback to be called every "rate" seconds
@@ -708,203 +832,305 @@ class zynthian_state_manager:
     # ------------------------------------------------------------------
 
     def zynmidi_read(self):
+        """Read and process pending events from zynmidi buffer
+
+        Returns number of events read
+        """
+
+        n = 0
         try:
             n = lib_zyncore.get_zynmidi_num_pending()
             if n <= 0:
-                return
+                return 0
             midi_events = (ctypes.c_uint32 * n)()
             n = lib_zyncore.read_zynmidi_buffer(midi_events, n)
-            i = 0
-            while i < n:
-                ev = midi_events[i].to_bytes(4, 'big')
-                i += 1
-                izmip = ev[0]
-                evhead = ev[1]
-                ev = ev[1:]
-
-                # Process SysEx
-                if evhead == 0xF0:
-                    # logging.debug(f"RECEIVED SYSEX FROM {izmip}...")
-                    sysex_data = bytearray(ev)
-                    while i < n:
-                        chunk = midi_events[i].to_bytes(4, 'big')
-                        sysex_data.extend(chunk)
-                        if 0xF7 in chunk:
-                            break
-                        i += 1
-                    # This is probably not correct and we should continue reading in the next period
-                    if i == n:
-                        logging.error(f"SysEx message from device {izmip} is not terminated")
-                        continue
-                    # Crop data until find the 0xF7 mark
-                    while sysex_data[-1] != 0xF7:
-                        del sysex_data[-1]
-                    # logging.debug(f"  SYSEX DATA => {sysex_data}")
-                    ev = bytes(sysex_data)
-
-                # Try to manage with a control device driver
-                if self.ctrldev_manager.midi_event(izmip, ev):
-                    self.status_midi = True
-                    self.last_event_flag = True
+            if n <= 0:
+                return 0
+            items, clock = decode_zynmidi_buffer(midi_events, n, self.ctrldev_manager.drivers,
+                                                 zynthian_gui_config.master_midi_channel)
+            if clock:
+                self.status_midi_clock = True
+            for item in items:
+                if item[0] == ZYNMIDI_CC_RUN:
+                    self.zynmidi_cc_run(item[1])
+                else:
+                    self.zynmidi_event(item[1], item[2])
+        except Exception as err:
+            logging.exception(err)
+
+        return n
+
+    def zynmidi_cc_run(self, cc_events):
+        """Process a run of regular CC events
+
+        cc_events - List of (izmip, chan, ccnum, ccval) tuples
+        """
+
+        if self.cc_coalesce_zmips and not self.midi_learn_zctrl:
+            cc_events = self.coalesce_cc_run(cc_events)
+        send_signal = zynsigman.is_subscribed(zynsigman.S_MIDI, zynsigman.SS_MIDI_CC)
+        if not self.midi_learn_zctrl:
+            # Each CC reaches every destination before the next one, as when processed event by event
+            if send_signal:
+                cc_cb = self.zynmidi_cc_dispatch_signal
+            else:
+                cc_cb = self.zynmidi_cc_dispatch
+            self.chain_manager.midi_control_change_run(cc_events, cc_cb)
+        elif send_signal:
+            for izmip, chan, ccnum, ccval in cc_events:
+                zynsigman.send_queued(zynsigman.S_MIDI, zynsigman.SS_MIDI_CC,
+                                      izmip=izmip, chan=chan, num=ccnum, val=ccval)
+        # Flag MIDI event
+        self.status_midi = True
+        self.last_event_flag = True
+
+    def zynmidi_cc_dispatch(self, izmip, chan, ccnum, ccval):
+        """Send a regular CC from a run to mixers & audio player, after chains"""
+
+        self.zynmixer.midi_control_change(chan, ccnum, ccval)
+        self.alsa_mixer_processor.midi_control_change(chan, ccnum, ccval)
+        self.audio_player.midi_control_change(chan, ccnum, ccval)
+
+    def zynmidi_cc_dispatch_signal(self, izmip, chan, ccnum, ccval):
+        """Send a regular CC from a run to mixers & audio player, after chains, and signal it"""
+
+        self.zynmidi_cc_dispatch(izmip, chan, ccnum, ccval)
+        zynsigman.send_queued(zynsigman.S_MIDI, zynsigman.SS_MIDI_CC,
+                              izmip=izmip, chan=chan, num=ccnum, val=ccval)
+
+    def coalesce_cc_run(self, cc_events):
+        """Drop CC values superseded by a later value for the same device, channel & CC
+
+        Only absolute mode CCs from devices with coalescing enabled are merged.
+        Relative mode CCs keep every value, so accumulated deltas are preserved.
+
+        cc_events - List of (izmip, chan, ccnum, ccval) tuples
+        Returns list of CC events to be processed
+        """
+
+        last = {}
+        n = 0
+        for i, ev in enumerate(cc_events):
+            if ev[0] in self.cc_coalesce_zmips:
+                last[ev[:3]] = i
+                n += 1
+        self.cc_coalesce_counters["received"] += n
+        if len(last) == n:
+            return cc_events
+
+        absolute = {}
+        res = []
+        for i, ev in enumerate(cc_events):
+            key = ev[:3]
+            j = last.get(key, i)
+            if j != i:
+                try:
+                    merge = absolute[key]
+                except KeyError:
+                    merge = absolute[key] = (self.chain_manager.is_midi_cc_absolute(*key)
+                                             and self.zynmixer.is_midi_cc_absolute(key[2]))
+                if merge:
+                    self.cc_coalesce_counters["merged"] += 1
                     continue
+            res.append(ev)
+        return res
 
-                evtype = (evhead >> 4) & 0x0F
-                chan = evhead & 0x0F
-
-                # logging.info(f"MIDI EVENT: IZMIP={izmip}, TYPE={evtype}, CHAN={chan}")
-
-                # System Messages (Common & RT)
-                if evtype == 0xF:
-                    # SysEx
-                    if chan == 0x0:
-                        # Handle SysEx from external devices only
-                        if izmip < self.get_max_num_midi_devs():
-                            zynsigman.send_queued(zynsigman.S_MIDI, zynsigman.SS_MIDI_SYSEX, izmip=izmip, data=ev)
-                    # Clock
-                    elif chan == 0x8:
-                        self.status_midi_clock = True
-                        continue
-                    # Tick
-                    elif chan == 0x9:
-                        continue
-                    # Active Sense
-                    elif chan == 0xE:
-                        continue
-                    # Reset
-                    elif chan == 0xF:
-                        pass
-
-                # Master MIDI Channel...
-                elif chan == zynthian_gui_config.master_midi_channel:
-                    logging.info(f"MASTER MIDI MESSAGE: {ev.hex()}")
-                    # Webconf configured messages for Snapshot Control...
-                    if ev == zynthian_gui_config.master_midi_program_change_up:
-                        logging.debug("PROGRAM CHANGE UP!")
-                        self.load_snapshot_by_prog(self.snapshot_program + 1)
-                    elif ev == zynthian_gui_config.master_midi_program_change_down:
-                        logging.debug("PROGRAM CHANGE DOWN!")
-                        self.load_snapshot_by_prog(self.snapshot_program - 1)
-                    elif ev == zynthian_gui_config.master_midi_bank_change_up:
-                        logging.debug("BANK CHANGE UP!")
-                        self.set_snapshot_midi_bank(self.snapshot_bank + 1)
-                    elif ev == zynthian_gui_config.master_midi_bank_change_down:
-                        logging.debug("BANK CHANGE DOWN!")
-                        self.set_snapshot_midi_bank(self.snapshot_bank - 1)
-                    # Program Change => Snapshot Load
-                    elif evtype == 0xC:
-                        pgm = ev[1] & 0x7F
-                        logging.debug("PROGRAM CHANGE %d" % pgm)
-                        self.start_busy("load_snapshot", "loading snapshot")
-                        self.load_snapshot_by_prog(pgm)
-                        self.end_busy("load_snapshot")
-                    # Control Change...
-                    elif evtype == 0xB:
-                        ccnum = ev[1] & 0x7F
-                        ccval = ev[2] & 0x7F
-                        if ccnum == zynthian_gui_config.master_midi_bank_change_ccnum:
-                            logging.debug(f"BANK CHANGE {ccval}")
-                            self.set_snapshot_midi_bank(ccval)
-                        elif ccnum == 120:
-                            self.all_sounds_off()
-                        elif ccnum == 123:
-                            self.all_notes_off()
-                        else:
-                            if self.midi_learn_zctrl:
-                                self.chain_manager.add_midi_learn(chan, ccnum, self.midi_learn_zctrl, izmip)
-                            else:
-                                self.zynmixer.midi_control_change(chan, ccnum, ccval)
-                    # Master Note CUIA with ZynSwitch emulation
-                    elif evtype == 0x8 or evtype == 0x9:
-                        note = str(ev[1] & 0x7F)
-                        vel = ev[2] & 0x7F
-                        if note in zynthian_gui_config.master_midi_note_cuia:
-                            cuia_str = zynthian_gui_config.master_midi_note_cuia[note]
-                            parts = cuia_str.split(" ", 2)
-                            cuia = parts[0].lower()
-                            if len(parts) > 1:
-                                params = self.parse_cuia_params(parts[1])
-                            else:
-                                params = None
-                            # Emulate Zynswitch Push/Release with Note On/Off
-                            if cuia == "zynswitch" and len(params) == 1:
-                                if evtype == 0x8 or vel == 0:
-                                    params.append('R')
-                                else:
-                                    params.append('P')
-                                self.cuia_queue.put_nowait((cuia, params))
-                            # Or normal CUIA
-                            elif evtype == 0x9 and vel > 0:
-                                self.cuia_queue.put_nowait((cuia, params))
-
-                # Control Change...
-                elif evtype == 0xB:
-                    ccnum = ev[1] & 0x7F
-                    ccval = ev[2] & 0x7F
-                    # logging.debug("MIDI CONTROL CHANGE: CH{}, CC{} => {}".format(chan, ccnum, ccval))
-                    if ccnum < 120:
-                        if not self.midi_learn_zctrl:
-                            self.chain_manager.midi_control_change(izmip, chan, ccnum, ccval)
-                            self.zynmixer.midi_control_change(chan, ccnum, ccval)
-                            self.alsa_mixer_processor.midi_control_change(chan, ccnum, ccval)
-                            self.audio_player.midi_control_change(chan, ccnum, ccval)
-                        zynsigman.send_queued(zynsigman.S_MIDI, zynsigman.SS_MIDI_CC,
-                                              izmip=izmip, chan=chan, num=ccnum, val=ccval)
-                    # Special CCs >= Channel Mode
-                    elif ccnum == 120:
-                        self.all_sounds_off_chan(chan)
-                    elif ccnum == 123:
-                        self.all_notes_off_chan(chan)
-
-                # Program Change...
-                elif evtype == 0xC:
-                    pgm = ev[1] & 0x7F
-                    logging.info(f"MIDI PROGRAM CHANGE: CH#{chan}, PRG#{pgm}")
-                    # MIDI learn SubSnapShot (ZS3)
-                    if self.midi_learn_pc is not None:
-                        # When using internal PC, ignore MIDI channel
-                        if izmip == 0xFF:
-                            self.save_zs3(f"*/{pgm}")
-                        else:
-                            self.save_zs3(f"{chan}/{pgm}")
-                        send_signal = True
+    def set_midi_cc_coalesce(self, izmip, enable=True):
+        """Enable / disable CC coalescing for a MIDI input device
+
+        izmip - MIDI input device index
+        enable - True to enable coalescing
+        """
+
+        if enable:
+            self.cc_coalesce_zmips.add(izmip)
+        else:
+            self.cc_coalesce_zmips.discard(izmip)
+
+    def get_midi_cc_coalesce(self, izmip):
+        return izmip in self.cc_coalesce_zmips
+
+    def get_cc_coalesce_counters(self):
+        """Get CC coalescing counters
+
+        Returns dictionary with received (from coalescing devices) & merged (dropped) CC events
+        """
+
+        return dict(self.cc_coalesce_counters)
+
+    def reset_cc_coalesce_counters(self):
+        self.cc_coalesce_counters = {"received": 0, "merged": 0}
+
+    def zynmidi_event(self, izmip, ev):
+        """Process a single MIDI event from zynmidi buffer
+
+        izmip - MIDI input device index
+        ev - bytes with full MIDI message
+        """
+
+        evhead = ev[0]
+
+        # Try to manage with a control device driver
+        if self.ctrldev_manager.midi_event(izmip, ev):
+            self.status_midi = True
+            self.last_event_flag = True
+            return
+
+        evtype = (evhead >> 4) & 0x0F
+        chan = evhead & 0x0F
+
+        # logging.info(f"MIDI EVENT: IZMIP={izmip}, TYPE={evtype}, CHAN={chan}")
+
+        # System Messages (Common & RT)
+        if evtype == 0xF:
+            # SysEx
+            if chan == 0x0:
+                # Handle SysEx from external devices only
+                if izmip < self.get_max_num_midi_devs() and zynsigman.is_subscribed(zynsigman.S_MIDI, zynsigman.SS_MIDI_SYSEX):
+                    zynsigman.send_queued(zynsigman.S_MIDI, zynsigman.SS_MIDI_SYSEX, izmip=izmip, data=ev)
+            # Clock
+            elif chan == 0x8:
+                self.status_midi_clock = True
+                return
+            # Tick
+            elif chan == 0x9:
+                return
+            # Active Sense
+            elif chan == 0xE:
+                return
+            # Reset
+            elif chan == 0xF:
+                pass
+
+        # Master MIDI Channel...
+        elif chan == zynthian_gui_config.master_midi_channel:
+            logging.info(f"MASTER MIDI MESSAGE: {ev.hex()}")
+            # Webconf configured messages for Snapshot Control...
+            if ev == zynthian_gui_config.master_midi_program_change_up:
+                logging.debug("PROGRAM CHANGE UP!")
+                self.load_snapshot_by_prog(self.snapshot_program + 1)
+            elif ev == zynthian_gui_config.master_midi_program_change_down:
+                logging.debug("PROGRAM CHANGE DOWN!")
+                self.load_snapshot_by_prog(self.snapshot_program - 1)
+            elif ev == zynthian_gui_config.master_midi_bank_change_up:
+                logging.debug("BANK CHANGE UP!")
+                self.set_snapshot_midi_bank(self.snapshot_bank + 1)
+            elif ev == zynthian_gui_config.master_midi_bank_change_down:
+                logging.debug("BANK CHANGE DOWN!")
+                self.set_snapshot_midi_bank(self.snapshot_bank - 1)
+            # Program Change => Snapshot Load
+            elif evtype == 0xC:
+                pgm = ev[1] & 0x7F
+                logging.debug("PROGRAM CHANGE %d" % pgm)
+                self.start_busy("load_snapshot", "loading snapshot")
+                self.load_snapshot_by_prog(pgm)
+                self.end_busy("load_snapshot")
+            # Control Change...
+            elif evtype == 0xB:
+                ccnum = ev[1] & 0x7F
+                ccval = ev[2] & 0x7F
+                if ccnum == zynthian_gui_config.master_midi_bank_change_ccnum:
+                    logging.debug(f"BANK CHANGE {ccval}")
+                    self.set_snapshot_midi_bank(ccval)
+                elif ccnum == 120:
+                    self.all_sounds_off()
+                elif ccnum == 123:
+                    self.all_notes_off()
+                else:
+                    if self.midi_learn_zctrl:
+                        self.chain_manager.add_midi_learn(chan, ccnum, self.midi_learn_zctrl, izmip)
                     else:
-                        # select SubSnapShot (ZS3)
-                        if zynthian_gui_config.midi_prog_change_zs3:
-                            # When using internal PC, ignore MIDI channel
-                            if izmip == 0xFF:
-                                send_signal = self.load_zs3(f"*/{pgm}")
-                            else:
-                                send_signal = self.load_zs3(f"{chan}/{pgm}")
-                        # or select preset
+                        self.zynmixer.midi_control_change(chan, ccnum, ccval)
+            # Master Note CUIA with ZynSwitch emulation
+            elif evtype == 0x8 or evtype == 0x9:
+                note = str(ev[1] & 0x7F)
+                vel = ev[2] & 0x7F
+                if note in zynthian_gui_config.master_midi_note_cuia:
+                    cuia_str = zynthian_gui_config.master_midi_note_cuia[note]
+                    parts = cuia_str.split(" ", 2)
+                    cuia = parts[0].lower()
+                    if len(parts) > 1:
+                        params = self.parse_cuia_params(parts[1])
+                    else:
+                        params = None
+                    # Emulate Zynswitch Push/Release with Note On/Off
+                    if cuia == "zynswitch" and len(params) == 1:
+                        if evtype == 0x8 or vel == 0:
+                            params.append('R')
                         else:
-                            # Sends to active chain's MIDI channel when device uses ACTI mode
-                            if zynautoconnect.get_midi_in_dev_mode(izmip):
-                                chan = self.chain_manager.get_active_chain().midi_chan
-                            send_signal = self.chain_manager.set_midi_prog_preset(chan, pgm)
-                    if send_signal:
-                        zynsigman.send_queued(zynsigman.S_MIDI, zynsigman.SS_MIDI_PC,
-                                              izmip=izmip, chan=chan, num=pgm)
-
-                # Note Off
-                elif evtype == 0x8:
-                    # Handle external devices only
-                    if izmip < self.get_max_num_midi_devs():
-                        zynsigman.send_queued(zynsigman.S_MIDI, zynsigman.SS_MIDI_NOTE_OFF,
-                                        izmip=izmip, chan=chan, note=ev[1] & 0x7f, vel=ev[2] & 0x7f)
-
-                # Note On
-                elif evtype == 0x9:
-                    # Handle external devices only
-                    if izmip < self.get_max_num_midi_devs():
-                        zynsigman.send_queued(zynsigman.S_MIDI, zynsigman.SS_MIDI_NOTE_ON,
-                                        izmip=izmip, chan=chan, note=ev[1] & 0x7f, vel=ev[2] & 0x7f)
-
-                # Flag MIDI event
-                self.status_midi = True
-                self.last_event_flag = True
-
-        except Exception as err:
-            logging.exception(err)
+                            params.append('P')
+                        self.cuia_queue.put_nowait((cuia, params))
+                    # Or normal CUIA
+                    elif evtype == 0x9 and vel > 0:
+                        self.cuia_queue.put_nowait((cuia, params))
+
+        # Control Change...
+        elif evtype == 0xB:
+            ccnum = ev[1] & 0x7F
+            ccval = ev[2] & 0x7F
+            # logging.debug("MIDI CONTROL CHANGE: CH{}, CC{} => {}".format(chan, ccnum, ccval))
+            if ccnum < 120:
+                if not self.midi_learn_zctrl:
+                    self.chain_manager.midi_control_change(izmip, chan, ccnum, ccval)
+                    self.zynmixer.midi_control_change(chan, ccnum, ccval)
+                    self.alsa_mixer_processor.midi_control_change(chan, ccnum, ccval)
+                    self.audio_player.midi_control_change(chan, ccnum, ccval)
+                if zynsigman.is_subscribed(zynsigman.S_MIDI, zynsigman.SS_MIDI_CC):
+                    zynsigman.send_queued(zynsigman.S_MIDI, zynsigman.SS_MIDI_CC,
+                                          izmip=izmip, chan=chan, num=ccnum, val=ccval)
+            # Special CCs >= Channel Mode
+            elif ccnum == 120:
+                self.all_sounds_off_chan(chan)
+            elif ccnum == 123:
+                self.all_notes_off_chan(chan)
+
+        # Program Change...
+        elif evtype == 0xC:
+            pgm = ev[1] & 0x7F
+            logging.info(f"MIDI PROGRAM CHANGE: CH#{chan}, PRG#{pgm}")
+            # MIDI learn SubSnapShot (ZS3)
+            if self.midi_learn_pc is not None:
+                # When using internal PC, ignore MIDI channel
+                if izmip == 0xFF:
+                    self.save_zs3(f"*/{pgm}")
+                else:
+                    self.save_zs3(f"{chan}/{pgm}")
+                send_signal = True
+            else:
+                # select SubSnapShot (ZS3)
+                if zynthian_gui_config.midi_prog_change_zs3:
+                    # When using internal PC, ignore MIDI channel
+                    if izmip == 0xFF:
+                        send_signal = self.load_zs3(f"*/{pgm}")
+                    else:
+                        send_signal = self.load_zs3(f"{chan}/{pgm}")
+                # or select preset
+                else:
+                    # Sends to active chain's MIDI channel when device uses ACTI mode
+                    if zynautoconnect.get_midi_in_dev_mode(izmip):
+                        chan = self.chain_manager.get_active_chain().midi_chan
+                    send_signal = self.chain_manager.set_midi_prog_preset(chan, pgm)
+            if send_signal and zynsigman.is_subscribed(zynsigman.S_MIDI, zynsigman.SS_MIDI_PC):
+                zynsigman.send_queued(zynsigman.S_MIDI, zynsigman.SS_MIDI_PC,
+                                      izmip=izmip, chan=chan, num=pgm)
+
+        # Note Off
+        elif evtype == 0x8:
+            # Handle external devices only
+            if izmip < self.get_max_num_midi_devs() and zynsigman.is_subscribed(zynsigman.S_MIDI, zynsigman.SS_MIDI_NOTE_OFF):
+                zynsigman.send_queued(zynsigman.S_MIDI, zynsigman.SS_MIDI_NOTE_OFF,
+                                      izmip=izmip, chan=chan, note=ev[1] & 0x7f, vel=ev[2] & 0x7f)
+
+        # Note On
+        elif evtype == 0x9:
+            # Handle external devices only
+            if izmip < self.get_max_num_midi_devs() and zynsigman.is_subscribed(zynsigman.S_MIDI, zynsigman.SS_MIDI_NOTE_ON):
+                zynsigman.send_queued(zynsigman.S_MIDI, zynsigman.SS_MIDI_NOTE_ON,
+                                      izmip=izmip, chan=chan, note=ev[1] & 0x7f, vel=ev[2] & 0x7f)
+
+        # Flag MIDI event
+        self.status_midi = True
+        self.last_event_flag = True
 
     # ---------------------------------------------------------------------------
     # Power Saving
@@ -950,8 +1176,11 @@ class zynthian_state_manager:
     # Snapshot Save & Load
     # ----------------------------------------------------------------------------
 
-    def get_state(self):
-        """Get a dictionary describing the full state model"""
+    def get_state(self, riff_b64=True):
+        """Get a dictionary describing the full state model
+
+        riff_b64 : True to include step sequencer RIFF data, base64 encoded
+        """
 
         self.save_zs3("zs3-0", "Last state")
         self.purge_zs3()
@@ -985,9 +1214,10 @@ class zynthian_state_manager:
             state['audio_recorder_armed'] = armed_state
 
         # Zynseq RIFF data
-        binary_riff_data = self.zynseq.get_riff_data()
-        b64_data = base64.b64encode(binary_riff_data)
-        state['zynseq_riff_b64'] = b64_data.decode('utf-8')
+        if riff_b64:
+            binary_riff_data = self.zynseq.get_riff_data()
+            b64_data = base64.b64encode(binary_riff_data)
+            state['zynseq_riff_b64'] = b64_data.decode('utf-8')
 
         return state
 
@@ -1026,7 +1256,7 @@ class zynthian_state_manager:
                         except:
                             pass
 
-            for key in ["last_snapshot_fpath", "midi_profile_state", "engine_config", "audio_recorder_armed", "zynseq_riff_b64", "alsa_mixer", "zyngui"]:
+            for key in ["last_snapshot_fpath", "midi_profile_state", "engine_config", "audio_recorder_armed", "zynseq_riff_b64", "zynseq_riff_file", "alsa_mixer", "zyngui"]:
                 try:
                     del state[key]
                 except:
@@ -1062,7 +1292,13 @@ class zynthian_state_manager:
         self.start_busy("save snapshot", "saving snapshot")
         try:
             # Get state
-            state = self.get_state()
+            if zynthian_gui_config.snapshot_zynseq_sidecar:
+                state = self.get_state(riff_b64=False)
+                state['zynseq_riff_file'] = self.save_zynseq_sidecar(fpath, self.zynseq.get_riff_data())
+            else:
+                state = self.get_state()
+                # Sequences are inside the snapshot => Remove sidecar saved before, if any
+                self.remove_zynseq_sidecar(fpath)
             if isinstance(extra_data, dict):
                 state = {**state, **extra_data}
             # JSON Encode
@@ -1114,7 +1350,12 @@ class zynthian_state_manager:
             converter = zynthian_legacy_snapshot(self)
             state = converter.convert_state(snapshot)
 
-            if load_sequences and "zynseq_riff_b64" in state:
+            if load_sequences and "zynseq_riff_file" in state:
+                binary_riff_data = self.load_zynseq_sidecar(fpath, state["zynseq_riff_file"])
+                if binary_riff_data:
+                    self.zynseq.restore_riff_data(binary_riff_data)
+                    self.zynseq.update_tempo()
+            elif load_sequences and "zynseq_riff_b64" in state:
                 b64_bytes = state["zynseq_riff_b64"].encode("utf-8")
                 binary_riff_data = base64.decodebytes(b64_bytes)
                 self.zynseq.restore_riff_data(binary_riff_data)
@@ -1133,7 +1374,7 @@ class zynthian_state_manager:
 
                     if merge:
                         # Remove elements that are not to be merged
-                        for key in ["last_snapshot_fpath", "last_zs3_id", "midi_profile_state", "audio_recorder_armed", "zynseq_riff_b64", "alsa_mixer", "zyngui"]:
+                        for key in ["last_snapshot_fpath", "last_zs3_id", "midi_profile_state", "audio_recorder_armed", "zynseq_riff_b64", "zynseq_riff_file", "alsa_mixer", "zyngui"]:
                             try:
                                 del state[key]
                             except:
@@ -1217,7 +1458,7 @@ class zynthian_state_manager:
                 zs3 = self.sanitize_zs3_from_json(state["zs3"])
                 if not merge:
                     self.zs3 = zs3
-                self.load_zs3(zs3["zs3-0"], autoconnect=False)
+                self.load_zs3(zs3["zs3-0"], autoconnect=False, diff=False)
                 try:
                     mute |= self.zs3["zs3-0"]["mixer"]["chan_16"]["mute"]
                 except:
@@ -1323,7 +1564,83 @@ class zynthian_state_manager:
             budir = dpath + "/.backup"
             if not isdir(budir):
                 os.mkdir(budir)
-            os.rename(path, "{}/{}.{}{}".format(budir, fbase, ts_str, fext))
+            self.move_snapshot(path, "{}/{}.{}{}".format(budir, fbase, ts_str, fext))
+
+    def move_snapshot(self, path, new_path):
+        """Rename or move a snapshot file, with its step sequencer sidecar file, if any
+
+        path : Full path and filename of snapshot
+        new_path : New full path and filename of snapshot
+        """
+
+        os.rename(path, new_path)
+        sidecar_fpath = self.get_zynseq_sidecar_fpath(path)
+        if isfile(sidecar_fpath):
+            os.rename(sidecar_fpath, self.get_zynseq_sidecar_fpath(new_path))
+        else:
+            self.remove_zynseq_sidecar(new_path)
+
+    def delete_snapshot(self, path):
+        """Delete a snapshot file, with its step sequencer sidecar file, if any
+
+        path : Full path and filename of snapshot
+        """
+
+        os.remove(path)
+        self.remove_zynseq_sidecar(path)
+
+    @staticmethod
+    def get_zynseq_sidecar_fpath(fpath):
+        """Get full path of step sequencer sidecar file of a snapshot => <snapshot>.zss.zynseq"""
+
+        return fpath + ".zynseq"
+
+    def save_zynseq_sidecar(self, fpath, riff_data):
+        """Save step sequencer RIFF data to a sidecar file, next to the snapshot
+
+        fpath : Full path and filename of snapshot
+        riff_data : Binary RIFF data
+        Returns : Sidecar filename, relative to snapshot directory
+        """
+
+        sidecar_fpath = self.get_zynseq_sidecar_fpath(fpath)
+        tmp_fpath = sidecar_fpath + ".tmp"
+        with open(tmp_fpath, "wb") as fh:
+            fh.write(riff_data)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp_fpath, sidecar_fpath)
+        return basename(sidecar_fpath)
+
+    def load_zynseq_sidecar(self, fpath, fname):
+        """Load step sequencer RIFF data from the sidecar file of a snapshot
+
+        fpath : Full path and filename of snapshot
+        fname : Sidecar filename saved in snapshot, used if snapshot was renamed without its sidecar
+        Returns : Binary RIFF data or None on failure
+        """
+
+        sidecar_fpath = self.get_zynseq_sidecar_fpath(fpath)
+        if not isfile(sidecar_fpath):
+            sidecar_fpath = join(dirname(fpath), basename(fname))
+        try:
+            with open(sidecar_fpath, "rb") as fh:
+                return fh.read()
+        except Exception as e:
+            logging.error(f"Can't load step sequencer data '{sidecar_fpath}' => {e}")
+            self.set_busy_warning("Sequences not loaded!", f"Missing sequencer file '{basename(sidecar_fpath)}'")
+            return None
+
+    def remove_zynseq_sidecar(self, fpath):
+        """Remove the step sequencer sidecar file of a snapshot, if any
+
+        fpath : Full path and filename of snapshot
+        """
+
+        try:
+            os.remove(self.get_zynseq_sidecar_fpath(fpath))
+        except FileNotFoundError:
+            pass
 
     def save_default_snapshot(self):
         self.save_snapshot(self.default_snapshot_fpath)
@@ -1377,13 +1694,18 @@ class zynthian_state_manager:
         except:
             tstate["restore"] = False
 
-    def load_zs3(self, zs3_id, autoconnect=True):
+    def load_zs3(self, zs3_id, autoconnect=True, diff=True):
         """Restore a ZS3
 
         zs3_id : ID of ZS3 to restore or zs3 dict
+        autoconnect : True to request autoconnect after restoring (only if routing changed when diff is enabled)
+        diff : True to apply only the differences from current state, False to restore everything
         Returns : True on success
         """
 
+        ts = monotonic()
+        counters = self.zs3_recall_counters
+
         if isinstance(zs3_id, str):
             # Try loading exact match
             try:
@@ -1408,6 +1730,7 @@ class zynthian_state_manager:
         restored_chains = []
         restored_cc_mapping = []
         mute_pause = False
+        routing_changed = False
         if "chains" in zs3_state:
             self.set_busy_details("restoring chains state")
             for chain_id, chain_state in zs3_state["chains"].items():
@@ -1438,56 +1761,52 @@ class zynthian_state_manager:
                 if "midi_chan" in chain_state:
                     if chain.midi_chan is not None and chain.midi_chan != chain_state['midi_chan']:
                         self.chain_manager.set_midi_chan(chain_id, chain_state['midi_chan'])
+                        routing_changed = True
 
                 if chain.zmop_index is not None:
-                    if "note_low" in chain_state:
-                        lib_zyncore.zmop_set_note_low(chain.zmop_index, chain_state["note_low"])
-                    else:
-                        lib_zyncore.zmop_set_note_low(chain.zmop_index, 0)
-                    if "note_high" in chain_state:
-                        lib_zyncore.zmop_set_note_high(chain.zmop_index, chain_state["note_high"])
-                    else:
-                        lib_zyncore.zmop_set_note_high(chain.zmop_index, 127)
-                    if "transpose_octave" in chain_state:
-                        lib_zyncore.zmop_set_transpose_octave(chain.zmop_index, chain_state["transpose_octave"])
-                    else:
-                        lib_zyncore.zmop_set_transpose_octave(chain.zmop_index, 0)
-                    if "transpose_semitone" in chain_state:
-                        lib_zyncore.zmop_set_transpose_semitone(chain.zmop_index, chain_state["transpose_semitone"])
-                    else:
-                        lib_zyncore.zmop_set_transpose_semitone(chain.zmop_index, 0)
-                if "midi_in" in chain_state:
-                    chain.midi_in = chain_state["midi_in"]
-                if "midi_out" in chain_state:
-                    chain.midi_out = chain_state["midi_out"]
-                if "midi_thru" in chain_state:
-                    chain.midi_thru = chain_state["midi_thru"]
-                if "audio_in" in chain_state:
-                    chain.audio_in = chain_state["audio_in"]
-                chain.audio_out = []
+                    for key, default, zmop_get, zmop_set in self.zs3_zmop_params:
+                        value = chain_state.get(key, default)
+                        if diff and zmop_get(chain.zmop_index) == value:
+                            counters["zmop_skipped"] += 1
+                        else:
+                            zmop_set(chain.zmop_index, value)
+                            counters["zmop_set"] += 1
+
+                midi_in = chain_state.get("midi_in", chain.midi_in)
+                midi_out = chain_state.get("midi_out", chain.midi_out)
+                midi_thru = chain_state.get("midi_thru", chain.midi_thru)
+                audio_in = chain_state.get("audio_in", chain.audio_in)
+                audio_out = []
                 if "audio_out" in chain_state:
                     for out in chain_state["audio_out"]:
                         if isinstance(out, list):
-                            chain.audio_out.append(f"{self.chain_manager.processors[out[0]].jackname}:{out[1]}")
+                            audio_out.append(f"{self.chain_manager.processors[out[0]].jackname}:{out[1]}")
                         elif isinstance(out, str) and out.startswith("system:playback_["):
                             # Nasty temporary fix for change of output routing
-                            chain.audio_out.append("^system:playback_1$|^system:playback_2$")
-                        elif out not in chain.audio_out:
-                            chain.audio_out.append(out)
-
-                if "audio_thru" in chain_state:
-                    chain.audio_thru = chain_state["audio_thru"]
-                chain.rebuild_graph()
+                            audio_out.append("^system:playback_1$|^system:playback_2$")
+                        elif out not in audio_out:
+                            audio_out.append(out)
+                audio_thru = chain_state.get("audio_thru", chain.audio_thru)
+
+                if not diff or (midi_in, midi_out, midi_thru, audio_in, audio_out, audio_thru) != \
+                        (chain.midi_in, chain.midi_out, chain.midi_thru, chain.audio_in, chain.audio_out, chain.audio_thru):
+                    chain.midi_in = midi_in
+                    chain.midi_out = midi_out
+                    chain.midi_thru = midi_thru
+                    chain.audio_in = audio_in
+                    chain.audio_out = audio_out
+                    chain.audio_thru = audio_thru
+                    chain.rebuild_graph()
+                    routing_changed = True
+                    counters["chains_rebuilt"] += 1
+                else:
+                    counters["chains_skipped"] += 1
 
                 # Current (right) chain MIDI-learn state
                 if "midi_learn" in chain_state:
-                    for low_key, cfg in chain_state["midi_learn"].items():
-                        low_key = int(low_key)
-                        midi_chan = (low_key >> 8) & 0xff
-                        midi_cc = low_key & 0x7f
-                        for proc_id, symbol in cfg:
-                            if proc_id in self.chain_manager.processors:
-                                restored_cc_mapping.append((proc_id, symbol, midi_chan, midi_cc))
+                    for midi_chan, midi_cc, proc_id, symbol in zynthian_midi_learn_store.parse_state(chain_state["midi_learn"]):
+                        if proc_id in self.chain_manager.processors:
+                            restored_cc_mapping.append((proc_id, symbol, midi_chan, midi_cc))
                 # Legacy (wrong) chain MIDI-learn state
                 elif "midi_cc" in chain_state:
                     for midi_cc, cfg in chain_state["midi_cc"].items():
@@ -1507,7 +1826,17 @@ class zynthian_state_manager:
                     processor = self.chain_manager.processors[int(proc_id)]
                     if processor.chain_id in restored_chains:
                         self.set_busy_details(f"restoring {processor.get_basepath()} state")
-                        processor.set_state(proc_state)
+                        if diff:
+                            nset = processor.set_state_diff(proc_state)
+                        else:
+                            processor.set_state(proc_state)
+                            nset = None
+                        if nset is None:
+                            counters["processors_full"] += 1
+                        else:
+                            counters["processors_diff"] += 1
+                            counters["controllers_set"] += nset
+                            counters["controllers_skipped"] += len(proc_state.get("controllers", {})) - nset
                 except Exception as e:
                     logging.error(f"Failed to restore processor {proc_id} state => {e}")
 
@@ -1529,10 +1858,12 @@ class zynthian_state_manager:
                 restore_flag = True
             if restore_flag:
                 self.set_busy_details("restoring mixer state")
-                self.zynmixer.set_state(zs3_state["mixer"])
+                self.zynmixer.set_state(zs3_state["mixer"], diff=diff)
 
         if "midi_capture" in zs3_state:
             self.set_busy_details("restoring midi capture state")
+            if diff and not routing_changed:
+                routing_changed = self.is_midi_capture_routing_changed(zs3_state['midi_capture'])
             self.set_midi_capture_state(zs3_state['midi_capture'])
 
         if "global" in zs3_state:
@@ -1565,9 +1896,12 @@ class zynthian_state_manager:
             #self.zs3['zs3-0'] = self.zs3[zs3_id].copy()
         zynsigman.send(zynsigman.S_STATE_MAN, self.SS_LOAD_ZS3, zs3_id=zs3_id)
 
-        if autoconnect:
+        if autoconnect and (routing_changed or not diff):
             zynautoconnect.request_midi_connect(True)
             zynautoconnect.request_audio_connect(True)
+
+        counters["recalls"] += 1
+        self.zs3_recall_time.add(monotonic() - ts)
         return True
 
     def get_next_zs3_index(self):
@@ -1657,12 +1991,7 @@ class zynthian_state_manager:
             if chain.audio_thru:
                 chain_state["audio_thru"] = chain.audio_thru
             # Add chain MIDI mapping
-            for key, zctrls in self.chain_manager.chain_midi_cc_binding.items():
-                if chain_id == (key >> 16) & 0xff:
-                    key_low = key & 0xff7f
-                    chain_state["midi_learn"][key_low] = []
-                    for zctrl in zctrls:
-                        chain_state["midi_learn"][key_low].append([zctrl.processor.id, zctrl.symbol])
+            chain_state["midi_learn"].update(self.chain_manager.chain_midi_cc_binding.get_state(chain_id))
             if chain_state:
                 chain_states[chain_id] = chain_state
         if chain_states:
@@ -1930,6 +2259,7 @@ class zynthian_state_manager:
                 "zmip_input_mode": bool(lib_zyncore.zmip_get_flag_active_chain(izmip)),
                 "zmip_system": bool(lib_zyncore.zmip_get_flag_system(izmip)),
                 "zmip_system_rt": bool(lib_zyncore.zmip_get_flag_system_rt(izmip)),
+                "cc_coalesce": izmip in self.cc_coalesce_zmips,
                 "disable_ctrldev": self.ctrldev_manager.get_disabled_driver(uid),
                 "ctrldev_driver": self.ctrldev_manager.get_driver_class_name(izmip),
                 "routed_chains": routed_chains,
@@ -1942,15 +2272,28 @@ class zynthian_state_manager:
             if uid == "AUBIO:in":
                 mcstate[uid]["audio_in"] = self.aubio_in
             # Add global / absolute MIDI mapping
-            for key, zctrls in self.chain_manager.absolute_midi_cc_binding.items():
-                if izmip == (key >> 16) & 0xff:
-                    key_low = key & 0xff7f
-                    mcstate[uid]["midi_learn"][key_low] = []
-                    for zctrl in zctrls:
-                        mcstate[uid]["midi_learn"][key_low].append([zctrl.processor.id, zctrl.symbol])
+            mcstate[uid]["midi_learn"].update(self.chain_manager.absolute_midi_cc_binding.get_state(izmip))
 
         return mcstate
 
+    def is_midi_capture_routing_changed(self, mcstate):
+        """Check if setting a midi capture state changes routing, so autoconnect is needed
+
+        mcstate : dictionary with state
+        Returns : True if audio input of aubio, ctrldev driver or input mode of any device would change
+        """
+
+        current = self.get_midi_capture_state()
+        for uid, state in mcstate.items():
+            try:
+                current_state = current[uid]
+            except KeyError:
+                continue
+            for key in self.MIDI_CAPTURE_ROUTING_KEYS:
+                if key in state and state[key] != current_state.get(key):
+                    return True
+        return False
+
     def set_midi_capture_state(self, mcstate=None):
         """Set midi input (capture) state: flags, chain routing, etc.
 
@@ -1975,6 +2318,7 @@ class zynthian_state_manager:
                     lib_zyncore.zmip_set_flag_system_rt(izmip, bool(state["zmip_system_rt"]))
                 except:
                     pass
+                self.set_midi_cc_coalesce(izmip, state.get("cc_coalesce", False))
                 try:
                     self.aubio_in = state["audio_in"]
                 except:
@@ -2009,26 +2353,23 @@ class zynthian_state_manager:
                     except:
                         midi_learn_state = None
                 if midi_learn_state:
-                    for key_low, cfg in midi_learn_state.items():
-                        key_low = int(key_low)
-                        for proc_id, symbol in cfg:
-                            try:
-                                processor = self.chain_manager.processors[proc_id]
-                            except:
-                                continue
-                            try:
-                                zctrl = processor.controllers_dict[symbol]
-                            except:
-                                logging.warning(f"Can't MIDI learn '{symbol}'. Controller not found in processor {proc_id}.")
-                                continue
-                            chan = (key_low >> 8) & 0xff
-                            cc = key_low & 0x7f
-                            self.chain_manager.add_midi_learn(chan, cc, zctrl, izmip)
+                    for chan, cc, proc_id, symbol in zynthian_midi_learn_store.parse_state(midi_learn_state):
+                        try:
+                            processor = self.chain_manager.processors[proc_id]
+                        except:
+                            continue
+                        try:
+                            zctrl = processor.controllers_dict[symbol]
+                        except:
+                            logging.warning(f"Can't MIDI learn '{symbol}'. Controller not found in processor {proc_id}.")
+                            continue
+                        self.chain_manager.add_midi_learn(chan, cc, zctrl, izmip)
 
             self.ctrldev_manager.set_state_drivers(ctrldev_state_drivers)
 
         else:
             zynautoconnect.reset_midi_in_dev_all()
+            self.cc_coalesce_zmips.clear()
 
     # ------------------------------------------------------------------
     # MIDI learning
@@ -2311,7 +2652,7 @@ class zynthian_state_manager:
             return self.status_midi_player
 
         try:
-            zynsmf.load(self.smf_player, fpath)
+            zynsmf.load(self.smf_player, fpath, zynthian_gui_config.midi_play_preload or -1)
             tempo = libsmf.getTempo(self.smf_player, 0)
             logging.info(f"STARTING MIDI PLAY '{fpath}' => {tempo}BPM")
             self.set_tempo(tempo)
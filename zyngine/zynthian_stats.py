@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+# ****************************************************************************
+# ZYNTHIAN PROJECT: Zynthian Statistics (zynthian_stats)
+#
+# Lightweight runtime statistics (histograms & counters) for profiling
+#
+# Copyright (C) 2015-2024 Fernando Moyano <jofemodo@zynthian.org>
+#
+# ****************************************************************************
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of
+# the License, or any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# For a full copy of the GNU General Public License see the LICENSE.txt file.
+#
+# ****************************************************************************
+
+from bisect import bisect_left
+from threading import Lock
+
+# ----------------------------------------------------------------------------
+# Histogram Class
+# ----------------------------------------------------------------------------
+
+# Default bucket upper limits (in seconds) for latency histograms
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1)
+
+
+class zynthian_histogram:
+
+    def __init__(self, name, buckets=LATENCY_BUCKETS):
+        """ Create a histogram
+
+        name - Histogram name, used in reports
+        buckets - Ordered list of bucket upper limits. An extra overflow bucket is added.
+        """
+
+        self.name = name
+        self.buckets = tuple(buckets)
+        self.lock = Lock()
+        self.reset()
+
+    def reset(self):
+        """Clear all collected data"""
+
+        with self.lock:
+            self.counts = [0] * (len(self.buckets) + 1)
+            self.count = 0
+            self.total = 0.0
+            self.min = None
+            self.max = None
+
+    def add(self, value):
+        """Add a sample to the histogram
+
+        value - Sample value (seconds for latency histograms)
+        """
+
+        with self.lock:
+            self.counts[bisect_left(self.buckets, value)] += 1
+            self.count += 1
+            self.total += value
+            if self.min is None or value < self.min:
+                self.min = value
+            if self.max is None or value > self.max:
+                self.max = value
+
+    def get_mean(self):
+        if self.count:
+            return self.total / self.count
+        return 0.0
+
+    def get_state(self):
+        """Get a dictionary with the histogram data"""
+
+        with self.lock:
+            return {
+                "name": self.name,
+                "buckets": list(self.buckets),
+                "counts": list(self.counts),
+                "count": self.count,
+                "mean": self.get_mean(),
+                "min": self.min,
+                "max": self.max
+            }
+
+    def get_report(self, scale=1000, unit="ms"):
+        """Get a human readable report
+
+        scale - Factor applied to values (default 1000 => seconds to milliseconds)
+        unit - Unit name shown in report
+        """
+
+        state = self.get_state()
+        lines = [f"{self.name}: {state['count']} samples"]
+        if state["count"]:
+            lines[0] += f", mean={state['mean'] * scale:.3f}{unit}, min={state['min'] * scale:.3f}{unit}, max={state['max'] * scale:.3f}{unit}"
+        lower = 0
+        for i, n in enumerate(state["counts"]):
+            if i < len(self.buckets):
+                label = f"{lower * scale:g}-{self.buckets[i] * scale:g}{unit}"
+                lower = self.buckets[i]
+            else:
+                label = f">{lower * scale:g}{unit}"
+            if state["count"]:
+                lines.append(f"  {label:>16}: {n:8d} {100 * n / state['count']:6.2f}%")
+            else:
+                lines.append(f"  {label:>16}: {n:8d}")
+        return "\n".join(lines)
+
+# ---------------------------------------------------------------------------
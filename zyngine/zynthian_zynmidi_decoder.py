@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+# ****************************************************************************
+# ZYNTHIAN PROJECT: Zynthian zynmidi buffer decoder (zynthian_zynmidi_decoder)
+#
+# Decode the zynmidi event buffer filled by lib_zyncore
+#
+# Copyright (C) 2015-2024 Fernando Moyano <jofemodo@zynthian.org>
+#
+# ****************************************************************************
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of
+# the License, or any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# For a full copy of the GNU General Public License see the LICENSE.txt file.
+#
+# ****************************************************************************
+#
+# Each zynmidi event is a uint32 => izmip (MSB), status, data1, data2 (LSB).
+# SysEx messages continue in the following uint32 words, as raw data, until 0xF7.
+#
+# ****************************************************************************
+
+import sys
+import ctypes
+import logging
+
+# ----------------------------------------------------------------------------
+# Decoded item types
+# ----------------------------------------------------------------------------
+
+ZYNMIDI_EVENT = 0   # (ZYNMIDI_EVENT, izmip, ev) => ev is bytes with the full MIDI message
+ZYNMIDI_CC_RUN = 1  # (ZYNMIDI_CC_RUN, [(izmip, chan, ccnum, ccval), ...]) => consecutive regular CCs
+
+# System realtime messages dropped in bulk: clock, tick & active sense
+ZYNMIDI_DROP_STATUS = b'\xf8\xf9\xfe'
+
+# Byte offsets of each column inside a uint32 word, as stored in memory
+if sys.byteorder == "little":
+    _COL_OFFSETS = (3, 2, 1, 0)
+else:
+    _COL_OFFSETS = (0, 1, 2, 3)
+
+# ----------------------------------------------------------------------------
+# Decoder functions
+# ----------------------------------------------------------------------------
+
+
+def split_zynmidi_buffer(midi_events, n):
+    """Split zynmidi buffer into columns in a single pass
+
+    midi_events - ctypes uint32 array
+    n - Number of events in array
+    Returns tuple of bytes (izmip, status, data1, data2)
+    """
+
+    raw = ctypes.string_at(midi_events, n * 4)
+    return tuple(raw[offset::4] for offset in _COL_OFFSETS)
+
+
+def decode_zynmidi_buffer_seq(midi_events, n):
+    """Decode zynmidi buffer event by event, assembling SysEx messages
+
+    midi_events - ctypes uint32 array
+    n - Number of events in array
+    Returns list of (izmip, ev) tuples
+    """
+
+    events = []
+    i = 0
+    while i < n:
+        ev = midi_events[i].to_bytes(4, 'big')
+        i += 1
+        izmip = ev[0]
+        evhead = ev[1]
+        ev = ev[1:]
+
+        # Process SysEx
+        if evhead == 0xF0:
+            sysex_data = bytearray(ev)
+            while i < n:
+                chunk = midi_events[i].to_bytes(4, 'big')
+                sysex_data.extend(chunk)
+                if 0xF7 in chunk:
+                    break
+                i += 1
+            # This is probably not correct and we should continue reading in the next period
+            if i == n:
+                logging.error(f"SysEx message from device {izmip} is not terminated")
+                continue
+            # Crop data until find the 0xF7 mark
+            while sysex_data[-1] != 0xF7:
+                del sysex_data[-1]
+            ev = bytes(sysex_data)
+
+        events.append((izmip, ev))
+    return events
+
+
+def decode_zynmidi_buffer(midi_events, n, driver_zmips=(), master_chan=-1):
+    """Decode zynmidi buffer, pre-classifying events
+
+    Clock, tick & active sense from devices without control driver are dropped.
+    Consecutive regular CCs (not master channel, not channel mode) from devices
+    without control driver are grouped in runs.
+
+    midi_events - ctypes uint32 array
+    n - Number of events in array
+    driver_zmips - Collection of zmip indexes handled by a control device driver
+    master_chan - Master MIDI channel (-1 if disabled)
+    Returns tuple (items, clock) => items is a list of ZYNMIDI_EVENT / ZYNMIDI_CC_RUN tuples,
+        clock is True if MIDI clock was dropped.
+    """
+
+    izmips, status, data1, data2 = split_zynmidi_buffer(midi_events, n)
+    clock = False
+    items = []
+
+    # SysEx spans several words => decode sequentially. It's rare, so not worth optimizing.
+    if 0xF0 in status:
+        for izmip, ev in decode_zynmidi_buffer_seq(midi_events, n):
+            if izmip not in driver_zmips and ev[0] in ZYNMIDI_DROP_STATUS:
+                if ev[0] == 0xF8:
+                    clock = True
+                continue
+            items.append((ZYNMIDI_EVENT, izmip, ev))
+        return items, clock
+
+    # Check dropped messages in bulk
+    if len(status.translate(None, ZYNMIDI_DROP_STATUS)) < n:
+        drop = ZYNMIDI_DROP_STATUS
+    else:
+        drop = b''
+
+    run = None
+    for izmip, evhead, d1, d2 in zip(izmips, status, data1, data2):
+        if izmip in driver_zmips:
+            run = None
+            items.append((ZYNMIDI_EVENT, izmip, bytes((evhead, d1, d2))))
+        elif evhead in drop:
+            if evhead == 0xF8:
+                clock = True
+        elif (evhead & 0xF0) == 0xB0 and (evhead & 0x0F) != master_chan and (d1 & 0x7F) < 120:
+            if run is None:
+                run = []
+                items.append((ZYNMIDI_CC_RUN, run))
+            run.append((izmip, evhead & 0x0F, d1 & 0x7F, d2 & 0x7F))
+        else:
+            run = None
+            items.append((ZYNMIDI_EVENT, izmip, bytes((evhead, d1, d2))))
+
+    return items, clock
+
+# ---------------------------------------------------------------------------
@@ -374,6 +374,7 @@ def set_midi_config():
     global midi_usb_by_port, transport_clock_source, midi_filter_rules
     global midi_network_enabled, midi_rtpmidi_enabled, midi_netump_enabled
     global midi_touchosc_enabled, bluetooth_enabled, ble_controller, midi_aubionotes_enabled
+    global midi_zynmidi_poll
 
     # MIDI options
     midi_fine_tuning = float(os.environ.get('ZYNTHIAN_MIDI_FINE_TUNING', "440.0"))
@@ -389,6 +390,8 @@ def set_midi_config():
     ble_controller = os.environ.get('ZYNTHIAN_MIDI_BLE_CONTROLLER', "")
     midi_aubionotes_enabled = get_env_int('ZYNTHIAN_MIDI_AUBIONOTES_ENABLED', 0)
     transport_clock_source = get_env_int('ZYNTHIAN_MIDI_TRANSPORT_CLOCK_SOURCE', 0)
+    # Force polling zynmidi buffer, even if lib_zyncore supports eventfd wakeup
+    midi_zynmidi_poll = get_env_int('ZYNTHIAN_MIDI_ZYNMIDI_POLL', 0)
 
     # Filter Rules
     midi_filter_rules = os.environ.get('ZYNTHIAN_MIDI_FILTER_RULES', "")
@@ -621,6 +624,35 @@ hotplug_audio_enabled = bool(get_env_int('ZYNTHIAN_HOTPLUG_AUDIO', 0))
 disabled_audio_in = os.environ.get('ZYNTHIAN_HOTPLUG_AUDIO_DISABLED_IN', "").split(',')
 disabled_audio_out = os.environ.get('ZYNTHIAN_HOTPLUG_AUDIO_DISABLED_OUT', 'headphones,b1,b2').split(',')
 
+# ------------------------------------------------------------------------------
+# Autoconnect Options
+# ------------------------------------------------------------------------------
+
+# Window to merge autoconnect requests (milliseconds)
+autoconnect_merge_ms = get_env_int('ZYNTHIAN_AUTOCONNECT_MERGE_MS', 50)
+# Period to check hardware ports when hot-plug notification is not available (seconds)
+autoconnect_poll_secs = get_env_int('ZYNTHIAN_AUTOCONNECT_POLL_SECS', 2)
+
+# ------------------------------------------------------------------------------
+# Engine Options
+# ------------------------------------------------------------------------------
+
+# Max number of engines started concurrently when loading snapshots (0 to start them one by one)
+engine_start_jobs = get_env_int('ZYNTHIAN_ENGINE_START_JOBS', 4)
+# Save step sequencer data of snapshots in sidecar files (<snapshot>.zss.zynseq) instead of base64 inside the snapshot
+# Snapshots saved this way must be copied to other devices together with their sidecar files.
+snapshot_zynseq_sidecar = get_env_int('ZYNTHIAN_SNAPSHOT_ZYNSEQ_SIDECAR', 0)
+# Offer binary IPC protocol to jalv (text protocol is used if jalv doesn't support it)
+jalv_binary_ipc = get_env_int('ZYNTHIAN_JALV_BINARY_IPC', 1)
+# Warm up the bank & preset index of file-based engines in background at startup
+preset_index_warmup = get_env_int('ZYNTHIAN_PRESET_INDEX_WARMUP', 1)
+# Max number of bank & preset directories watched for changes with inotify
+preset_index_max_watches = get_env_int('ZYNTHIAN_PRESET_INDEX_MAX_WATCHES', 8192)
+# Max number of bank subdirectories scanned concurrently when getting preset lists
+preset_scan_jobs = get_env_int('ZYNTHIAN_PRESET_SCAN_JOBS', 4)
+# Max number of GIG files parsed concurrently to get their instrument lists
+gig_scan_jobs = get_env_int('ZYNTHIAN_GIG_SCAN_JOBS', 2)
+
 # ------------------------------------------------------------------------------
 # Networking Options
 # ------------------------------------------------------------------------------
@@ -632,6 +664,8 @@ vncserver_enabled = get_env_int('ZYNTHIAN_VNCSERVER_ENABLED', 0)
 # ------------------------------------------------------------------------------
 
 midi_play_loop = get_env_int('ZYNTHIAN_MIDI_PLAY_LOOP', 0)
+# Seconds of MIDI file loaded before starting playback. The rest is loaded in background. 0 to load whole file first.
+midi_play_preload = get_env_int('ZYNTHIAN_MIDI_PLAY_PRELOAD', 10)
 audio_play_loop = get_env_int('ZYNTHIAN_AUDIO_PLAY_LOOP', 0)
 
 # ------------------------------------------------------------------------------
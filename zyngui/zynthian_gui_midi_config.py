@@ -376,6 +376,12 @@ class zynthian_gui_midi_config(zynthian_gui_selector_info):
                     title = f"\u2610 {ZMIP_MODE_SYS_RT} Transport"
                     options[title] = ["SYSTEM_RT/ON", [mode_info, "midi_input.png"]]
 
+                mode_info = "Coalesce absolute CC messages from this device. Only the last value of each CC is processed when several values are received at once. Relative CCs are not affected.\n\n"
+                if self.zyngui.state_manager.get_midi_cc_coalesce(idev):
+                    options["\u2612 Coalesce CC"] = ["CC_COALESCE/OFF", [mode_info, "midi_input.png"]]
+                else:
+                    options["\u2610 Coalesce CC"] = ["CC_COALESCE/ON", [mode_info, "midi_input.png"]]
+
                 # Reload drivers => Hot reload the driver classes!
                 #self.zyngui.state_manager.ctrldev_manager.update_available_drivers(reload_modules=False)
                 # Get driver list for the device (dev_id) connected to this slot (idev)
@@ -460,6 +466,10 @@ class zynthian_gui_midi_config(zynthian_gui_selector_info):
                             lib_zyncore.zmip_set_flag_system_rt(idev, True)
                         case "SYSTEM_RT/OFF":
                             lib_zyncore.zmip_set_flag_system_rt(idev, False)
+                        case "CC_COALESCE/ON":
+                            self.zyngui.state_manager.set_midi_cc_coalesce(idev, True)
+                        case "CC_COALESCE/OFF":
+                            self.zyngui.state_manager.set_midi_cc_coalesce(idev, False)
                         case "ACTI":
                             lib_zyncore.zmip_set_flag_active_chain(idev, True)
                             zynautoconnect.update_midi_in_dev_mode(idev)
@@ -974,8 +974,9 @@ class zynthian_gui_mixer(zynthian_gui_base.zynthian_gui_base):
                 zynsigman.S_AUDIO_RECORDER, zynthian_audio_recorder.SS_AUDIO_RECORDER_STATE, self.update_control_rec)
             zynsigman.register_queued(
                 zynsigman.S_AUDIO_PLAYER, zynthian_engine_audioplayer.SS_AUDIO_PLAYER_STATE, self.update_control_play)
+            # Only last value of each pedal is shown => Skip superseded CCs
             zynsigman.register_queued(
-                zynsigman.S_MIDI, zynsigman.SS_MIDI_CC, self.midi_cc_cb)
+                zynsigman.S_MIDI, zynsigman.SS_MIDI_CC, self.midi_cc_cb, coalesce=True)
             zynsigman.register_queued(
                 zynsigman.S_MIDI, zynsigman.SS_MIDI_PC, self.midi_pc_cb)
             zynsigman.register_queued(
@@ -83,6 +83,9 @@ EDIT_PARAM_LAST = 7  # Index of last parameter
 SHOW_NOTES = 0 # Display note events
 SHOW_CC = 1 # Display CC events
 
+MIDI_NOTE_ON = 0x90  # Command of note events in patterns
+MIDI_CONTROL = 0xB0  # Command of CC events in patterns
+
 # List of permissible steps per beat
 STEPS_PER_BEAT = [1, 2, 3, 4, 6, 8, 12, 24]
 INPUT_CHANNEL_LABELS = ['OFF', 'ANY', '1', '2', '3', '4', '5',
@@ -186,6 +189,7 @@ class zynthian_gui_patterneditor(zynthian_gui_base.zynthian_gui_base):
         self.keymap = []
         self.reload_keymap = False  # Signal keymap needs reloading
         self.cells = []  # Array of cells indices
+        self.cells_drawn = []  # Array of (fill, coords, tags) of drawn cells, to skip unchanged ones
         # What to redraw: 0=nothing, 1=selected cell, 2=selected row, 3=refresh grid, 4=rebuild grid
         self.redraw_pending = 4
         self.rows_pending = Queue()
@@ -1288,13 +1292,32 @@ class zynthian_gui_patterneditor(zynthian_gui_base.zynthian_gui_base):
         self.select_cell(step, row)
         return True
 
+    # Function to get a snapshot of the pattern cells shown in current display mode
+    # return: Dictionary of (value, duration, offset) indexed by (step, note)
+    def get_pattern_cells(self):
+        # Flush modified flag to avoid refresh redrawing whole grid => Is this OK?
+        self.zynseq.libseq.isPatternModified()
+        if self.display_mode == SHOW_CC:
+            command = MIDI_CONTROL
+        else:
+            command = MIDI_NOTE_ON
+        cells = {}
+        for ev in self.zynseq.get_pattern_events():
+            if ev.command == command:
+                # Only first event of each step & note is shown
+                cells.setdefault((ev.step, ev.value1start), (ev.value2start, ev.duration, ev.offset))
+        return cells
+
     # Function to draw a grid row
     # row: Row number (keymap index)
     # colour: Black, white or None (default) to not care
-    def draw_row(self, row, white=None):
+    # pattern_cells: Snapshot of pattern cells or None to get it
+    def draw_row(self, row, white=None, pattern_cells=None):
         self.grid_canvas.itemconfig(f"lastnotetext{row}", state="hidden")
+        if pattern_cells is None:
+            pattern_cells = self.get_pattern_cells()
         for step in range(self.n_steps):
-            self.draw_cell(step, row, white)
+            self.draw_cell(step, row, white, pattern_cells)
 
     # Function to get cell coordinates
     # col: Column number (step)
@@ -1313,13 +1336,14 @@ class zynthian_gui_patterneditor(zynthian_gui_base.zynthian_gui_base):
     # step: Step (column) index
     # row: Index of row
     # white: True for white notes
-    def draw_cell(self, step, row, white=None):
-        # Flush modified flag to avoid refresh redrawing whole grid => Is this OK?
-        self.zynseq.libseq.isPatternModified()
+    # pattern_cells: Snapshot of pattern cells or None to get it
+    def draw_cell(self, step, row, white=None, pattern_cells=None):
         # Cells are stored in array sequentially: 1st row, 2nd row...
         cellIndex = row * self.n_steps + step
         if cellIndex >= len(self.cells):
             return
+        if pattern_cells is None:
+            pattern_cells = self.get_pattern_cells()
         note = self.keymap[row]["note"]
         cell = self.cells[cellIndex]
         if white is None:
@@ -1328,25 +1352,16 @@ class zynthian_gui_patterneditor(zynthian_gui_base.zynthian_gui_base):
             else:
                 white = True
 
-        if self.display_mode == SHOW_CC:
-            velocity_colour = self.zynseq.libseq.getControlValue(step, note)
-            if velocity_colour == 255:
-                self.grid_canvas.delete(cell)
-                self.cells[cellIndex] = None
-                return
-            velocity_colour += 70
-            duration = self.zynseq.libseq.getControlDuration(step, note)
-            offset = self.zynseq.libseq.getControlOffset(step, note)
-        else:
-            velocity_colour = self.zynseq.libseq.getNoteVelocity(step, note)
-            if 0 < velocity_colour < 128:
-                velocity_colour += 70
-                duration = self.zynseq.libseq.getNoteDuration(step, note)
-                offset = self.zynseq.libseq.getNoteOffset(step, note)
-            else:
+        value = pattern_cells.get((step, note))
+        if value is None or (self.display_mode != SHOW_CC and not 0 < value[0] < 128):
+            if cell:
                 self.grid_canvas.delete(cell)
                 self.cells[cellIndex] = None
-                return
+                self.cells_drawn[cellIndex] = None
+            return
+        velocity_colour = value[0] + 70
+        duration = value[1]
+        offset = value[2]
 
         fill_colour = f"#{velocity_colour:02x}{velocity_colour:02x}{velocity_colour:02x}"
         coord = self.get_cell(step, row, duration, offset)
@@ -1357,14 +1372,18 @@ class zynthian_gui_patterneditor(zynthian_gui_base.zynthian_gui_base):
             cell_tags = ("%d,%d" % (step, row), "gridcell", "step%d" % step)
 
         if cell:
-            # Update existing cell
-            self.grid_canvas.itemconfig(cell, fill=fill_colour, tags=cell_tags)
-            self.grid_canvas.coords(cell, coord)
+            # Update existing cell, only if changed
+            drawn = (fill_colour, coord, cell_tags)
+            if self.cells_drawn[cellIndex] != drawn:
+                self.grid_canvas.itemconfig(cell, fill=fill_colour, tags=cell_tags)
+                self.grid_canvas.coords(cell, coord)
+                self.cells_drawn[cellIndex] = drawn
         else:
             # Create new cell
             cell = self.grid_canvas.create_rectangle(
                 coord, fill=fill_colour, width=0, tags=cell_tags)
             self.cells[cellIndex] = cell
+            self.cells_drawn[cellIndex] = (fill_colour, coord, cell_tags)
 
         if step + duration > self.n_steps:
             self.grid_canvas.itemconfig(
@@ -1387,6 +1406,7 @@ class zynthian_gui_patterneditor(zynthian_gui_base.zynthian_gui_base):
             self.grid_canvas.delete(tkinter.ALL)
             self.draw_pianoroll()
             self.cells = [None] * len(self.keymap) * self.n_steps
+            self.cells_drawn = [None] * len(self.keymap) * self.n_steps
             self.play_canvas.coords("playCursor", 1 + self.playhead * self.step_width,
                                     0, 1 + self.step_width * (self.playhead + 1), PLAYHEAD_HEIGHT)
 
@@ -1435,6 +1455,8 @@ class zynthian_gui_patterneditor(zynthian_gui_base.zynthian_gui_base):
                 row_min = self.selected_cell[1]
                 row_max = self.selected_cell[1]
 
+            # Get all pattern events at once
+            pattern_cells = self.get_pattern_cells()
             for row in range(row_min, row_max):
                 # Create last note labels in grid
                 self.grid_canvas.create_text(self.total_width - self.select_thickness, int(self.row_height * (
@@ -1470,7 +1492,7 @@ class zynthian_gui_patterneditor(zynthian_gui_base.zynthian_gui_base):
                     self.grid_canvas.create_line(
                         0, ypos, self.total_width, ypos, fill=GRID_LINE_WEAK, tags="gridline")
                 # Draw row of note cells
-                self.draw_row(row, (colour == "white"))
+                self.draw_row(row, (colour == "white"), pattern_cells)
 
         # Set z-order to allow duration to show
         if redraw_pending > 2:
@@ -1840,8 +1862,10 @@ class zynthian_gui_patterneditor(zynthian_gui_base.zynthian_gui_base):
             pending_rows = set()
             while not self.rows_pending.empty():
                 pending_rows.add(self.rows_pending.get_nowait())
-            while len(pending_rows):
-                self.draw_row(pending_rows.pop(), None)
+            if pending_rows:
+                pattern_cells = self.get_pattern_cells()
+                while len(pending_rows):
+                    self.draw_row(pending_rows.pop(), None, pattern_cells)
         self.save_pattern_snapshot(now=False, force=False)
 
     # Function to handle MIDI notes (only used to refresh screen - actual MIDI input handled by lib)
@@ -23,11 +23,14 @@
 #
 # ******************************************************************************
 
+import os
 import copy
 import logging
 
 # Zynthian specific modules
 from zyngui import zynthian_gui_config
+from zyngine.zynthian_engine import zynthian_engine
+from zyngine.zynthian_signal_manager import zynsigman
 from zyngui.zynthian_gui_selector_info import zynthian_gui_selector_info
 from zyngui.zynthian_gui_save_preset import zynthian_gui_save_preset
 
@@ -54,11 +57,32 @@ class zynthian_gui_preset(zynthian_gui_selector_info, zynthian_gui_save_preset):
 
     def build_view(self):
         self.processor = self.zyngui.get_current_processor()
-        if self.processor:
-            return super().build_view()
+        if self.processor and super().build_view():
+            zynsigman.register_queued(zynsigman.S_CHAIN, zynthian_engine.SS_PRESET_LIST, self.cb_preset_list)
+            return True
         else:
             return False
 
+    def hide(self):
+        if self.shown:
+            zynsigman.unregister(zynsigman.S_CHAIN, zynthian_engine.SS_PRESET_LIST, self.cb_preset_list)
+            super().hide()
+
+    def cb_preset_list(self, bank_dpaths):
+        # Refresh list if current bank's presets changed in background, keeping the selected preset
+        if not self.shown or not self.processor or not self.processor.bank_info:
+            return
+        if os.path.normpath(self.processor.bank_info[0]) not in bank_dpaths:
+            return
+        preset_id = None
+        if 0 <= self.index < len(self.list_data):
+            preset_id = self.list_data[self.index][0]
+        self.update_list()
+        for i, row in enumerate(self.list_data):
+            if row[0] == preset_id:
+                self.select(i)
+                break
+
     def show(self):
         if len(self.list_data) > 0:
             super().show()
@@ -394,7 +394,7 @@ class zynthian_gui_snapshot(zynthian_gui_selector_info):
 
     def do_rename(self, data):
         try:
-            os.rename(data[0], data[1])
+            self.sm.move_snapshot(data[0], data[1])
             self.update_list()
         except Exception as e:
             logging.warning(f"Failed to rename snapshot '{data[0]}' to '{data[1]}' => {e}")
@@ -451,9 +451,9 @@ class zynthian_gui_snapshot(zynthian_gui_selector_info):
             return
         files_to_change.sort(reverse=True)
         for files in files_to_change:
-            os.rename(files[0], files[1])
+            self.sm.move_snapshot(files[0], files[1])
 
-        os.rename(fpath, dfpath)
+        self.sm.move_snapshot(fpath, dfpath)
         parts = self.get_parts_from_path(dfpath)
 
         self.zyngui.close_screen()
@@ -475,7 +475,7 @@ class zynthian_gui_snapshot(zynthian_gui_selector_info):
     def delete_confirmed(self, fpath):
         logging.info("DELETE SNAPSHOT: {}".format(fpath))
         try:
-            os.remove(fpath)
+            self.sm.delete_snapshot(fpath)
             self.update_list()
         except Exception as e:
             logging.error(e)
@@ -25,6 +25,7 @@
 
 import logging
 import tkinter
+import numpy
 import soundfile
 import traceback
 from math import modf
@@ -33,6 +34,7 @@ from threading import Thread
 
 # Zynthian specific modules
 from zynlibs.zynaudioplayer import *
+from zyngine.zynthian_audio_peaks import get_peaks
 from zyngui import zynthian_gui_config
 from zyngui import zynthian_widget_base
 from zyngui import zynthian_gui_config
@@ -69,6 +71,7 @@ class zynthian_widget_audioplayer(zynthian_widget_base.zynthian_widget_base):
         self.offset = 0  # Frames from start of file that waveform display starts
         self.channels = 0  # Quantity of channels in audio
         self.frames = 0  # Quantity of frames in audio
+        self.peaks = None  # Peak pyramid of audio
         self.info = None
         self.images = []
         self.waveform_height = 1  # ratio of height for y offset of zoom overview display
@@ -413,7 +416,9 @@ class zynthian_widget_audioplayer(zynthian_widget_base.zynthian_widget_base):
             self.widget_canvas.delete("waveform")
             self.widget_canvas.itemconfig("overlay", state=tkinter.HIDDEN)
             self.widget_canvas.itemconfig(self.loading_text, text="Creating waveform...")
+            self.peaks = None
             self.sf = soundfile.SoundFile(self.filename)
+            self.peaks = get_peaks(self.filename)
             self.channels = self.sf.channels
             self.samplerate = self.sf.samplerate
             self.frames = self.sf.seek(0, soundfile.SEEK_END)
@@ -461,69 +466,30 @@ class zynthian_widget_audioplayer(zynthian_widget_base.zynthian_widget_base):
         if not self.channels:
             self.widget_canvas.itemconfig(self.loading_text, text="No audio in file")
             return
+        if self.peaks is None:
+            return
         start = max(0, start)
         start = min(self.frames, start)
         length = min(self.frames - start, length)
-        steps_per_peak = 16
-        data = [[] for i in range(self.channels)]
-        large_file = self.frames * self.channels > 24000000
-
-        y0 = self.waveform_height // self.channels
-        y_offsets = []
-        for i in range(self.channels):
-            y_offsets.append(y0 * (i + 0.5))
-        y0 //= 2
-
-        if large_file:
-            frames_per_pixel = length // self.width
-            # Limit read blocks for larger files
-            block_size = min(frames_per_pixel, 1024)
-            offset1 = 0
-            offset2 = block_size
-            step = max(1, block_size // steps_per_peak)
-        else:
-            self.sf.seek(start)
-            a_data = self.sf.read(length, always_2d=True)
-            frames_per_pixel = len(a_data) // self.width
-            step = max(1, frames_per_pixel // steps_per_peak)
-            # Limit read blocks for larger files
-            block_size = min(frames_per_pixel, 1024)
-
-        if frames_per_pixel < 1:
+        if length // self.width < 1:
             self.refresh_waveform = False
             self.widget_canvas.itemconfig(self.loading_text, text="Audio too short")
             return
 
-        v1 = [0.0 for i in range(self.channels)]
-        v2 = [0.0 for i in range(self.channels)]
+        y0 = self.waveform_height // self.channels
+        y_offsets = numpy.array([y0 * (i + 0.5) for i in range(self.channels)])
+        y0 //= 2
 
-        for x in range(self.width):
-            # For each x-axis pixel
-            if large_file:
-                self.sf.seek(start + x * frames_per_pixel)
-                a_data = self.sf.read(block_size, always_2d=True)
-                if len(a_data) == 0:
-                    break
-            else:
-                offset1 = x * frames_per_pixel
-                offset2 = offset1 + frames_per_pixel
-            for channel in range(self.channels):
-                # For each audio channel
-                v1[0:] = [0.0] * self.channels
-                v2[0:] = [0.0] * self.channels
-                for frame in range(offset1, offset2, step):
-                    # Find peak audio within block of audio represented by this x-axis pixel
-                    av = a_data[frame][channel] * self.v_zoom
-                    if av < v1[channel]:
-                        v1[channel] = av
-                    if av > v2[channel]:
-                        v2[channel] = av
-                data[channel] += (x, y_offsets[channel] + int(v1[channel] * y0),
-                                  x, y_offsets[channel] + int(v2[channel] * y0))
+        # Find peak audio within block of audio represented by each x-axis pixel
+        mins, maxs = self.peaks.get_pixels(start, length, self.width, self.sf)
+        mins = y_offsets + (numpy.minimum(mins * self.v_zoom, 0.0) * y0).astype(int)
+        maxs = y_offsets + (numpy.maximum(maxs * self.v_zoom, 0.0) * y0).astype(int)
+        xs = numpy.arange(len(mins))
 
         for chan in range(self.channels):
             # Plot each point on the graph as series of vertical lines spanning max and min peaks of audio represented by each x-axis pixel
-            self.widget_canvas.coords(f"waveform{chan}", data[chan])
+            data = numpy.column_stack((xs, mins[:, chan], xs, maxs[:, chan])).ravel()
+            self.widget_canvas.coords(f"waveform{chan}", data.tolist())
         self.widget_canvas.tag_lower(self.loading_text)
         self.widget_canvas.tag_raise("overlay")
 
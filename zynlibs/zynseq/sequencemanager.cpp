@@ -122,6 +122,13 @@ Sequence* SequenceManager::getSequence(uint8_t bank, uint8_t sequence) {
     return m_mBanks[bank][sequence];
 }
 
+Sequence* SequenceManager::findSequence(uint8_t bank, uint8_t sequence) {
+    auto it = m_mBanks.find(bank);
+    if (it == m_mBanks.end() || sequence >= it->second.size())
+        return NULL;
+    return it->second[sequence];
+}
+
 bool SequenceManager::addPattern(uint8_t bank, uint8_t sequence, uint32_t track, uint32_t position, uint32_t pattern, bool force) {
     Sequence* pSequence = getSequence(bank, sequence);
     Track* pTrack       = pSequence->getTrack(track);
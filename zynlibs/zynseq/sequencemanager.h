@@ -93,6 +93,14 @@ class SequenceManager {
      */
     Sequence* getSequence(uint8_t bank, uint8_t sequence);
 
+    /** @brief  Get pointer to existing sequence
+     *   @param  bank Index of bank containing sequence
+     *   @param  sequence Index of sequence within bank
+     *   @retval Sequence* Pointer to sequence or NULL if not existing
+     *   @note   Doesn't allocate memory, so it may be called from JACK process thread
+     */
+    Sequence* findSequence(uint8_t bank, uint8_t sequence);
+
     /** @brief  Add pattern to sequence
      *   @param  bank Index of bank
      *   @param  sequence Index of sequence
@@ -163,6 +163,20 @@ class TestLibZynSeq(unittest.TestCase):
         self.assertTrue(libseq.isPatternModified())
         self.assertFalse(libseq.isPatternModified())
 
+    def test_ac11_get_pattern_events(self):
+        libseq.selectPattern(999)
+        libseq.clear()
+        libseq.addNote(0, 60, 100, 4, 0)
+        libseq.addNote(2, 62, 90, 1, 0)
+        events = (zynseq.PatternEvent * 1)()
+        self.assertEqual(libseq.getPatternEvents(events, 0), 2)
+        self.assertEqual(libseq.getPatternEvents(events, 1), 2)
+        self.assertEqual(events[0].value1start, 60)
+        events = (zynseq.PatternEvent * 4)()
+        self.assertEqual(libseq.getPatternEvents(events, 4), 2)
+        self.assertEqual([(ev.step, ev.command, ev.value1start, ev.value2start) for ev in events[:2]],
+                         [(0, 0x90, 60, 100), (2, 0x90, 62, 90)])
+
     # Trigger tests
     def test_ad00_trigger_channel(self):
         self.assertEqual(libseq.getTriggerChannel(), 0xFF)
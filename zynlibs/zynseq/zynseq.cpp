@@ -23,6 +23,7 @@
  * ******************************************************************
  */
 
+#include <atomic>  // provides atomic indexes of state notification ring
 #include <cstring> // provides strcmp
 #include <queue>
 #include <set>
@@ -33,6 +34,8 @@
 #include <jack/midiport.h> // provides JACK MIDI interface
 #include <stdio.h>         // provides printf
 #include <stdlib.h>        // provides exit
+#include <sys/eventfd.h>   // provides eventfd for state notification wakeup
+#include <unistd.h>        // provides write
 #include <thread>          // provides thread for timer
 
 #include "metronome.h"       // metronome wav data
@@ -76,6 +79,19 @@ bool g_bMidiRecord    = false;                      // True to add notes to curr
 uint8_t g_nSustainValue = 0;                        // Last sustain pedal value during note input (recording)
 uint32_t g_nSustainStart = 0;						// Step when sustain pedal was last pressed
 
+// State notifications are pushed by the JACK process thread into a single producer, single consumer, lock-free ring
+#define NOTIFY_RING_SIZE 512                            // Must be a power of 2
+SEQ_NOTIFY g_aNotifyRing[NOTIFY_RING_SIZE];             // Ring of pending state notifications
+std::atomic<uint32_t> g_nNotifyWrite(0);                // Index of next notification to write (only written by JACK process thread)
+std::atomic<uint32_t> g_nNotifyRead(0);                 // Index of next notification to read (only written by consumer)
+std::atomic<bool> g_bNotifyOverflow(false);             // True if notifications were lost because ring was full
+std::atomic<int> g_nNotifyFd(-1);                       // eventfd used to wake consumer (-1 if notifications disabled)
+uint8_t g_nNotifyBank        = 0;                       // Bank to monitor for state changes (0 for none)
+uint8_t g_nNotifySequences   = 0;                       // Quantity of sequences to monitor in bank
+uint8_t g_aNotifyProgress[256];                         // Last notified progress of each monitored sequence (0xFF if not notified)
+std::atomic<uint8_t> g_nNotifySuspend(0);               // Quantity of API calls adding or removing sequences (notifications are not checked)
+std::atomic<bool> g_bNotifyBusy(false);                 // True while JACK process thread checks sequences for notifications or signals eventfd
+
 char g_sName[16];                             // Buffer to hold sequence name so that it can be sent back for Python to parse
 uint8_t g_nInputRest                  = 0xFF; // MIDI note number that creates rest in pattern
 uint16_t g_nVerticalZoom              = 16;   // Quantity of rows to show in pattern and arranger view
@@ -322,6 +338,74 @@ void onJackTimebase(jack_transport_state_t nState, jack_nframes_t nFramesInPerio
     For each event, add MIDI events to the output buffer at appropriate sample sequence
     Remove events from schedule
 */
+// Push a state notification into ring => false if ring is full
+bool pushNotify(uint8_t type, uint8_t bank, uint8_t sequence, uint32_t value) {
+    uint32_t nWrite = g_nNotifyWrite.load(std::memory_order_relaxed);
+    if (nWrite - g_nNotifyRead.load(std::memory_order_acquire) >= NOTIFY_RING_SIZE) {
+        g_bNotifyOverflow.store(true, std::memory_order_release);
+        return false;
+    }
+    SEQ_NOTIFY* pNotify = &g_aNotifyRing[nWrite & (NOTIFY_RING_SIZE - 1)];
+    pNotify->type       = type;
+    pNotify->bank       = bank;
+    pNotify->sequence   = sequence;
+    pNotify->value      = value;
+    g_nNotifyWrite.store(nWrite + 1, std::memory_order_release);
+    return true;
+}
+
+// Check monitored sequences for changes of state and progress, notifying them. Called from JACK process thread.
+void notifyStateChanges() {
+    if (g_nNotifyBank == 0)
+        return;
+    // Flag busy before reading eventfd, so it is not closed until notification finishes
+    g_bNotifyBusy = true;
+    int nFd       = g_nNotifyFd;
+    if (nFd < 0 || g_nNotifySuspend) {
+        g_bNotifyBusy = false;
+        return;
+    }
+    uint8_t nBank       = g_nNotifyBank;
+    uint32_t nSequences = g_nNotifySequences;
+    bool bNotify        = false;
+    for (uint32_t nSequence = 0; nSequence < nSequences; ++nSequence) {
+        Sequence* pSequence = g_seqMan.findSequence(nBank, nSequence);
+        if (!pSequence)
+            break;
+        if (pSequence->isModified())
+            bNotify |= pushNotify(SEQ_NOTIFY_STATE, nBank, nSequence, pSequence->getState() & 0xffffff);
+        uint32_t nLength = pSequence->getLength();
+        if (nLength == 0)
+            continue;
+        uint8_t nProgress = 100 * pSequence->getPlayPosition() / nLength;
+        if (nProgress != g_aNotifyProgress[nSequence] && pushNotify(SEQ_NOTIFY_PROGRESS, nBank, nSequence, nProgress)) {
+            g_aNotifyProgress[nSequence] = nProgress;
+            bNotify                      = true;
+        }
+    }
+    if (bNotify) {
+        uint64_t nValue = 1;
+        if (write(nFd, &nValue, sizeof(nValue)) < 0)
+            DPRINTF("Failed to signal state notification\n");
+    }
+    g_bNotifyBusy = false;
+}
+
+// Wait for any notification in progress in JACK process thread to finish
+void waitStateNotify() {
+    while (g_bNotifyBusy)
+        std::this_thread::sleep_for(std::chrono::microseconds(10));
+}
+
+// Stop checking sequences for notifications while they are added or removed, waiting for any check in progress
+void suspendStateNotify() {
+    ++g_nNotifySuspend;
+    waitStateNotify();
+}
+
+// Resume checking sequences for notifications
+void resumeStateNotify() { --g_nNotifySuspend; }
+
 int onJackProcess(jack_nframes_t nFrames, void* pArgs) {
     static jack_position_t transportPosition; // JACK transport position structure populated each cycle and checked for transport progress
     static uint8_t nClock = PPQN;             // Clock pulse count 0..PPQN - 1
@@ -604,6 +688,8 @@ int onJackProcess(jack_nframes_t nFrames, void* pArgs) {
         }
     }
 
+    notifyStateChanges();
+
     // Process events scheduled to be sent to MIDI output
     if (g_mSchedule.size()) {
         auto it = g_mSchedule.begin();
@@ -822,14 +908,11 @@ bool checkBlock(FILE* pFile, uint32_t nActualSize, uint32_t nExpectedSize) {
     return false;
 }
 
-bool load(const char* filename) {
+// Load sequencer state from an open RIFF stream, closing it when done
+bool loadStream(FILE* pFile) {
     g_pSequence = NULL;
     g_seqMan.init();
     uint32_t nVersion = 0;
-    FILE* pFile;
-    pFile = fopen(filename, "r");
-    if (pFile == NULL)
-        return false;
     char sHeader[4];
     int bs;
     // Iterate each block within IFF file
@@ -1033,6 +1116,34 @@ bool load(const char* filename) {
     return true;
 }
 
+bool load(const char* filename) {
+    bool bResult = false;
+    suspendStateNotify();
+    FILE* pFile = fopen(filename, "r");
+    if (pFile == NULL) {
+        g_pSequence = NULL;
+        g_seqMan.init();
+    } else
+        bResult = loadStream(pFile);
+    resumeStateNotify();
+    return bResult;
+}
+
+bool loadFromBuffer(const uint8_t* buffer, uint32_t size) {
+    bool bResult = false;
+    FILE* pFile  = NULL;
+    suspendStateNotify();
+    if (buffer && size)
+        pFile = fmemopen((void*)buffer, size, "r");
+    if (pFile == NULL) {
+        g_pSequence = NULL;
+        g_seqMan.init();
+    } else
+        bResult = loadStream(pFile);
+    resumeStateNotify();
+    return bResult;
+}
+
 bool load_pattern(uint32_t nPattern, const char* filename) {
     uint32_t nVersion = 0;
     FILE* pFile;
@@ -1152,15 +1263,10 @@ bool load_pattern(uint32_t nPattern, const char* filename) {
     return true;
 }
 
-void save(const char* filename) {
+// Save sequencer state to an open RIFF stream, closing it when done
+void saveStream(FILE* pFile) {
     //!@todo Need to save / load ticks per beat (unless we always use 1920)
-    FILE* pFile;
     int nPos = 0;
-    pFile    = fopen(filename, "w");
-    if (pFile == NULL) {
-        fprintf(stderr, "ERROR: SequenceManager failed to open file %s\n", filename);
-        return;
-    }
     uint32_t nBlockSize;
     fwrite("vers", 4, 1, pFile); // IFF block name
     nPos += 4;
@@ -1293,6 +1399,67 @@ void save(const char* filename) {
     g_bDirty = false;
 }
 
+void save(const char* filename) {
+    FILE* pFile = fopen(filename, "w");
+    if (pFile == NULL) {
+        fprintf(stderr, "ERROR: SequenceManager failed to open file %s\n", filename);
+        return;
+    }
+    saveStream(pFile);
+}
+
+// Growable memory stream. open_memstream can't be used because it truncates data when seeking back to write block sizes.
+struct MEM_STREAM {
+    std::vector<uint8_t> data;
+    size_t pos = 0;
+};
+
+static ssize_t memStreamWrite(void* cookie, const char* buf, size_t size) {
+    MEM_STREAM* pStream = (MEM_STREAM*)cookie;
+    if (pStream->data.size() < pStream->pos + size)
+        pStream->data.resize(pStream->pos + size);
+    memcpy(pStream->data.data() + pStream->pos, buf, size);
+    pStream->pos += size;
+    return size;
+}
+
+static int memStreamSeek(void* cookie, off64_t* offset, int whence) {
+    MEM_STREAM* pStream = (MEM_STREAM*)cookie;
+    off64_t nPos;
+    switch (whence) {
+    case SEEK_SET:
+        nPos = *offset;
+        break;
+    case SEEK_CUR:
+        nPos = pStream->pos + *offset;
+        break;
+    case SEEK_END:
+        nPos = pStream->data.size() + *offset;
+        break;
+    default:
+        return -1;
+    }
+    if (nPos < 0)
+        return -1;
+    pStream->pos = nPos;
+    *offset      = nPos;
+    return 0;
+}
+
+uint32_t saveToBuffer(uint8_t* buffer, uint32_t size) {
+    MEM_STREAM stream;
+    cookie_io_functions_t ioFuncs = {NULL, memStreamWrite, memStreamSeek, NULL};
+    FILE* pFile                   = fopencookie(&stream, "w", ioFuncs);
+    if (pFile == NULL) {
+        fprintf(stderr, "ERROR: SequenceManager failed to open memory stream\n");
+        return 0;
+    }
+    saveStream(pFile);
+    if (buffer && stream.data.size() <= size)
+        memcpy(buffer, stream.data.data(), stream.data.size());
+    return stream.data.size();
+}
+
 void save_pattern(uint32_t nPattern, const char* filename) {
     //!@todo Need to save / load ticks per beat (unless we always use 1920)
 
@@ -1968,6 +2135,28 @@ bool isPatternModified() {
     return false;
 }
 
+uint32_t getPatternEvents(PATTERN_EVENT* events, uint32_t size) {
+    Pattern* pPattern = g_seqMan.getPattern(g_nPattern);
+    if (!pPattern)
+        return 0;
+    uint32_t count = pPattern->getEvents();
+    for (uint32_t i = 0; i < count && i < size; ++i) {
+        StepEvent* pEvent = pPattern->getEventAt(i);
+        events[i].step = pEvent->getPosition();
+        events[i].offset = pEvent->getOffset();
+        events[i].duration = pEvent->getDuration();
+        events[i].command = pEvent->getCommand();
+        events[i].value1start = pEvent->getValue1start();
+        events[i].value2start = pEvent->getValue2start();
+        events[i].value1end = pEvent->getValue1end();
+        events[i].value2end = pEvent->getValue2end();
+        events[i].stutterCount = pEvent->getStutterCount();
+        events[i].stutterDur = pEvent->getStutterDur();
+        events[i].playChance = pEvent->getPlayChance();
+    }
+    return count;
+}
+
 uint8_t getRefNote() {
     if (g_seqMan.getPattern(g_nPattern))
         return g_seqMan.getPattern(g_nPattern)->getRefNote();
@@ -2110,6 +2299,40 @@ uint8_t getProgress(uint8_t bank, uint8_t start, uint8_t end, uint16_t* progress
     return count;
 }
 
+int enableStateNotify(bool enable) {
+    if (enable && g_nNotifyFd < 0) {
+        memset(g_aNotifyProgress, 0xff, sizeof(g_aNotifyProgress));
+        g_nNotifyRead.store(g_nNotifyWrite.load());
+        g_nNotifyFd = eventfd(0, EFD_NONBLOCK | EFD_CLOEXEC);
+        if (g_nNotifyFd < 0)
+            fprintf(stderr, "ERROR: Failed to create eventfd for state notifications\n");
+    } else if (!enable && g_nNotifyFd >= 0) {
+        int nFd = g_nNotifyFd.exchange(-1);
+        // Wait for JACK process thread to stop using eventfd before closing it
+        waitStateNotify();
+        close(nFd);
+    }
+    return g_nNotifyFd;
+}
+
+void setStateNotifyBank(uint8_t bank, uint8_t sequences) {
+    memset(g_aNotifyProgress, 0xff, sizeof(g_aNotifyProgress));
+    g_nNotifySequences = sequences;
+    g_nNotifyBank      = bank;
+}
+
+uint32_t getStateNotifications(SEQ_NOTIFY* buffer, uint32_t size) {
+    uint32_t nRead  = g_nNotifyRead.load(std::memory_order_relaxed);
+    uint32_t nWrite = g_nNotifyWrite.load(std::memory_order_acquire);
+    uint32_t nCount = 0;
+    while (nRead != nWrite && nCount < size)
+        buffer[nCount++] = g_aNotifyRing[nRead++ & (NOTIFY_RING_SIZE - 1)];
+    g_nNotifyRead.store(nRead, std::memory_order_release);
+    return nCount;
+}
+
+bool getStateNotifyOverflow() { return g_bNotifyOverflow.exchange(false); }
+
 void stop() { g_seqMan.stop(); }
 
 uint32_t getPlayPosition(uint8_t bank, uint8_t sequence) {
@@ -2125,8 +2348,10 @@ void setPlayPosition(uint8_t bank, uint8_t sequence, uint32_t clock) {
 uint32_t getSequenceLength(uint8_t bank, uint8_t sequence) { return g_seqMan.getSequence(bank, sequence)->getLength(); }
 
 void clearSequence(uint8_t bank, uint8_t sequence) {
+    suspendStateNotify();
     Sequence* pSequence = g_seqMan.getSequence(bank, sequence);
     pSequence->clear();
+    resumeStateNotify();
     g_bDirty = true;
 }
 
@@ -2136,7 +2361,9 @@ void setSequencesInBank(uint8_t bank, uint8_t sequences) {
     while (g_bMutex)
         std::this_thread::sleep_for(std::chrono::microseconds(10));
     g_bMutex = true;
+    suspendStateNotify();
     g_seqMan.setSequencesInBank(bank, sequences);
+    resumeStateNotify();
     g_bMutex    = false;
     g_pSequence = g_seqMan.getSequence(bank, 0);
 }
@@ -2160,12 +2387,18 @@ bool hasSequenceChanged(uint8_t bank, uint8_t sequence) { return g_seqMan.getSeq
 
 uint32_t addTrackToSequence(uint8_t bank, uint8_t sequence, uint32_t track) {
     g_bDirty = true;
-    return g_seqMan.getSequence(bank, sequence)->addTrack(track);
+    suspendStateNotify();
+    uint32_t nResult = g_seqMan.getSequence(bank, sequence)->addTrack(track);
+    resumeStateNotify();
+    return nResult;
 }
 
 void removeTrackFromSequence(uint8_t bank, uint8_t sequence, uint32_t track) {
+    suspendStateNotify();
     Sequence* pSequence = g_seqMan.getSequence(bank, sequence);
-    if (!pSequence->removeTrack(track))
+    bool bRemoved       = pSequence->removeTrack(track);
+    resumeStateNotify();
+    if (!bRemoved)
         return;
     pSequence->updateLength();
     g_bDirty = true;
@@ -2202,19 +2435,25 @@ const char* getSequenceName(uint8_t bank, uint8_t sequence) {
 }
 
 bool moveSequence(uint8_t bank, uint8_t sequence, uint8_t position) {
+    suspendStateNotify();
     bool bResult = g_seqMan.moveSequence(bank, sequence, position);
     g_pSequence  = g_seqMan.getSequence(0, 0);
+    resumeStateNotify();
     return bResult;
 }
 
 void insertSequence(uint8_t bank, uint8_t sequence) {
+    suspendStateNotify();
     g_seqMan.insertSequence(bank, sequence);
     g_pSequence = g_seqMan.getSequence(0, 0);
+    resumeStateNotify();
 }
 
 void removeSequence(uint8_t bank, uint8_t sequence) {
+    suspendStateNotify();
     g_seqMan.removeSequence(bank, sequence);
     g_pSequence = g_seqMan.getSequence(0, 0);
+    resumeStateNotify();
 }
 
 void updateSequenceInfo() { g_seqMan.updateAllSequenceLengths(); }
@@ -88,6 +88,14 @@ void enableDebug(bool bEnable);
  */
 bool load(const char* filename);
 
+/** @brief  Load sequences and patterns from a memory buffer with the same RIFF data as a file
+ *   @param  buffer Pointer to RIFF data
+ *   @param  size Size of RIFF data in bytes
+ *   @retval bool True on success
+ *   @note   Pass NULL or empty buffer to clear sequences (returns false)
+ */
+bool loadFromBuffer(const uint8_t* buffer, uint32_t size);
+
 /** @brief  Load pattern from file
  *   @param  nPattern Pattern number
  *   @param  filename Full path and filename
@@ -99,6 +107,13 @@ bool load_pattern(uint32_t nPattern, const char* filename);
  */
 void save(const char* filename);
 
+/** @brief  Save sequences and patterns to a memory buffer with the same RIFF data as a file
+ *   @param  buffer Pointer to buffer to populate (may be NULL to get required size)
+ *   @param  size Size of buffer in bytes
+ *   @retval uint32_t Size of RIFF data in bytes. Buffer is only populated if it is big enough.
+ */
+uint32_t saveToBuffer(uint8_t* buffer, uint32_t size);
+
 /** @brief  Save pattern to file
  *   @param  nPattern Pattern number
  *   @param  filename Full path and filename
@@ -648,6 +663,29 @@ void setPatternModified(Pattern* pPattern, bool bModified = true, bool bModified
  */
 bool isPatternModified();
 
+/** @brief  Event of selected pattern, as exported by getPatternEvents */
+struct PATTERN_EVENT {
+    uint32_t step;         // Index of step at which event starts
+    float offset;          // Offset factor of start of step
+    float duration;        // Quantity of steps event spans
+    uint8_t command;       // MIDI command (without channel)
+    uint8_t value1start;   // MIDI value 1 (note / control) at start of event
+    uint8_t value2start;   // MIDI value 2 (velocity / control value) at start of event
+    uint8_t value1end;     // MIDI value 1 at end of event
+    uint8_t value2end;     // MIDI value 2 at end of event
+    uint8_t stutterCount;  // Quantity of stutters
+    uint8_t stutterDur;    // Duration of each stutter in clock cycles
+    uint8_t playChance;    // Play probability from 0% to 100%
+};
+
+/** @brief  Get all events of selected pattern in a single call
+ *   @param  events Pointer to array of PATTERN_EVENT to hold results
+ *   @param  size Quantity of elements in array
+ *   @retval uint32_t Quantity of events in pattern (may be more than size, in which case only size events are copied)
+ *   @note   Events are in pattern order (by position). Call with size 0 to get quantity of events.
+ */
+uint32_t getPatternEvents(PATTERN_EVENT* events, uint32_t size);
+
 /**    @brief    Get the reference note
  *    @retval uint8_t MIDI note number
  *    @note    May be used for position within user interface
@@ -841,6 +879,44 @@ uint8_t getStateChange(uint8_t bank, uint8_t start, uint8_t end, uint32_t* state
  */
 uint8_t getProgress(uint8_t bank, uint8_t start, uint8_t end, uint16_t* progress);
 
+#define SEQ_NOTIFY_STATE 1    // Play state, mode or group of a sequence changed (value: [group, mode, play state])
+#define SEQ_NOTIFY_PROGRESS 2 // Play progress of a sequence changed (value: % progress)
+
+/** @brief  Notification of sequence state change, as exported by getStateNotifications */
+struct SEQ_NOTIFY {
+    uint8_t type;     // Notification type (SEQ_NOTIFY_STATE, SEQ_NOTIFY_PROGRESS)
+    uint8_t bank;     // Index of bank
+    uint8_t sequence; // Index of sequence within bank
+    uint8_t padding;
+    uint32_t value;   // Value, depending on type
+};
+
+/** @brief  Enable push notification of sequence state changes
+ *   @param  enable True to enable, false to disable
+ *   @retval int eventfd file descriptor signalled when notifications are pending or -1 if disabled (or failed)
+ *   @note   Notifications replace polling with getStateChange and getProgress, which should not be used while enabled
+ */
+int enableStateNotify(bool enable);
+
+/** @brief  Set bank monitored for state change notifications
+ *   @param  bank Index of bank (0 to disable)
+ *   @param  sequences Quantity of sequences (from start of bank) to monitor
+ *   @note   Progress of all monitored sequences is notified again after calling
+ */
+void setStateNotifyBank(uint8_t bank, uint8_t sequences);
+
+/** @brief  Get pending state notifications, removing them from queue
+ *   @param  buffer Pointer to array of SEQ_NOTIFY to hold results
+ *   @param  size Quantity of elements in array
+ *   @retval uint32_t Quantity of notifications copied to buffer
+ */
+uint32_t getStateNotifications(SEQ_NOTIFY* buffer, uint32_t size);
+
+/** @brief  Check if state notifications were lost because queue was full, clearing the flag
+ *   @retval bool True if notifications were lost. Full state should be refreshed.
+ */
+bool getStateNotifyOverflow();
+
 /** @brief  Get quantity of tracks in a sequence
  *   @param  bank Index of bank
  *   @param  sequence Index of sequence
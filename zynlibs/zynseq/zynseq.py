@@ -23,9 +23,13 @@
 #
 # ********************************************************************
 
+import os
 import ctypes
 import logging
+import select
+from time import sleep
 from math import sqrt
+from threading import Thread
 from hashlib import new
 from os.path import dirname, realpath
 
@@ -73,10 +77,43 @@ SEQ_RESTARTING = 4
 SEQ_STOPPINGSYNC = 5
 SEQ_LASTPLAYSTATUS = 5
 
+SEQ_NOTIFY_STATE = 1
+SEQ_NOTIFY_PROGRESS = 2
+
+NOTIFY_BATCH_TIME = 0.01  # Seconds to wait for more notifications after a wakeup, so they are sent in batches
+
 PLAY_MODES = ['Disabled', 'Oneshot', 'Loop',
               'Oneshot all', 'Loop all', 'Oneshot sync', 'Loop sync']
 
 
+# Event of selected pattern, as exported by libseq getPatternEvents (PATTERN_EVENT)
+class PatternEvent(ctypes.Structure):
+    _fields_ = [
+        ("step", ctypes.c_uint32),
+        ("offset", ctypes.c_float),
+        ("duration", ctypes.c_float),
+        ("command", ctypes.c_uint8),
+        ("value1start", ctypes.c_uint8),
+        ("value2start", ctypes.c_uint8),
+        ("value1end", ctypes.c_uint8),
+        ("value2end", ctypes.c_uint8),
+        ("stutterCount", ctypes.c_uint8),
+        ("stutterDur", ctypes.c_uint8),
+        ("playChance", ctypes.c_uint8)
+    ]
+
+
+# Sequence state change notification, as exported by libseq getStateNotifications (SEQ_NOTIFY)
+class SeqNotify(ctypes.Structure):
+    _fields_ = [
+        ("type", ctypes.c_uint8),
+        ("bank", ctypes.c_uint8),
+        ("sequence", ctypes.c_uint8),
+        ("padding", ctypes.c_uint8),
+        ("value", ctypes.c_uint32)
+    ]
+
+
 class zynseq(zynthian_engine):
 
     # Subsignals are defined inside each module. Here we define zynseq subsignals:
@@ -88,6 +125,11 @@ class zynseq(zynthian_engine):
     def __init__(self, state_manager=None):
         self.state_manager = state_manager
         self.changing_bank = False
+        self.pattern_events = (PatternEvent * 256)()  # Buffer for getPatternEvents, grown as needed
+        self.riff_buffer = ctypes.create_string_buffer(64 * 1024)  # Buffer for saveToBuffer, grown as needed
+        self.notify_buffer = (SeqNotify * 256)()  # Buffer for getStateNotifications
+        self.notify_fd = -1  # eventfd signalled by libseq when state notifications are pending (-1 => polling)
+        self.notify_thread = None
         try:
             self.libseq = ctypes.cdll.LoadLibrary(
                 dirname(realpath(__file__))+"/build/libzynseq.so")
@@ -123,6 +165,17 @@ class zynseq(zynthian_engine):
             self.libseq.getProgress.argtypes = [
                 ctypes.c_uint8, ctypes.c_uint8, ctypes.c_uint8, ctypes.POINTER(ctypes.c_uint16)]
             self.libseq.getProgress.restype = ctypes.c_uint8
+            self.libseq.getPatternEvents.argtypes = [ctypes.POINTER(PatternEvent), ctypes.c_uint32]
+            self.libseq.getPatternEvents.restype = ctypes.c_uint32
+            self.libseq.saveToBuffer.argtypes = [ctypes.c_char_p, ctypes.c_uint32]
+            self.libseq.saveToBuffer.restype = ctypes.c_uint32
+            self.libseq.loadFromBuffer.argtypes = [ctypes.c_char_p, ctypes.c_uint32]
+            self.libseq.loadFromBuffer.restype = ctypes.c_bool
+            self.libseq.enableStateNotify.argtypes = [ctypes.c_bool]
+            self.libseq.setStateNotifyBank.argtypes = [ctypes.c_uint8, ctypes.c_uint8]
+            self.libseq.getStateNotifications.argtypes = [ctypes.POINTER(SeqNotify), ctypes.c_uint32]
+            self.libseq.getStateNotifications.restype = ctypes.c_uint32
+            self.libseq.getStateNotifyOverflow.restype = ctypes.c_bool
             self.libseq.init(bytes("zynseq", "utf-8"))
         except Exception as e:
             self.libseq = None
@@ -138,13 +191,97 @@ class zynseq(zynthian_engine):
 
         self.bank = None
         self.select_bank(1, True)
+        self.start_state_notify()
 
     # Destroy instance of shared library
     def destroy(self):
+        self.stop_state_notify()
         if self.libseq:
             ctypes.dlclose(self.libseq._handle)
         self.libseq = None
 
+    # ----------------------------------------------------------------------------
+    # Sequence state notifications
+    # ----------------------------------------------------------------------------
+
+    def start_state_notify(self):
+        """Start thread that sends sequence state & progress signals when libseq notifies changes.
+        If it can't be started, update_state must be polled instead.
+        """
+
+        if self.notify_thread or not self.libseq:
+            return
+        self.notify_fd = self.libseq.enableStateNotify(True)
+        if self.notify_fd < 0:
+            logging.warning("Can't enable sequence state notifications. Using polling.")
+            return
+        self.update_state_notify_bank()
+        self.notify_thread = Thread(target=self.state_notify_task, name="zynseq_notify", daemon=True)
+        self.notify_thread.start()
+
+    def stop_state_notify(self):
+        if self.notify_thread:
+            notify_thread = self.notify_thread
+            self.notify_thread = None
+            notify_thread.join()
+        if self.notify_fd >= 0:
+            self.notify_fd = -1
+            self.libseq.enableStateNotify(False)
+
+    def is_state_notify(self):
+        """Check if state & progress signals are sent by notification thread => if False, update_state must be polled"""
+
+        return self.notify_thread is not None
+
+    def update_state_notify_bank(self):
+        if self.notify_fd >= 0 and self.bank is not None:
+            self.libseq.setStateNotifyBank(self.bank, self.col_in_bank ** 2)
+
+    def state_notify_task(self):
+        while self.notify_thread:
+            try:
+                if not select.select([self.notify_fd], [], [], 0.5)[0]:
+                    continue
+                os.read(self.notify_fd, 8)
+                # Let notifications of the same period (e.g. a group of sequences starting on sync) accumulate
+                sleep(NOTIFY_BATCH_TIME)
+                self.process_state_notifications()
+            except BlockingIOError:
+                pass
+            except Exception as e:
+                logging.exception(e)
+
+    def process_state_notifications(self):
+        """Drain pending state notifications from libseq, sending a signal per sequence for the latest change only"""
+
+        states = {}
+        progress = {}
+        while True:
+            count = self.libseq.getStateNotifications(self.notify_buffer, len(self.notify_buffer))
+            for i in range(count):
+                notify = self.notify_buffer[i]
+                key = (notify.bank, notify.sequence)
+                if notify.type == SEQ_NOTIFY_STATE:
+                    states[key] = notify.value
+                elif notify.type == SEQ_NOTIFY_PROGRESS:
+                    progress[key] = notify.value
+            if count < len(self.notify_buffer):
+                break
+
+        if self.libseq.getStateNotifyOverflow():
+            # Some notifications were lost => refresh state of all monitored sequences
+            logging.warning("Sequence state notifications lost. Refreshing all.")
+            for seq in range(min(self.col_in_bank ** 2, self.libseq.getSequencesInBank(self.bank))):
+                states[(self.bank, seq)] = self.libseq.getSequenceState(self.bank, seq)
+
+        for (bank, seq), state in states.items():
+            zynsigman.send(zynsigman.S_STEPSEQ, self.SS_SEQ_PLAY_STATE, bank=bank, seq=seq,
+                           state=state & 0xff, mode=(state >> 8) & 0xff, group=(state >> 16) & 0xff)
+        for (bank, seq), prog in progress.items():
+            zynsigman.send(zynsigman.S_STEPSEQ, self.SS_SEQ_PROGRESS, bank=bank, seq=seq, progress=prog)
+
+    # Poll state & progress of sequences in current bank, sending signals
+    # Only needed when state notifications are not available (see is_state_notify)
     def update_state(self):
         num_seq = self.col_in_bank ** 2
         states = (ctypes.c_uint32 * num_seq)()
@@ -186,6 +323,7 @@ class zynseq(zynthian_engine):
         # WARNING!!! Limited to 8 to avoid issues with GUI zynpad that have 8x8 = 64 pads
         self.col_in_bank = min(8, int(sqrt(self.seq_in_bank)))
         self.bank = bank
+        self.update_state_notify_bank()
         zynsigman.send(zynsigman.S_STEPSEQ, self.SS_SEQ_REFRESH)
         self.changing_bank = False
 
@@ -252,6 +390,7 @@ class zynseq(zynthian_engine):
                     self.libseq.removeSequence(self.bank, offset)
         self.seq_in_bank = self.libseq.getSequencesInBank(self.bank)
         self.col_in_bank = min(8, int(sqrt(self.seq_in_bank)))
+        self.update_state_notify_bank()
         zynsigman.send(zynsigman.S_STEPSEQ, self.SS_SEQ_REFRESH)
 
     # Load a zynseq file
@@ -296,6 +435,17 @@ class zynseq(zynthian_engine):
             return self.libseq.isPatternEmpty(patnum)
         return False
 
+    # Get all events of selected pattern with a single library call
+    # Returns: List of PatternEvent, ordered by position. Valid until next call.
+    def get_pattern_events(self):
+        if not self.libseq:
+            return []
+        count = self.libseq.getPatternEvents(self.pattern_events, len(self.pattern_events))
+        if count > len(self.pattern_events):
+            self.pattern_events = (PatternEvent * (2 * count))()
+            count = self.libseq.getPatternEvents(self.pattern_events, len(self.pattern_events))
+        return self.pattern_events[:count]
+
     # Get sequence name
     # Returns: Sequence name (maximum 16 characters)
     def get_sequence_name(self, bank, sequence):
@@ -382,31 +532,31 @@ class zynseq(zynthian_engine):
             logging.error(e)
 
     def get_riff_data(self):
-        fpath = "/tmp/snapshot.zynseq"
+        """Get sequencer state as RIFF data, the same as a zynseq file, without touching the filesystem"""
+
         try:
-            # Save to tmp
-            self.save(fpath)
-            # Load binary data
-            with open(fpath, "rb") as fh:
-                riff_data = fh.read()
-                logging.info("Loading RIFF data...\n")
-            return riff_data
+            size = self.libseq.saveToBuffer(self.riff_buffer, len(self.riff_buffer))
+            if size > len(self.riff_buffer):
+                self.riff_buffer = ctypes.create_string_buffer(size + 64 * 1024)
+                size = self.libseq.saveToBuffer(self.riff_buffer, len(self.riff_buffer))
+            if size == 0:
+                raise Exception("serialisation failed")
+            return self.riff_buffer.raw[:size]
 
         except Exception as e:
             logging.error("Can't get RIFF data! => {}".format(e))
             return None
 
     def restore_riff_data(self, riff_data):
-        fpath = "/tmp/snapshot.zynseq"
+        """Restore sequencer state from RIFF data, as returned by get_riff_data"""
+
         try:
-            # Save RIFF data to tmp file
-            with open(fpath, "wb") as fh:
-                fh.write(riff_data)
-                logging.info("Restoring RIFF data...\n")
-            # Load from tmp file
-            if self.load(fpath):
+            logging.info("Restoring RIFF data...")
+            res = self.libseq.loadFromBuffer(riff_data, len(riff_data))
+            self.select_bank(1, True)
+            if res:
                 self.filename = "snapshot"
-                return True
+            return res
 
         except Exception as e:
             logging.error("Can't restore RIFF data! => {}".format(e))
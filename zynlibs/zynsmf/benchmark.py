@@ -0,0 +1,159 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# Benchmark of zynsmf file loading
+# Generates a large synthetic SMF and measures:
+#   - full load, parsing the whole file
+#   - full load for playback, saving the event cache
+#   - time until playback may start, loading the first seconds & the rest in background
+#   - reload from event cache
+#
+# Usage: python3 -m zynlibs.zynsmf.benchmark [minutes] [tracks] [preload seconds]
+
+import os
+import sys
+import struct
+import tempfile
+from time import monotonic, sleep
+
+from zynlibs.zynsmf import zynsmf
+from zynlibs.zynsmf.zynsmf import libsmf
+
+TICKS_PER_QUARTER_NOTE = 480
+
+
+def var_len(value):
+    """Get a MIDI variable length quantity"""
+
+    data = bytearray([value & 0x7F])
+    value >>= 7
+    while value:
+        data.insert(0, 0x80 | (value & 0x7F))
+        value >>= 7
+    return bytes(data)
+
+
+def track_block(events):
+    """Get MTrk block with list of (time, bytes) events, using running status when possible"""
+
+    data = bytearray()
+    time = 0
+    status = None
+    for t, msg in sorted(events, key=lambda ev: ev[0]):
+        data += var_len(t - time)
+        time = t
+        if msg[0] == status:
+            data += msg[1:]
+        else:
+            data += msg
+            status = msg[0] if msg[0] < 0xF0 else None
+    data += var_len(0) + b"\xFF\x2F\x00"
+    return b"MTrk" + struct.pack(">I", len(data)) + data
+
+
+def generate_smf(fpath, minutes=10, tracks=16):
+    """Write a format 1 SMF with a tempo track & busy note tracks
+
+    fpath - Full path of file to create
+    minutes - Approximate duration at 120 BPM
+    tracks - Quantity of note tracks
+    """
+
+    quarter_notes = minutes * 120
+    # Tempo changes every 8 bars
+    tempo_events = [(0, b"\xFF\x03\x05Tempo")]
+    for bar in range(0, quarter_notes // 4, 8):
+        bpm = 110 + (bar // 8) % 3 * 10
+        tempo_events.append((bar * 4 * TICKS_PER_QUARTER_NOTE, b"\xFF\x51\x03" + (60000000 // bpm).to_bytes(3, "big")))
+    blocks = [track_block(tempo_events)]
+    for track in range(tracks):
+        chan = track % 16
+        events = [(0, bytes([0xC0 | chan, track])), (0, bytes([0xB0 | chan, 7, 100]))]
+        step = TICKS_PER_QUARTER_NOTE // 4
+        for n in range(quarter_notes * 4):
+            t = n * step + track
+            note = 36 + (n * 7 + track * 5) % 48
+            events.append((t, bytes([0x90 | chan, note, 64 + n % 64])))
+            events.append((t + step - 10, bytes([0x90 | chan, note, 0])))
+            if n % 8 == 0:
+                events.append((t, bytes([0xB0 | chan, 1, n % 128])))
+        blocks.append(track_block(events))
+    with open(fpath, "wb") as fh:
+        fh.write(b"MThd" + struct.pack(">IHHH", 6, 1, len(blocks), TICKS_PER_QUARTER_NOTE))
+        for block in blocks:
+            fh.write(block)
+
+
+def wait_loaded(smf):
+    while libsmf.isLoading(smf):
+        sleep(0.001)
+
+
+def unload(smf):
+    """Unload previous song, so its release is not timed with the next load"""
+    wait_loaded(smf)
+    libsmf.unload(smf)
+
+
+def main():
+    minutes = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    tracks = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    preload = float(sys.argv[3]) if len(sys.argv) > 3 else 10.0
+    if libsmf is None:
+        print("zynsmf library not available")
+        return
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        fpath = os.path.join(tmpdir, "benchmark.mid")
+        cache_dir = os.path.join(tmpdir, "smf_cache")
+        generate_smf(fpath, minutes, tracks)
+        smf = libsmf.addSmf()
+
+        def clear_cache():
+            for fn in os.listdir(cache_dir) if os.path.isdir(cache_dir) else []:
+                os.remove(os.path.join(cache_dir, fn))
+
+        libsmf.setCacheDir(b"", 0)
+        t0 = monotonic()
+        zynsmf.load(smf, fpath)
+        t_parse = monotonic() - t0
+        events = libsmf.getEvents(smf, -1)
+        duration = libsmf.getDuration(smf)
+
+        libsmf.setCacheDir(bytes(cache_dir, "utf-8"), 0)
+        unload(smf)
+        t0 = monotonic()
+        zynsmf.load(smf, fpath, -1)
+        t_parse_save = monotonic() - t0
+
+        clear_cache()
+        unload(smf)
+        t0 = monotonic()
+        zynsmf.load(smf, fpath, preload)
+        t_stream_first = monotonic() - t0
+        wait_loaded(smf)
+        t_stream_all = monotonic() - t0
+
+        unload(smf)
+        t0 = monotonic()
+        zynsmf.load(smf, fpath)
+        t_cache = monotonic() - t0
+
+        unload(smf)
+        t0 = monotonic()
+        zynsmf.load(smf, fpath, preload)
+        t_cache_first = monotonic() - t0
+        wait_loaded(smf)
+        t_cache_all = monotonic() - t0
+
+        libsmf.removeSmf(smf)
+
+        print(f"SMF: {os.path.getsize(fpath)} bytes, {tracks + 1} tracks, {events} events, {duration:.1f} seconds")
+        print(f"Full load, no cache:           {t_parse * 1000:8.1f} ms")
+        print(f"Full load, saving cache:       {t_parse_save * 1000:8.1f} ms")
+        print(f"Stream load, first {preload:.0f}s:       {t_stream_first * 1000:8.1f} ms (whole song {t_stream_all * 1000:.1f} ms)")
+        print(f"Full load from cache:          {t_cache * 1000:8.1f} ms")
+        print(f"Stream load from cache, first: {t_cache_first * 1000:8.1f} ms (whole song {t_cache_all * 1000:.1f} ms)")
+
+
+if __name__ == "__main__":
+    main()
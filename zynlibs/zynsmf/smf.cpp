@@ -3,14 +3,40 @@
 
 #include "smf.h"
 
-#include <cstring> //provides strcmp, memset
-#include <stdio.h> //provides printf
-
-#define MAX_TRACKS 16 // Maximum quantity of tracks automatically created
+#include <algorithm>  //provides sort
+#include <cstring>    //provides strcmp, memset
+#include <dirent.h>   //provides opendir, readdir
+#include <stdio.h>    //provides printf
+#include <sys/stat.h> //provides stat, mkdir
+
+#define MAX_TRACKS 16             // Maximum quantity of tracks automatically created
+#define LOADED_ALL 0xFFFFFFFF     // Value of m_nLoadedTicks when there are no more events to load
+#define CACHE_MAGIC "ZSMC"        // Event cache file identifier
+#define CACHE_VERSION 1           // Event cache file format version
+#define CACHE_EVENT_HEADER_SIZE 9 // Size of each cached event before its data: time (4), track (2), type, subtype, size
 #define DPRINTF(fmt, args...)                                                                                                                                  \
     if (m_bDebug)                                                                                                                                              \
     fprintf(stderr, fmt, ##args)
 
+// Header of event cache files, followed by quantity of events of each track (uint32_t) and the events in time order
+struct SMF_CACHE_HEADER {
+    char sMagic[4];                // CACHE_MAGIC
+    uint32_t nVersion;             // CACHE_VERSION
+    uint64_t nSourceSize;          // Size of SMF file
+    int64_t nSourceMtime;          // Modification time of SMF file in nanoseconds
+    double fDuration;              // Duration of song in seconds
+    uint32_t nDurationInTicks;     // Duration of song in ticks
+    uint32_t nEvents;              // Quantity of events
+    uint16_t nFormat;              // MIDI file format [0|1|2]
+    uint16_t nTracks;              // Quantity of MIDI tracks reported by IFF header
+    uint16_t nTicksPerQuarterNote; // Ticks per quarter note
+    uint16_t nTrackBlocks;         // Quantity of MTrk blocks
+    uint16_t nManufacturerId;      // Manufacturers MIDI ID
+};
+
+std::string Smf::s_sCacheDir;
+size_t Smf::s_nMaxCacheFiles = 0;
+
 Smf::~Smf() { unload(); }
 
 void Smf::enableDebug(bool bEnable) { m_bDebug = bEnable; }
@@ -22,44 +48,18 @@ int Smf::fileWrite8(uint8_t nValue, FILE* pFile) {
     return nResult;
 }
 
-uint8_t Smf::fileRead8(FILE* pFile) {
-    uint8_t nResult = 0;
-    fread(&nResult, 1, 1, pFile);
-    return nResult;
-}
-
 int Smf::fileWrite16(uint16_t nValue, FILE* pFile) {
     for (int i = 1; i >= 0; --i)
         fileWrite8((nValue >> i * 8), pFile);
     return 2;
 }
 
-uint16_t Smf::fileRead16(FILE* pFile) {
-    uint16_t nResult = 0;
-    for (int i = 1; i >= 0; --i) {
-        uint8_t nValue;
-        fread(&nValue, 1, 1, pFile);
-        nResult |= nValue << (i * 8);
-    }
-    return nResult;
-}
-
 int Smf::fileWrite32(uint32_t nValue, FILE* pFile) {
     for (int i = 3; i >= 0; --i)
         fileWrite8((nValue >> i * 8), pFile);
     return 4;
 }
 
-uint32_t Smf::fileRead32(FILE* pFile) {
-    uint32_t nResult = 0;
-    for (int i = 3; i >= 0; --i) {
-        uint8_t nValue;
-        fread(&nValue, 1, 1, pFile);
-        nResult |= nValue << (i * 8);
-    }
-    return nResult;
-}
-
 int Smf::fileWriteVar(uint32_t nValue, FILE* pFile) {
     uint8_t aVal[] = {0, 0, 0, 0};
     int nLen       = 0;
@@ -80,10 +80,34 @@ int Smf::fileWriteVar(uint32_t nValue, FILE* pFile) {
     return nLen;
 }
 
-uint32_t Smf::fileReadVar(FILE* pFile) {
+size_t Smf::fileWriteString(const char* pString, size_t nSize, FILE* pFile) { return fwrite(pString, 1, nSize, pFile); }
+
+// Private load data functions
+
+uint8_t Smf::read8(size_t& nPos) {
+    if (nPos >= m_vLoadData.size()) {
+        ++nPos;
+        return 0;
+    }
+    return m_vLoadData[nPos++];
+}
+
+uint16_t Smf::read16(size_t& nPos) {
+    uint16_t nResult = read8(nPos) << 8;
+    return nResult | read8(nPos);
+}
+
+uint32_t Smf::read32(size_t& nPos) {
+    uint32_t nResult = 0;
+    for (int i = 0; i < 4; ++i)
+        nResult = nResult << 8 | read8(nPos);
+    return nResult;
+}
+
+uint32_t Smf::readVar(size_t& nPos) {
     uint32_t nValue = 0;
     for (int i = 0; i < 4; ++i) {
-        uint8_t nByte = fileRead8(pFile);
+        uint8_t nByte = read8(nPos);
         nValue <<= 7;
         nValue |= (nByte & 0x7F);
         if ((nByte & 0x80) == 0)
@@ -92,15 +116,365 @@ uint32_t Smf::fileReadVar(FILE* pFile) {
     return nValue;
 }
 
-size_t Smf::fileWriteString(const char* pString, size_t nSize, FILE* pFile) { return fwrite(pString, 1, nSize, pFile); }
+uint8_t* Smf::readData(size_t& nPos, uint32_t nSize, uint32_t nAlloc) {
+    uint8_t* pData = new uint8_t[nAlloc];
+    memset(pData, 0, nAlloc);
+    if (nPos < m_vLoadData.size())
+        memcpy(pData, m_vLoadData.data() + nPos, std::min(size_t(nSize), m_vLoadData.size() - nPos));
+    nPos += nSize;
+    return pData;
+}
+
+bool Smf::readFile(const char* sFilename) {
+    m_vLoadData.clear();
+    FILE* pFile = fopen(sFilename, "r");
+    if (pFile == NULL)
+        return false;
+    bool bResult = false;
+    if (fseek(pFile, 0, SEEK_END) == 0) {
+        long nSize = ftell(pFile);
+        if (nSize >= 0) {
+            m_vLoadData.resize(nSize);
+            rewind(pFile);
+            bResult = fread(m_vLoadData.data(), 1, nSize, pFile) == size_t(nSize);
+        }
+    }
+    fclose(pFile);
+    return bResult;
+}
+
+bool Smf::openSmf() {
+    size_t nPos = 0;
+    // Iterate each block within IFF file
+    while (nPos + 8 <= m_vLoadData.size()) {
+        const uint8_t* pHeader = m_vLoadData.data() + nPos;
+        nPos += 4;
+        uint32_t nBlockSize = read32(nPos);
+        size_t nBlockEnd    = std::min(nPos + nBlockSize, m_vLoadData.size());
+        if (memcmp(pHeader, "MThd", 4) == 0) {
+            // SMF file header
+            DPRINTF("Found MThd block of size %u\n", nBlockSize);
+            m_nFormat          = read16(nPos);
+            m_nTracks          = read16(nPos);
+            uint16_t nDivision = read16(nPos);
+            m_bTimecodeBased   = ((nDivision & 0x8000) == 0x8000);
+            if (m_bTimecodeBased) {
+                m_nSmpteFps        = -(int8_t(nDivision & 0xFF00) >> 8);
+                m_nSmpteResolution = nDivision & 0x00FF;
+                DPRINTF("Standard MIDI File - Format: %u, Tracks: %u, SMPTE fps: %u, SMPTE subframe resolution: %u\n", m_nFormat, m_nTracks, m_nSmpteFps,
+                        m_nSmpteResolution);
+                fprintf(stderr, "zynsmf does not support SMPTE timebase SMF\n");
+                //!@todo Add support for SMPTE timebase
+                return false;
+            } else {
+                m_nTicksPerQuarterNote = nDivision & 0x7FFF;
+                DPRINTF("Standard MIDI File - Format: %u, Tracks: %u, Ticks per quarter note: %u\n", m_nFormat, m_nTracks, m_nTicksPerQuarterNote);
+            }
+            DPRINTF("\n");
+        } else if (memcmp(pHeader, "MTrk", 4) == 0) {
+            // SMF track header
+            DPRINTF("Found MTrk block of size %u\n", nBlockSize);
+            Track* pTrack = new Track();
+            // Each event uses at least 2 bytes (delta time & data byte with running status)
+            pTrack->reserve(nBlockSize / 2 + 1);
+            m_vTracks.push_back(pTrack);
+            TRACK_CURSOR cursor = {nPos, nBlockEnd, 0, 0};
+            if (cursor.nPos < cursor.nEnd) {
+                cursor.nTime = readVar(cursor.nPos);
+                m_qLoadQueue.push({cursor.nTime, m_vLoadCursors.size()});
+            }
+            m_vLoadCursors.push_back(cursor);
+        } else {
+            // Ignore unknown block
+            DPRINTF("Found unsupported %c%c%c%c block of size %u\n", pHeader[0], pHeader[1], pHeader[2], pHeader[3], nBlockSize);
+        }
+        nPos = nBlockEnd; // Skip any extra header bytes which might be added in later version of SMF standard
+    }
+    return true;
+}
+
+bool Smf::openCache() {
+    SMF_CACHE_HEADER header;
+    if (m_vLoadData.size() < sizeof(header))
+        return false;
+    memcpy(&header, m_vLoadData.data(), sizeof(header));
+    m_nLoadPos = sizeof(header) + header.nTrackBlocks * sizeof(uint32_t);
+    if (memcmp(header.sMagic, CACHE_MAGIC, 4) || header.nVersion != CACHE_VERSION || header.nSourceSize != m_nSourceSize ||
+        header.nSourceMtime != m_nSourceMtime || m_nLoadPos > m_vLoadData.size())
+        return false;
+    m_nFormat              = header.nFormat;
+    m_nTracks              = header.nTracks;
+    m_nTicksPerQuarterNote = header.nTicksPerQuarterNote;
+    m_nManufacturerId      = header.nManufacturerId;
+    m_nDurationInTicks     = header.nDurationInTicks;
+    m_fDuration            = header.fDuration;
+    for (size_t nTrack = 0; nTrack < header.nTrackBlocks; ++nTrack) {
+        uint32_t nEvents;
+        memcpy(&nEvents, m_vLoadData.data() + sizeof(header) + nTrack * sizeof(uint32_t), sizeof(uint32_t));
+        Track* pTrack = new Track();
+        pTrack->reserve(nEvents);
+        m_vTracks.push_back(pTrack);
+    }
+    DPRINTF("Loading %u events from cache '%s'\n", header.nEvents, m_sCacheFilename.c_str());
+    return true;
+}
+
+bool Smf::loadEvents(double dPreload) {
+    while (!m_bStopLoading) {
+        if (dPreload >= 0 && m_dLoadSeconds >= dPreload)
+            return false;
+        if (!(m_bFromCache ? readCacheEvent() : parseEvent()))
+            break;
+    }
+    finishLoading();
+    return true;
+}
+
+bool Smf::parseEvent() {
+    if (m_qLoadQueue.empty())
+        return false;
+    size_t nTrack = m_qLoadQueue.top().second;
+    m_qLoadQueue.pop();
+    TRACK_CURSOR& cursor = m_vLoadCursors[nTrack];
+    size_t& nPos         = cursor.nPos;
+    uint32_t nPosition   = cursor.nTime;
+    uint8_t nStatus      = read8(nPos);
+    DPRINTF("Track: %lu Abs: %u ", nTrack, nPosition);
+    if ((nStatus & 0x80) == 0) {
+        nStatus = cursor.nRunningStatus;
+        --nPos;
+    }
+    uint32_t nMessageLength;
+    uint8_t nMetaType;
+    uint8_t* pData;
+    Event* pEvent = NULL;
+    switch (nStatus) {
+    case 0xFF:
+        // Meta event
+        nMetaType             = read8(nPos);
+        nMessageLength        = readVar(nPos);
+        pData                 = readData(nPos, nMessageLength, nMessageLength + 1);
+        pEvent                = new Event(nPosition, EVENT_TYPE_META, nMetaType, nMessageLength, pData);
+        cursor.nRunningStatus = 0;
+        break;
+    case 0xF0:
+        // SysEx event
+        //!@todo Store SysEx messages
+        nMessageLength = readVar(nPos);
+        DPRINTF("SysEx %u bytes\n", nMessageLength);
+        cursor.nRunningStatus = 0;
+        if (nMessageLength > 0) {
+            nPos += nMessageLength - 1;
+            if (read8(nPos) == 0xF7)
+                cursor.nRunningStatus = 0xF0;
+        }
+        break;
+    case 0xF7:
+        // End of SysEx or Escape sequence
+        nMessageLength = readVar(nPos);
+        if (cursor.nRunningStatus == 0xF0) {
+            DPRINTF("SysEx continuation %u bytes\n", nMessageLength);
+            if (nMessageLength > 0) {
+                nPos += nMessageLength - 1;
+                if (read8(nPos) == 0xF7)
+                    cursor.nRunningStatus = 0;
+            } else
+                cursor.nRunningStatus = 0;
+        } else {
+            DPRINTF("Escape sequence %u bytes\n", nMessageLength);
+            pData                 = readData(nPos, nMessageLength, nMessageLength);
+            pEvent                = new Event(nPosition, EVENT_TYPE_ESCAPE, 0, nMessageLength, pData);
+            cursor.nRunningStatus = 0;
+        }
+        break;
+    default:
+        // MIDI event
+        cursor.nRunningStatus = nStatus;
+        switch (nStatus & 0xF0) {
+        case 0x80: // Note Off
+        case 0x90: // Note On
+        case 0xA0: // Polyphonic Pressure
+        case 0xB0: // Control Change
+        case 0xE0: // Pitchbend
+            // MIDI commands with 2 parameters
+            pData  = readData(nPos, 2, 2);
+            pEvent = new Event(nPosition, EVENT_TYPE_MIDI, nStatus, 2, pData);
+            break;
+        case 0xC0: // Program Change
+        case 0xD0: // Channel Pressure
+            pData  = readData(nPos, 1, 1);
+            pEvent = new Event(nPosition, EVENT_TYPE_MIDI, nStatus, 1, pData);
+            break;
+        default:
+            DPRINTF("Unexpected MIDI event 0x%02X\n", nStatus);
+            cursor.nRunningStatus = 0;
+        }
+    }
+    if (pEvent)
+        addLoadedEvent(nTrack, pEvent);
+
+    // Queue next event of this track
+    if (nPos < cursor.nEnd) {
+        cursor.nTime += readVar(nPos);
+        m_qLoadQueue.push({cursor.nTime, nTrack});
+    }
+    if (!m_qLoadQueue.empty())
+        m_nLoadedTicks.store(m_qLoadQueue.top().first, std::memory_order_release);
+    return true;
+}
+
+bool Smf::readCacheEvent() {
+    if (m_nLoadPos + CACHE_EVENT_HEADER_SIZE > m_vLoadData.size())
+        return false;
+    const uint8_t* pRecord = m_vLoadData.data() + m_nLoadPos;
+    uint32_t nTime;
+    uint16_t nTrack;
+    memcpy(&nTime, pRecord, 4);
+    memcpy(&nTrack, pRecord + 4, 2);
+    uint8_t nType    = pRecord[6];
+    uint8_t nSubtype = pRecord[7];
+    uint8_t nSize    = pRecord[8];
+    if (nTrack >= m_vTracks.size())
+        return false;
+    m_nLoadPos += CACHE_EVENT_HEADER_SIZE;
+    uint8_t* pData = readData(m_nLoadPos, nSize, nSize + 1);
+    addLoadedEvent(nTrack, new Event(nTime, nType, nSubtype, nSize, pData));
+    // Events before next cached event are loaded
+    if (m_nLoadPos + 4 <= m_vLoadData.size()) {
+        memcpy(&nTime, m_vLoadData.data() + m_nLoadPos, 4);
+        m_nLoadedTicks.store(nTime, std::memory_order_release);
+    }
+    return true;
+}
+
+void Smf::addLoadedEvent(size_t nTrack, Event* pEvent) {
+    uint32_t nTime = pEvent->getTime();
+    m_dLoadSeconds += double(nTime - m_nLoadTime) * m_nLoadTempo / m_nTicksPerQuarterNote / 1000000;
+    m_nLoadTime = nTime;
+    if (pEvent->getType() == EVENT_TYPE_META) {
+        if (pEvent->getSubtype() == 0x51) {
+            uint32_t nTempo = pEvent->getInt32();
+            std::lock_guard<std::mutex> lock(m_mutexTempo);
+            m_mTempoMap[nTime] = nTempo;
+            if (nTempo)
+                m_nLoadTempo = nTempo;
+        } else if (pEvent->getSubtype() == 0x7F) // Manufacturer
+            m_nManufacturerId = pEvent->getInt32();
+    }
+    if (m_bSaveCache) {
+        uint16_t nCacheTrack = nTrack;
+        size_t nOffset       = m_vCacheData.size();
+        m_vCacheData.resize(nOffset + CACHE_EVENT_HEADER_SIZE + pEvent->getSize());
+        uint8_t* pRecord = m_vCacheData.data() + nOffset;
+        memcpy(pRecord, &nTime, 4);
+        memcpy(pRecord + 4, &nCacheTrack, 2);
+        pRecord[6] = pEvent->getType();
+        pRecord[7] = pEvent->getSubtype();
+        pRecord[8] = pEvent->getSize();
+        memcpy(pRecord + CACHE_EVENT_HEADER_SIZE, pEvent->getData(), pEvent->getSize());
+    }
+    if (!m_vTracks[nTrack]->appendEvent(pEvent)) {
+        DPRINTF("No space reserved for event in track %lu\n", nTrack);
+        delete pEvent;
+        return;
+    }
+}
+
+void Smf::finishLoading() {
+    if (!m_bFromCache) {
+        m_nDurationInTicks = m_nLoadTime;
+        m_fDuration        = m_dLoadSeconds;
+    }
+    if (m_bSaveCache && !m_bStopLoading) {
+        if (saveCache())
+            pruneCache();
+        else
+            DPRINTF("Failed to save event cache '%s'\n", m_sCacheFilename.c_str());
+    }
+    m_vLoadData.clear();
+    m_vLoadData.shrink_to_fit();
+    m_vLoadCursors.clear();
+    m_qLoadQueue = decltype(m_qLoadQueue)();
+    m_vCacheData.clear();
+    m_vCacheData.shrink_to_fit();
+    m_nLoadedTicks.store(LOADED_ALL, std::memory_order_release);
+    m_bLoading.store(false, std::memory_order_release);
+}
+
+bool Smf::saveCache() {
+    if (m_vTracks.size() > 0xFFFF)
+        return false;
+    SMF_CACHE_HEADER header;
+    memset(&header, 0, sizeof(header));
+    memcpy(header.sMagic, CACHE_MAGIC, 4);
+    header.nVersion             = CACHE_VERSION;
+    header.nSourceSize          = m_nSourceSize;
+    header.nSourceMtime         = m_nSourceMtime;
+    header.fDuration            = m_fDuration;
+    header.nDurationInTicks     = m_nDurationInTicks;
+    header.nEvents              = getEvents();
+    header.nFormat              = m_nFormat;
+    header.nTracks              = m_nTracks;
+    header.nTicksPerQuarterNote = m_nTicksPerQuarterNote;
+    header.nTrackBlocks         = m_vTracks.size();
+    header.nManufacturerId      = m_nManufacturerId;
+
+    mkdir(s_sCacheDir.c_str(), 0755);
+    std::string sTmpFilename = m_sCacheFilename + ".tmp";
+    FILE* pFile              = fopen(sTmpFilename.c_str(), "w");
+    if (pFile == NULL)
+        return false;
+    bool bResult = fwrite(&header, sizeof(header), 1, pFile) == 1;
+    for (auto it = m_vTracks.begin(); bResult && it != m_vTracks.end(); ++it) {
+        uint32_t nEvents = (*it)->getEvents();
+        bResult          = fwrite(&nEvents, sizeof(nEvents), 1, pFile) == 1;
+    }
+    if (bResult && m_vCacheData.size())
+        bResult = fwrite(m_vCacheData.data(), m_vCacheData.size(), 1, pFile) == 1;
+    if (fclose(pFile) || !bResult || rename(sTmpFilename.c_str(), m_sCacheFilename.c_str())) {
+        remove(sTmpFilename.c_str());
+        return false;
+    }
+    return true;
+}
+
+void Smf::pruneCache() {
+    if (s_nMaxCacheFiles == 0)
+        return;
+    DIR* pDir = opendir(s_sCacheDir.c_str());
+    if (pDir == NULL)
+        return;
+    std::vector<std::pair<int64_t, std::string>> vFiles; // Modification time & full path of each cache file
+    struct dirent* pEntry;
+    struct stat fileStat;
+    while ((pEntry = readdir(pDir))) {
+        size_t nLen = strlen(pEntry->d_name);
+        if (nLen < 5 || strcmp(pEntry->d_name + nLen - 5, ".smfc"))
+            continue;
+        std::string sPath = s_sCacheDir + "/" + pEntry->d_name;
+        if (stat(sPath.c_str(), &fileStat) == 0)
+            vFiles.emplace_back(int64_t(fileStat.st_mtim.tv_sec) * 1000000000 + fileStat.st_mtim.tv_nsec, sPath);
+    }
+    closedir(pDir);
+    if (vFiles.size() <= s_nMaxCacheFiles)
+        return;
+    std::sort(vFiles.begin(), vFiles.end());
+    for (size_t i = 0; i < vFiles.size() - s_nMaxCacheFiles; ++i)
+        remove(vFiles[i].second.c_str());
+}
 
-size_t Smf::fileReadString(char* pString, size_t nSize, FILE* pFile) {
-    size_t nRead   = fread(pString, 1, nSize, pFile);
-    pString[nRead] = '\0';
-    return nRead;
+void Smf::stopLoading() {
+    if (!m_pLoadThread)
+        return;
+    m_bStopLoading = true;
+    m_pLoadThread->join();
+    delete m_pLoadThread;
+    m_pLoadThread  = NULL;
+    m_bStopLoading = false;
 }
 
 uint32_t Smf::getMicrosecondsPerQuarterNote(uint32_t nTime) {
+    std::lock_guard<std::mutex> lock(m_mutexTempo);
     for (auto it = m_mTempoMap.begin(); it != m_mTempoMap.end(); ++it) {
         if (it->first < nTime)
             continue;
@@ -123,162 +497,59 @@ bool Smf::isTrackMuted(size_t nTrack) {
 
 /*** Public functions ***/
 
-bool Smf::load(char* sFilename) {
+bool Smf::load(char* sFilename, double dPreload, bool bSaveCache) {
     unload();
 
-    FILE* pFile;
-    pFile = fopen(sFilename, "r");
-    if (pFile == NULL) {
+    struct stat fileStat;
+    if (stat(sFilename, &fileStat) || !readFile(sFilename)) {
         DPRINTF("Failed to open file '%s'\n", sFilename);
+        m_vLoadData.clear();
         return false;
     }
-    char sHeader[4];
-
-    // Iterate each block within IFF file
-    while (fread(sHeader, 4, 1, pFile) == 1) {
-        uint32_t nPosition  = 0;
-        double fPosition    = 0.0;
-        uint32_t nBlockSize = fileRead32(pFile);
-        if (memcmp(sHeader, "MThd", 4) == 0) {
-            // SMF file header
-            DPRINTF("Found MThd block of size %u\n", nBlockSize);
-            m_nFormat          = fileRead16(pFile);
-            m_nTracks          = fileRead16(pFile);
-            uint16_t nDivision = fileRead16(pFile);
-            m_bTimecodeBased   = ((nDivision & 0x8000) == 0x8000);
-            if (m_bTimecodeBased) {
-                m_nSmpteFps        = -(int8_t(nDivision & 0xFF00) >> 8);
-                m_nSmpteResolution = nDivision & 0x00FF;
-                DPRINTF("Standard MIDI File - Format: %u, Tracks: %u, SMPTE fps: %u, SMPTE subframe resolution: %u\n", m_nFormat, m_nTracks, m_nSmpteFps,
-                        m_nSmpteResolution);
-                unload();
-                fprintf(stderr, "zynsmf does not support SMPTE timebase SMF\n");
-                //!@todo Add support for SMPTE timebase
-                return false;
-            } else {
-                m_nTicksPerQuarterNote = nDivision & 0x7FFF;
-                DPRINTF("Standard MIDI File - Format: %u, Tracks: %u, Ticks per quarter note: %u\n", m_nFormat, m_nTracks, m_nTicksPerQuarterNote);
-            }
-            DPRINTF("\n");
-            for (size_t i = 0; i < nBlockSize - 6; ++i)
-                fileRead8(pFile); // Eat any extra header bytes which might be added in later version of SMF standard
-        } else if (memcmp(sHeader, "MTrk", 4) == 0) {
-            // SMF track header
-            DPRINTF("Found MTrk block of size %u\n", nBlockSize);
-            Track* pTrack = new Track();
-            m_vTracks.push_back(pTrack);
-            uint8_t nRunningStatus = 0;
-            long nEnd              = ftell(pFile) + nBlockSize;
-            while (ftell(pFile) < nEnd) {
-                uint32_t nDelta = fileReadVar(pFile);
-                nPosition += nDelta;
-                fPosition += double(getMicrosecondsPerQuarterNote(nPosition)) * nDelta / m_nTicksPerQuarterNote;
-                uint8_t nStatus = fileRead8(pFile);
-                DPRINTF("Abs: %u Delta: %u ", nPosition, nDelta);
-                if ((nStatus & 0x80) == 0) {
-                    nStatus = nRunningStatus;
-                    fseek(pFile, -1, SEEK_CUR);
-                }
-                uint32_t nMessageLength;
-                uint8_t nMetaType;
-                uint8_t nChannel;
-                uint8_t* pData;
-                Event* pEvent = NULL;
-                switch (nStatus) {
-                case 0xFF:
-                    // Meta event
-                    nMetaType      = fileRead8(pFile);
-                    nMessageLength = fileReadVar(pFile);
-                    pData          = new uint8_t[nMessageLength + 1];
-                    fread(pData, nMessageLength, 1, pFile);
-                    pEvent = new Event(nPosition, EVENT_TYPE_META, nMetaType, nMessageLength, pData);
-                    pTrack->addEvent(pEvent);
-                    if (nMetaType == 0x51)
-                        m_mTempoMap[nPosition] = pEvent->getInt32();
-                    else if (nMetaType == 0x7F) // Manufacturer
-                        m_nManufacturerId = pEvent->getInt32();
-                    nRunningStatus = 0;
-                    break;
-                case 0xF0:
-                    // SysEx event
-                    //!@todo Store SysEx messages
-                    nMessageLength = fileReadVar(pFile);
-                    DPRINTF("SysEx %u bytes\n", nMessageLength);
-                    if (nMessageLength > 0) {
-                        fseek(pFile, nMessageLength - 1, SEEK_CUR);
-                        if (fileRead8(pFile) == 0xF7)
-                            nRunningStatus = 0xF0;
-                        else
-                            nRunningStatus = 0;
-                    } else
-                        nRunningStatus = 0;
-                    break;
-                case 0xF7:
-                    // End of SysEx or Escape sequence
-                    nMessageLength = fileReadVar(pFile);
-                    if (nRunningStatus == 0xF0) {
-                        DPRINTF("SysEx continuation %u bytes\n", nMessageLength);
-                        if (nMessageLength > 0) {
-                            fseek(pFile, nMessageLength - 1, SEEK_CUR);
-                            if (fileRead8(pFile) == 0xF7)
-                                nRunningStatus = 0;
-                        } else
-                            nRunningStatus = 0;
-                    } else {
-                        DPRINTF("Escape sequence %u bytes\n", nMessageLength);
-                        pData = new uint8_t[nMessageLength];
-                        fread(pData, nMessageLength, 1, pFile);
-                        pEvent = new Event(nPosition, EVENT_TYPE_ESCAPE, 0, nMessageLength, pData);
-                        pTrack->addEvent(pEvent);
-                        nRunningStatus = 0;
-                    }
-                    break;
-                default:
-                    // MIDI event
-                    nChannel       = nStatus & 0x0F;
-                    nRunningStatus = nStatus;
-                    switch (nStatus & 0xF0) {
-                    case 0x80: // Note Off
-                    case 0x90: // Note On
-                    case 0xA0: // Polyphonic Pressure
-                    case 0xB0: // Control Change
-                    case 0xE0: // Pitchbend
-                        // MIDI commands with 2 parameters
-                        pData = new uint8_t[2];
-                        fread(pData, 1, 2, pFile);
-                        pEvent = new Event(nPosition, EVENT_TYPE_MIDI, nStatus, 2, pData);
-                        pTrack->addEvent(pEvent);
-                        break;
-                    case 0xC0: // Program Change
-                    case 0xD0: // Channel Pressure
-                        pData = new uint8_t;
-                        fread(pData, 1, 1, pFile);
-                        pEvent = new Event(nPosition, EVENT_TYPE_MIDI, nStatus, 1, pData);
-                        pTrack->addEvent(pEvent);
-                        break;
-                    default:
-                        DPRINTF("Unexpected MIDI event 0x%02X\n", nStatus);
-                        nRunningStatus = 0;
-                    }
-                }
-            }
-        } else {
-            // Ignore unknown block
-            DPRINTF("Found unsupported %c%c%c%c block of size %u\n", sHeader[0], sHeader[1], sHeader[2], sHeader[3], nBlockSize);
-            fseek(pFile, nBlockSize, SEEK_CUR);
+    m_sFilename    = sFilename;
+    m_nSourceSize  = fileStat.st_size;
+    m_nSourceMtime = int64_t(fileStat.st_mtim.tv_sec) * 1000000000 + fileStat.st_mtim.tv_nsec;
+    m_bLoading     = true;
+    m_nLoadedTicks = 0;
+
+    if (!s_sCacheDir.empty()) {
+        // Event cache file is named after FNV-1a hash of path, mtime & size of SMF
+        std::string sKey = m_sFilename + ":" + std::to_string(m_nSourceMtime) + ":" + std::to_string(m_nSourceSize);
+        uint64_t nHash   = 0xcbf29ce484222325;
+        for (char c : sKey)
+            nHash = (nHash ^ uint8_t(c)) * 0x100000001b3;
+        char sHash[17];
+        snprintf(sHash, sizeof(sHash), "%016llx", (unsigned long long)nHash);
+        m_sCacheFilename = s_sCacheDir + "/" + sHash + ".smfc";
+        std::vector<uint8_t> vSmfData;
+        vSmfData.swap(m_vLoadData);
+        m_bFromCache = readFile(m_sCacheFilename.c_str()) && openCache();
+        if (!m_bFromCache) {
+            for (auto it = m_vTracks.begin(); it != m_vTracks.end(); ++it)
+                delete (*it);
+            m_vTracks.clear();
+            m_vLoadData.swap(vSmfData);
+            m_bSaveCache = bSaveCache;
         }
-        if (nPosition > m_nDurationInTicks)
-            m_nDurationInTicks = nPosition;
-        if (fPosition > m_fDuration * 1000000)
-            m_fDuration = fPosition / 1000000;
+    }
+    if (!m_bFromCache && !openSmf()) {
+        unload();
+        return false;
     }
 
-    fclose(pFile);
     setPosition(0);
-
+    if (!loadEvents(dPreload))
+        m_pLoadThread = new std::thread(&Smf::loadEvents, this, -1.0);
     return true;
 }
 
+bool Smf::isLoading() { return m_bLoading.load(std::memory_order_acquire); }
+
+void Smf::setCacheDir(const char* sPath, size_t nMaxFiles) {
+    s_sCacheDir      = sPath;
+    s_nMaxCacheFiles = nMaxFiles;
+}
+
 bool Smf::save(char* sFilename) {
     if (getEvents() < 2)
         return false; // Don't save if empty (or only the first tempo)
@@ -349,6 +620,7 @@ bool Smf::save(char* sFilename) {
 }
 
 void Smf::unload() {
+    stopLoading();
     for (auto it = m_vTracks.begin(); it != m_vTracks.end(); ++it)
         delete (*it);
     m_vTracks.clear();
@@ -361,11 +633,33 @@ void Smf::unload() {
     m_nManufacturerId      = 0;
     m_nDurationInTicks     = 0;
     m_fDuration            = 0.0;
+    m_mTempoMap.clear();
+    m_vLoadData.clear();
+    m_vLoadCursors.clear();
+    m_qLoadQueue = decltype(m_qLoadQueue)();
+    m_vCacheData.clear();
+    m_sCacheFilename.clear();
+    m_bFromCache   = false;
+    m_bSaveCache   = false;
+    m_nLoadPos     = 0;
+    m_nLoadTime    = 0;
+    m_nLoadTempo   = 500000;
+    m_dLoadSeconds = 0;
+    m_bLoading     = false;
+    m_nLoadedTicks = LOADED_ALL;
 }
 
-double Smf::getDuration() { return m_fDuration; }
+double Smf::getDuration() {
+    // Duration is set when parsing finishes (or from event cache before loading)
+    if (isLoading() && !m_bFromCache)
+        return 0.0;
+    return m_fDuration;
+}
 
 Event* Smf::getEvent(bool bAdvance) {
+    // Events before m_nLoadedTicks are loaded, so tracks can't have any earlier event pending
+    bool bLoading    = isLoading();
+    uint32_t nLoaded = m_nLoadedTicks.load(std::memory_order_acquire);
     size_t nPosition = -1;
     for (size_t nTrack = 0; nTrack < m_vTracks.size(); ++nTrack) {
         // Iterate through tracks and find earilest next event
@@ -375,7 +669,7 @@ Event* Smf::getEvent(bool bAdvance) {
             m_nCurrentTrack = nTrack;
         }
     }
-    if (nPosition == -1)
+    if (nPosition == -1 || (bLoading && nPosition >= nLoaded))
         return NULL;
     if (bAdvance)
         m_nPosition = nPosition;
@@ -3,9 +3,13 @@
 #pragma once
 
 #include "track.h" //provides Track class
+#include <atomic>  //provides atomic load state
 #include <cstdio>  //provides FILE
 #include <map>     //provides map class
+#include <mutex>   //provides mutex to protect tempo map
+#include <queue>   //provides priority_queue to merge tracks while parsing
 #include <string>  //provides string
+#include <thread>  //provides background loading thread
 #include <vector>  //provides vector class
 
 class Smf {
@@ -20,9 +24,23 @@ class Smf {
 
     /** @brief  Load a SMF file
      *   @param  sFilename Full path and name of file to load
+     *   @param  dPreload Seconds of song to load before returning. The rest is loaded by a background thread. (Default: -1 to load whole song)
+     *   @param  bSaveCache True to save events to the event cache if not cached yet (Default: false)
      *   @retval bool True on success
+     *   @note   Events are loaded from the event cache if the file was loaded before with bSaveCache
      */
-    bool load(char* sFilename);
+    bool load(char* sFilename, double dPreload = -1, bool bSaveCache = false);
+
+    /** @brief  Check if song is still being loaded by background thread
+     *   @retval bool True if loading
+     */
+    bool isLoading();
+
+    /** @brief  Set directory where event cache files are saved
+     *   @param  sPath Full path of directory or empty string to disable event cache
+     *   @param  nMaxFiles Maximum quantity of cache files. Oldest files are removed when exceeded. (Default: 0 for no limit)
+     */
+    static void setCacheDir(const char* sPath, size_t nMaxFiles = 0);
 
     /** @brief  Save a SMF file
      *   @param  sFilename Full path and name of file to save
@@ -51,7 +69,7 @@ class Smf {
     bool removeTrack(size_t nTrack);
 
     /** @brief  Get duration of longest track
-     *   @retval double Duration in milliseconds
+     *   @retval double Duration in milliseconds (0 while loading, unless loaded from event cache)
      *   @todo   Should Smf class should return duration in ticks, microseconds and seconds?
      */
     double getDuration();
@@ -59,6 +77,7 @@ class Smf {
     /** @brief  Get current event
      *   @param  bAdvance True to advance to next event (Default: false)
      *   @retval Event* Pointer to the next event
+     *   @note   While loading, NULL is returned when next event is not loaded yet
      */
     Event* getEvent(bool bAdvance = false);
 
@@ -123,12 +142,6 @@ class Smf {
      */
     int fileWrite8(uint8_t nValue, FILE* pFile);
 
-    /** @brief  Read 8-bit word from file
-     *   @param  pfile Pointer to open file
-     *   @retval uint8_t 8-bit word read from file
-     */
-    uint8_t fileRead8(FILE* pFile);
-
     /** @brief  Write 16-bit word to file
      *   @param  nValue 16-bit word  to write
      *   @param  pfile Pointer to open file
@@ -136,12 +149,6 @@ class Smf {
      */
     int fileWrite16(uint16_t nValue, FILE* pFile);
 
-    /** @brief  Read 16-bit word from file
-     *   @param  pfile Pointer to open file
-     *   @retval uint16_t 16-bit word read from file
-     */
-    uint16_t fileRead16(FILE* pFile);
-
     /** @brief  Write 32 bit word to file
      *   @param  nValue 32-bit word to write
      *   @param  pfile Pointer to open file
@@ -149,12 +156,6 @@ class Smf {
      */
     int fileWrite32(uint32_t nValue, FILE* pFile);
 
-    /** @brief  Read 32-bit word from file
-     *   @param  pfile Pointer to open file
-     *   @retval uint8_t 32-bit word read from file
-     */
-    uint32_t fileRead32(FILE* pFile);
-
     /** @brief  Write variable length number to file
      *   @param  nValue Number to be written
      *   @param  pfile Pointer to open file
@@ -162,12 +163,6 @@ class Smf {
      */
     int fileWriteVar(uint32_t nValue, FILE* pFile);
 
-    /** @brief  Read variable length number from file
-     *   @param  pfile Pointer to open file
-     *   @retval uint32_t Number read from file
-     */
-    uint32_t fileReadVar(FILE* pFile);
-
     /** @brief  Write c-string to file
      *   @param  pString Pointer to a char buffer to store string
      *   @param  nSize Length of c-string without terminating null character
@@ -176,13 +171,92 @@ class Smf {
      */
     size_t fileWriteString(const char* pString, size_t nSize, FILE* pFile);
 
-    /** @brief  Read c-string from file
-     *   @param  pString Pointer to a char buffer to store string
-     *   @param  nSize Length of c-string without terminating null character
-     *   @param  pfile Pointer to open file
-     *   @retval size_t Quantity of bytes read from file
+    /** @brief  Read 8-bit word from loaded file data
+     *   @param  nPos Offset within file data, advanced past the word
+     *   @retval uint8_t 8-bit word or 0 if beyond end of data
+     */
+    uint8_t read8(size_t& nPos);
+
+    /** @brief  Read big-endian 16-bit word from loaded file data
+     *   @param  nPos Offset within file data, advanced past the word
+     *   @retval uint16_t 16-bit word
      */
-    size_t fileReadString(char* pString, size_t nSize, FILE* pFile);
+    uint16_t read16(size_t& nPos);
+
+    /** @brief  Read big-endian 32-bit word from loaded file data
+     *   @param  nPos Offset within file data, advanced past the word
+     *   @retval uint32_t 32-bit word
+     */
+    uint32_t read32(size_t& nPos);
+
+    /** @brief  Read variable length number from loaded file data
+     *   @param  nPos Offset within file data, advanced past the number
+     *   @retval uint32_t Number
+     */
+    uint32_t readVar(size_t& nPos);
+
+    /** @brief  Read a block of loaded file data into a new buffer
+     *   @param  nPos Offset within file data, advanced past the block
+     *   @param  nSize Quantity of bytes to read
+     *   @param  nAlloc Size of buffer to allocate, at least nSize. Bytes not read are zeroed.
+     *   @retval uint8_t* Pointer to new buffer
+     */
+    uint8_t* readData(size_t& nPos, uint32_t nSize, uint32_t nAlloc);
+
+    /** @brief  Read whole file into memory
+     *   @param  sFilename Full path and name of file
+     *   @retval bool True on success
+     */
+    bool readFile(const char* sFilename);
+
+    /** @brief  Parse IFF blocks of loaded SMF data, creating tracks and preparing to parse their events
+     *   @retval bool True on success
+     */
+    bool openSmf();
+
+    /** @brief  Check header of loaded event cache data and create tracks
+     *   @retval bool True if cache is valid for the loaded SMF
+     */
+    bool openCache();
+
+    /** @brief  Load events in time order
+     *   @param  dPreload Seconds of song to load before returning or -1 to load whole song
+     *   @retval bool True if whole song is loaded
+     */
+    bool loadEvents(double dPreload);
+
+    /** @brief  Parse the earliest pending event of all tracks
+     *   @retval bool False if there are no more events
+     */
+    bool parseEvent();
+
+    /** @brief  Read next event from event cache data
+     *   @retval bool False if there are no more events
+     */
+    bool readCacheEvent();
+
+    /** @brief  Add event to track, publishing it to the player
+     *   @param  nTrack Index of track
+     *   @param  pEvent Pointer to the event, not earlier than previous loaded event
+     */
+    void addLoadedEvent(size_t nTrack, Event* pEvent);
+
+    /** @brief  Free load data, save event cache if required and flag song as loaded
+     */
+    void finishLoading();
+
+    /** @brief  Save loaded events to event cache
+     *   @retval bool True on success
+     */
+    bool saveCache();
+
+    /** @brief  Remove oldest event cache files if there are more than the maximum
+     */
+    static void pruneCache();
+
+    /** @brief  Stop background loading thread and wait for it to finish
+     */
+    void stopLoading();
 
     std::vector<Track*> m_vTracks;            // Vector of tracks within SMF
     std::map<uint32_t, uint32_t> m_mTempoMap; // Map of tempo changes (duration of quarter note in microseconds) indexed by time in ticks
@@ -199,4 +273,36 @@ class Smf {
     size_t m_nPosition              = 0;      // Event cursor position in ticks
     size_t m_nCurrentTrack          = 0;      // Index of track that last event was retrieved
     double m_fDuration              = 0;      // Duration of song in seconds
+
+    // Cursor within a track, used while parsing
+    struct TRACK_CURSOR {
+        size_t nPos;            // Offset of next byte within file data
+        size_t nEnd;            // Offset of end of track block within file data
+        uint32_t nTime;         // Time of next event in ticks
+        uint8_t nRunningStatus; // Running status
+    };
+
+    // Time & index of tracks with pending events, earliest first
+    typedef std::priority_queue<std::pair<uint32_t, size_t>, std::vector<std::pair<uint32_t, size_t>>, std::greater<std::pair<uint32_t, size_t>>> LOAD_QUEUE;
+
+    static std::string s_sCacheDir;                   // Directory of event cache files (empty to disable event cache)
+    static size_t s_nMaxCacheFiles;                   // Maximum quantity of event cache files (0 for no limit)
+    std::vector<uint8_t> m_vLoadData;                 // Content of file being loaded (SMF or event cache)
+    std::vector<TRACK_CURSOR> m_vLoadCursors;         // Parse cursor of each track
+    LOAD_QUEUE m_qLoadQueue;                          // Tracks with pending events while parsing
+    std::vector<uint8_t> m_vCacheData;                // Events to save in event cache
+    std::string m_sCacheFilename;                     // Full path and name of event cache file (empty if not cached)
+    bool m_bFromCache      = false;                   // True if loading from event cache
+    bool m_bSaveCache      = false;                   // True to save event cache when loaded
+    size_t m_nLoadPos      = 0;                       // Offset of next cached event within cache data
+    uint32_t m_nLoadTime   = 0;                       // Time of last loaded event in ticks
+    uint32_t m_nLoadTempo  = 500000;                  // Tempo at last loaded event (microseconds per quarter note)
+    double m_dLoadSeconds  = 0;                       // Time of last loaded event in seconds
+    uint64_t m_nSourceSize = 0;                       // Size of SMF file being loaded
+    int64_t m_nSourceMtime = 0;                       // Modification time of SMF file being loaded in nanoseconds
+    std::atomic<bool> m_bLoading{false};              // True while events are being loaded
+    std::atomic<bool> m_bStopLoading{false};          // True to request background loading thread to stop
+    std::atomic<uint32_t> m_nLoadedTicks{0xFFFFFFFF}; // Time before which all events are loaded (while loading)
+    std::thread* m_pLoadThread = NULL;                // Background loading thread
+    std::mutex m_mutexTempo;                          // Protects tempo map while loading
 };
\ No newline at end of file
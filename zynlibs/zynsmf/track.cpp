@@ -8,6 +8,7 @@ void Track::clear() {
     for (auto it = m_vSchedule.begin(); it != m_vSchedule.end(); ++it)
         delete *it;
     m_vSchedule.clear();
+    m_nEvents = 0;
 }
 
 void Track::addEvent(Event* pEvent) {
@@ -19,16 +20,29 @@ void Track::addEvent(Event* pEvent) {
         auto it = m_vSchedule.begin();
         it += index;
         m_vSchedule.insert(it, pEvent);
+        m_nEvents = m_vSchedule.size();
         return;
     }
     m_vSchedule.insert(m_vSchedule.begin(), pEvent);
+    m_nEvents = m_vSchedule.size();
 }
 
+bool Track::appendEvent(Event* pEvent) {
+    if (m_vSchedule.size() >= m_vSchedule.capacity())
+        return false;
+    m_vSchedule.push_back(pEvent);
+    m_nEvents.store(m_vSchedule.size(), std::memory_order_release);
+    return true;
+}
+
+void Track::reserve(size_t nEvents) { m_vSchedule.reserve(nEvents); }
+
 void Track::removeEvent(size_t nEvent) {
     if (nEvent >= m_vSchedule.size())
         return;
     delete (m_vSchedule[nEvent]);
     m_vSchedule.erase(m_vSchedule.begin() + nEvent);
+    m_nEvents = m_vSchedule.size();
 }
 
 void Track::removeEvent(Event* pEvent) {
@@ -39,21 +53,23 @@ void Track::removeEvent(Event* pEvent) {
     if (it != m_vSchedule.end()) {
         delete *it;
         m_vSchedule.erase(it);
+        m_nEvents = m_vSchedule.size();
     }
 }
 
 Event* Track::getEvent(bool bAdvance) {
-    if (m_nNextEvent >= m_vSchedule.size())
+    if (m_nNextEvent >= m_nEvents.load(std::memory_order_acquire))
         return NULL;
     if (bAdvance)
         return m_vSchedule[m_nNextEvent++];
     return m_vSchedule[m_nNextEvent];
 }
 
-size_t Track::getEvents() { return m_vSchedule.size(); }
+size_t Track::getEvents() { return m_nEvents.load(std::memory_order_acquire); }
 
 void Track::setPosition(size_t nTime) {
-    for (m_nNextEvent = 0; m_nNextEvent < m_vSchedule.size(); ++m_nNextEvent) {
+    size_t nEvents = m_nEvents.load(std::memory_order_acquire);
+    for (m_nNextEvent = 0; m_nNextEvent < nEvents; ++m_nNextEvent) {
         if (m_vSchedule[m_nNextEvent]->getTime() < nTime)
             continue;
         return;
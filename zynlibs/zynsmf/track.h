@@ -1,6 +1,7 @@
 #pragma once
 
 #include "event.h"
+#include <atomic>
 #include <cstddef>
 #include <cstdint>
 #include <stddef.h>
@@ -21,6 +22,18 @@ class Track {
      */
     void addEvent(Event* pEvent);
 
+    /** @brief  Append an event to end of track without sorting
+     *   @param  pEvent Pointer to an Event object, not earlier than last event
+     *   @retval bool True on success, false if there is no reserved space left
+     *   @note   Used while loading a SMF. Events are published to readers of other threads, so space must be reserved before.
+     */
+    bool appendEvent(Event* pEvent);
+
+    /** @brief  Reserve space for events, so appending doesn't move them
+     *   @param  nEvents Quantity of events
+     */
+    void reserve(size_t nEvents);
+
     /** @brief  Remove event by index
      *   @param  nEvent Index of event to remove
      */
@@ -61,5 +74,6 @@ class Track {
     bool m_bMute = false;
     uint32_t m_nPosition;
     std::vector<Event*> m_vSchedule;
-    size_t m_nNextEvent = 0; // Index of the next event
+    std::atomic<size_t> m_nEvents{0}; // Quantity of events published to readers
+    size_t m_nNextEvent = 0;          // Index of the next event
 };
@@ -3,12 +3,15 @@
 # Unit tests for zynsmf
 # Tests use two letters to define order of groups and two digit integer to define order within group
 
+import os
 import unittest
+import tempfile
 import jack
 from time import sleep
 
 from zynlibs.zynsmf import zynsmf
 from zynlibs.zynsmf.zynsmf import libsmf
+from zynlibs.zynsmf.benchmark import generate_smf
 
 smf = None
 client = jack.Client("zynsmf_unittest")
@@ -19,6 +22,19 @@ PLAYING = 2
 STOPPING = 3
 
 
+def get_events(smf):
+    """Get list of (time, track, type, status, value1, value2) of all events"""
+
+    while libsmf.isLoading(smf):
+        sleep(0.01)
+    events = []
+    libsmf.setPosition(smf, 0)
+    while libsmf.getEvent(smf, True):
+        events.append((libsmf.getEventTime(), libsmf.getEventTrack(), libsmf.getEventType(),
+                       libsmf.getEventStatus(), libsmf.getEventValue1(), libsmf.getEventValue2()))
+    return events
+
+
 class TestLibZynSmf(unittest.TestCase):
     @classmethod
     def setUpClass(self):
@@ -64,6 +80,44 @@ class TestLibZynSmf(unittest.TestCase):
         self.assertEqual(libsmf.getEventValue1(), 60)
         self.assertEqual(libsmf.getEventValue2(), 100)
 
+    def test_aa07_load_stream(self):
+        self.assertTrue(zynsmf.load(smf, "./test.mid", 0.5))
+        while libsmf.isLoading(smf):
+            sleep(0.01)
+        self.assertEqual(libsmf.getTracks(smf), 1)
+        libsmf.setPosition(smf, 0)
+        self.assertEqual(libsmf.getEventTime(), 0)
+
+    def test_aa08_cache(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            fpath = os.path.join(tmpdir, "song.mid")
+            cache_dir = os.path.join(tmpdir, "smf_cache")
+            generate_smf(fpath, 2, 4)
+            libsmf.setCacheDir(bytes(cache_dir, "utf-8"), 1)
+            try:
+                # Loading file info doesn't save the event cache
+                self.assertTrue(zynsmf.load(smf, fpath))
+                events = get_events(smf)
+                duration = libsmf.getDuration(smf)
+                self.assertFalse(os.path.isdir(cache_dir))
+                # Playback load saves it
+                self.assertTrue(zynsmf.load(smf, fpath, 1))
+                self.assertEqual(get_events(smf), events)
+                self.assertEqual(len(os.listdir(cache_dir)), 1)
+                # Next loads use it
+                self.assertTrue(zynsmf.load(smf, fpath))
+                self.assertEqual(get_events(smf), events)
+                self.assertEqual(libsmf.getDuration(smf), duration)
+                self.assertTrue(zynsmf.load(smf, fpath, 1))
+                self.assertEqual(get_events(smf), events)
+                # Saving a new cache file removes the oldest one
+                os.utime(fpath, ns=(0, 0))
+                self.assertTrue(zynsmf.load(smf, fpath, -1))
+                self.assertEqual(get_events(smf), events)
+                self.assertEqual(len(os.listdir(cache_dir)), 1)
+            finally:
+                libsmf.setCacheDir(bytes(zynsmf.SMF_CACHE_DIR, "utf-8"), zynsmf.MAX_CACHE_FILES)
+
     def test_ab_01_player(self):
         self.assertTrue(zynsmf.load(smf, "./test.mid"))
         self.assertTrue(libsmf.attachPlayer(smf))
@@ -9,7 +9,9 @@
 #include <jack/jack.h>     //provides interface to JACK
 #include <jack/midiport.h> //provides interface to JACK MIDI ports
 #include <map>             //provides std::map
+#include <semaphore.h>     //provides semaphore to wake status thread
 #include <stdio.h>         //provides printf
+#include <thread>          //provides status thread
 
 #define DPRINTF(fmt, args...)                                                                                                                                  \
     if (g_bDebug)                                                                                                                                              \
@@ -42,6 +44,11 @@ bool g_aRecNotes[16][128];
 int8_t g_nTranspose  = 0;     // +/- notes to transpose playback
 bool g_bClearHanging = false; // True to request hanging notes are cleared in next process cycle
 
+status_cb_fn_t* g_pStatusCb = NULL;  // Pointer to function to receive notification of status change
+std::thread* g_pStatusThread = NULL; // Thread that calls status callback, so it is not called from JACK process thread
+sem_t g_semStatus;                   // Posted by JACK process thread when status changes
+bool g_bStatusThreadExit = false;    // True to request status thread to exit
+
 Smf* g_pPlayerSmf    = NULL; // Pointer to the SMF object that is attached to player
 Smf* g_pRecorderSmf  = NULL; // Pointer to the SMF object that is attached to recorder
 Smf* g_pSmf          = NULL; // Pointer to the SMF containing g_pEvent (current event)
@@ -121,6 +128,20 @@ bool load(Smf* pSmf, char* filename) {
     return pSmf->load(filename);
 }
 
+bool loadStream(Smf* pSmf, char* filename, double preload) {
+    if (!isSmfValid(pSmf))
+        return false;
+    return pSmf->load(filename, preload, true);
+}
+
+bool isLoading(Smf* pSmf) {
+    if (!isSmfValid(pSmf))
+        return false;
+    return pSmf->isLoading();
+}
+
+void setCacheDir(char* path, uint32_t maxFiles) { Smf::setCacheDir(path, maxFiles); }
+
 bool save(Smf* pSmf, char* filename) {
     if (!isSmfValid(pSmf))
         return false;
@@ -273,7 +294,19 @@ static int onJackSamplerate(jack_nframes_t nFrames, void* args) {
 }
 
 // Handle JACK process callback
-static int onJackProcess(jack_nframes_t nFrames, void* notused) {
+// Check for change of play or record state, waking status thread. Called from JACK process thread.
+static void checkStatus() {
+    static uint8_t nLastPlayState = STOPPED;
+    static bool bLastRecording    = false;
+    if (nLastPlayState != g_nPlayState || bLastRecording != g_bRecording) {
+        nLastPlayState = g_nPlayState;
+        bLastRecording = g_bRecording;
+        if (g_pStatusThread)
+            sem_post(&g_semStatus);
+    }
+}
+
+static int processJack(jack_nframes_t nFrames) {
     static uint8_t nCommand;
     static uint8_t nData1;
     static uint8_t nData2;
@@ -442,7 +475,7 @@ static int onJackProcess(jack_nframes_t nFrames, void* notused) {
                     }
                 }
             }
-            if (!g_pPlayerSmf->getEvent(false)) {
+            if (!g_pPlayerSmf->getEvent(false) && !g_pPlayerSmf->isLoading()) {
                 // No more events so must be at end of song
                 stopPlayback();
                 if (g_bLoop)
@@ -469,6 +502,12 @@ static int onJackProcess(jack_nframes_t nFrames, void* notused) {
     return 0;
 }
 
+static int onJackProcess(jack_nframes_t nFrames, void* notused) {
+    int nResult = processJack(nFrames);
+    checkStatus();
+    return nResult;
+}
+
 void removeJackClient() {
     if (g_pJackClient)
         jack_client_close(g_pJackClient);
@@ -607,6 +646,39 @@ void stopRecording() {
 
 bool isRecording() { return g_bRecording; }
 
+static void statusThreadFn() {
+    uint8_t nPlayState = STOPPED;
+    bool bRecording    = false;
+    while (true) {
+        sem_wait(&g_semStatus);
+        if (g_bStatusThreadExit)
+            break;
+        if (nPlayState == g_nPlayState && bRecording == g_bRecording)
+            continue;
+        nPlayState = g_nPlayState;
+        bRecording = g_bRecording;
+        status_cb_fn_t* pCb = g_pStatusCb;
+        if (pCb)
+            pCb(nPlayState, bRecording);
+    }
+}
+
+void setStatusCallback(status_cb_fn_t* cb_fn) {
+    g_pStatusCb = cb_fn;
+    if (cb_fn && !g_pStatusThread) {
+        sem_init(&g_semStatus, 0, 0);
+        g_bStatusThreadExit = false;
+        g_pStatusThread     = new std::thread(statusThreadFn);
+    } else if (!cb_fn && g_pStatusThread) {
+        g_bStatusThreadExit = true;
+        sem_post(&g_semStatus);
+        g_pStatusThread->join();
+        delete g_pStatusThread;
+        g_pStatusThread = NULL;
+        sem_destroy(&g_semStatus);
+    }
+}
+
 double getTempo(Smf* pSmf, uint32_t nTime) {
     if (!isSmfValid(pSmf))
         return 120.0;
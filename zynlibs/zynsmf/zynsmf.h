@@ -41,6 +41,28 @@ void enableDebug(bool bEnable);
  */
 bool load(Smf* pSmf, char* filename);
 
+/** @brief  Load a file into a SMF object, loading the rest of the song in background
+ *   @param  pSmf Pointer to the SMF object to populate
+ *   @param  filename Full path and name of file to load
+ *   @param  preload Seconds of song loaded before returning or -1 to load whole song
+ *   @retval bool True on success
+ *   @note   Playback may start before loading finishes. It waits for events not loaded yet.
+ *   @note   Use it to load songs for playback. Events are saved to the event cache, so next load is faster.
+ */
+bool loadStream(Smf* pSmf, char* filename, double preload);
+
+/** @brief  Check if a SMF is still being loaded in background
+ *   @param  pSmf Pointer to the SMF
+ *   @retval bool True if loading
+ */
+bool isLoading(Smf* pSmf);
+
+/** @brief  Set directory where loaded events are cached, so files load faster next time
+ *   @param  path Full path of directory or empty string to disable event cache
+ *   @param  maxFiles Maximum quantity of cache files. Oldest files are removed when exceeded. 0 for no limit.
+ */
+void setCacheDir(char* path, uint32_t maxFiles);
+
 /** @brief  Save a SMF object to file
  *   @param  pSmf Pointer to the SMF object to save
  *   @param  filename Full path and name of file to create or overwrite
@@ -209,6 +231,14 @@ void stopRecording();
  */
 bool isRecording();
 
+typedef void status_cb_fn_t(uint8_t, bool);
+
+/** @brief  Register a function to be called when play or record state changes
+ *   @param  cb_fn Pointer to callback function with template void(uint8_t play_state, bool recording) or NULL to unregister
+ *   @note   Callback is called from a dedicated thread, not from JACK process thread
+ */
+void setStatusCallback(status_cb_fn_t* cb_fn);
+
 /** @brief  Get tempo at current position
  *   @param  pSmf Pointer to the SMF
  *   @param  nTime Ticks from start of song
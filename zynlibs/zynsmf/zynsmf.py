@@ -31,6 +31,7 @@ import re
 import unicodedata
 
 libsmf = None
+status_cb = None
 
 EVENT_TYPE_NONE = 0x00
 EVENT_TYPE_MIDI = 0x01
@@ -70,6 +71,11 @@ PLAY_STATE_STARTING = 1
 PLAY_STATE_PLAYING = 2
 PLAY_STATE_STOPPING = 3
 
+STATUS_CB_FN = ctypes.CFUNCTYPE(None, ctypes.c_uint8, ctypes.c_bool)  # void(uint8_t play_state, bool recording)
+
+SMF_CACHE_DIR = os.environ.get('ZYNTHIAN_CONFIG_DIR', "/zynthian/config") + "/smf_cache"
+MAX_CACHE_FILES = 100  # Older event cache files are removed when a new one is saved
+
 
 # -------------------------------------------------------------------------------
 # Zynthian Standard MIDI File Library Wrapper
@@ -114,6 +120,13 @@ def init():
         libsmf.muteTrack.argtypes = [
             ctypes.c_ulong, ctypes.c_uint, ctypes.c_ubyte]
         libsmf.isTrackMuted.argtypes = [ctypes.c_ulong, ctypes.c_uint]
+        libsmf.setStatusCallback.argtypes = [STATUS_CB_FN]
+        libsmf.load.argtypes = [ctypes.c_ulong, ctypes.c_char_p]
+        libsmf.loadStream.argtypes = [ctypes.c_ulong, ctypes.c_char_p, ctypes.c_double]
+        libsmf.isLoading.argtypes = [ctypes.c_ulong]
+        libsmf.isLoading.restype = ctypes.c_bool
+        libsmf.setCacheDir.argtypes = [ctypes.c_char_p, ctypes.c_uint32]
+        libsmf.setCacheDir(bytes(SMF_CACHE_DIR, "utf-8"), MAX_CACHE_FILES)
     except Exception as e:
         libsmf = None
         print(f"Can't initialise zynsmf library: {e}")
@@ -123,19 +136,42 @@ def init():
 def destroy():
     global libsmf
     if libsmf:
+        set_status_cb(None)
         dlclose(libsmf._handle)
     libsmf = None
 
 
+# Set function to be called when play or record state changes
+#  cb: Function with parameters (play_state, recording) or None to disable
+#  Note: cb is called from a library thread
+def set_status_cb(cb):
+    global status_cb
+    status_cb = cb
+    if libsmf:
+        libsmf.setStatusCallback(status_changed_cb if cb else STATUS_CB_FN())
+
+
+@STATUS_CB_FN
+def status_changed_cb(play_state, recording):
+    if callable(status_cb):
+        status_cb(play_state, recording)
+
+
 # Load a MIDI file
 #  smf: Pointer to smf object to populate
 #  filename: Full path and filename
+#  preload: Seconds of song loaded before returning. The rest is loaded in background. -1 to load whole song.
+#      Use it to load songs for playback: events are saved to the event cache, so the next load is faster.
+#      None to load whole song without saving the event cache, i.e. to get file info.
 #  Returns: True on success
-def load(smf, filename):
+def load(smf, filename, preload=None):
     if libsmf:
-        return libsmf.load(ctypes.c_ulong(smf), bytes(filename, "utf-8"))
+        if preload is None:
+            return libsmf.load(ctypes.c_ulong(smf), bytes(filename, "utf-8"))
+        return libsmf.loadStream(ctypes.c_ulong(smf), bytes(filename, "utf-8"), preload)
     return False
 
+
 # Create a safe filename
 #  path: Original filename
 #  max_length: Maximum path length
@@ -146,6 +146,7 @@ ZynthianState = {
     }, # ... Other engines
     "audio_recorder_armed": [0, 3], # List of audio mixer strip indicies armed for multi-track audio recording
     "zynseq_riff_b64": "dmVycwAA...", # Binary encoded RIFF data for step sequencer patterns, sequences, etc.
+    "zynseq_riff_file": "001-My Snapshot.zss.zynseq", # Sidecar file next to the snapshot with the RIFF data, used instead of zynseq_riff_b64 when enabled
     "alsa_mixer": {  # Indexed by processor ID
         "controllers": {  # Dictionary of controllers
             "Digital_0": {  # Indexed by control symbol